@@ -135,7 +135,7 @@ const VerificationPage = () => {
           updateUser({
             ...user!,
             verification_status: data.data.user.verification_status
-          });
+          }, data.data.access_token);
         }
         // Keep showing the success screen
       } else {
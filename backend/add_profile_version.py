@@ -0,0 +1,78 @@
+"""
+Database Update Script for Claims-based /auth/me
+Adds the profile_version column to the users table
+
+Access tokens carry a snapshot of the profile tagged with profile_version;
+every profile write bumps it, which retires older snapshots.
+
+Usage:
+    python add_profile_version.py [env]
+"""
+import psycopg2
+from config import config
+import sys
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def get_db_config(env="production"):
+    """Get database configuration"""
+    cfg = config[env]
+    return {
+        'host': cfg.DB_HOST if hasattr(cfg, 'DB_HOST') else os.getenv('DB_HOST'),
+        'database': cfg.DB_NAME if hasattr(cfg, 'DB_NAME') else os.getenv('DB_NAME'),
+        'user': cfg.DB_USER if hasattr(cfg, 'DB_USER') else os.getenv('DB_USER'),
+        'password': cfg.DB_PASSWORD if hasattr(cfg, 'DB_PASSWORD') else os.getenv('DB_PASSWORD'),
+        'port': cfg.DB_PORT if hasattr(cfg, 'DB_PORT') else os.getenv('DB_PORT')
+    }
+
+def add_profile_version_column(env="production"):
+    """Add profile_version to users (safe to run more than once)"""
+    try:
+        conn = psycopg2.connect(**get_db_config(env))
+    except Exception as e:
+        print(f"❌ Database connection error: {e}")
+        sys.exit(1)
+
+    try:
+        cursor = conn.cursor()
+
+        print("🔄 Adding profile_version column...")
+        cursor.execute("""
+            ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS profile_version INTEGER NOT NULL DEFAULT 1
+        """)
+
+        conn.commit()
+        print("✅ profile_version column is in place")
+        print("\n🚀 Next steps:")
+        print("  1. Restart your backend server")
+        print("  2. Tokens issued from now on carry profile claims")
+
+        cursor.close()
+        conn.close()
+
+    except Exception as e:
+        print(f"\n❌ Error updating database: {e}")
+        conn.rollback()
+        conn.close()
+        sys.exit(1)
+
+if __name__ == '__main__':
+    print("=" * 60)
+    print("  Profile Version Database Update")
+    print("=" * 60)
+    print()
+
+    # Determine environment
+    env = "production"
+    if len(sys.argv) > 1:
+        env = sys.argv[1]
+
+    print(f"Environment: {env}\n")
+
+    add_profile_version_column(env)
+
+    print("\n" + "=" * 60)
@@ -0,0 +1,121 @@
+"""
+ASGI build of the API
+
+The WSGI app (app/) blocks a worker thread on every psycopg2 call and bcrypt
+hash, so concurrency is capped by workers x threads. This package serves the
+same auth_bp routes as async Quart handlers on an asyncpg pool, with bcrypt
+awaited on the shared process pool, so one worker holds many requests in
+flight. Configuration, caches and the token format are shared with the WSGI
+build. Entry point: asgi.py.
+"""
+import asyncio
+
+from quart import Quart, jsonify
+from quart_cors import cors
+
+from app import create_password_hasher, create_profile_cache, create_profile_versions
+from app.json_provider import FastJSONProvider
+from config import config
+from services.async_repository import (
+    AsyncTokenRevocationRepository, AsyncTransactionRepository, AsyncUserRepository,
+    AsyncVerificationRepository, create_pool
+)
+from services.token_cache import VerifiedTokenCache
+from services.token_revocations import RevocationList
+
+
+async def follow_revocations(app):
+    """Keep app.revocation_list current; tokens are refused until the first load"""
+    revocations = app.revocation_list
+    while True:
+        try:
+            revocations.apply(await app.token_revocations.changes(revocations.version))
+        except Exception as e:
+            app.logger.error(f"Token revocation refresh error: {e}")
+        await asyncio.sleep(app.config['TOKEN_REVOCATION_POLL_INTERVAL'])
+
+
+def create_asgi_app(env="development"):
+    """Quart application factory"""
+    app = Quart(__name__)
+
+    # Load configuration
+    app.config.from_object(config[env])
+
+    # Same JSON encoding as the WSGI build
+    app.json = FastJSONProvider(app)
+
+    app = cors(
+        app,
+        allow_origin=app.config['CORS_ORIGINS'],
+        allow_credentials=True,
+        allow_headers=["Content-Type", "Authorization"],
+        expose_headers=["Content-Type"]
+    )
+
+    # bcrypt is awaited on the process pool, never run on the event loop
+    app.password_hasher = create_password_hasher(app)
+    app.profile_cache = create_profile_cache(app)
+    app.profile_versions = create_profile_versions(app) if app.config['JWT_PROFILE_CLAIMS'] else None
+
+    app.token_cache = None
+    if app.config['JWT_CLAIM_CACHE_SIZE'] > 0:
+        app.token_cache = VerifiedTokenCache(
+            max_entries=app.config['JWT_CLAIM_CACHE_SIZE'],
+            max_ttl=app.config['JWT_CLAIM_CACHE_MAX_TTL']
+        )
+
+    # Mirror of token_revocations, fed from the event loop (no refresh thread)
+    app.revocation_list = RevocationList(logger=app.logger)
+
+    # The asyncpg pool belongs to the serving event loop, so it is created
+    # once the server starts rather than at import time
+    @app.before_serving
+    async def open_pool():
+        app.db_pool = await create_pool(
+            app.config,
+            min_size=app.config['DB_POOL_MIN_SIZE'],
+            max_size=app.config['DB_POOL_MAX_SIZE'],
+            max_inactive_lifetime=app.config['DB_POOL_IDLE_TIMEOUT']
+        )
+        app.users = AsyncUserRepository(app.db_pool, timeout=app.config['DB_POOL_TIMEOUT'])
+        app.verification = AsyncVerificationRepository(app.db_pool, timeout=app.config['DB_POOL_TIMEOUT'])
+        app.transactions = AsyncTransactionRepository(app.db_pool, timeout=app.config['DB_POOL_TIMEOUT'])
+        app.token_revocations = AsyncTokenRevocationRepository(app.db_pool, timeout=app.config['DB_POOL_TIMEOUT'])
+        app.revocation_poll = asyncio.create_task(follow_revocations(app))
+
+    @app.after_serving
+    async def close_pool():
+        app.revocation_poll.cancel()
+        await app.db_pool.close()
+        app.password_hasher.shutdown()
+
+    @app.route("/")
+    async def index():
+        return jsonify({
+            'status': 'running',
+            'service': 'Davspay API (ASGI)',
+            'endpoints': '/api/health'
+        })
+
+    # Register blueprints
+    from .routes import auth_bp
+    app.register_blueprint(auth_bp)
+
+    # Global error handlers
+    @app.errorhandler(404)
+    async def not_found(err):
+        return jsonify({
+            "success": False,
+            "message": "Endpoint not found"
+        }), 404
+
+    @app.errorhandler(500)
+    async def internal_server_error(err):
+        app.logger.error(f"Internal server error: {err}")
+        return jsonify({
+            "success": False,
+            "message": "Internal server error"
+        }), 500
+
+    return app
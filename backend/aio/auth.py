@@ -0,0 +1,127 @@
+"""
+JWT handling for the ASGI build
+
+flask_jwt_extended is bound to Flask's request context, so the async build
+encodes and verifies tokens with PyJWT directly. Tokens use the same claims
+layout, secret and algorithm as flask_jwt_extended, so a token issued by
+either build is accepted by the other. Verified claims are cached in the
+same VerifiedTokenCache the WSGI build uses, and tokens revoked through the
+WSGI build (logout, deactivation) are refused by both.
+"""
+import hmac
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+import jwt
+from quart import current_app, g, jsonify, request
+
+from services.repository import DatabaseUnavailable
+
+
+def create_access_token(identity, additional_claims=None):
+    """Access token in flask_jwt_extended's format"""
+    cfg = current_app.config
+    now = datetime.now(timezone.utc)
+    claims = {
+        'fresh': False,
+        'iat': now,
+        'jti': str(uuid.uuid4()),
+        'type': 'access',
+        'sub': identity,
+        'nbf': now,
+        'exp': now + cfg['JWT_ACCESS_TOKEN_EXPIRES']
+    }
+    if additional_claims:
+        claims.update(additional_claims)
+    return jwt.encode(claims, cfg['JWT_SECRET_KEY'], algorithm=cfg.get('JWT_ALGORITHM', 'HS256'))
+
+
+def _auth_error(message, status):
+    # Same body and status codes flask_jwt_extended's default handlers use
+    return jsonify({'msg': message}), status
+
+
+def _bearer_token():
+    """Raw token from the Authorization header, or None"""
+    value = request.headers.get('Authorization')
+    if not value:
+        return None
+    prefix, _, token = value.partition(' ')
+    if prefix != 'Bearer' or not token or ' ' in token:
+        return None
+    return token
+
+
+def _decode(token):
+    cfg = current_app.config
+    return jwt.decode(
+        token,
+        cfg['JWT_SECRET_KEY'],
+        algorithms=[cfg.get('JWT_ALGORITHM', 'HS256')],
+        options={'require': ['exp', 'sub']}
+    )
+
+
+def jwt_required(fn):
+    """Protect an async route with a JWT access token"""
+    @wraps(fn)
+    async def decorator(*args, **kwargs):
+        if 'Authorization' not in request.headers:
+            return _auth_error('Missing Authorization Header', 401)
+        token = _bearer_token()
+        if token is None:
+            return _auth_error("Bad Authorization header. Expected 'Authorization: Bearer <JWT>'", 422)
+
+        cache = current_app.token_cache
+        cached = cache.get(token) if cache is not None else None
+        if cached is not None:
+            claims = cached[1]
+        else:
+            try:
+                claims = _decode(token)
+            except jwt.ExpiredSignatureError:
+                return _auth_error('Token has expired', 401)
+            except jwt.InvalidTokenError as e:
+                return _auth_error(str(e), 422)
+            if claims.get('type') != 'access':
+                return _auth_error('Only non-refresh tokens are allowed', 422)
+            if cache is not None:
+                cache.put(token, jwt.get_unverified_header(token), claims)
+
+        try:
+            revoked = current_app.revocation_list.is_revoked(claims)
+        except DatabaseUnavailable:
+            return jsonify({'success': False, 'message': 'Database connection error'}), 500
+        if revoked:
+            if cache is not None:
+                cache.revoke_token(token)
+            return _auth_error('Token has been revoked', 401)
+
+        g.jwt_claims = claims
+        return await fn(*args, **kwargs)
+    return decorator
+
+
+def admin_token_required(fn):
+    """Reject requests without the configured X-Admin-Token (always, when unset)"""
+    @wraps(fn)
+    async def decorator(*args, **kwargs):
+        expected = current_app.config['ADMIN_API_TOKEN']
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not expected or not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return jsonify({
+                'success': False,
+                'message': 'Admin token required'
+            }), 401
+        return await fn(*args, **kwargs)
+    return decorator
+
+
+def get_jwt():
+    """Claims of the current request's token"""
+    return g.jwt_claims
+
+
+def get_jwt_identity():
+    return g.jwt_claims['sub']
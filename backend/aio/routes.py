@@ -0,0 +1,533 @@
+"""
+Async versions of the auth_bp routes
+
+Same paths, validation, status codes and response bodies as app/routes.py.
+Database calls await the asyncpg pool and bcrypt awaits the process pool, so
+one worker keeps serving other requests while either is in progress.
+"""
+import asyncio
+
+from quart import Blueprint, request, jsonify, current_app
+
+from aio.auth import admin_token_required, create_access_token, get_jwt, get_jwt_identity, jwt_required
+from services.async_repository import pool_stats
+from services.password_hasher import HasherBusy
+from services.profile_versions import profile_claims, profile_from_claims
+from services.repository import DatabaseUnavailable
+from services.transactions import (
+    EXPORT_FORMATS, ExportEncoder, HistoryQueryError, export_filename, history_page,
+    parse_export_args, parse_history_args
+)
+
+auth_bp = Blueprint('auth', __name__, url_prefix='/api')
+
+def hasher_busy_response(err):
+    """503 with Retry-After when the password hashing queue is saturated"""
+    response = jsonify({
+        'success': False,
+        'message': 'Server is busy, please retry shortly'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(err.retry_after)
+    return response
+
+def email_taken_response():
+    """409 for an email that is already registered"""
+    return jsonify({
+        'success': False,
+        'message': 'Email already registered'
+    }), 409
+
+def database_error_response():
+    """500 when no database connection could be obtained"""
+    return jsonify({
+        'success': False,
+        'message': 'Database connection error'
+    }), 500
+
+async def shared(fn, *args):
+    """Call into the profile cache / version map
+
+    The in-memory backends answer without I/O; Redis round trips are moved
+    off the event loop.
+    """
+    if current_app.config['PROFILE_CACHE_BACKEND'] == 'redis':
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+async def load_profile(user_id):
+    """Read-through profile lookup shared by /auth/me and /auth/verification-status"""
+    cache = current_app.profile_cache
+    profile, token = await shared(cache.get, user_id)
+    if profile is not None:
+        return profile
+
+    user = await current_app.users.get_profile(user_id)
+    if user is None:
+        return None
+
+    profile = user._asdict()
+    profile['verification_status'] = user.verification_status or 'not_submitted'
+    await shared(cache.fill, user_id, token, profile)
+    if current_app.profile_versions is not None:
+        await shared(current_app.profile_versions.record, user_id, user.profile_version)
+    return profile
+
+async def issue_access_token(user):
+    """Access token for a user row carrying the profile columns"""
+    versions = current_app.profile_versions
+    if versions is None:
+        return create_access_token(str(user.id))
+
+    await shared(versions.record, user.id, user.profile_version)
+    return create_access_token(str(user.id), additional_claims=profile_claims(user))
+
+async def claims_profile(user_id):
+    """Profile from the access token's claims, or None if they may be stale"""
+    versions = current_app.profile_versions
+    if versions is None:
+        return None
+    claims = get_jwt()
+    if 'profile_version' not in claims or not claims.get('is_active'):
+        return None
+    if not await shared(versions.is_current, user_id, claims['profile_version']):
+        return None
+    return profile_from_claims(user_id, claims)
+
+@auth_bp.route('/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Davspay API is running',
+        'service': 'payment-gateway'
+    }), 200
+
+@auth_bp.route('/health/stats', methods=['GET'])
+@admin_token_required
+async def health_stats():
+    """Runtime statistics for capacity planning (operators only: they expose internals)"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'db_pool': pool_stats(current_app.db_pool),
+            'password_hasher': current_app.password_hasher.stats(),
+            'profile_cache': current_app.profile_cache.stats(),
+            'profile_versions': current_app.profile_versions.stats() if current_app.profile_versions else None,
+            'token_cache': current_app.token_cache.stats() if current_app.token_cache else None,
+            'revocation_list': current_app.revocation_list.stats()
+        }
+    }), 200
+
+@auth_bp.route('/auth/register', methods=['POST'])
+async def register():
+    """Register a new user"""
+    try:
+        data = await request.get_json()
+
+        # Validate required fields
+        required_fields = ['email', 'password', 'full_name']
+        for field in required_fields:
+            if not data.get(field):
+                return jsonify({
+                    'success': False,
+                    'message': f'{field} is required'
+                }), 400
+
+        email = data.get('email').lower().strip()
+        password = data.get('password')
+        full_name = data.get('full_name').strip()
+        company_name = data.get('company_name', '').strip()
+        phone = data.get('phone', '').strip()
+
+        # Validate email format
+        if '@' not in email or '.' not in email:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid email format'
+            }), 400
+
+        # Validate password strength
+        if len(password) < 8:
+            return jsonify({
+                'success': False,
+                'message': 'Password must be at least 8 characters long'
+            }), 400
+
+        # Cheap existence probe so duplicates never pay for a bcrypt hash
+        if await current_app.users.email_exists(email):
+            return email_taken_response()
+
+        password_hash = await current_app.password_hasher.generate_password_hash_async(password)
+
+        new_user = await current_app.users.create(email, password_hash, full_name, company_name, phone)
+        if new_user is None:
+            return email_taken_response()
+
+        access_token = await issue_access_token(new_user)
+
+        return jsonify({
+            'success': True,
+            'message': 'Registration successful',
+            'data': {
+                'user': {
+                    'id': new_user.id,
+                    'email': new_user.email,
+                    'full_name': new_user.full_name,
+                    'company_name': new_user.company_name,
+                    'phone': new_user.phone,
+                    'created_at': new_user.created_at
+                },
+                'access_token': access_token
+            }
+        }), 201
+
+    except HasherBusy as e:
+        return hasher_busy_response(e)
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Registration error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred during registration'
+        }), 500
+
+@auth_bp.route('/auth/login', methods=['POST'])
+async def login():
+    """Login user"""
+    try:
+        data = await request.get_json()
+
+        # Validate required fields
+        if not data.get('email') or not data.get('password'):
+            return jsonify({
+                'success': False,
+                'message': 'Email and password are required'
+            }), 400
+
+        email = data.get('email').lower().strip()
+        password = data.get('password')
+
+        user = await current_app.users.get_credentials(email)
+
+        if not user:
+            return jsonify({
+                'success': False,
+                'message': 'Invalid email or password'
+            }), 401
+
+        # Check if account is active
+        if not user.is_active:
+            return jsonify({
+                'success': False,
+                'message': 'Account is deactivated. Please contact support.'
+            }), 403
+
+        if not await current_app.password_hasher.check_password_hash_async(user.password_hash, password):
+            return jsonify({
+                'success': False,
+                'message': 'Invalid email or password'
+            }), 401
+
+        access_token = await issue_access_token(user)
+
+        return jsonify({
+            'success': True,
+            'message': 'Login successful',
+            'data': {
+                'user': {
+                    'id': user.id,
+                    'email': user.email,
+                    'full_name': user.full_name,
+                    'company_name': user.company_name,
+                    'phone': user.phone,
+                    'is_verified': user.is_verified,
+                    'verification_status': user.verification_status or 'not_submitted'
+                },
+                'access_token': access_token
+            }
+        }), 200
+
+    except HasherBusy as e:
+        return hasher_busy_response(e)
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Login error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred during login'
+        }), 500
+
+@auth_bp.route('/auth/me', methods=['GET'])
+@jwt_required
+async def get_current_user():
+    """Get current user profile"""
+    try:
+        current_user_id = int(get_jwt_identity())
+
+        user = await claims_profile(current_user_id) or await load_profile(current_user_id)
+
+        if not user:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'user': {
+                    'id': user['id'],
+                    'email': user['email'],
+                    'full_name': user['full_name'],
+                    'company_name': user['company_name'],
+                    'phone': user['phone'],
+                    'is_verified': user['is_verified'],
+                    'verification_status': user['verification_status'],
+                    'created_at': user['created_at']
+                }
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Get user error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred'
+        }), 500
+
+@auth_bp.route('/auth/update-profile', methods=['PUT'])
+@jwt_required
+async def update_profile():
+    """Update user profile"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = await request.get_json()
+
+        # Only non-empty fields are updated
+        changes = {
+            field: data[field].strip()
+            for field in ('full_name', 'company_name', 'phone')
+            if data.get(field)
+        }
+
+        if not changes:
+            return jsonify({
+                'success': False,
+                'message': 'No fields to update'
+            }), 400
+
+        updated_user = await current_app.users.update_profile(current_user_id, changes)
+
+        await shared(current_app.profile_cache.invalidate, current_user_id)
+
+        if not updated_user:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+        access_token = await issue_access_token(updated_user)
+
+        return jsonify({
+            'success': True,
+            'message': 'Profile updated successfully',
+            'data': {
+                'user': {
+                    'id': updated_user.id,
+                    'email': updated_user.email,
+                    'full_name': updated_user.full_name,
+                    'company_name': updated_user.company_name,
+                    'phone': updated_user.phone
+                },
+                'access_token': access_token
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Update profile error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while updating profile'
+        }), 500
+
+@auth_bp.route('/auth/submit-verification', methods=['POST'])
+@jwt_required
+async def submit_verification():
+    """Submit verification - just marks user as pending, no data collected"""
+    try:
+        current_user_id = int(get_jwt_identity())
+
+        result = await current_app.verification.submit(current_user_id)
+
+        if not result:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+        # Check if already submitted
+        if result.id is None:
+            return jsonify({
+                'success': False,
+                'message': 'Verification already submitted'
+            }), 400
+
+        await shared(current_app.profile_cache.invalidate, current_user_id)
+        access_token = await issue_access_token(result)
+
+        return jsonify({
+            'success': True,
+            'message': 'Verification request submitted successfully.',
+            'data': {
+                'user': {
+                    'id': result.id,
+                    'email': result.email,
+                    'full_name': result.full_name,
+                    'verification_status': result.verification_status
+                },
+                'access_token': access_token
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Submit verification error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while submitting verification'
+        }), 500
+
+@auth_bp.route('/auth/verification-status', methods=['GET'])
+@jwt_required
+async def get_verification_status():
+    """Get user verification status"""
+    try:
+        current_user_id = int(get_jwt_identity())
+
+        user = await load_profile(current_user_id)
+
+        if not user:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'verification_status': user['verification_status'],
+                'verification_submitted_at': user['verification_submitted_at']
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Get verification status error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred'
+        }), 500
+
+@auth_bp.route('/transactions', methods=['GET'])
+@jwt_required
+async def get_transactions():
+    """Transaction history, newest first, one keyset-paginated page at a time
+
+    Pass the previous response's next_cursor as ?cursor= for the next page.
+    Optional filters: channel, kind, status, since, until (ISO 8601).
+    """
+    try:
+        current_user_id = int(get_jwt_identity())
+        limit, before, filters = parse_history_args(request.args)
+
+        rows, has_more = await current_app.transactions.history(current_user_id, limit, before, filters)
+
+        return jsonify({
+            'success': True,
+            'data': history_page(rows, has_more)
+        }), 200
+
+    except HistoryQueryError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Transaction history error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading transactions'
+        }), 500
+
+@auth_bp.route('/transactions/export', methods=['GET'])
+@jwt_required
+async def export_transactions():
+    """Download transactions as NDJSON or CSV (?format=), optionally gzipped (?gzip=1)"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        fmt, compress, filters = parse_export_args(request.args)
+
+        batches = current_app.transactions.export(
+            current_user_id, filters, itersize=current_app.config['EXPORT_ITERSIZE']
+        )
+        # Run the query before any bytes go out, so a database error still
+        # gets a proper JSON response
+        first = await anext(batches, [])
+        encoder = ExportEncoder(fmt, current_app.json.dumps_bytes, compress)
+
+        async def body():
+            chunk = encoder.start() + encoder.encode(first)
+            if chunk:
+                yield chunk
+            async for rows in batches:
+                chunk = encoder.encode(rows)
+                if chunk:
+                    yield chunk
+            yield encoder.finish()
+
+        response = current_app.response_class(
+            body(), mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt]
+        )
+        # Large exports outlive Quart's default RESPONSE_TIMEOUT
+        response.timeout = None
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+        response.headers['Cache-Control'] = 'no-store'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except HistoryQueryError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Transaction export error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while exporting transactions'
+        }), 500
@@ -1,232 +1,340 @@
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, jsonify, g, has_request_context, request
 from flask_cors import CORS
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from config import config
-import psycopg2
-from psycopg2.extras import RealDictCursor
+from .auth import token_revoked
+from .json_provider import FastJSONProvider
+from .metrics import init_metrics
+from .static_pages import build_static_pages
+from services.db_pool import ConnectionPool
+from services.sqlite_pool import SQLitePool
+from services.api_keys import ApiKeyIndex
+from services.bank_accounts import HttpBankAdapter, PennyDropper, StubBankAdapter
+from services.bulk_import import BulkImporter
+from services.idempotency import IdempotencyStore
+from services.ifsc import IfscDirectory
+from services.password_hasher import PasswordHasher
+from services.profile_cache import ProfileCache, MemoryCacheBackend, RedisCacheBackend
+from services.profile_versions import ProfileVersions, RedisVersionMap
+from services.repository import (
+    ApiKeyRepository, IdempotencyRepository, SettlementRepository, SummaryRepository,
+    TokenRevocationRepository, TransactionRepository, UserRepository, VerificationRepository,
+    WebhookRepository
+)
+from services.slow_queries import SlowQueryLog
+from services.token_cache import VerifiedTokenCache
+from services.token_revocations import RevocationList
+from services.webhooks import WebhookDispatcher
 
 # Initialize extensions
 bcrypt = Bcrypt()
 jwt = JWTManager()
 
+def create_db_pool(app):
+    """Create the connection pool for the configured storage driver"""
+    if app.config['STORAGE_BACKEND'] == 'sqlite':
+        return SQLitePool(
+            app.config['SQLITE_PATH'],
+            timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+            logger=app.logger
+        )
+    return ConnectionPool(
+        {
+            'host': app.config['DB_HOST'],
+            'database': app.config['DB_NAME'],
+            'user': app.config['DB_USER'],
+            'password': app.config['DB_PASSWORD'],
+            'port': app.config['DB_PORT']
+        },
+        min_size=app.config['DB_POOL_MIN_SIZE'],
+        max_size=app.config['DB_POOL_MAX_SIZE'],
+        timeout=app.config['DB_POOL_TIMEOUT'],
+        max_lifetime=app.config['DB_POOL_MAX_LIFETIME'],
+        idle_timeout=app.config['DB_POOL_IDLE_TIMEOUT'],
+        ping_after=app.config['DB_POOL_PING_AFTER'],
+        prepare_statements=app.config['DB_PREPARED_STATEMENTS'],
+        logger=app.logger
+    )
+
+def create_password_hasher(app):
+    """Create the bounded bcrypt worker pool from app config"""
+    return PasswordHasher(
+        rounds=app.config['BCRYPT_LOG_ROUNDS'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        queue_size=app.config['PASSWORD_HASH_QUEUE_SIZE'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+        retry_after=app.config['PASSWORD_HASH_RETRY_AFTER']
+    )
+
+def create_profile_cache(app):
+    """Create the user profile cache with the configured backend
+
+    The memory backend is private to this process, so when several workers
+    serve the app its TTL is capped at PROFILE_CACHE_MULTI_WORKER_TTL: the
+    other workers serve a changed profile for at most that long.
+    """
+    ttl = app.config['PROFILE_CACHE_TTL']
+    if app.config['PROFILE_CACHE_BACKEND'] == 'redis':
+        backend = RedisCacheBackend(app.config['REDIS_URL'])
+    else:
+        backend = MemoryCacheBackend(max_entries=app.config['PROFILE_CACHE_MAX_ENTRIES'])
+        if app.config['WEB_CONCURRENCY'] > 1:
+            ttl = min(ttl, app.config['PROFILE_CACHE_MULTI_WORKER_TTL'])
+    return ProfileCache(backend, ttl=ttl)
+
+def create_profile_versions(app):
+    """Create the Redis profile version map for JWT_PROFILE_CLAIMS
+
+    A per-process map would let a worker that never saw a profile write keep
+    trusting the claims it had recorded, so claims need Redis.
+    """
+    if app.config['PROFILE_CACHE_BACKEND'] != 'redis':
+        raise RuntimeError(
+            "JWT_PROFILE_CLAIMS needs the version map shared by every worker; "
+            "set PROFILE_CACHE_BACKEND=redis or JWT_PROFILE_CLAIMS=False"
+        )
+    return ProfileVersions(RedisVersionMap(app.config['REDIS_URL']))
+
+def create_slow_query_log(app):
+    """Attach the slow-query log to the connection pool, if enabled"""
+    threshold_ms = app.config['SLOW_QUERY_THRESHOLD_MS']
+    if threshold_ms <= 0:
+        return None
+    log = SlowQueryLog(
+        threshold_ms / 1000,
+        capacity=app.config['SLOW_QUERY_LOG_SIZE'],
+        dialect=app.db_pool.dialect,
+        explain_rate=app.config['SLOW_QUERY_EXPLAIN_RATE'],
+        explain_interval=app.config['SLOW_QUERY_EXPLAIN_INTERVAL'],
+        endpoint=lambda: request.endpoint if has_request_context() else None,
+        logger=app.logger
+    )
+    app.db_pool.add_query_observer(log)
+    return log
+
+def create_api_key_index(app):
+    """Per-worker API key index, following the api_keys table in the background"""
+    # The refresh thread runs outside any app context, so it borrows
+    # connections from the pool directly rather than through g
+    changes = ApiKeyRepository(app.db_pool.getconn).changes
+    listen = app.db_pool.unpooled if app.db_pool.dialect == 'postgresql' else None
+    return ApiKeyIndex(
+        changes,
+        listen=listen,
+        poll_interval=app.config['API_KEY_POLL_INTERVAL'],
+        logger=app.logger
+    )
+
+def create_revocation_list(app):
+    """Per-worker mirror of token_revocations, kept current in the background"""
+    changes = TokenRevocationRepository(app.db_pool.getconn).changes
+    listen = app.db_pool.unpooled if app.db_pool.dialect == 'postgresql' else None
+    return RevocationList(
+        changes,
+        listen=listen,
+        poll_interval=app.config['TOKEN_REVOCATION_POLL_INTERVAL'],
+        logger=app.logger
+    )
+
+def create_webhook_dispatcher(app, metrics=None):
+    """Outbox dispatcher for webhook_dispatcher.py, from app config"""
+    return WebhookDispatcher(
+        app.db_pool,
+        workers=app.config['WEBHOOK_WORKERS'],
+        batch_size=app.config['WEBHOOK_BATCH_SIZE'],
+        timeout=app.config['WEBHOOK_TIMEOUT'],
+        max_attempts=app.config['WEBHOOK_MAX_ATTEMPTS'],
+        retry_base=app.config['WEBHOOK_RETRY_BASE'],
+        retry_max=app.config['WEBHOOK_RETRY_MAX'],
+        lease=app.config['WEBHOOK_LEASE'],
+        poll_interval=app.config['WEBHOOK_POLL_INTERVAL'],
+        retention_days=app.config['WEBHOOK_RETENTION_DAYS'],
+        metrics=metrics,
+        allow_private=app.config['WEBHOOK_ALLOW_PRIVATE'],
+        logger=app.logger
+    )
+
+def create_settlement_engine(app):
+    """Settlement engine for settle.py, from app config"""
+    # NumPy is only loaded by the settlement run, not by every web worker
+    from services.settlements import SettlementEngine
+    return SettlementEngine(
+        app.db_pool,
+        fees={
+            'upi': (app.config['SETTLEMENT_UPI_FEE_BPS'], app.config['SETTLEMENT_UPI_FEE_FIXED']),
+            'virtual_account': (app.config['SETTLEMENT_VA_FEE_BPS'], app.config['SETTLEMENT_VA_FEE_FIXED'])
+        },
+        gst_bps=app.config['SETTLEMENT_GST_BPS'],
+        chunk_rows=app.config['SETTLEMENT_CHUNK_ROWS'],
+        write_batch=app.config['SETTLEMENT_WRITE_BATCH'],
+        logger=app.logger
+    )
+
+def create_bank_adapter(app):
+    """Penny-drop adapter named by PENNY_DROP_ADAPTER: 'stub' (no money moves) or 'http'"""
+    if app.config['PENNY_DROP_ADAPTER'] == 'http':
+        return HttpBankAdapter(
+            app.config['PENNY_DROP_URL'],
+            api_key=app.config['PENNY_DROP_API_KEY'],
+            timeout=app.config['PENNY_DROP_TIMEOUT'],
+            pool_size=app.config['PENNY_DROP_WORKERS']
+        )
+    return StubBankAdapter(latency=app.config['PENNY_DROP_STUB_LATENCY'])
+
 def get_db_connection(app):
-    """Create and return a database connection using app config"""
+    """Check out a pooled database connection (conn.close() returns it to the pool)"""
     try:
-        conn = psycopg2.connect(
-            host=app.config['DB_HOST'],
-            database=app.config['DB_NAME'],
-            user=app.config['DB_USER'],
-            password=app.config['DB_PASSWORD'],
-            port=app.config['DB_PORT']
-        )
-        return conn
+        conn = app.db_pool.getconn()
     except Exception as e:
         app.logger.error(f"Database connection error: {e}")
         return None
 
-def create_app(env="development"):
-    """Flask application factory"""
+    # Remember the checkout so it is returned even if the handler raises
+    if '_db_connections' not in g:
+        g._db_connections = []
+    g._db_connections.append(conn)
+    return conn
+
+def create_app(env="development", config_overrides=None):
+    """Flask application factory
+
+    ``config_overrides`` (a dict) is applied on top of the environment's
+    config class, e.g. by the test suite to pick the storage driver.
+    """
     app = Flask(__name__)
 
     # Load configuration
     app.config.from_object(config[env])
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    # orjson-backed JSON with native datetime/Decimal/row support
+    app.json = FastJSONProvider(app)
 
     # Initialize extensions
     bcrypt.init_app(app)
     jwt.init_app(app)
+    # Logged-out and deactivated users' tokens (app.revocation_list, below)
+    jwt.token_in_blocklist_loader(token_revoked)
 
     # Initialize CORS
     CORS(
         app,
         resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}},
         supports_credentials=True,
-        allow_headers=["Content-Type", "Authorization"],
-        expose_headers=["Content-Type"]
+        allow_headers=["Content-Type", "Authorization", "Idempotency-Key"],
+        expose_headers=["Content-Type", "Idempotent-Replayed"]
     )
 
-    # Store db connection function in app
+    # Connection pool and db connection function
+    app.db_pool = create_db_pool(app)
     app.get_db_connection = lambda: get_db_connection(app)
 
-    # Root route - Server status page
+    @app.teardown_appcontext
+    def release_db_connections(exc):
+        for conn in g.pop('_db_connections', ()):
+            conn.close()
+
+    # Statements slower than SLOW_QUERY_THRESHOLD_MS, for /api/admin/slow-queries
+    app.slow_queries = create_slow_query_log(app)
+
+    # Data-access layer; every query borrows its connection from the pool
+    app.users = UserRepository(app.get_db_connection)
+    app.verification = VerificationRepository(app.get_db_connection)
+    # Ledger writes queue their webhook events in the same transaction
+    app.webhooks = WebhookRepository(app.get_db_connection, app.json.dumps)
+    app.transactions = TransactionRepository(app.get_db_connection, outbox=app.webhooks)
+    # Hourly summaries, kept current by every ledger write, for the overview
+    app.summaries = SummaryRepository(app.get_db_connection)
+    app.settlements = SettlementRepository(app.get_db_connection)
+
+    # API keys: issued through the repository, authenticated from memory.
+    # The index loads now and then keeps itself current
+    app.api_keys = ApiKeyRepository(app.get_db_connection)
+    app.api_key_index = create_api_key_index(app)
+    app.api_key_index.start()
+
+    # Token revocations (logout, deactivation): written to the database,
+    # checked against this worker's mirror
+    app.token_revocations = TokenRevocationRepository(app.get_db_connection)
+    app.revocation_list = create_revocation_list(app)
+    app.revocation_list.start()
+
+    # Idempotency-Key records: first response per key, replayed for retries
+    app.idempotency = IdempotencyStore(
+        IdempotencyRepository(app.get_db_connection),
+        ttl=app.config['IDEMPOTENCY_TTL'],
+        lock_timeout=app.config['IDEMPOTENCY_LOCK_TIMEOUT'],
+        wait_timeout=app.config['IDEMPOTENCY_WAIT_TIMEOUT'],
+        max_entries=app.config['IDEMPOTENCY_CACHE_SIZE'],
+        logger=app.logger
+    )
+
+    # Bank account validation: the IFSC directory is memory-mapped on first
+    # use (one copy in the page cache for every worker); penny drops fan out
+    # to the bank adapter on a per-worker thread pool
+    app.ifsc_directory = IfscDirectory(
+        app.config['IFSC_DIRECTORY_PATH'],
+        reload_interval=app.config['IFSC_RELOAD_INTERVAL'],
+        logger=app.logger
+    )
+    app.penny_drop = PennyDropper(
+        create_bank_adapter(app),
+        workers=app.config['PENNY_DROP_WORKERS'],
+        timeout=app.config['PENNY_DROP_TIMEOUT'],
+        logger=app.logger
+    )
+
+    # Password hashing runs off the request thread
+    app.password_hasher = create_password_hasher(app)
+
+    # Bulk user imports run on background threads, hashing on their own pool
+    app.bulk_importer = BulkImporter(
+        app.db_pool,
+        app.config['IMPORT_DIR'],
+        rounds=app.config['BCRYPT_LOG_ROUNDS'],
+        hash_workers=app.config['IMPORT_HASH_WORKERS'],
+        batch_size=app.config['IMPORT_BATCH_SIZE'],
+        logger=app.logger
+    )
+
+    # Read-through cache for profile reads
+    app.profile_cache = create_profile_cache(app)
+
+    # Latest profile_version per user, so /auth/me can answer from token claims
+    app.profile_versions = create_profile_versions(app) if app.config['JWT_PROFILE_CLAIMS'] else None
+
+    # Verified-JWT claims, so repeat requests skip the HMAC check
+    app.token_cache = None
+    if app.config['JWT_CLAIM_CACHE_SIZE'] > 0:
+        app.token_cache = VerifiedTokenCache(
+            max_entries=app.config['JWT_CLAIM_CACHE_SIZE'],
+            max_ttl=app.config['JWT_CLAIM_CACHE_MAX_TTL']
+        )
+
+    # Latency histograms and /api/metrics
+    init_metrics(app)
+
+    # Root route - Server status page (pre-rendered once the url_map is final)
     @app.route("/")
     def index():
-        return render_template_string("""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8" />
-            <meta name="viewport" content="width=device-width,initial-scale=1" />
-            <title>Davspay API Server</title>
-            <style>
-                * {
-                    margin: 0;
-                    padding: 0;
-                    box-sizing: border-box;
-                }
-                body {
-                    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                    color: #fff;
-                    display: flex;
-                    flex-direction: column;
-                    align-items: center;
-                    justify-content: center;
-                    min-height: 100vh;
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen', 'Ubuntu', 'Cantarell', sans-serif;
-                    overflow-x: hidden;
-                    padding: 20px;
-                }
-                .logo {
-                    font-size: 5rem;
-                    animation: float 3s ease-in-out infinite;
-                    margin-bottom: 20px;
-                    filter: drop-shadow(0 10px 20px rgba(0,0,0,0.3));
-                }
-                @keyframes float {
-                    0%, 100% { transform: translateY(0px) rotate(0deg); }
-                    50% { transform: translateY(-20px) rotate(5deg); }
-                }
-                h1 {
-                    font-size: clamp(1.5rem, 5vw, 2.5rem);
-                    margin-bottom: 0.5em;
-                    letter-spacing: 2px;
-                    text-align: center;
-                    text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
-                }
-                .status-indicator {
-                    display: flex;
-                    align-items: center;
-                    gap: 10px;
-                    margin-top: 20px;
-                    padding: 15px 30px;
-                    background: rgba(255, 255, 255, 0.1);
-                    backdrop-filter: blur(10px);
-                    border-radius: 50px;
-                    border: 2px solid rgba(255, 255, 255, 0.2);
-                }
-                .dot {
-                    height: 16px;
-                    width: 16px;
-                    background-color: #00ff88;
-                    border-radius: 50%;
-                    box-shadow: 0 0 12px #00ff88, 0 0 24px #00ff88;
-                    animation: pulse 1.5s infinite;
-                }
-                @keyframes pulse {
-                    0%, 100% {
-                        box-shadow: 0 0 8px #00ff88, 0 0 16px #00ff88;
-                        transform: scale(1);
-                    }
-                    50% {
-                        box-shadow: 0 0 16px #00ff88, 0 0 32px #00ff88;
-                        transform: scale(1.1);
-                    }
-                }
-                .info {
-                    margin-top: 40px;
-                    padding: 30px;
-                    background: rgba(255, 255, 255, 0.1);
-                    backdrop-filter: blur(10px);
-                    border-radius: 20px;
-                    border: 2px solid rgba(255, 255, 255, 0.2);
-                    max-width: 600px;
-                    text-align: center;
-                }
-                .info h2 {
-                    font-size: 1.5rem;
-                    margin-bottom: 15px;
-                    color: #fff;
-                }
-                .endpoint {
-                    display: flex;
-                    justify-content: space-between;
-                    align-items: center;
-                    padding: 12px 20px;
-                    margin: 10px 0;
-                    background: rgba(0, 0, 0, 0.2);
-                    border-radius: 10px;
-                    font-family: 'Courier New', monospace;
-                    font-size: 0.9rem;
-                }
-                .method {
-                    padding: 4px 12px;
-                    border-radius: 6px;
-                    font-weight: bold;
-                    font-size: 0.75rem;
-                }
-                .get { background: #61affe; color: #fff; }
-                .post { background: #49cc90; color: #fff; }
-                .put { background: #fca130; color: #fff; }
-                .endpoint-path {
-                    flex: 1;
-                    margin-left: 15px;
-                    text-align: left;
-                    color: #f0f0f0;
-                }
-                .footer {
-                    margin-top: 40px;
-                    opacity: 0.7;
-                    font-size: 0.9rem;
-                    text-align: center;
-                }
-                @media (max-width: 768px) {
-                    .logo { font-size: 3rem; }
-                    .info { padding: 20px; }
-                    .endpoint {
-                        flex-direction: column;
-                        align-items: flex-start;
-                        gap: 8px;
-                    }
-                    .endpoint-path {
-                        margin-left: 0;
-                        word-break: break-all;
-                    }
-                }
-            </style>
-        </head>
-        <body>
-            <div class="logo">&#128179;</div>
-            <h1>Davspay Payment Gateway API</h1>
-            <div class="status-indicator">
-                <span class="dot"></span>
-                <span style="font-weight: 600; font-size: 1.1rem;">Server Running</span>
-            </div>
-
-            <div class="info">
-                <h2>&#128279; Available Endpoints</h2>
-                <div class="endpoint">
-                    <span class="method get">GET</span>
-                    <span class="endpoint-path">/api/health</span>
-                </div>
-                <div class="endpoint">
-                    <span class="method post">POST</span>
-                    <span class="endpoint-path">/api/auth/register</span>
-                </div>
-                <div class="endpoint">
-                    <span class="method post">POST</span>
-                    <span class="endpoint-path">/api/auth/login</span>
-                </div>
-                <div class="endpoint">
-                    <span class="method get">GET</span>
-                    <span class="endpoint-path">/api/auth/me</span>
-                </div>
-                <div class="endpoint">
-                    <span class="method put">PUT</span>
-                    <span class="endpoint-path">/api/auth/update-profile</span>
-                </div>
-            </div>
-
-            <div class="footer">
-                <p>&#128274; Secure Payment Processing Platform</p>
-                <p style="margin-top: 10px;">Powered by Flask & PostgreSQL</p>
-            </div>
-        </body>
-        </html>
-        """)
+        return app.static_pages['index'].respond()
 
     # Register blueprints
     from .routes import auth_bp
     app.register_blueprint(auth_bp)
+    from .webhooks import webhooks_bp
+    app.register_blueprint(webhooks_bp)
+    from .api_keys import api_keys_bp
+    app.register_blueprint(api_keys_bp)
+    from .settlements import settlements_bp
+    app.register_blueprint(settlements_bp)
+    from .validation import validation_bp
+    app.register_blueprint(validation_bp)
+    if app.config['ADMIN_API_TOKEN']:
+        from .admin import admin_bp
+        app.register_blueprint(admin_bp)
 
     # Global error handlers
     @app.errorhandler(404)
@@ -250,4 +358,7 @@ def create_app(env="development"):
         messages = getattr(err, 'data', {}).get('messages', 'Invalid input.')
         return jsonify({"error": messages}), 400
 
+    # Render / and /api/ now that every route is registered
+    app.static_pages = build_static_pages(app)
+
     return app
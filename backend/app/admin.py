@@ -0,0 +1,248 @@
+"""
+Operator endpoints under /api/admin
+
+Registered only when ADMIN_API_TOKEN is set; every request must send that
+token in the X-Admin-Token header. The slow-query log is per worker process
+(the response carries its pid); import jobs keep their state in IMPORT_DIR
+and the webhook outbox lives in the database, so any worker can report on
+those.
+"""
+import os
+import shutil
+
+from flask import Blueprint, request, jsonify, current_app, send_file, url_for
+from app.api_keys import refresh_key_index
+from app.auth import admin_token_required, revoke_identity
+from app.routes import database_error_response
+from services.bulk_import import ImportFormatError
+from services.repository import DatabaseUnavailable
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+@admin_bp.route('/slow-queries', methods=['GET'])
+@admin_token_required
+def slow_queries():
+    """Recent slow statements, newest first, with a per-shape summary"""
+    log = current_app.slow_queries
+    if log is None:
+        return jsonify({
+            'success': False,
+            'message': 'Slow-query log is disabled (SLOW_QUERY_THRESHOLD_MS=0)'
+        }), 404
+
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        'success': True,
+        'data': {
+            'pid': os.getpid(),
+            'stats': log.stats(),
+            'summary': log.summary(),
+            'entries': log.entries(limit=max(limit, 0) or None)
+        }
+    }), 200
+
+@admin_bp.route('/slow-queries', methods=['DELETE'])
+@admin_token_required
+def clear_slow_queries():
+    """Empty this worker's slow-query log"""
+    if current_app.slow_queries is not None:
+        current_app.slow_queries.clear()
+    return jsonify({
+        'success': True,
+        'message': 'Slow-query log cleared'
+    }), 200
+
+def upload_format(upload):
+    """csv or ndjson, from ?format=, the file name or the content type"""
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt.lower()
+    name = (upload.filename if upload is not None else '') or ''
+    mimetype = upload.mimetype if upload is not None else request.mimetype
+    if name.endswith('.csv') or mimetype in ('text/csv', 'application/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or mimetype in ('application/x-ndjson', 'application/jsonl'):
+        return 'ndjson'
+    return None
+
+@admin_bp.route('/users/<int:user_id>/deactivate', methods=['POST'])
+@admin_token_required
+def deactivate_user(user_id):
+    """Deactivate a user: login is refused, their tokens revoked and their API keys disabled"""
+    try:
+        user = current_app.users.deactivate(user_id)
+        if user is None:
+            return jsonify({
+                'success': False,
+                'message': 'Active user not found'
+            }), 404
+
+        revoke_identity(user_id)
+        # The keys were revoked with the user; drop them from this worker now
+        refresh_key_index()
+        # Bumped profile_version: no cached or claimed profile outlives this
+        current_app.profile_cache.invalidate(user_id)
+        if current_app.profile_versions is not None:
+            current_app.profile_versions.record(user_id, user.profile_version)
+
+        return jsonify({
+            'success': True,
+            'message': 'User deactivated',
+            'data': {
+                'user': {
+                    'id': user.id,
+                    'email': user.email,
+                    'is_active': user.is_active
+                }
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Deactivate user error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while deactivating the user'
+        }), 500
+
+@admin_bp.route('/imports/users', methods=['POST'])
+@admin_token_required
+def import_users():
+    """Start a bulk user import from a CSV or NDJSON upload
+
+    Send the file as multipart field ``file`` or as the raw request body.
+    Columns: email, full_name, password or password_hash (bcrypt, stored as
+    is), and optionally company_name and phone.
+    """
+    try:
+        length = request.content_length
+        if length is None:
+            return jsonify({
+                'success': False,
+                'message': 'Content-Length is required'
+            }), 411
+        if length > current_app.config['IMPORT_MAX_BYTES']:
+            return jsonify({
+                'success': False,
+                'message': f"Upload exceeds {current_app.config['IMPORT_MAX_BYTES']} bytes"
+            }), 413
+
+        upload = request.files.get('file')
+        fmt = upload_format(upload)
+        if fmt is None:
+            return jsonify({
+                'success': False,
+                'message': 'Upload must be CSV or NDJSON (set ?format=csv|ndjson)'
+            }), 400
+
+        importer = current_app.bulk_importer
+        job_id, path = importer.create_job(fmt)
+        if upload is not None:
+            upload.save(path)
+        else:
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(request.stream, f, 64 * 1024)
+        status = importer.start(job_id, fmt)
+
+        return jsonify({
+            'success': True,
+            'message': 'Import started',
+            'data': {
+                'job': status,
+                'status_url': url_for('admin.import_status', job_id=job_id),
+                'report_url': url_for('admin.import_report', job_id=job_id)
+            }
+        }), 202
+
+    except ImportFormatError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except Exception as e:
+        current_app.logger.error(f"Import upload error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while starting the import'
+        }), 500
+
+@admin_bp.route('/imports/<job_id>', methods=['GET'])
+@admin_token_required
+def import_status(job_id):
+    """Progress and counts for an import job"""
+    status = current_app.bulk_importer.status(job_id)
+    if status is None:
+        return jsonify({
+            'success': False,
+            'message': 'Import job not found'
+        }), 404
+    return jsonify({
+        'success': True,
+        'data': {'job': status}
+    }), 200
+
+@admin_bp.route('/imports/<job_id>/errors', methods=['GET'])
+@admin_token_required
+def import_report(job_id):
+    """Rejected rows as CSV: line, email, error"""
+    path = current_app.bulk_importer.report_path(job_id)
+    if path is None:
+        return jsonify({
+            'success': False,
+            'message': 'Import report not found'
+        }), 404
+    return send_file(path, mimetype='text/csv', as_attachment=True,
+                     download_name=f'import-{job_id}-errors.csv', max_age=0)
+
+@admin_bp.route('/webhooks', methods=['GET'])
+@admin_token_required
+def webhook_outbox():
+    """Outbox counts, delivery backlog and the latest dead-lettered events"""
+    try:
+        limit = request.args.get('limit', 50, type=int)
+        return jsonify({
+            'success': True,
+            'data': {
+                'outbox': current_app.webhooks.outbox_summary(),
+                'dead_letters': current_app.webhooks.dead_letters(limit=min(max(limit, 1), 500))
+            }
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook outbox error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading the webhook outbox'
+        }), 500
+
+@admin_bp.route('/webhooks/requeue', methods=['POST'])
+@admin_token_required
+def requeue_webhooks():
+    """Retry dead-lettered events: {"ids": [...]} and/or {"endpoint_id": n}"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids') or []
+    endpoint_id = data.get('endpoint_id')
+    if not isinstance(ids, list) or not all(isinstance(id, int) for id in ids) \
+            or not (endpoint_id is None or isinstance(endpoint_id, int)) or not (ids or endpoint_id):
+        return jsonify({
+            'success': False,
+            'message': 'Send ids (a list of outbox ids) and/or endpoint_id'
+        }), 400
+
+    try:
+        requeued = current_app.webhooks.requeue(ids, endpoint_id)
+        return jsonify({
+            'success': True,
+            'message': f'{requeued} events requeued',
+            'data': {'requeued': requeued}
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook requeue error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while requeueing events'
+        }), 500
@@ -0,0 +1,172 @@
+"""
+Merchant API keys under /api/api-keys
+
+Keys are issued and rotated from the dashboard (JWT only; an API key cannot
+manage keys). The key itself is returned once, at issue; only its SHA-256
+digest is stored. Routes that take keys authenticate them from each
+worker's in-memory index (services/api_keys.py).
+"""
+from datetime import timedelta
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from app.auth import cached_jwt_required
+from app.routes import database_error_response
+from services.api_keys import api_key_digest, display_prefix, generate_api_key
+from services.repository import DatabaseUnavailable
+
+api_keys_bp = Blueprint('api_keys', __name__, url_prefix='/api/api-keys')
+
+def api_key_json(row, key=None):
+    """API shape of an ApiKeyRow; the key itself only when just issued"""
+    data = {
+        'id': row.id,
+        'name': row.name,
+        'prefix': row.prefix,
+        'created_at': row.created_at,
+        'expires_at': row.expires_at
+    }
+    if key is not None:
+        data['key'] = key
+    return data
+
+def refresh_key_index():
+    """Make a key change visible to this worker straight away; the others
+    pick it up from NOTIFY or their next poll"""
+    try:
+        current_app.api_key_index.refresh()
+    except Exception as e:
+        current_app.logger.error(f"API key index refresh error: {e}")
+
+def api_key_not_found_response():
+    return jsonify({
+        'success': False,
+        'message': 'API key not found'
+    }), 404
+
+@api_keys_bp.route('', methods=['GET'])
+@cached_jwt_required()
+def list_api_keys():
+    """The merchant's usable keys, including rotated keys still in their grace period"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        keys = current_app.api_keys.keys(current_user_id)
+        return jsonify({
+            'success': True,
+            'data': {'api_keys': [api_key_json(row) for row in keys]}
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"API key list error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading API keys'
+        }), 500
+
+@api_keys_bp.route('', methods=['POST'])
+@cached_jwt_required()
+def create_api_key():
+    """Issue a key; the response carries it, once"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+
+        name = (data.get('name') or 'Default').strip()
+        if not name or len(name) > 100:
+            return jsonify({
+                'success': False,
+                'message': 'name must be 1 to 100 characters'
+            }), 400
+
+        limit = current_app.config['API_KEY_MAX_PER_MERCHANT']
+        if len(current_app.api_keys.keys(current_user_id)) >= limit:
+            return jsonify({
+                'success': False,
+                'message': f'At most {limit} API keys are allowed; revoke one first'
+            }), 409
+
+        key = generate_api_key()
+        row = current_app.api_keys.create(current_user_id, name, display_prefix(key), api_key_digest(key))
+        refresh_key_index()
+
+        return jsonify({
+            'success': True,
+            'message': 'API key created. Store it now; it is not shown again.',
+            'data': {'api_key': api_key_json(row, key=key)}
+        }), 201
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"API key create error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while creating the API key'
+        }), 500
+
+@api_keys_bp.route('/<int:key_id>/rotate', methods=['POST'])
+@cached_jwt_required()
+def rotate_api_key(key_id):
+    """Replace a key; the old one keeps working for grace_seconds (default API_KEY_ROTATION_GRACE)"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+
+        grace_max = current_app.config['API_KEY_ROTATION_GRACE_MAX']
+        grace = data.get('grace_seconds', current_app.config['API_KEY_ROTATION_GRACE'])
+        if not isinstance(grace, int) or isinstance(grace, bool) or not 0 <= grace <= grace_max:
+            return jsonify({
+                'success': False,
+                'message': f'grace_seconds must be an integer between 0 and {grace_max}'
+            }), 400
+
+        key = generate_api_key()
+        row = current_app.api_keys.rotate(current_user_id, key_id, display_prefix(key), api_key_digest(key),
+                                          timedelta(seconds=grace))
+        if row is None:
+            return api_key_not_found_response()
+        refresh_key_index()
+
+        return jsonify({
+            'success': True,
+            'message': f'API key rotated; the old key stops working in {grace} seconds',
+            'data': {'api_key': api_key_json(row, key=key)}
+        }), 201
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"API key rotate error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while rotating the API key'
+        }), 500
+
+@api_keys_bp.route('/<int:key_id>', methods=['DELETE'])
+@cached_jwt_required()
+def revoke_api_key(key_id):
+    """Revoke a key at once"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        if not current_app.api_keys.revoke(current_user_id, key_id):
+            return api_key_not_found_response()
+        refresh_key_index()
+        return jsonify({
+            'success': True,
+            'message': 'API key revoked'
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"API key revoke error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while revoking the API key'
+        }), 500
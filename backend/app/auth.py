@@ -0,0 +1,216 @@
+"""
+JWT verification with a verified-claim cache
+
+``cached_jwt_required()`` is a drop-in for flask_jwt_extended's
+``jwt_required()`` on routes that take a bearer token in the Authorization
+header. The first request with a token runs the full decode and HMAC check;
+repeats within the token's lifetime are answered from
+``current_app.token_cache`` and populate the same request context, so
+``get_jwt_identity()``/``get_jwt()`` keep working unchanged.
+
+``merchant_auth_required()`` also accepts a server-side API key
+(``Bearer live_sk_...``), checked against the in-memory key index;
+such routes read the caller with ``current_merchant_id()``.
+
+``admin_token_required`` guards operator routes with the X-Admin-Token
+header (ADMIN_API_TOKEN).
+
+``revoke_token()`` (logout) and ``revoke_identity()`` (deactivation) record
+revocations in the database; every worker's ``current_app.revocation_list``
+mirrors them, and both the full check (``token_revoked``, registered as
+flask_jwt_extended's token_in_blocklist_loader) and the cached path consult
+it. Register a current_user loader with ``user_lookup_loader`` so cached
+tokens load the user too.
+
+Every decorator here tags the view with ``auth_schemes``, the credentials
+it accepts, which the endpoint catalogue on / and /api/ reports.
+"""
+import hmac
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.config import config as jwt_config
+from flask_jwt_extended.exceptions import RevokedTokenError, UserLookupError
+
+from services.api_keys import API_KEY_PREFIX
+from services.repository import DatabaseUnavailable, TokenRevocationRow, utcnow
+
+# The current_user loader, if one is registered (see user_lookup_loader)
+_user_lookup = None
+
+
+def user_lookup_loader(fn):
+    """Register ``fn(jwt_header, jwt_data)`` as the current_user loader
+
+    Registers it with flask_jwt_extended's public ``user_lookup_loader`` for
+    fully verified tokens, and keeps it for tokens answered from the cache.
+    """
+    global _user_lookup
+    from app import jwt
+    jwt.user_lookup_loader(fn)
+    _user_lookup = fn
+    return fn
+
+
+def _loaded_user(jwt_header, jwt_data):
+    """What flask_jwt_extended keeps in the request context for current_user"""
+    if _user_lookup is None:
+        return None
+    user = _user_lookup(jwt_header, jwt_data)
+    if user is None:
+        raise UserLookupError(f"user_lookup returned None for {jwt_data.get('sub')}", jwt_header, jwt_data)
+    return {'loaded_user': user}
+
+
+def token_revoked(jwt_header, jwt_data):
+    """flask_jwt_extended's token_in_blocklist_loader: logged out or deactivated"""
+    return current_app.revocation_list.is_revoked(jwt_data)
+
+
+def bearer_token():
+    """Raw token from the Authorization header, or None"""
+    value = request.headers.get(jwt_config.header_name)
+    if not value:
+        return None
+    header_type = jwt_config.header_type
+    if not header_type:
+        return value
+    prefix, _, token = value.partition(' ')
+    if prefix != header_type or not token or ' ' in token:
+        return None
+    return token
+
+
+def verify_cached_jwt():
+    """verify_jwt_in_request(), skipping the decode for recently verified tokens"""
+    cache = current_app.token_cache
+    token = bearer_token() if cache is not None else None
+
+    if token is not None:
+        cached = cache.get(token)
+        if cached is not None:
+            jwt_header, jwt_data = cached
+            if token_revoked(jwt_header, jwt_data):
+                cache.revoke_token(token)
+                raise RevokedTokenError(jwt_header, jwt_data)
+            g._jwt_extended_jwt_user = _loaded_user(jwt_header, jwt_data)
+            g._jwt_extended_jwt_header = jwt_header
+            g._jwt_extended_jwt = jwt_data
+            g._jwt_extended_jwt_location = 'headers'
+            return jwt_header, jwt_data
+
+    result = verify_jwt_in_request()
+    if token is not None and result is not None and g._jwt_extended_jwt_location == 'headers':
+        cache.put(token, *result)
+    return result
+
+
+def _database_error():
+    # The revocation list or API key index has not loaded yet
+    return jsonify({
+        'success': False,
+        'message': 'Database connection error'
+    }), 500
+
+
+def _accepts(*schemes):
+    """Tag a view with the credentials its auth decorator accepts"""
+    def tag(view):
+        view.auth_schemes = schemes
+        return view
+    return tag
+
+
+def cached_jwt_required():
+    """Protect a route with a JWT access token, using the verified-claim cache"""
+    def wrapper(fn):
+        @_accepts('jwt')
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            try:
+                verify_cached_jwt()
+            except DatabaseUnavailable:
+                return _database_error()
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def merchant_auth_required():
+    """Protect a route with a dashboard JWT or an API key
+
+    API keys are looked up in current_app.api_key_index, without a
+    database round trip; any other bearer token goes through the JWT check.
+    """
+    def wrapper(fn):
+        @_accepts('jwt', 'api_key')
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            token = bearer_token()
+            if token is not None and token.startswith(API_KEY_PREFIX):
+                try:
+                    entry = current_app.api_key_index.authenticate(token)
+                except DatabaseUnavailable:
+                    return _database_error()
+                if entry is None:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Invalid or expired API key'
+                    }), 401
+                g.api_key = entry
+            else:
+                try:
+                    verify_cached_jwt()
+                except DatabaseUnavailable:
+                    return _database_error()
+            return current_app.ensure_sync(fn)(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def admin_token_required(fn):
+    """Reject requests without the configured X-Admin-Token (always, when unset)"""
+    @_accepts('admin_token')
+    @wraps(fn)
+    def decorator(*args, **kwargs):
+        expected = current_app.config['ADMIN_API_TOKEN']
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not expected or not hmac.compare_digest(supplied.encode(), expected.encode()):
+            return jsonify({
+                'success': False,
+                'message': 'Admin token required'
+            }), 401
+        return current_app.ensure_sync(fn)(*args, **kwargs)
+    return decorator
+
+
+def current_merchant_id():
+    """The merchant behind a merchant_auth_required() request"""
+    entry = g.get('api_key')
+    return entry.merchant_id if entry is not None else int(get_jwt_identity())
+
+
+def revoke_token(token, claims):
+    """Revoke one access token until it expires (logout)
+
+    ``claims`` are the token's verified claims, e.g. get_jwt(). Every worker
+    rejects it once its revocation list catches up; this one at once.
+    """
+    user_id = int(claims['sub'])
+    expires_at = datetime.fromtimestamp(claims['exp'], timezone.utc).replace(tzinfo=None)
+    current_app.token_revocations.revoke_token(user_id, claims['jti'], expires_at)
+    current_app.revocation_list.apply([TokenRevocationRow((user_id, claims['jti'], utcnow(), expires_at, None))])
+    if current_app.token_cache is not None:
+        current_app.token_cache.revoke_token(token)
+
+
+def revoke_identity(user_id):
+    """Revoke every access token issued to a user so far (deactivation)"""
+    now = utcnow()
+    expires_at = now + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
+    current_app.token_revocations.revoke_user(user_id, expires_at)
+    current_app.revocation_list.apply([TokenRevocationRow((user_id, None, now, expires_at, None))])
+    if current_app.token_cache is not None:
+        current_app.token_cache.revoke_identity(user_id)
@@ -0,0 +1,164 @@
+"""
+Idempotency-Key support for POST/PUT routes
+
+``idempotent()`` goes under the route (and auth) decorators. Requests
+without the header run as before. With it, the first request runs and its
+response is recorded by current_app.idempotency; a retry with the same key
+and body gets that response back with ``Idempotent-Replayed: true``.
+
+Keys are scoped to the caller (JWT identity or API key merchant; one shared
+scope for anonymous routes such as register), the method and the path, and
+bound to a SHA-256 of the body: reusing a key for a different body is a 422.
+
+Access tokens are never recorded: ``data.access_token`` is stored as null,
+in the table and in the LRU alike, and a replay gets a freshly issued token
+from the route's ``reissue(user_id)`` (null if the user has since been
+deactivated). Routes that answer with other secrets name them in
+``redact``; those are stored, and replayed, as null.
+"""
+import hashlib
+from functools import wraps
+
+from flask import current_app, g, jsonify, request
+
+from services.idempotency import IN_PROGRESS, MISMATCH, REPLAY
+from services.repository import DatabaseUnavailable
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+TOKEN_FIELD = 'access_token'
+
+
+def _caller_scope():
+    """Who the key belongs to: the API key's merchant, the JWT subject, or anonymous"""
+    entry = g.get('api_key')
+    if entry is not None:
+        return f"merchant:{entry.merchant_id}"
+    claims = g.get('_jwt_extended_jwt')
+    if claims:
+        return f"user:{claims.get('sub')}"
+    return 'anonymous'
+
+
+def idempotency_key_hash(key):
+    """Digest identifying ``key`` for this caller, method and path"""
+    scoped = f"{_caller_scope()}\n{request.method}\n{request.path}\n{key}"
+    return hashlib.sha256(scoped.encode('utf-8')).hexdigest()
+
+
+def _redact(data, path):
+    """Null the field at dotted ``path`` under ``data``; True if one was set"""
+    *parents, field = path.split('.')
+    for name in parents:
+        data = data.get(name)
+        if not isinstance(data, dict):
+            return False
+    if data.get(field) is None:
+        return False
+    data[field] = None
+    return True
+
+
+def recorded_body(response, redact=()):
+    """The body to store for ``response``, with any access token and the
+    ``redact`` fields of its ``data`` nulled"""
+    body = response.get_data(as_text=True)
+    payload = response.get_json(silent=True) if response.is_json else None
+    data = payload.get('data') if isinstance(payload, dict) else None
+    if not isinstance(data, dict):
+        return body
+    redacted = [_redact(data, path) for path in (TOKEN_FIELD, *redact)]
+    if not any(redacted):
+        return body
+    return current_app.json.dumps(payload)
+
+
+def replayed_body(stored, reissue):
+    """A stored body with a fresh access token in place of the nulled one"""
+    if reissue is None or not stored.content_type.startswith('application/json'):
+        return stored.body
+    payload = current_app.json.loads(stored.body)
+    data = payload.get('data') if isinstance(payload, dict) else None
+    if not isinstance(data, dict) or TOKEN_FIELD not in data or not isinstance(data.get('user'), dict):
+        return stored.body
+    data[TOKEN_FIELD] = reissue(data['user']['id'])
+    return current_app.json.dumps(payload)
+
+
+def idempotent(reissue=None, redact=()):
+    """Record the first response per Idempotency-Key and replay it for retries
+
+    Routes that answer with an access token pass ``reissue``, called with
+    the response's user id to issue the token a replay carries. ``redact``
+    lists dotted paths under ``data`` (``'endpoint.secret'``) that are never
+    recorded; a replay carries null for them.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            store = current_app.idempotency
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if store is None or key is None:
+                return current_app.ensure_sync(fn)(*args, **kwargs)
+
+            if not key or len(key) > MAX_KEY_LENGTH:
+                return jsonify({
+                    'success': False,
+                    'message': f'{IDEMPOTENCY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters'
+                }), 400
+
+            key_hash = idempotency_key_hash(key)
+            fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+            try:
+                outcome, stored = store.begin(key_hash, fingerprint)
+            except DatabaseUnavailable:
+                return jsonify({
+                    'success': False,
+                    'message': 'Database connection error'
+                }), 500
+
+            if outcome == REPLAY:
+                try:
+                    body = replayed_body(stored, reissue)
+                except DatabaseUnavailable:
+                    return jsonify({
+                        'success': False,
+                        'message': 'Database connection error'
+                    }), 500
+                response = current_app.response_class(body, status=stored.status,
+                                                      content_type=stored.content_type)
+                response.headers[REPLAYED_HEADER] = 'true'
+                return response
+            if outcome == MISMATCH:
+                return jsonify({
+                    'success': False,
+                    'message': f'{IDEMPOTENCY_HEADER} was already used for a different request'
+                }), 422
+            if outcome == IN_PROGRESS:
+                response = jsonify({
+                    'success': False,
+                    'message': f'A request with this {IDEMPOTENCY_HEADER} is still in progress'
+                })
+                response.status_code = 409
+                response.headers['Retry-After'] = '1'
+                return response
+
+            # This request owns the key: run it and record the outcome
+            try:
+                response = current_app.make_response(current_app.ensure_sync(fn)(*args, **kwargs))
+            except Exception:
+                store.abandon(key_hash)
+                raise
+            try:
+                if response.status_code >= 500 or response.is_streamed:
+                    store.abandon(key_hash)
+                else:
+                    store.complete(key_hash, fingerprint, response.status_code,
+                                   recorded_body(response, redact), response.content_type)
+            except Exception as e:
+                # The response stands; the key's lock lapses and a retry runs again
+                current_app.logger.error(f"Idempotency record error: {e}")
+            return response
+        return decorator
+    return wrapper
@@ -0,0 +1,85 @@
+"""
+Application JSON provider
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Both paths serialize datetimes as ISO 8601, Decimals as strings
+(no float rounding on money) and repository row objects as JSON objects, so
+handlers can pass rows straight to jsonify().
+"""
+import datetime
+import decimal
+import json
+import time
+import uuid
+
+from flask.json.provider import DefaultJSONProvider
+
+from .metrics import record_component
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(obj):
+    """Types neither encoder handles natively"""
+    if hasattr(obj, '_asdict'):
+        return obj._asdict()
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """orjson-backed provider with a stdlib fallback"""
+
+    # Keep keys in the order handlers build them; sorting costs time on
+    # large payloads and clients do not depend on it
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=kwargs.get('indent')).decode('utf-8')
+
+    def dumps_bytes(self, obj, indent=None):
+        """Serialize straight to bytes (what a response body needs)"""
+        if orjson is not None:
+            option = orjson.OPT_NON_STR_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            return orjson.dumps(obj, default=_default, option=option)
+
+        separators = None if indent else (',', ':')
+        return json.dumps(
+            obj,
+            default=_default,
+            ensure_ascii=self.ensure_ascii,
+            sort_keys=self.sort_keys,
+            indent=indent,
+            separators=separators
+        ).encode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = None
+        if self.compact is False or (self.compact is None and self._app.debug):
+            indent = 2
+        start = time.perf_counter()
+        body = self.dumps_bytes(obj, indent=indent)
+        record_component('serialization', time.perf_counter() - start)
+        if indent:
+            body += b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,127 @@
+"""
+Prometheus metrics
+
+Per-endpoint latency histograms, status-code counters and in-flight gauges,
+plus a per-request breakdown of time spent in the database, bcrypt and JSON
+serialization. When PROMETHEUS_MULTIPROC_DIR is set (see gunicorn.conf.py)
+values live in shared mmap files and /api/metrics aggregates every worker.
+The endpoint takes the X-Admin-Token, like /api/health/stats.
+"""
+import os
+import time
+
+from flask import current_app, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest, multiprocess
+)
+
+from app.auth import admin_token_required
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    'davspay_request_duration_seconds',
+    'Request latency by endpoint',
+    ['endpoint', 'method'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_COUNT = Counter(
+    'davspay_requests_total',
+    'Requests by endpoint and status code',
+    ['endpoint', 'method', 'status']
+)
+IN_FLIGHT = Gauge(
+    'davspay_requests_in_flight',
+    'Requests currently being served',
+    ['endpoint'],
+    multiprocess_mode='livesum'
+)
+COMPONENT_TIME = Histogram(
+    'davspay_request_component_seconds',
+    'Time a request spent in db, bcrypt or serialization',
+    ['endpoint', 'component'],
+    buckets=LATENCY_BUCKETS
+)
+DB_POOL_CONNECTIONS = Gauge(
+    'davspay_db_pool_connections',
+    'Pooled database connections by state',
+    ['state'],
+    multiprocess_mode='livesum'
+)
+HASH_QUEUE_DEPTH = Gauge(
+    'davspay_password_hash_queue_depth',
+    'Password hashes queued or running',
+    multiprocess_mode='livesum'
+)
+
+# Components reported in the per-request breakdown
+COMPONENTS = ('db', 'bcrypt', 'serialization')
+
+
+def record_component(component, seconds):
+    """Add time spent in a component to the current request's breakdown"""
+    if not has_request_context():
+        return
+    times = g.get('_component_times')
+    if times is None:
+        times = g._component_times = dict.fromkeys(COMPONENTS, 0.0)
+    times[component] = times.get(component, 0.0) + seconds
+
+
+def _endpoint_label():
+    # Unmatched URLs share one label so 404 scans cannot explode cardinality
+    return request.endpoint or 'unmatched'
+
+
+@admin_token_required
+def metrics_view():
+    """Prometheus metrics for every worker; operators only"""
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return current_app.response_class(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
+
+
+def init_metrics(app):
+    """Install request instrumentation and the /api/metrics endpoint"""
+
+    app.db_pool.add_query_observer(lambda cursor, sql, params, seconds: record_component('db', seconds))
+    app.password_hasher.add_observer(lambda op, seconds: record_component('bcrypt', seconds))
+
+    @app.before_request
+    def start_request_timer():
+        g._request_start = time.perf_counter()
+        g._in_flight_label = _endpoint_label()
+        IN_FLIGHT.labels(g._in_flight_label).inc()
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.get('_request_start')
+        if start is None:
+            return response
+
+        endpoint = _endpoint_label()
+        method = request.method
+        REQUEST_LATENCY.labels(endpoint, method).observe(time.perf_counter() - start)
+        REQUEST_COUNT.labels(endpoint, method, str(response.status_code)).inc()
+
+        for component, seconds in (g.get('_component_times') or {}).items():
+            if seconds:
+                COMPONENT_TIME.labels(endpoint, component).observe(seconds)
+
+        in_use, idle = app.db_pool.usage()
+        DB_POOL_CONNECTIONS.labels('in_use').set(in_use)
+        DB_POOL_CONNECTIONS.labels('idle').set(idle)
+        HASH_QUEUE_DEPTH.set(app.password_hasher.queue_depth)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        label = g.pop('_in_flight_label', None)
+        if label is not None:
+            IN_FLIGHT.labels(label).dec()
+
+    app.add_url_rule('/api/metrics', 'metrics', metrics_view, methods=['GET'])
@@ -1,61 +1,103 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from psycopg2.extras import RealDictCursor
-from app import bcrypt
+from datetime import datetime
+from itertools import chain
+
+from flask import Blueprint, request, jsonify, current_app, stream_with_context
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity
+from app.auth import (
+    admin_token_required, bearer_token, cached_jwt_required, current_merchant_id, merchant_auth_required,
+    revoke_token
+)
+from app.idempotency import idempotent
+from services.password_hasher import HasherBusy
+from services.profile_versions import profile_claims, profile_from_claims
+from services.repository import DatabaseUnavailable, utcnow
+from services.transactions import (
+    EXPORT_FORMATS, ExportEncoder, HistoryQueryError, export_chunks, export_filename,
+    history_page, overview_data, parse_export_args, parse_history_args, parse_overview_args
+)
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api')
 
+def hasher_busy_response(err):
+    """503 with Retry-After when the password hashing queue is saturated"""
+    response = jsonify({
+        'success': False,
+        'message': 'Server is busy, please retry shortly'
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(err.retry_after)
+    return response
+
+def email_taken_response():
+    """409 for an email that is already registered"""
+    return jsonify({
+        'success': False,
+        'message': 'Email already registered'
+    }), 409
+
+def database_error_response():
+    """500 when no database connection could be obtained"""
+    return jsonify({
+        'success': False,
+        'message': 'Database connection error'
+    }), 500
+
+def load_profile(user_id):
+    """Read-through profile lookup shared by /auth/me and /auth/verification-status
+
+    Returns the cached profile dict, or None if the user is missing or inactive.
+    """
+    cache = current_app.profile_cache
+    profile, token = cache.get(user_id)
+    if profile is not None:
+        return profile
+
+    user = current_app.users.get_profile(user_id)
+    if user is None:
+        return None
+
+    profile = user._asdict()
+    profile['verification_status'] = user.verification_status or 'not_submitted'
+    cache.fill(user_id, token, profile)
+    if current_app.profile_versions is not None:
+        current_app.profile_versions.record(user_id, user.profile_version)
+    return profile
+
+def issue_access_token(user):
+    """Access token for a user row carrying the profile columns
+
+    With JWT_PROFILE_CLAIMS on, the token also carries a snapshot of the
+    profile tagged with its profile_version, and that version is recorded so
+    /auth/me can answer from the claims until the next profile write.
+    """
+    versions = current_app.profile_versions
+    if versions is None:
+        return create_access_token(identity=str(user.id))
+
+    versions.record(user.id, user.profile_version)
+    return create_access_token(identity=str(user.id), additional_claims=profile_claims(user))
+
+def reissue_access_token(user_id):
+    """Access token for an Idempotency-Key replay; None if the user is gone or inactive"""
+    user = current_app.users.get_profile(user_id)
+    return issue_access_token(user) if user is not None else None
+
+def claims_profile(user_id):
+    """Profile from the access token's claims, or None if they may be stale"""
+    versions = current_app.profile_versions
+    if versions is None:
+        return None
+    claims = get_jwt()
+    if 'profile_version' not in claims or not claims.get('is_active'):
+        return None
+    if not versions.is_current(user_id, claims['profile_version']):
+        return None
+    return profile_from_claims(user_id, claims)
+
 @auth_bp.route('/', methods=['GET'])
 def api_root():
     """API root endpoint - shows available endpoints"""
-    return jsonify({
-        'success': True,
-        'message': 'Davspay Payment Gateway API',
-        'version': '1.0.0',
-        'endpoints': {
-            'health': {
-                'method': 'GET',
-                'path': '/api/health',
-                'description': 'Check API health status'
-            },
-            'register': {
-                'method': 'POST',
-                'path': '/api/auth/register',
-                'description': 'Register a new user account',
-                'requires_auth': False
-            },
-            'login': {
-                'method': 'POST',
-                'path': '/api/auth/login',
-                'description': 'Login with email and password',
-                'requires_auth': False
-            },
-            'profile': {
-                'method': 'GET',
-                'path': '/api/auth/me',
-                'description': 'Get current user profile',
-                'requires_auth': True
-            },
-            'update_profile': {
-                'method': 'PUT',
-                'path': '/api/auth/update-profile',
-                'description': 'Update user profile',
-                'requires_auth': True
-            },
-            'submit_verification': {
-                'method': 'POST',
-                'path': '/api/auth/submit-verification',
-                'description': 'Submit verification documents',
-                'requires_auth': True
-            },
-            'verification_status': {
-                'method': 'GET',
-                'path': '/api/auth/verification-status',
-                'description': 'Get user verification status',
-                'requires_auth': True
-            }
-        }
-    }), 200
+    return current_app.static_pages['api_root'].respond()
 
 @auth_bp.route('/health', methods=['GET'])
 def health_check():
@@ -66,7 +108,26 @@ def health_check():
         'service': 'payment-gateway'
     }), 200
 
+@auth_bp.route('/health/stats', methods=['GET'])
+@admin_token_required
+def health_stats():
+    """Runtime statistics for capacity planning (operators only: they expose internals)"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'db_pool': current_app.db_pool.stats(),
+            'password_hasher': current_app.password_hasher.stats(),
+            'profile_cache': current_app.profile_cache.stats(),
+            'profile_versions': current_app.profile_versions.stats() if current_app.profile_versions else None,
+            'token_cache': current_app.token_cache.stats() if current_app.token_cache else None,
+            'api_key_index': current_app.api_key_index.stats(),
+            'revocation_list': current_app.revocation_list.stats(),
+            'idempotency': current_app.idempotency.stats()
+        }
+    }), 200
+
 @auth_bp.route('/auth/register', methods=['POST'])
+@idempotent(reissue=reissue_access_token)
 def register():
     """Register a new user"""
     try:
@@ -101,62 +162,44 @@ def register():
                 'message': 'Password must be at least 8 characters long'
             }), 400
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        existing_user = cursor.fetchone()
-
-        if existing_user:
-            cursor.close()
-            conn.close()
-            return jsonify({
-                'success': False,
-                'message': 'Email already registered'
-            }), 409
+        # Cheap existence probe so duplicates never pay for a bcrypt hash
+        if current_app.users.email_exists(email):
+            return email_taken_response()
 
         # Hash password
-        password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        password_hash = current_app.password_hasher.generate_password_hash(password)
 
-        # Insert new user
-        cursor.execute("""
-            INSERT INTO users (email, password_hash, full_name, company_name, phone)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id, email, full_name, company_name, phone, created_at
-        """, (email, password_hash, full_name, company_name, phone))
-
-        new_user = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Insert new user; a concurrent registration of the same email
+        # loses the ON CONFLICT race and gets no row back
+        new_user = current_app.users.create(email, password_hash, full_name, company_name, phone)
+        if new_user is None:
+            return email_taken_response()
 
         # Generate access token (convert ID to string for JWT)
-        access_token = create_access_token(identity=str(new_user['id']))
+        access_token = issue_access_token(new_user)
 
         return jsonify({
             'success': True,
             'message': 'Registration successful',
             'data': {
                 'user': {
-                    'id': new_user['id'],
-                    'email': new_user['email'],
-                    'full_name': new_user['full_name'],
-                    'company_name': new_user['company_name'],
-                    'phone': new_user['phone'],
-                    'created_at': new_user['created_at'].isoformat()
+                    'id': new_user.id,
+                    'email': new_user.email,
+                    'full_name': new_user.full_name,
+                    'company_name': new_user.company_name,
+                    'phone': new_user.phone,
+                    'created_at': new_user.created_at
                 },
                 'access_token': access_token
             }
         }), 201
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Registration error: {e}")
         return jsonify({
@@ -180,26 +223,8 @@ def login():
         email = data.get('email').lower().strip()
         password = data.get('password')
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
         # Get user by email
-        cursor.execute("""
-            SELECT id, email, password_hash, full_name, company_name, phone, is_active, is_verified, verification_status
-            FROM users
-            WHERE email = %s
-        """, (email,))
-
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        user = current_app.users.get_credentials(email)
 
         if not user:
             return jsonify({
@@ -208,39 +233,45 @@ def login():
             }), 401
 
         # Check if account is active
-        if not user['is_active']:
+        if not user.is_active:
             return jsonify({
                 'success': False,
                 'message': 'Account is deactivated. Please contact support.'
             }), 403
 
         # Verify password
-        if not bcrypt.check_password_hash(user['password_hash'], password):
+        if not current_app.password_hasher.check_password_hash(user.password_hash, password):
             return jsonify({
                 'success': False,
                 'message': 'Invalid email or password'
             }), 401
 
         # Generate access token (convert ID to string for JWT)
-        access_token = create_access_token(identity=str(user['id']))
+        access_token = issue_access_token(user)
 
         return jsonify({
             'success': True,
             'message': 'Login successful',
             'data': {
                 'user': {
-                    'id': user['id'],
-                    'email': user['email'],
-                    'full_name': user['full_name'],
-                    'company_name': user['company_name'],
-                    'phone': user['phone'],
-                    'is_verified': user['is_verified'],
-                    'verification_status': user.get('verification_status', 'not_submitted')
+                    'id': user.id,
+                    'email': user.email,
+                    'full_name': user.full_name,
+                    'company_name': user.company_name,
+                    'phone': user.phone,
+                    'is_verified': user.is_verified,
+                    'verification_status': user.verification_status or 'not_submitted'
                 },
                 'access_token': access_token
             }
         }), 200
 
+    except HasherBusy as e:
+        return hasher_busy_response(e)
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Login error: {e}")
         return jsonify({
@@ -248,33 +279,37 @@ def login():
             'message': 'An error occurred during login'
         }), 500
 
+@auth_bp.route('/auth/logout', methods=['POST'])
+@cached_jwt_required()
+def logout():
+    """Revoke the access token the request was made with"""
+    try:
+        revoke_token(bearer_token(), get_jwt())
+        return jsonify({
+            'success': True,
+            'message': 'Logged out'
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Logout error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred during logout'
+        }), 500
+
 @auth_bp.route('/auth/me', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def get_current_user():
     """Get current user profile"""
     try:
         current_user_id = int(get_jwt_identity())
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Get user data
-        cursor.execute("""
-            SELECT id, email, full_name, company_name, phone, is_verified, verification_status, created_at
-            FROM users
-            WHERE id = %s AND is_active = TRUE
-        """, (current_user_id,))
-
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        # Tokens still at the user's current profile_version answer from
+        # their own claims; anything else goes through the profile cache
+        user = claims_profile(current_user_id) or load_profile(current_user_id)
 
         if not user:
             return jsonify({
@@ -292,12 +327,15 @@ def get_current_user():
                     'company_name': user['company_name'],
                     'phone': user['phone'],
                     'is_verified': user['is_verified'],
-                    'verification_status': user.get('verification_status', 'not_submitted'),
-                    'created_at': user['created_at'].isoformat()
+                    'verification_status': user['verification_status'],
+                    'created_at': user['created_at']
                 }
             }
         }), 200
 
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Get user error: {e}")
         return jsonify({
@@ -306,71 +344,59 @@ def get_current_user():
         }), 500
 
 @auth_bp.route('/auth/update-profile', methods=['PUT'])
-@jwt_required()
+@cached_jwt_required()
+@idempotent(reissue=reissue_access_token)
 def update_profile():
     """Update user profile"""
     try:
         current_user_id = int(get_jwt_identity())
         data = request.get_json()
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Build update query dynamically
-        update_fields = []
-        params = []
-
-        if data.get('full_name'):
-            update_fields.append("full_name = %s")
-            params.append(data['full_name'].strip())
-
-        if data.get('company_name'):
-            update_fields.append("company_name = %s")
-            params.append(data['company_name'].strip())
-
-        if data.get('phone'):
-            update_fields.append("phone = %s")
-            params.append(data['phone'].strip())
+        # Only non-empty fields are updated
+        changes = {
+            field: data[field].strip()
+            for field in ('full_name', 'company_name', 'phone')
+            if data.get(field)
+        }
 
-        if not update_fields:
-            cursor.close()
-            conn.close()
+        if not changes:
             return jsonify({
                 'success': False,
                 'message': 'No fields to update'
             }), 400
 
-        update_fields.append("updated_at = CURRENT_TIMESTAMP")
-        params.append(current_user_id)
+        updated_user = current_app.users.update_profile(current_user_id, changes)
 
-        query = f"""
-            UPDATE users
-            SET {', '.join(update_fields)}
-            WHERE id = %s
-            RETURNING id, email, full_name, company_name, phone
-        """
+        current_app.profile_cache.invalidate(current_user_id)
+
+        if not updated_user:
+            return jsonify({
+                'success': False,
+                'message': 'User not found'
+            }), 404
 
-        cursor.execute(query, params)
-        updated_user = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # The update bumped profile_version; a fresh token keeps the
+        # caller on the /auth/me fast path
+        access_token = issue_access_token(updated_user)
 
         return jsonify({
             'success': True,
             'message': 'Profile updated successfully',
             'data': {
-                'user': dict(updated_user)
+                'user': {
+                    'id': updated_user.id,
+                    'email': updated_user.email,
+                    'full_name': updated_user.full_name,
+                    'company_name': updated_user.company_name,
+                    'phone': updated_user.phone
+                },
+                'access_token': access_token
             }
         }), 200
 
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Update profile error: {e}")
         return jsonify({
@@ -379,76 +405,48 @@ def update_profile():
         }), 500
 
 @auth_bp.route('/auth/submit-verification', methods=['POST'])
-@jwt_required()
+@cached_jwt_required()
+@idempotent(reissue=reissue_access_token)
 def submit_verification():
     """Submit verification - just marks user as pending, no data collected"""
     try:
         current_user_id = int(get_jwt_identity())
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Check current verification status
-        cursor.execute("""
-            SELECT verification_status
-            FROM users
-            WHERE id = %s
-        """, (current_user_id,))
+        result = current_app.verification.submit(current_user_id)
 
-        user = cursor.fetchone()
-
-        if not user:
-            cursor.close()
-            conn.close()
+        if not result:
             return jsonify({
                 'success': False,
                 'message': 'User not found'
             }), 404
 
         # Check if already submitted
-        if user['verification_status'] == 'pending':
-            cursor.close()
-            conn.close()
+        if result.id is None:
             return jsonify({
                 'success': False,
                 'message': 'Verification already submitted'
             }), 400
 
-        # Update user verification status to pending
-        cursor.execute("""
-            UPDATE users
-            SET verification_status = 'pending',
-                verification_submitted_at = CURRENT_TIMESTAMP,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = %s
-            RETURNING id, email, full_name, verification_status
-        """, (current_user_id,))
-
-        updated_user = cursor.fetchone()
-        conn.commit()
-        cursor.close()
-        conn.close()
+        current_app.profile_cache.invalidate(current_user_id)
+        access_token = issue_access_token(result)
 
         return jsonify({
             'success': True,
             'message': 'Verification request submitted successfully.',
             'data': {
                 'user': {
-                    'id': updated_user['id'],
-                    'email': updated_user['email'],
-                    'full_name': updated_user['full_name'],
-                    'verification_status': updated_user['verification_status']
-                }
+                    'id': result.id,
+                    'email': result.email,
+                    'full_name': result.full_name,
+                    'verification_status': result.verification_status
+                },
+                'access_token': access_token
             }
         }), 200
 
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Submit verification error: {e}")
         return jsonify({
@@ -457,32 +455,13 @@ def submit_verification():
         }), 500
 
 @auth_bp.route('/auth/verification-status', methods=['GET'])
-@jwt_required()
+@cached_jwt_required()
 def get_verification_status():
     """Get user verification status"""
     try:
         current_user_id = int(get_jwt_identity())
 
-        # Connect to database
-        conn = current_app.get_db_connection()
-        if conn is None:
-            return jsonify({
-                'success': False,
-                'message': 'Database connection error'
-            }), 500
-
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-
-        # Get verification status
-        cursor.execute("""
-            SELECT verification_status, verification_submitted_at
-            FROM users
-            WHERE id = %s AND is_active = TRUE
-        """, (current_user_id,))
-
-        user = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        user = load_profile(current_user_id)
 
         if not user:
             return jsonify({
@@ -493,14 +472,135 @@ def get_verification_status():
         return jsonify({
             'success': True,
             'data': {
-                'verification_status': user.get('verification_status', 'not_submitted'),
-                'verification_submitted_at': user['verification_submitted_at'].isoformat() if user.get('verification_submitted_at') else None
+                'verification_status': user['verification_status'],
+                'verification_submitted_at': user['verification_submitted_at']
             }
         }), 200
 
+    except DatabaseUnavailable:
+        return database_error_response()
+
     except Exception as e:
         current_app.logger.error(f"Get verification status error: {e}")
         return jsonify({
             'success': False,
             'message': 'An error occurred'
         }), 500
+
+@auth_bp.route('/transactions', methods=['GET'])
+@merchant_auth_required()
+def get_transactions():
+    """Transaction history, newest first, one keyset-paginated page at a time
+
+    Pass the previous response's next_cursor as ?cursor= for the next page.
+    Optional filters: channel, kind, status, since, until (ISO 8601).
+    """
+    try:
+        current_user_id = current_merchant_id()
+        limit, before, filters = parse_history_args(request.args)
+
+        rows, has_more = current_app.transactions.history(current_user_id, limit, before, filters)
+
+        return jsonify({
+            'success': True,
+            'data': history_page(rows, has_more)
+        }), 200
+
+    except HistoryQueryError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Transaction history error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading transactions'
+        }), 500
+
+@auth_bp.route('/transactions/overview', methods=['GET'])
+@merchant_auth_required()
+def transaction_overview():
+    """Dashboard totals, success rate and daily volume for the last ?days= UTC days
+
+    Reads only the hourly summaries, so the cost depends on the window, not
+    on how many transactions the merchant has.
+    """
+    try:
+        current_user_id = current_merchant_id()
+        first_day, days = parse_overview_args(request.args, utcnow().date())
+
+        since = datetime.combine(first_day, datetime.min.time())
+        rows = current_app.summaries.overview(current_user_id, since)
+
+        return jsonify({
+            'success': True,
+            'data': overview_data(rows, first_day, days)
+        }), 200
+
+    except HistoryQueryError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Transaction overview error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading the overview'
+        }), 500
+
+@auth_bp.route('/transactions/export', methods=['GET'])
+@merchant_auth_required()
+def export_transactions():
+    """Download transactions as NDJSON or CSV (?format=), optionally gzipped (?gzip=1)
+
+    Rows stream from a server-side cursor through a generator response, so
+    memory stays flat however long the statement is. Same filters as
+    /transactions.
+    """
+    try:
+        current_user_id = current_merchant_id()
+        fmt, compress, filters = parse_export_args(request.args)
+
+        batches = current_app.transactions.export(
+            current_user_id, filters, itersize=current_app.config['EXPORT_ITERSIZE']
+        )
+        # Run the query before any bytes go out, so a database error still
+        # gets a proper JSON response
+        first = next(batches, [])
+        encoder = ExportEncoder(fmt, current_app.json.dumps_bytes, compress)
+
+        response = current_app.response_class(
+            stream_with_context(export_chunks(chain([first], batches), encoder)),
+            mimetype='application/gzip' if compress else EXPORT_FORMATS[fmt]
+        )
+        response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(fmt, compress)}"'
+        response.headers['Cache-Control'] = 'no-store'
+        # Tell nginx to pass chunks through instead of buffering the download
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except HistoryQueryError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Transaction export error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while exporting transactions'
+        }), 500
@@ -0,0 +1,84 @@
+"""
+Merchant settlements under /api/settlements
+
+One settlement per merchant and day, computed by the settle.py run (see
+services/settlements.py). These routes only read them; like the
+transaction routes they accept the dashboard JWT or an API key.
+"""
+from datetime import date
+
+from flask import Blueprint, request, jsonify, current_app
+from app.auth import current_merchant_id, merchant_auth_required
+from app.routes import database_error_response
+from services.repository import DatabaseUnavailable
+
+settlements_bp = Blueprint('settlements', __name__, url_prefix='/api/settlements')
+
+DEFAULT_PAGE_SIZE = 30
+MAX_PAGE_SIZE = 100
+
+def settlement_json(row):
+    """API shape of a SettlementRow; amounts in paise"""
+    return {
+        'date': row.settlement_date,
+        'payment_count': row.payment_count,
+        'gross': row.gross,
+        'refund_count': row.refund_count,
+        'refunds': row.refunds,
+        'fees': row.fees,
+        'gst': row.gst,
+        'net': row.net,
+        'created_at': row.created_at
+    }
+
+def bad_request(message):
+    return jsonify({
+        'success': False,
+        'message': message
+    }), 400
+
+@settlements_bp.route('', methods=['GET'])
+@merchant_auth_required()
+def list_settlements():
+    """Settlements newest day first, plus totals over every day
+
+    Page with ?before=<next_before from the previous response>; ?limit=
+    defaults to 30.
+    """
+    try:
+        current_user_id = current_merchant_id()
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return bad_request('limit must be an integer')
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return bad_request(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        before = request.args.get('before')
+        if before:
+            try:
+                before = date.fromisoformat(before)
+            except ValueError:
+                return bad_request('before must be an ISO 8601 date')
+
+        rows, has_more = current_app.settlements.history(current_user_id, limit, before or None)
+        summary = current_app.settlements.summary(current_user_id)
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'settlements': [settlement_json(row) for row in rows],
+                'summary': summary._asdict(),
+                'next_before': rows[-1].settlement_date if has_more else None,
+                'has_more': has_more
+            }
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Settlement list error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading settlements'
+        }), 500
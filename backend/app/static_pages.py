@@ -0,0 +1,259 @@
+"""
+Pre-rendered static responses for / and /api/
+
+Load balancers and uptime probes hit both constantly. They are rendered once
+when the app is created into immutable bytes with a strong ETag, so a hit
+costs a header comparison (304) or a copy of cached bytes. The endpoint
+catalogue comes from the registered url_map, so it stays correct as routes
+are added.
+"""
+import hashlib
+
+from flask import request
+
+API_VERSION = '1.0.0'
+
+# Methods Flask adds to every rule; not worth listing
+_IMPLICIT_METHODS = {'HEAD', 'OPTIONS'}
+
+
+
+class PrerenderedPage:
+    """Immutable response body served with a strong ETag and Cache-Control"""
+
+    def __init__(self, app, body, mimetype, max_age=60):
+        self.app = app
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.cache_control = f"public, max-age={max_age}"
+
+    def respond(self):
+        """200 with the cached body, or 304 if the client already has it"""
+        if request.if_none_match.contains_weak(self.etag):
+            response = self.app.response_class(status=304)
+        else:
+            response = self.app.response_class(self.body, mimetype=self.mimetype)
+        response.set_etag(self.etag)
+        response.headers['Cache-Control'] = self.cache_control
+        return response
+
+
+def auth_schemes(view):
+    """Credentials the view accepts, as tagged by the app.auth decorators
+    anywhere in its wrapper chain; empty for public views"""
+    while view is not None:
+        schemes = getattr(view, 'auth_schemes', None)
+        if schemes:
+            return list(schemes)
+        view = getattr(view, '__wrapped__', None)
+    return []
+
+
+def build_endpoint_catalogue(app):
+    """Describe every /api rule registered on the app, sorted by path"""
+    endpoints = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: (r.rule, r.endpoint)):
+        if not rule.rule.startswith('/api'):
+            continue
+        view = app.view_functions[rule.endpoint]
+        doc = (view.__doc__ or '').strip().splitlines()
+        schemes = auth_schemes(view)
+        endpoints.append({
+            # Full endpoint names: views in different blueprints may share a name
+            'name': rule.endpoint,
+            'method': ', '.join(sorted(rule.methods - _IMPLICIT_METHODS)),
+            'path': rule.rule,
+            'description': doc[0].strip() if doc else '',
+            'requires_auth': bool(schemes),
+            'auth': schemes
+        })
+    return endpoints
+
+
+def build_static_pages(app):
+    """Render / and /api/ once; call after every blueprint is registered"""
+    endpoints = build_endpoint_catalogue(app)
+
+    index_html = app.jinja_env.from_string(INDEX_TEMPLATE).render(endpoints=endpoints)
+
+    api_root = app.json.dumps({
+        'success': True,
+        'message': 'Davspay Payment Gateway API',
+        'version': API_VERSION,
+        'endpoints': {
+            endpoint['name']: {
+                'method': endpoint['method'],
+                'path': endpoint['path'],
+                'description': endpoint['description'],
+                'requires_auth': endpoint['requires_auth'],
+                'auth': endpoint['auth']
+            }
+            for endpoint in endpoints
+        }
+    })
+
+    return {
+        'index': PrerenderedPage(app, index_html.encode('utf-8'), 'text/html'),
+        'api_root': PrerenderedPage(app, api_root.encode('utf-8'), app.json.mimetype)
+    }
+
+
+INDEX_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8" />
+    <meta name="viewport" content="width=device-width,initial-scale=1" />
+    <title>Davspay API Server</title>
+    <style>
+        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+        body {
+            background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+            color: #fff;
+            display: flex;
+            flex-direction: column;
+            align-items: center;
+            justify-content: center;
+            min-height: 100vh;
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen', 'Ubuntu', 'Cantarell', sans-serif;
+            overflow-x: hidden;
+            padding: 20px;
+        }
+        .logo {
+            font-size: 5rem;
+            animation: float 3s ease-in-out infinite;
+            margin-bottom: 20px;
+            filter: drop-shadow(0 10px 20px rgba(0,0,0,0.3));
+        }
+        @keyframes float {
+            0%, 100% { transform: translateY(0px) rotate(0deg); }
+            50% { transform: translateY(-20px) rotate(5deg); }
+        }
+        h1 {
+            font-size: clamp(1.5rem, 5vw, 2.5rem);
+            margin-bottom: 0.5em;
+            letter-spacing: 2px;
+            text-align: center;
+            text-shadow: 2px 2px 4px rgba(0,0,0,0.2);
+        }
+        .status-indicator {
+            display: flex;
+            align-items: center;
+            gap: 10px;
+            margin-top: 20px;
+            padding: 15px 30px;
+            background: rgba(255, 255, 255, 0.1);
+            backdrop-filter: blur(10px);
+            border-radius: 50px;
+            border: 2px solid rgba(255, 255, 255, 0.2);
+        }
+        .dot {
+            height: 16px;
+            width: 16px;
+            background-color: #00ff88;
+            border-radius: 50%;
+            box-shadow: 0 0 12px #00ff88, 0 0 24px #00ff88;
+            animation: pulse 1.5s infinite;
+        }
+        @keyframes pulse {
+            0%, 100% {
+                box-shadow: 0 0 8px #00ff88, 0 0 16px #00ff88;
+                transform: scale(1);
+            }
+            50% {
+                box-shadow: 0 0 16px #00ff88, 0 0 32px #00ff88;
+                transform: scale(1.1);
+            }
+        }
+        .info {
+            margin-top: 40px;
+            padding: 30px;
+            background: rgba(255, 255, 255, 0.1);
+            backdrop-filter: blur(10px);
+            border-radius: 20px;
+            border: 2px solid rgba(255, 255, 255, 0.2);
+            max-width: 600px;
+            text-align: center;
+        }
+        .info h2 {
+            font-size: 1.5rem;
+            margin-bottom: 15px;
+            color: #fff;
+        }
+        .endpoint {
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            padding: 12px 20px;
+            margin: 10px 0;
+            background: rgba(0, 0, 0, 0.2);
+            border-radius: 10px;
+            font-family: 'Courier New', monospace;
+            font-size: 0.9rem;
+        }
+        .method {
+            padding: 4px 12px;
+            border-radius: 6px;
+            font-weight: bold;
+            font-size: 0.75rem;
+        }
+        .get { background: #61affe; color: #fff; }
+        .post { background: #49cc90; color: #fff; }
+        .put { background: #fca130; color: #fff; }
+        .delete { background: #f93e3e; color: #fff; }
+        .endpoint-path {
+            flex: 1;
+            margin-left: 15px;
+            text-align: left;
+            color: #f0f0f0;
+        }
+        .footer {
+            margin-top: 40px;
+            opacity: 0.7;
+            font-size: 0.9rem;
+            text-align: center;
+        }
+        @media (max-width: 768px) {
+            .logo { font-size: 3rem; }
+            .info { padding: 20px; }
+            .endpoint {
+                flex-direction: column;
+                align-items: flex-start;
+                gap: 8px;
+            }
+            .endpoint-path {
+                margin-left: 0;
+                word-break: break-all;
+            }
+        }
+    </style>
+</head>
+<body>
+    <div class="logo">&#128179;</div>
+    <h1>Davspay Payment Gateway API</h1>
+    <div class="status-indicator">
+        <span class="dot"></span>
+        <span style="font-weight: 600; font-size: 1.1rem;">Server Running</span>
+    </div>
+
+    <div class="info">
+        <h2>&#128279; Available Endpoints</h2>
+        {% for endpoint in endpoints %}
+        <div class="endpoint">
+            <span class="method {{ endpoint.method.split(',')[0].lower() }}">{{ endpoint.method }}</span>
+            <span class="endpoint-path">{{ endpoint.path }}</span>
+        </div>
+        {% endfor %}
+    </div>
+
+    <div class="footer">
+        <p>&#128274; Secure Payment Processing Platform</p>
+        <p style="margin-top: 10px;">Powered by Flask & PostgreSQL</p>
+    </div>
+</body>
+</html>
+"""
@@ -0,0 +1,130 @@
+"""
+Bank account validation under /api/validation
+
+IFSC lookups and batch account checks answer from each worker's mapped
+IFSC directory (services/ifsc.py); penny drops go out through the
+configured bank adapter (services/bank_accounts.py). Like the transaction
+routes they accept the dashboard JWT or an API key.
+"""
+from flask import Blueprint, request, jsonify, current_app
+from app.auth import merchant_auth_required
+from app.idempotency import idempotent
+from services.bank_accounts import AccountBatchError, batch_summary, parse_batch, validate_accounts
+from services.ifsc import DirectoryUnavailable
+
+validation_bp = Blueprint('validation', __name__, url_prefix='/api/validation')
+
+def directory_unavailable_response(e):
+    current_app.logger.error(f"IFSC directory unavailable: {e}")
+    return jsonify({
+        'success': False,
+        'message': 'The IFSC directory is temporarily unavailable'
+    }), 503
+
+def bad_request(message):
+    return jsonify({
+        'success': False,
+        'message': message
+    }), 400
+
+@validation_bp.route('/ifsc/<code>', methods=['GET'])
+@merchant_auth_required()
+def get_ifsc(code):
+    """Branch details for one IFSC"""
+    try:
+        branch = current_app.ifsc_directory.lookup(code)
+        if branch is None:
+            return jsonify({
+                'success': False,
+                'message': 'IFSC not found'
+            }), 404
+
+        return jsonify({
+            'success': True,
+            'data': {'branch': branch}
+        }), 200
+
+    except DirectoryUnavailable as e:
+        return directory_unavailable_response(e)
+
+    except Exception as e:
+        current_app.logger.error(f"IFSC lookup error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while looking up the IFSC'
+        }), 500
+
+@validation_bp.route('/accounts', methods=['POST'])
+@merchant_auth_required()
+def validate_account_batch():
+    """Check up to ACCOUNT_VALIDATION_MAX_BATCH account number / IFSC pairs
+
+    Formats and the IFSC directory only; nothing is sent to a bank.
+    """
+    try:
+        try:
+            accounts = parse_batch(request.get_json(silent=True),
+                                   current_app.config['ACCOUNT_VALIDATION_MAX_BATCH'])
+        except AccountBatchError as e:
+            return bad_request(str(e))
+
+        results = validate_accounts(accounts, current_app.ifsc_directory.table())
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'results': results,
+                'summary': batch_summary(results)
+            }
+        }), 200
+
+    except DirectoryUnavailable as e:
+        return directory_unavailable_response(e)
+
+    except Exception as e:
+        current_app.logger.error(f"Account validation error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while validating accounts'
+        }), 500
+
+@validation_bp.route('/penny-drop', methods=['POST'])
+@merchant_auth_required()
+@idempotent()
+def penny_drop():
+    """Validate up to PENNY_DROP_MAX_BATCH pairs, then penny-drop the valid ones concurrently
+
+    Send an Idempotency-Key: each penny drop moves money, and a retried
+    request with the same key gets the first response back.
+    """
+    try:
+        try:
+            accounts = parse_batch(request.get_json(silent=True), current_app.config['PENNY_DROP_MAX_BATCH'])
+        except AccountBatchError as e:
+            return bad_request(str(e))
+
+        results = validate_accounts(accounts, current_app.ifsc_directory.table())
+        valid = [result for result in results if result['valid']]
+        checks = current_app.penny_drop.verify([(result['account_number'], result['ifsc']) for result in valid])
+        for result in results:
+            result['penny_drop'] = None
+        for result, check in zip(valid, checks):
+            result['penny_drop'] = check
+
+        return jsonify({
+            'success': True,
+            'data': {
+                'results': results,
+                'summary': batch_summary(results)
+            }
+        }), 200
+
+    except DirectoryUnavailable as e:
+        return directory_unavailable_response(e)
+
+    except Exception as e:
+        current_app.logger.error(f"Penny drop error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while verifying accounts'
+        }), 500
@@ -0,0 +1,173 @@
+"""
+Merchant webhook endpoints under /api/webhooks
+
+Merchants register the URLs events are delivered to. The signing secret is
+returned once, when the endpoint is created. Deliveries themselves are made
+by webhook_dispatcher.py from the outbox (see services/webhooks.py).
+"""
+import secrets
+from urllib.parse import urlsplit
+
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import get_jwt_identity
+from app.auth import cached_jwt_required
+from app.idempotency import idempotent
+from app.routes import database_error_response
+from services.repository import DatabaseUnavailable
+from services.webhooks import destination_error
+
+webhooks_bp = Blueprint('webhooks', __name__, url_prefix='/api/webhooks')
+
+DEFAULT_MAX_CONCURRENCY = 4
+
+def endpoint_json(endpoint, secret=False):
+    """API shape of a WebhookEndpointRow; the secret only when asked for"""
+    data = {
+        'id': endpoint.id,
+        'url': endpoint.url,
+        'max_concurrency': endpoint.max_concurrency,
+        'created_at': endpoint.created_at
+    }
+    if secret:
+        data['secret'] = endpoint.secret
+    return data
+
+def validate_endpoint_url(url):
+    """Return an error message, or None for an acceptable URL"""
+    if not url or len(url) > 2048:
+        return 'url is required (at most 2048 characters)'
+    parts = urlsplit(url)
+    schemes = ('https', 'http') if current_app.config['WEBHOOK_ALLOW_HTTP'] else ('https',)
+    if parts.scheme not in schemes or not parts.hostname:
+        return f"url must be an absolute {' or '.join(schemes)} URL"
+    if not current_app.config['WEBHOOK_ALLOW_PRIVATE']:
+        return destination_error(url)
+    return None
+
+def endpoint_not_found_response():
+    return jsonify({
+        'success': False,
+        'message': 'Webhook endpoint not found'
+    }), 404
+
+@webhooks_bp.route('', methods=['GET'])
+@cached_jwt_required()
+def list_endpoints():
+    """The merchant's active webhook endpoints"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        endpoints = current_app.webhooks.endpoints(current_user_id)
+        return jsonify({
+            'success': True,
+            'data': {'endpoints': [endpoint_json(endpoint) for endpoint in endpoints]}
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook list error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while loading webhook endpoints'
+        }), 500
+
+@webhooks_bp.route('', methods=['POST'])
+@cached_jwt_required()
+@idempotent(redact=('endpoint.secret',))
+def create_endpoint():
+    """Register a webhook URL; the response carries its signing secret, once"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        data = request.get_json(silent=True) or {}
+
+        url = (data.get('url') or '').strip()
+        error = validate_endpoint_url(url)
+        if error:
+            return jsonify({
+                'success': False,
+                'message': error
+            }), 400
+
+        limit = current_app.config['WEBHOOK_MAX_CONCURRENCY']
+        max_concurrency = data.get('max_concurrency', min(DEFAULT_MAX_CONCURRENCY, limit))
+        if not isinstance(max_concurrency, int) or isinstance(max_concurrency, bool) \
+                or not 1 <= max_concurrency <= limit:
+            return jsonify({
+                'success': False,
+                'message': f'max_concurrency must be an integer between 1 and {limit}'
+            }), 400
+
+        if len(current_app.webhooks.endpoints(current_user_id)) >= current_app.config['WEBHOOK_MAX_ENDPOINTS']:
+            return jsonify({
+                'success': False,
+                'message': f"At most {current_app.config['WEBHOOK_MAX_ENDPOINTS']} webhook endpoints are allowed"
+            }), 409
+
+        secret = f"whsec_{secrets.token_hex(24)}"
+        endpoint = current_app.webhooks.create_endpoint(current_user_id, url, secret, max_concurrency)
+
+        return jsonify({
+            'success': True,
+            'message': 'Webhook endpoint created. Store the secret now; it is not shown again.',
+            'data': {'endpoint': endpoint_json(endpoint, secret=True)}
+        }), 201
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook create error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while creating the webhook endpoint'
+        }), 500
+
+@webhooks_bp.route('/<int:endpoint_id>', methods=['DELETE'])
+@cached_jwt_required()
+def delete_endpoint(endpoint_id):
+    """Stop deliveries to an endpoint; queued events for it are dead-lettered"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        if not current_app.webhooks.disable_endpoint(current_user_id, endpoint_id):
+            return endpoint_not_found_response()
+        return jsonify({
+            'success': True,
+            'message': 'Webhook endpoint removed'
+        }), 200
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook delete error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while removing the webhook endpoint'
+        }), 500
+
+@webhooks_bp.route('/<int:endpoint_id>/test', methods=['POST'])
+@cached_jwt_required()
+@idempotent()
+def send_test_event(endpoint_id):
+    """Queue a webhook.test event for one endpoint"""
+    try:
+        current_user_id = int(get_jwt_identity())
+        delivery_id = current_app.webhooks.send_test(current_user_id, endpoint_id)
+        if delivery_id is None:
+            return endpoint_not_found_response()
+        return jsonify({
+            'success': True,
+            'message': 'Test event queued',
+            'data': {'delivery_id': delivery_id}
+        }), 202
+
+    except DatabaseUnavailable:
+        return database_error_response()
+
+    except Exception as e:
+        current_app.logger.error(f"Webhook test error: {e}")
+        return jsonify({
+            'success': False,
+            'message': 'An error occurred while queueing the test event'
+        }), 500
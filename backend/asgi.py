@@ -0,0 +1,14 @@
+"""
+ASGI entry point (async build of the API, see aio/)
+
+Usage (from backend/):
+    WEB_CONCURRENCY=4 uvicorn asgi:application --host 0.0.0.0 --port 8000
+
+Requires the packages in requirements-asgi.txt. Set the worker count with
+WEB_CONCURRENCY rather than --workers: the app reads it to cap the TTL of
+per-worker profile caches (see PROFILE_CACHE_BACKEND in config.py).
+"""
+from aio import create_asgi_app
+
+# Create the application instance for production
+application = create_asgi_app("production")
@@ -0,0 +1,368 @@
+"""
+Microbenchmarks for the auth hot path
+
+Covers the primitives every auth request pays for:
+    bcrypt      Flask-Bcrypt generate/check at several cost factors
+    jwt         create_access_token / decode_token, with and without the
+                profile claims /auth/me answers from
+    validate    utils.validate_email / validate_password / validate_phone
+    json        the login, /auth/me and register payloads from app/routes.py
+                through the app's JSON provider and through stdlib json
+    startup     create_app() in-process, and a cold interpreter start
+
+Each case is auto-calibrated so one batch runs for at least --min-time, then
+timed for --repeats batches with the garbage collector off. The table reports
+the median per-call time with its spread (IQR and relative stdev). Baselines
+are machine-specific, so keep one per machine. Save one with --save-baseline,
+then later runs with --baseline exit 1 when a case's median regresses by more
+than --threshold.
+
+Usage (from backend/):
+    python benchmarks/bench_auth.py [--only jwt,json] [--rounds 10,12]
+        [--json results.json] [--save-baseline base.json | --baseline base.json]
+"""
+import argparse
+import datetime
+import fnmatch
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from flask_jwt_extended import create_access_token, decode_token
+
+from app import bcrypt, create_app
+from services.profile_versions import profile_claims
+from services.repository import CredentialsRow, UserRow
+from utils import validate_email, validate_password, validate_phone
+
+PASSWORD = 'Sup3rSecret!'
+NOW = datetime.datetime(2024, 1, 2, 3, 4, 5)
+
+# Rows shaped like the ones the routes serialize
+CREDENTIALS = CredentialsRow((
+    42, 'merchant@example.com', '', 'Asha Merchant', 'Asha Traders Pvt Ltd', '9876543210',
+    True, False, 'not_submitted', NOW, 3
+))
+NEW_USER = UserRow((
+    42, 'merchant@example.com', 'Asha Merchant', 'Asha Traders Pvt Ltd', '9876543210', NOW,
+    True, False, 'not_submitted', 1
+))
+
+
+def login_payload(user, token):
+    """Body of a successful /api/auth/login"""
+    return {
+        'success': True,
+        'message': 'Login successful',
+        'data': {
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'full_name': user.full_name,
+                'company_name': user.company_name,
+                'phone': user.phone,
+                'is_verified': user.is_verified,
+                'verification_status': user.verification_status or 'not_submitted'
+            },
+            'access_token': token
+        }
+    }
+
+
+def me_payload(user):
+    """Body of /api/auth/me"""
+    return {
+        'success': True,
+        'data': {
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'full_name': user.full_name,
+                'company_name': user.company_name,
+                'phone': user.phone,
+                'is_verified': user.is_verified,
+                'verification_status': user.verification_status,
+                'created_at': user.created_at
+            }
+        }
+    }
+
+
+def register_payload(user, token):
+    """Body of a successful /api/auth/register"""
+    return {
+        'success': True,
+        'message': 'Registration successful',
+        'data': {
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'full_name': user.full_name,
+                'company_name': user.company_name,
+                'phone': user.phone,
+                'created_at': user.created_at
+            },
+            'access_token': token
+        }
+    }
+
+
+# ----------------------------------------------------------------------
+# Cases
+# ----------------------------------------------------------------------
+def build_cases(app, rounds):
+    """[(name, fn)] for every benchmark; fn takes no arguments"""
+    cases = []
+
+    for cost in rounds:
+        pw_hash = bcrypt.generate_password_hash(PASSWORD, rounds=cost)
+        cases.append((f'bcrypt/hash/rounds={cost}',
+                      lambda cost=cost: bcrypt.generate_password_hash(PASSWORD, rounds=cost)))
+        cases.append((f'bcrypt/check/rounds={cost}',
+                      lambda pw_hash=pw_hash: bcrypt.check_password_hash(pw_hash, PASSWORD)))
+
+    claims = profile_claims(CREDENTIALS)
+    plain_token = create_access_token(identity='42')
+    claims_token = create_access_token(identity='42', additional_claims=claims)
+    cases += [
+        ('jwt/create', lambda: create_access_token(identity='42')),
+        ('jwt/create+profile_claims', lambda: create_access_token(identity='42', additional_claims=claims)),
+        ('jwt/decode', lambda: decode_token(plain_token)),
+        ('jwt/decode+profile_claims', lambda: decode_token(claims_token)),
+    ]
+
+    cases += [
+        ('validate/email/valid', lambda: validate_email('merchant.ops+alerts@example.co.in')),
+        ('validate/email/invalid', lambda: validate_email('merchant.ops@example')),
+        ('validate/password/valid', lambda: validate_password('Sup3rSecretPass')),
+        ('validate/password/no_digit', lambda: validate_password('SuperSecretPass')),
+        ('validate/phone/10_digits', lambda: validate_phone('98765 43210')),
+        ('validate/phone/+91', lambda: validate_phone('+91 98765-43210')),
+    ]
+
+    provider = app.json
+    payloads = {
+        'login': login_payload(CREDENTIALS, claims_token),
+        'me': me_payload(NEW_USER),
+        'register': register_payload(NEW_USER, claims_token),
+    }
+    for name, payload in payloads.items():
+        # The stdlib path needs datetimes converted up front, as the original
+        # handlers did with isoformat()
+        plain = json.loads(provider.dumps(payload))
+        cases.append((f'json/{name}/app_provider', lambda payload=payload: provider.dumps_bytes(payload)))
+        cases.append((f'json/{name}/stdlib', lambda plain=plain: json.dumps(plain).encode('utf-8')))
+
+    def create_and_discard():
+        created = create_app('testing')
+        created.password_hasher.shutdown()
+
+    cases.append(('startup/create_app', create_and_discard))
+    return cases
+
+
+COLD_START = (
+    "import sys; sys.path.insert(0, {dir!r}); from app import create_app; "
+    "create_app('testing').password_hasher.shutdown()"
+)
+
+
+def cold_start_case():
+    """A fresh interpreter importing the app and building it (one call per run)"""
+    command = [sys.executable, '-c', COLD_START.format(dir=BACKEND_DIR)]
+    return 'startup/cold_interpreter', lambda: subprocess.run(command, check=True, cwd=BACKEND_DIR)
+
+
+# ----------------------------------------------------------------------
+# Timing
+# ----------------------------------------------------------------------
+def calibrate(fn, min_time):
+    """Smallest power-of-two call count whose batch takes at least min_time"""
+    number = 1
+    while True:
+        elapsed = run_batch(fn, number)
+        if elapsed >= min_time or number >= 1 << 24:
+            return number
+        number *= 2 if elapsed > min_time / 10 else 10
+
+
+def run_batch(fn, number):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        return time.perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def measure(fn, repeats, min_time, number=None):
+    """Per-call timings summary over ``repeats`` calibrated batches"""
+    number = number or calibrate(fn, min_time)
+    run_batch(fn, number)  # warm-up batch
+    samples = sorted(run_batch(fn, number) / number for _ in range(repeats))
+    median = statistics.median(samples)
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [median, median, median]
+    stdev = statistics.stdev(samples) if len(samples) > 1 else 0.0
+    return {
+        'median_us': median * 1e6,
+        'mean_us': statistics.fmean(samples) * 1e6,
+        'min_us': samples[0] * 1e6,
+        'max_us': samples[-1] * 1e6,
+        'iqr_us': (quartiles[2] - quartiles[0]) * 1e6,
+        'rel_stdev': stdev / median if median else 0.0,
+        'ops_per_sec': 1 / median if median else 0.0,
+        'calls_per_batch': number,
+        'repeats': repeats
+    }
+
+
+def format_time(us):
+    if us >= 1e6:
+        return f"{us / 1e6:8.3f} s "
+    if us >= 1e3:
+        return f"{us / 1e3:8.3f} ms"
+    return f"{us:8.3f} us"
+
+
+# ----------------------------------------------------------------------
+# Baselines
+# ----------------------------------------------------------------------
+def environment():
+    versions = {}
+    for module in ('bcrypt', 'jwt', 'flask', 'orjson'):
+        try:
+            versions[module] = getattr(__import__(module), '__version__', 'unknown')
+        except ImportError:
+            versions[module] = None
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpu_count': os.cpu_count(),
+        'packages': versions
+    }
+
+
+def compare(results, baseline, threshold):
+    """[(name, base_us, now_us, change)] for cases slower than the threshold
+
+    A case only counts as regressed when the slowdown is also larger than the
+    combined run-to-run spread, so noisy sub-microsecond cases do not flap.
+    """
+    regressions = []
+    for name, now in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            continue
+        change = now['median_us'] / base['median_us'] - 1
+        noise = (now['iqr_us'] + base['iqr_us']) / base['median_us']
+        if change > threshold and change > noise:
+            regressions.append((name, base['median_us'], now['median_us'], change))
+    return regressions
+
+
+def print_table(results, baseline):
+    print("\n" + "=" * 96)
+    print("  Auth hot-path microbenchmarks (median per call)")
+    print("=" * 96)
+    header = f"  {'case':<36} {'median':>11} {'IQR':>11} {'rsd':>6} {'ops/s':>12}"
+    if baseline:
+        header += f" {'baseline':>11} {'change':>8}"
+    print(header)
+    group = None
+    for name, r in results.items():
+        if name.split('/')[0] != group:
+            group = name.split('/')[0]
+            print(f"  {'-' * 92}")
+        line = (f"  {name:<36} {format_time(r['median_us']):>11} {format_time(r['iqr_us']):>11} "
+                f"{r['rel_stdev'] * 100:5.1f}% {r['ops_per_sec']:>12,.0f}")
+        base = (baseline or {}).get('results', {}).get(name)
+        if base:
+            line += f" {format_time(base['median_us']):>11} {(r['median_us'] / base['median_us'] - 1) * 100:+7.1f}%"
+        print(line)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', help='comma-separated case filters (substring or glob, e.g. jwt,json/me*)')
+    parser.add_argument('--rounds', default='10,12', help='bcrypt cost factors to measure (default 10,12)')
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum seconds per batch')
+    parser.add_argument('--no-cold-start', action='store_true', help='skip the fresh-interpreter startup case')
+    parser.add_argument('--json', dest='json_path', help='write results JSON here')
+    parser.add_argument('--save-baseline', help='write results as a baseline file')
+    parser.add_argument('--baseline', help='compare against a baseline file')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='allowed median slowdown before failing (0.15 = +15%%)')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    rounds = [int(r) for r in args.rounds.split(',') if r]
+    filters = [f.strip() for f in args.only.split(',')] if args.only else None
+
+    def selected(name):
+        if not filters:
+            return True
+        return any(f in name or fnmatch.fnmatch(name, f) for f in filters)
+
+    results = {}
+    with app.app_context():
+        for name, fn in build_cases(app, rounds):
+            if selected(name):
+                print(f"  running {name}", file=sys.stderr)
+                results[name] = measure(fn, args.repeats, args.min_time)
+    if not args.no_cold_start:
+        name, fn = cold_start_case()
+        if selected(name):
+            print(f"  running {name}", file=sys.stderr)
+            results[name] = measure(fn, max(3, args.repeats // 2), 0, number=1)
+    app.password_hasher.shutdown()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print_table(results, baseline)
+
+    document = {
+        'created_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'settings': {'repeats': args.repeats, 'min_time': args.min_time, 'rounds': rounds},
+        'results': results
+    }
+    for path in (args.json_path, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(document, f, indent=2)
+            print(f"[+] Results written to {path}")
+
+    if baseline:
+        if baseline.get('environment', {}).get('python') != document['environment']['python']:
+            print("[!] Baseline was recorded on a different Python version")
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n[!] {len(regressions)} case(s) slower than baseline by more than {args.threshold:.0%}:")
+            for name, base, now, change in regressions:
+                print(f"    - {name}: {format_time(base).strip()} -> {format_time(now).strip()} ({change:+.1%})")
+            return 1
+        print(f"[+] No case regressed by more than {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Benchmark: memory use of /api/transactions/export
+
+Seeds one merchant with N transactions (10 million by default), streams the
+whole export through the app in this process and samples resident memory as
+the rows go by. A streaming export should hold the heap flat after the first
+few batches however large N gets; the run fails if it grows by more than
+--max-growth MB. For contrast it then loads --baseline-rows rows the
+pre-streaming way (fetch everything, serialize once) and extrapolates that
+cost to N rows.
+
+Uses the configured storage driver. Seeding 10M rows takes a few minutes the
+first time; later runs reuse them.
+
+Usage (from backend/, after `python init_db.py development`):
+    python benchmarks/bench_export.py [--rows 10000000] [--format csv] [--gzip]
+    STORAGE_BACKEND=sqlite python benchmarks/bench_export.py --rows 1000000
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+import zlib
+from itertools import chain
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from services.transactions import transaction_json
+
+BENCH_EMAIL = 'bench-export@davspay.local'
+BENCH_PASSWORD = 'BenchExport123'
+
+SEED_POSTGRESQL = """
+    INSERT INTO transactions (merchant_id, channel, kind, status, amount, reference, created_at)
+    SELECT %s,
+           CASE WHEN n % 3 = 0 THEN 'virtual_account' ELSE 'upi' END,
+           CASE WHEN n % 50 = 0 THEN 'refund' ELSE 'payment' END,
+           'success', 100 + n % 100000, 'BENCH' || n,
+           timestamp '2025-01-01' + n * interval '1 second'
+    FROM generate_series(%s, %s) AS n
+"""
+
+SEED_SQLITE = """
+    INSERT INTO transactions (merchant_id, channel, kind, status, amount, reference, created_at)
+    WITH RECURSIVE seq(n) AS (SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+    SELECT ?,
+           CASE WHEN n % 3 = 0 THEN 'virtual_account' ELSE 'upi' END,
+           CASE WHEN n % 50 = 0 THEN 'refund' ELSE 'payment' END,
+           'success', 100 + n % 100000, 'BENCH' || n,
+           datetime('2025-01-01', '+' || n || ' seconds')
+    FROM seq
+"""
+
+SEED_BATCH = 500_000
+
+
+def rss_mb():
+    """(anonymous, total) resident memory of this process in MB
+
+    Anonymous RSS is the heap; the total also counts file pages mapped in by
+    SQLite's mmap_size, which grow with the database read, not the export.
+    """
+    try:
+        fields = {}
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('VmRSS:', 'RssAnon:')):
+                    name, value = line.split()[:2]
+                    fields[name] = int(value) / 1024
+        return fields['RssAnon:'], fields['VmRSS:']
+    except (OSError, KeyError):
+        pass
+    # No /proc (macOS): fall back to the peak, which is still an upper bound
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak /= 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return peak, peak
+
+
+def bench_token(client):
+    response = client.post('/api/auth/login', json={'email': BENCH_EMAIL, 'password': BENCH_PASSWORD})
+    if response.status_code != 200:
+        response = client.post('/api/auth/register', json={
+            'email': BENCH_EMAIL, 'password': BENCH_PASSWORD, 'full_name': 'Bench Export'
+        })
+    body = response.get_json()
+    if not body or not body.get('success'):
+        sys.exit(f"Could not log in the benchmark user: {body}")
+    return body['data']['access_token']
+
+
+def seed(app, merchant_id, rows):
+    """Top the merchant up to ``rows`` transactions"""
+    conn = app.db_pool.getconn()
+    try:
+        cursor = conn.cursor()
+        param = '?' if conn.dialect == 'sqlite' else '%s'
+        cursor.execute(f"SELECT COUNT(*) FROM transactions WHERE merchant_id = {param}", (merchant_id,))
+        have = cursor.fetchone()[0]
+        if have >= rows:
+            return have
+        print(f"Seeding {rows - have:,} transactions ...", flush=True)
+        started = time.perf_counter()
+        for low in range(have + 1, rows + 1, SEED_BATCH):
+            high = min(low + SEED_BATCH - 1, rows)
+            if conn.dialect == 'sqlite':
+                cursor.execute(SEED_SQLITE, (low, high, merchant_id))
+            else:
+                cursor.execute(SEED_POSTGRESQL, (merchant_id, low, high))
+            conn.commit()
+            print(f"  {high:,} rows ({time.perf_counter() - started:.0f}s)", flush=True)
+        if conn.dialect != 'sqlite':
+            cursor.execute("ANALYZE transactions")
+            conn.commit()
+        cursor.close()
+        return rows
+    finally:
+        conn.close()
+
+
+def stream_export(client, token, fmt, compress, rows, samples):
+    """Read the export chunk by chunk; returns (rows, bytes, seconds, [(rows, rss)])"""
+    query = f"format={fmt}" + ('&gzip=1' if compress else '')
+    started = time.perf_counter()
+    response = client.get(f'/api/transactions/export?{query}',
+                          headers={'Authorization': f'Bearer {token}'}, buffered=False)
+    if response.status_code != 200:
+        sys.exit(f"Export failed: {response.status_code} {response.get_data(as_text=True)[:200]}")
+
+    step = max(rows // samples, 1)
+    next_sample = step
+    lines = total_bytes = 0
+    trace = [(0, rss_mb())]
+    # Count rows by newline; gzip output is inflated a chunk at a time
+    inflate = zlib.decompressobj(31) if compress else None
+    for chunk in response.iter_encoded():
+        total_bytes += len(chunk)
+        lines += (inflate.decompress(chunk) if inflate else chunk).count(b'\n')
+        if lines >= next_sample:
+            trace.append((lines, rss_mb()))
+            next_sample += step
+    response.close()
+    elapsed = time.perf_counter() - started
+    trace.append((lines, rss_mb()))
+    return lines - (fmt == 'csv'), total_bytes, elapsed, trace
+
+
+def buffered_export(app, merchant_id, rows):
+    """The naive export: every row in memory, then one big serialize"""
+    before = rss_mb()[0]
+    batches = app.transactions.export(merchant_id)
+    loaded = []
+    for row in chain.from_iterable(batches):
+        loaded.append(row)
+        if len(loaded) >= rows:
+            batches.close()
+            break
+    body = app.json.dumps_bytes([transaction_json(row) for row in loaded])
+    peak = rss_mb()[0]
+    del body, loaded
+    return peak - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson')
+    parser.add_argument('--gzip', action='store_true')
+    parser.add_argument('--samples', type=int, default=20, help='RSS samples over the export')
+    parser.add_argument('--max-growth', type=float, default=32.0,
+                        help='allowed heap growth in MB after the first sample (default 32)')
+    parser.add_argument('--baseline-rows', type=int, default=200_000,
+                        help='rows for the fetch-everything comparison (0 skips it)')
+    args = parser.parse_args()
+
+    app = create_app('development')
+    client = app.test_client()
+    token = bench_token(client)
+    with app.app_context():
+        merchant_id = app.users.get_credentials(BENCH_EMAIL).id
+    rows = seed(app, merchant_id, args.rows)
+
+    print(f"\nExporting {rows:,} rows as {args.format}{' (gzip)' if args.gzip else ''} "
+          f"via {app.db_pool.dialect}, itersize {app.config['EXPORT_ITERSIZE']}")
+    exported, total_bytes, elapsed, trace = stream_export(
+        client, token, args.format, args.gzip, rows, args.samples
+    )
+
+    print(f"\n{'rows':>14}  {'heap MB':>8}  {'RSS MB':>8}")
+    for position, (heap, rss) in trace:
+        print(f"{position:>14,}  {heap:>8.1f}  {rss:>8.1f}")
+
+    # The first batches warm up the JSON encoder, statement cache and
+    # allocator arenas; measure growth after that
+    settled = trace[min(2, len(trace) - 1)][1][0]
+    growth = max(heap for _, (heap, _) in trace) - settled
+    print(f"\n{exported:,} rows, {total_bytes / 1e6:,.1f} MB in {elapsed:.1f}s "
+          f"({exported / elapsed:,.0f} rows/s, {total_bytes / 1e6 / elapsed:,.1f} MB/s)")
+    print(f"Heap growth after warm-up: {growth:.1f} MB (limit {args.max_growth:.0f} MB)")
+
+    if args.baseline_rows:
+        sample = min(args.baseline_rows, rows)
+        with app.app_context():
+            cost = buffered_export(app, merchant_id, sample)
+        print(f"\nFetch-everything export of {sample:,} rows: +{cost:.1f} MB heap "
+              f"(~{cost * rows / sample / 1024:,.1f} GB extrapolated to {rows:,} rows)")
+
+    if exported != rows:
+        print(f"\nFAIL: exported {exported:,} rows, expected {rows:,}")
+        sys.exit(1)
+    if growth > args.max_growth:
+        print("\nFAIL: memory grew with the export")
+        sys.exit(1)
+    print("\nOK: memory stayed flat")
+
+
+if __name__ == '__main__':
+    main()
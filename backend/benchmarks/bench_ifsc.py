@@ -0,0 +1,277 @@
+"""
+Benchmark: IFSC directory, batch account validation and penny-drop fan-out
+
+1. Correctness. --branches random branches (RBI's list has about 180k)
+   are written as CSV and built into a directory file. Every IFSC must come
+   back with exactly its fields, and absent IFSCs must not be found. The file
+   is then rebuilt in place, and an open IfscDirectory must map the new one.
+2. Lookups. Random hits and misses per second against the mapped file.
+3. Batch validation. --batch account / IFSC pairs, valid, malformed and
+   unknown, are validated in one validate_accounts() pass.
+4. Sharing. --processes forked workers each map the file and read every
+   branch. Each worker's proportional share (Pss) of the mapping must be
+   about 1/processes of what it maps: one copy in the page cache for all.
+   Linux only.
+5. Penny drops. --checks penny drops through the stub adapter with
+   --latency seconds per check, fanned out over --workers threads, against
+   the sequential time. A short deadline must report the rest as timeouts.
+
+Usage (from backend/):
+    python benchmarks/bench_ifsc.py [--branches 180000] [--batch 10000] [--checks 200]
+"""
+import argparse
+import csv
+import io
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.bank_accounts import (
+    FAILED, NOT_FOUND, TIMEOUT, VERIFIED, PennyDropper, StubBankAdapter, validate_accounts
+)
+from services.ifsc import IfscDirectory, IfscTable, branches_from_csv, write_directory
+
+CSV_COLUMNS = ('BANK', 'IFSC', 'BRANCH', 'CENTRE', 'DISTRICT', 'STATE', 'ADDRESS', 'MICR',
+               'UPI', 'NEFT', 'RTGS', 'IMPS')
+STATES = ('MAHARASHTRA', 'KARNATAKA', 'TAMIL NADU', 'DELHI', 'GUJARAT', 'WEST BENGAL', 'KERALA')
+
+
+def random_word(rng, low, high):
+    return ''.join(rng.choices(string.ascii_uppercase, k=rng.randint(low, high)))
+
+
+def random_ifsc(rng, bank_code):
+    return bank_code + '0' + ''.join(rng.choices(string.ascii_uppercase + string.digits, k=6))
+
+
+def random_branches(rng, n, banks=1500):
+    """{ifsc: expected Branch fields} and the same rows as CSV text"""
+    codes = {random_word(rng, 4, 4) for _ in range(banks)}
+    names = {code: f"{random_word(rng, 4, 12)} BANK LIMITED" for code in codes}
+    codes = sorted(codes)
+    expected = {}
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(CSV_COLUMNS)
+    while len(expected) < n:
+        code = rng.choice(codes)
+        ifsc = random_ifsc(rng, code)
+        if ifsc in expected:
+            continue
+        branch = f"{random_word(rng, 3, 14)} {random_word(rng, 3, 10)}"
+        city, district = random_word(rng, 4, 12), random_word(rng, 4, 12)
+        state = rng.choice(STATES)
+        micr = ''.join(rng.choices(string.digits, k=9)) if rng.random() < 0.7 else ''
+        flags = [rng.random() < p for p in (0.4, 0.95, 0.9, 0.8)]
+        writer.writerow((names[code], ifsc, branch, city, district, state, 'SOME ADDRESS', micr,
+                         *('true' if flag else 'false' for flag in flags)))
+        expected[ifsc] = (ifsc, code, names[code], branch, city, district, state, micr, *flags)
+    return expected, out.getvalue()
+
+
+def build(csv_text, path):
+    return write_directory(branches_from_csv(csv.DictReader(io.StringIO(csv_text))), path)
+
+
+def check_correctness(rng, n, workdir):
+    expected, csv_text = random_branches(rng, n)
+    path = os.path.join(workdir, 'ifsc.dir')
+    started = time.perf_counter()
+    count = build(csv_text, path)
+    elapsed = time.perf_counter() - started
+    size = os.path.getsize(path)
+    print(f"Build: {count:,} branches in {elapsed:.2f}s, {size / 1048576:.1f} MiB "
+          f"({size / count:.0f} bytes per branch)")
+
+    ok = count == len(expected)
+    table = IfscTable(path)
+    wrong = [ifsc for ifsc, fields in expected.items() if table.get(ifsc)._asdict() != dict(
+        zip(('ifsc', 'bank_code', 'bank', 'branch', 'city', 'district', 'state', 'micr',
+             'upi', 'neft', 'rtgs', 'imps'), fields))]
+    codes = sorted({ifsc[:4] for ifsc in expected})
+    absent = [ifsc for ifsc in (random_ifsc(rng, rng.choice(codes)) for _ in range(100_000))
+              if ifsc not in expected]
+    found = sum(1 for ifsc in absent if table.get(ifsc) is not None)
+    ok &= not wrong and not found
+    print(f"  {len(expected) - len(wrong):,}/{len(expected):,} branches read back exactly, "
+          f"{found} of {len(absent):,} absent IFSCs found")
+
+    directory = IfscDirectory(path, reload_interval=0)
+    before = directory.table()
+    smaller, smaller_csv = random_branches(rng, 1000)
+    build(smaller_csv, path)
+    after = directory.table()
+    remapped = after is not before and len(after) == 1000 and before.get(next(iter(expected))) is not None
+    ok &= remapped
+    print(f"  rebuilt in place: {'remapped' if remapped else 'NOT remapped'} "
+          f"({len(before):,} -> {len(after):,} branches), old mapping still readable")
+
+    build(csv_text, path)
+    return ok, expected, path
+
+
+def bench_lookups(rng, expected, path, lookups=500_000):
+    table = IfscTable(path)
+    hits = rng.choices(list(expected), k=lookups)
+    codes = sorted({ifsc[:4] for ifsc in expected})
+    misses = [random_ifsc(rng, rng.choice(codes)) for _ in range(lookups)]
+    for label, keys in (('hits', hits), ('misses', misses)):
+        get = table.get
+        started = time.perf_counter()
+        for key in keys:
+            get(key)
+        elapsed = time.perf_counter() - started
+        print(f"Lookups ({label}): {lookups / elapsed:,.0f}/s, {elapsed / lookups * 1e6:.2f} µs each")
+
+
+def bench_batch(rng, expected, path, size):
+    table = IfscTable(path)
+    known = list(expected)
+    accounts = []
+    for i in range(size):
+        roll = rng.random()
+        number = ''.join(rng.choices(string.digits, k=rng.randint(9, 18)))
+        if roll < 0.85:
+            ifsc = rng.choice(known).lower() if roll < 0.05 else rng.choice(known)
+        elif roll < 0.92:
+            ifsc = random_ifsc(rng, 'ZZZZ')
+        else:
+            number, ifsc = number[:5], 'NOT-AN-IFSC'
+        accounts.append({'account_number': number, 'ifsc': ifsc, 'reference': f'row-{i}'})
+
+    started = time.perf_counter()
+    results = validate_accounts(accounts, table)
+    elapsed = time.perf_counter() - started
+    valid = sum(1 for result in results if result['valid'])
+    print(f"Batch validation: {size:,} pairs in {elapsed * 1000:.1f} ms "
+          f"({size / elapsed:,.0f} pairs/s), {valid:,} valid")
+    expected_valid = sum(1 for account in accounts if account['ifsc'].upper() in expected
+                         and len(account['account_number']) >= 9)
+    return valid == expected_valid
+
+
+def _mapping_pss_kb(path):
+    """Rss and Pss (kB) of this process's mappings of ``path``"""
+    rss = pss = 0
+    inside = False
+    with open('/proc/self/smaps') as f:
+        for line in f:
+            fields = line.split()
+            if '-' in fields[0] and len(fields) >= 5:
+                inside = fields[-1] == path
+            elif inside and fields[0] == 'Rss:':
+                rss += int(fields[1])
+            elif inside and fields[0] == 'Pss:':
+                pss += int(fields[1])
+    return rss, pss
+
+
+def bench_sharing(path, processes):
+    if not os.path.exists('/proc/self/smaps') or not hasattr(os, 'fork'):
+        print("Sharing: skipped (needs Linux)")
+        return True
+    path = os.path.realpath(path)
+    ready_r, ready_w = os.pipe()
+    go_r, go_w = os.pipe()
+    report_r, report_w = os.pipe()
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            table = IfscTable(path)
+            slots = len(table._map)
+            # Touch every page of the file, as a long-running worker eventually would
+            sum(table._map[offset] for offset in range(0, slots, 4096))
+            os.write(ready_w, b'.')
+            os.read(go_r, 1)
+            rss, pss = _mapping_pss_kb(path)
+            os.write(report_w, f"{rss} {pss}\n".encode())
+            os.read(go_r, 1)
+            os._exit(0)
+        children.append(pid)
+
+    for _ in children:
+        os.read(ready_r, 1)
+    os.write(go_w, b'x' * processes)
+    reports = b''
+    while reports.count(b'\n') < processes:
+        reports += os.read(report_r, 4096)
+    os.write(go_w, b'x' * processes)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+    sizes = [tuple(map(int, line.split())) for line in reports.decode().splitlines()]
+    rss = max(size[0] for size in sizes)
+    pss = max(size[1] for size in sizes)
+    print(f"Sharing: {processes} workers each map {rss / 1024:.1f} MiB of the file; "
+          f"each one's share is {pss / 1024:.1f} MiB (total {sum(size[1] for size in sizes) / 1024:.1f} MiB)")
+    return pss <= rss / processes * 1.5
+
+
+def bench_penny_drops(checks, workers, latency):
+    # A third each of unknown, failing and verifiable accounts, by the stub's rules
+    accounts = [(f'{i:09d}' + ('000', '999', f'{i % 800 + 100}')[i % 3], 'HDFC0000001')
+                for i in range(checks)]
+    expected = [NOT_FOUND if number.endswith('000') else FAILED if number.endswith('999') else VERIFIED
+                for number, _ in accounts]
+
+    dropper = PennyDropper(StubBankAdapter(latency=latency), workers=workers, timeout=60)
+    started = time.perf_counter()
+    results = dropper.verify(accounts)
+    elapsed = time.perf_counter() - started
+    statuses = [result.status for result in results]
+    ok = statuses == expected and len({result.request_id for result in results}) == checks
+    print(f"Penny drops: {checks} checks at {latency * 1000:.0f} ms with {workers} workers in "
+          f"{elapsed:.2f}s (sequential {checks * latency:.1f}s), statuses {'match' if ok else 'DIFFER'}")
+    dropper.close()
+
+    deadline = latency * 2.5
+    dropper = PennyDropper(StubBankAdapter(latency=latency), workers=workers, timeout=deadline)
+    started = time.perf_counter()
+    results = dropper.verify(accounts)
+    elapsed = time.perf_counter() - started
+    timeouts = sum(1 for result in results if result.status == TIMEOUT)
+    bounded = elapsed < deadline + 0.5 and 0 < timeouts < checks
+    print(f"  {deadline:.2f}s deadline: answered in {elapsed:.2f}s, {checks - timeouts} done, "
+          f"{timeouts} timed out")
+    dropper.close()
+    return ok and bounded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--branches', type=int, default=180_000)
+    parser.add_argument('--batch', type=int, default=10_000, help='pairs per validation batch')
+    parser.add_argument('--processes', type=int, default=4, help='forked workers for the sharing check')
+    parser.add_argument('--checks', type=int, default=200, help='penny drops in the fan-out run')
+    parser.add_argument('--workers', type=int, default=16, help='penny-drop threads')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub bank round trip, seconds')
+    parser.add_argument('--seed', type=int, default=random.randrange(2 ** 32))
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"Seed {args.seed}\n")
+    workdir = tempfile.mkdtemp(prefix='bench_ifsc_')
+    try:
+        ok, expected, path = check_correctness(rng, args.branches, workdir)
+        bench_lookups(rng, expected, path)
+        ok &= bench_batch(rng, expected, path, args.batch)
+        ok &= bench_sharing(path, args.processes)
+        ok &= bench_penny_drops(args.checks, args.workers, args.latency)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if not ok:
+        print("\nFAIL")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark: plain vs server-side prepared auth queries
+
+Runs the login, /auth/me, verification-status and update-profile statements
+through the repository layer against a local PostgreSQL, once with plain
+execute() and once with PREPARE/EXECUTE, and prints per-query latency.
+
+Usage (from backend/, after `python init_db.py development`):
+    python benchmarks/bench_prepared_statements.py [iterations]
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from services.db_pool import ConnectionPool
+from services.repository import UserRepository
+
+BENCH_EMAIL = 'bench-prepared@davspay.local'
+
+
+def make_pool(prepare_statements):
+    cfg = config['development']
+    return ConnectionPool(
+        {
+            'host': cfg.DB_HOST,
+            'database': cfg.DB_NAME,
+            'user': cfg.DB_USER,
+            'password': cfg.DB_PASSWORD,
+            'port': cfg.DB_PORT
+        },
+        min_size=1,
+        max_size=1,
+        prepare_statements=prepare_statements
+    )
+
+
+def ensure_user(users):
+    """Create the benchmark user once; the hash is never checked"""
+    users.create(BENCH_EMAIL, 'x' * 60, 'Bench User', 'Bench Co', '9876543210')
+    return users.get_credentials(BENCH_EMAIL).id
+
+
+def time_query(fn, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        'mean': statistics.fmean(samples),
+        'p50': samples[len(samples) // 2],
+        'p95': samples[int(len(samples) * 0.95) - 1]
+    }
+
+
+def run(prepare_statements, iterations):
+    pool = make_pool(prepare_statements)
+    users = UserRepository(pool.getconn)
+    user_id = ensure_user(users)
+
+    queries = {
+        'login (credentials by email)': lambda: users.get_credentials(BENCH_EMAIL),
+        'me / verification-status (profile by id)': lambda: users.get_profile(user_id),
+        'update-profile (full_name, phone)': lambda: users.update_profile(
+            user_id, {'full_name': 'Bench User', 'phone': '9876543210'}
+        )
+    }
+
+    results = {}
+    for label, fn in queries.items():
+        for _ in range(50):
+            fn()  # warm up: connection, PREPARE, plan cache
+        results[label] = time_query(fn, iterations)
+
+    pool.closeall()
+    return results
+
+
+if __name__ == '__main__':
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print("\n" + "=" * 78)
+    print(f"  Prepared statement benchmark ({iterations} iterations per query)")
+    print("=" * 78)
+
+    plain = run(False, iterations)
+    prepared = run(True, iterations)
+
+    print(f"\n  {'Query':<44}{'plain p50':>10}{'prep p50':>10}{'change':>10}")
+    print("  " + "-" * 74)
+    for label in plain:
+        before = plain[label]['p50']
+        after = prepared[label]['p50']
+        change = (after - before) / before * 100
+        print(f"  {label:<44}{before:>8.1f}us{after:>8.1f}us{change:>9.1f}%")
+
+    print("\n  Means / p95 (us):")
+    for label in plain:
+        print(f"    {label}: plain {plain[label]['mean']:.1f} / {plain[label]['p95']:.1f}, "
+              f"prepared {prepared[label]['mean']:.1f} / {prepared[label]['p95']:.1f}")
+    print()
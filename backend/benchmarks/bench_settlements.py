@@ -0,0 +1,249 @@
+"""
+Benchmark: settlement engine throughput
+
+1. Throughput. --rows transactions (20 million by default) are folded in
+   chunk by chunk, once as columns and once through the binary COPY parser
+   with one write() per row, as psycopg2 delivers them. Heap growth must
+   stay under --max-growth MB.
+2. End to end. --db-rows transactions are seeded for one day in the
+   configured storage, then settle.py's run settles the day and is timed.
+
+Correctness (rounding, fee caps, currencies, the COPY parser) is checked
+against a Decimal reference by tests/test_settlements.py, not here.
+
+Usage (from backend/, after `python init_db.py development`):
+    python benchmarks/bench_settlements.py [--rows 20000000] [--db-rows 2000000]
+    STORAGE_BACKEND=sqlite python benchmarks/bench_settlements.py --db-rows 500000
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, create_settlement_engine
+from services.settlements import (
+    COPY_RECORD, COPY_SIGNATURE, COPY_TRAILER, PAYMENT, BinaryCopyReader, SettlementTotals
+)
+from services.transactions import CHANNELS
+
+BENCH_DAY = date(2024, 6, 15)
+BENCH_MERCHANTS = 1000
+
+SEED_POSTGRESQL = """
+    INSERT INTO transactions (merchant_id, channel, kind, status, amount, currency, created_at)
+    SELECT %s + n %% %s,
+           CASE WHEN n %% 3 = 0 THEN 'virtual_account' ELSE 'upi' END,
+           CASE WHEN n %% 40 = 0 THEN 'refund' ELSE 'payment' END,
+           CASE WHEN n %% 25 = 0 THEN 'failed' WHEN n %% 97 = 0 THEN 'pending' ELSE 'success' END,
+           1 + (n * 7919) %% 2500000,
+           CASE WHEN n %% 501 = 0 THEN 'USD' ELSE 'INR' END,
+           %s + (n %% 86400) * interval '1 second'
+    FROM generate_series(%s, %s) AS n
+"""
+
+SEED_SQLITE = """
+    INSERT INTO transactions (merchant_id, channel, kind, status, amount, currency, created_at)
+    WITH RECURSIVE seq(n) AS (SELECT ? UNION ALL SELECT n + 1 FROM seq WHERE n < ?)
+    SELECT ? + n % ?,
+           CASE WHEN n % 3 = 0 THEN 'virtual_account' ELSE 'upi' END,
+           CASE WHEN n % 40 = 0 THEN 'refund' ELSE 'payment' END,
+           CASE WHEN n % 25 = 0 THEN 'failed' WHEN n % 97 = 0 THEN 'pending' ELSE 'success' END,
+           1 + (n * 7919) % 2500000,
+           CASE WHEN n % 501 = 0 THEN 'USD' ELSE 'INR' END,
+           datetime(?, '+' || (n % 86400) || ' seconds')
+    FROM seq
+"""
+
+SEED_BATCH = 500_000
+
+
+def rss_mb():
+    """Anonymous resident memory (the heap) of this process in MB"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # No /proc (macOS): fall back to the peak, which is still an upper bound
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+# ----------------------------------------------------------------------
+# Data
+# ----------------------------------------------------------------------
+def copy_stream(merchant_id, channel, kind, amount):
+    """The binary COPY of the scan query for these columns"""
+    records = np.zeros(len(amount), dtype=COPY_RECORD)
+    records['fields'] = 4
+    records['merchant_id_length'], records['merchant_id'] = 4, merchant_id
+    records['channel_length'], records['channel'] = 2, channel
+    records['kind_length'], records['kind'] = 2, kind
+    records['amount_length'], records['amount'] = 8, amount
+    header = COPY_SIGNATURE + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+    return header + records.tobytes() + COPY_TRAILER
+
+
+# ----------------------------------------------------------------------
+# Benchmarks
+# ----------------------------------------------------------------------
+def bench_throughput(fees, gst_bps, rows, chunk_rows, merchants, copy_rows, max_growth, seed):
+    print(f"\nThroughput: {rows:,} rows in chunks of {chunk_rows:,}, {merchants:,} merchants")
+    rng = np.random.default_rng(seed)
+
+    def chunk(n):
+        return (rng.integers(1, merchants, n, endpoint=True),
+                rng.integers(0, len(CHANNELS), n),
+                np.where(rng.random(n) < 0.05, 1 - PAYMENT, PAYMENT),
+                rng.integers(100, 5_000_000, n))
+
+    before = rss_mb()
+    peak = before
+    totals = SettlementTotals(fees, gst_bps)
+    elapsed = 0.0
+    for low in range(0, rows, chunk_rows):
+        columns = chunk(min(chunk_rows, rows - low))
+        started = time.perf_counter()
+        totals.add(*columns)
+        elapsed += time.perf_counter() - started
+        del columns
+        peak = max(peak, rss_mb())
+    started = time.perf_counter()
+    totals.result()
+    elapsed += time.perf_counter() - started
+    columns_rate = rows / elapsed
+    growth = peak - before
+    print(f"  columns:     {columns_rate:>14,.0f} rows/s  ({elapsed:.2f}s, heap +{growth:.1f} MB)")
+
+    # One write per row, as psycopg2's copy_expert calls it
+    copy_rows = min(copy_rows, rows)
+    totals = SettlementTotals(fees, gst_bps)
+    reader = BinaryCopyReader(totals.add_copy_records, chunk_rows)
+    size = COPY_RECORD.itemsize
+    elapsed = 0.0
+    reader.write(COPY_SIGNATURE + bytes(8))
+    for low in range(0, copy_rows, chunk_rows):
+        stream = copy_stream(*chunk(min(chunk_rows, copy_rows - low)))[19:-2]
+        pieces = [stream[i:i + size] for i in range(0, len(stream), size)]
+        del stream
+        write = reader.write
+        started = time.perf_counter()
+        for piece in pieces:
+            write(piece)
+        elapsed += time.perf_counter() - started
+        del pieces
+    started = time.perf_counter()
+    reader.write(COPY_TRAILER)
+    reader.finish()
+    totals.result()
+    elapsed += time.perf_counter() - started
+    copy_rate = copy_rows / elapsed
+    print(f"  binary COPY: {copy_rate:>14,.0f} rows/s  ({copy_rows:,} rows, one write() per row)")
+
+    ok = growth <= max_growth
+    if not ok:
+        print(f"  FAIL: heap grew {growth:.1f} MB (limit {max_growth:.0f} MB)")
+    return ok, columns_rate, copy_rate
+
+
+def seed_day(app, rows):
+    """Top BENCH_DAY up to ``rows`` transactions over BENCH_MERCHANTS merchants"""
+    start = datetime.combine(BENCH_DAY, datetime.min.time())
+    conn = app.db_pool.getconn()
+    try:
+        cursor = conn.cursor()
+        sqlite = conn.dialect == 'sqlite'
+        param = '?' if sqlite else '%s'
+        cursor.execute(f"SELECT id FROM users WHERE email LIKE {param} ORDER BY id",
+                       ('bench-settle-%@davspay.local',))
+        ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            cursor.executemany(
+                f"INSERT INTO users (email, password_hash, full_name) VALUES ({param}, {param}, {param})",
+                [(f'bench-settle-{i}@davspay.local', '!', f'Bench Merchant {i}')
+                 for i in range(BENCH_MERCHANTS)]
+            )
+            conn.commit()
+            cursor.execute(f"SELECT id FROM users WHERE email LIKE {param} ORDER BY id",
+                           ('bench-settle-%@davspay.local',))
+            ids = [row[0] for row in cursor.fetchall()]
+        if len(ids) != BENCH_MERCHANTS or ids[-1] - ids[0] != BENCH_MERCHANTS - 1:
+            sys.exit("Benchmark merchants must have consecutive ids; remove bench-settle-* users and retry")
+
+        cursor.execute(f"SELECT COUNT(*) FROM transactions WHERE merchant_id BETWEEN {param} AND {param} "
+                       f"AND created_at >= {param} AND created_at < {param}",
+                       (ids[0], ids[-1], start, start + timedelta(days=1)))
+        have = cursor.fetchone()[0]
+        if have < rows:
+            print(f"Seeding {rows - have:,} transactions for {BENCH_DAY} ...", flush=True)
+            started = time.perf_counter()
+            for low in range(have + 1, rows + 1, SEED_BATCH):
+                high = min(low + SEED_BATCH - 1, rows)
+                if sqlite:
+                    cursor.execute(SEED_SQLITE, (low, high, ids[0], BENCH_MERCHANTS, start))
+                else:
+                    cursor.execute(SEED_POSTGRESQL, (ids[0], BENCH_MERCHANTS, start, low, high))
+                conn.commit()
+                print(f"  {high:,} rows ({time.perf_counter() - started:.0f}s)", flush=True)
+            if not sqlite:
+                cursor.execute("ANALYZE transactions")
+                conn.commit()
+        cursor.close()
+        return ids
+    finally:
+        conn.close()
+
+
+def bench_end_to_end(app, engine, rows):
+    seed_day(app, rows)
+
+    print(f"\nSettling {BENCH_DAY} via {app.db_pool.dialect}, chunks of {engine.chunk_rows:,} rows")
+    before = rss_mb()
+    summary = engine.run(BENCH_DAY)
+    growth = rss_mb() - before
+    print(f"  {summary['transactions']:,} transactions, {summary['merchants']:,} merchants in "
+          f"{summary['seconds']}s (scan {summary['scan_seconds']}s, {summary['rows_per_second']:,} rows/s), "
+          f"heap +{growth:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20_000_000, help='rows for the throughput run')
+    parser.add_argument('--copy-rows', type=int, default=5_000_000,
+                        help='rows for the one-write-per-row COPY run (default 5M)')
+    parser.add_argument('--merchants', type=int, default=100_000)
+    parser.add_argument('--db-rows', type=int, default=2_000_000, help='rows for the end-to-end run (0 skips it)')
+    parser.add_argument('--max-growth', type=float, default=256.0,
+                        help='allowed heap growth in MB during the throughput run (default 256)')
+    parser.add_argument('--seed', type=int, default=random.randrange(2 ** 32))
+    args = parser.parse_args()
+
+    app = create_app('development')
+    engine = create_settlement_engine(app)
+    print(f"Fees {engine.fees}, GST {engine.gst_bps} bps, seed {args.seed}\n")
+
+    ok, _, _ = bench_throughput(
+        engine.fees, engine.gst_bps, args.rows, engine.chunk_rows, args.merchants,
+        args.copy_rows, args.max_growth, args.seed
+    )
+
+    if args.db_rows:
+        bench_end_to_end(app, engine, args.db_rows)
+
+    if not ok:
+        print("\nFAIL")
+        sys.exit(1)
+    print("\nOK")
+
+
+if __name__ == '__main__':
+    main()
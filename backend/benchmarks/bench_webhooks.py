@@ -0,0 +1,158 @@
+"""
+Benchmark: webhook outbox delivery
+
+Queues events for a bench merchant with several healthy endpoints and one
+flaky one, plus a second merchant whose endpoint always fails, then runs the
+dispatcher against the in-process stub receiver (webhook_receiver.py) until
+the outbox has nothing left to deliver. Reports throughput, delivery lag,
+connection reuse and per-endpoint concurrency, and fails if an event is
+lost, an endpoint cap is exceeded or the failing endpoint is not
+dead-lettered. Retries are shortened so the run takes seconds.
+
+Uses the configured storage driver; run it against a scratch database.
+
+Usage (from backend/, after `python init_db.py development`):
+    python benchmarks/bench_webhooks.py [--events 5000] [--endpoints 8] [--latency-ms 5]
+    STORAGE_BACKEND=sqlite SQLITE_PATH=/tmp/webhooks.db python benchmarks/bench_webhooks.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, create_webhook_dispatcher
+from services.webhooks import DispatcherMetrics
+from webhook_receiver import StubReceiver
+
+MERCHANT_EMAIL = 'bench-webhooks@davspay.local'
+FAILING_EMAIL = 'bench-webhooks-down@davspay.local'
+
+
+def bench_merchant(users, email):
+    """Create the merchant once; the password hash is never checked"""
+    users.create(email, 'x' * 60, 'Bench Webhooks', 'Bench Co', '9876543210')
+    return users.get_credentials(email).id
+
+
+def add_endpoint(app, receiver, merchant_id, name, cap, behaviour):
+    secret = f"whsec_bench_{name}"
+    endpoint = app.webhooks.create_endpoint(merchant_id, f"{receiver.url}/hooks/{name}", secret, cap)
+    receiver.behaviour[name] = dict(behaviour, secret=secret)
+    return endpoint
+
+
+def queue_events(app, merchant_id, count, batch=1000):
+    """``count`` payment events, ``batch`` per transaction"""
+    conn = app.db_pool.getconn()
+    try:
+        cursor = conn.cursor()
+        for start in range(0, count, batch):
+            for n in range(start, min(start + batch, count)):
+                app.webhooks.emit(conn, cursor, merchant_id, 'payment.captured',
+                                  {'id': f"pay_bench_{n}", 'amount': 100000 + n, 'currency': 'INR'})
+            conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=5000, help='events for the bench merchant')
+    parser.add_argument('--endpoints', type=int, default=8, help='healthy endpoints (each gets every event)')
+    parser.add_argument('--cap', type=int, default=4, help='max_concurrency per endpoint')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='receiver latency per request')
+    parser.add_argument('--flaky-rate', type=float, default=0.2, help='failure rate of the flaky endpoint')
+    parser.add_argument('--dead-events', type=int, default=50, help='events for the always-failing endpoint')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--batch-size', type=int, default=200)
+    parser.add_argument('--max-attempts', type=int, default=10)
+    args = parser.parse_args()
+
+    app = create_app('development')
+    app.config.update(WEBHOOK_WORKERS=args.workers, WEBHOOK_BATCH_SIZE=args.batch_size,
+                      WEBHOOK_MAX_ATTEMPTS=args.max_attempts, WEBHOOK_RETRY_BASE=0.05,
+                      WEBHOOK_RETRY_MAX=0.5, WEBHOOK_POLL_INTERVAL=0.05, WEBHOOK_ALLOW_PRIVATE=True)
+
+    receiver = StubReceiver().start()
+    latency = args.latency_ms / 1000
+    with app.app_context():
+        merchant_id = bench_merchant(app.users, MERCHANT_EMAIL)
+        failing_id = bench_merchant(app.users, FAILING_EMAIL)
+        # Endpoints from earlier runs point at a dead port; retire them
+        for endpoint in app.webhooks.endpoints(merchant_id) + app.webhooks.endpoints(failing_id):
+            app.webhooks.disable_endpoint(endpoint.merchant_id, endpoint.id)
+        for n in range(args.endpoints):
+            add_endpoint(app, receiver, merchant_id, f"ok{n}", args.cap, {'latency': latency})
+        add_endpoint(app, receiver, merchant_id, 'flaky', args.cap,
+                     {'latency': latency, 'fail_rate': args.flaky_rate})
+        add_endpoint(app, receiver, failing_id, 'down', args.cap, {'fail_rate': 1.0})
+
+        before = app.webhooks.outbox_summary()
+        if before['pending']:
+            sys.exit(f"Outbox already has {before['pending']} pending rows; use a scratch database")
+
+        started = time.perf_counter()
+        queue_events(app, merchant_id, args.events)
+        queue_events(app, failing_id, args.dead_events)
+        queued = time.perf_counter() - started
+        deliveries = args.events * (args.endpoints + 1) + args.dead_events
+        print(f"Queued {deliveries:,} deliveries in {queued:.1f}s via {app.db_pool.dialect}")
+
+        metrics = DispatcherMetrics()
+        dispatcher = create_webhook_dispatcher(app, metrics)
+        stop = threading.Event()
+        thread = threading.Thread(target=dispatcher.run, args=(stop,), name='dispatcher')
+        started = time.perf_counter()
+        thread.start()
+
+        while True:
+            time.sleep(0.5)
+            summary = app.webhooks.outbox_summary()
+            done = summary['delivered'] - before['delivered'] + summary['dead'] - before['dead']
+            print(f"  {done:>9,} / {deliveries:,} done, {summary['pending']:,} pending, "
+                  f"oldest due {summary['oldest_due_seconds']}s", flush=True)
+            if not summary['pending']:
+                break
+        elapsed = time.perf_counter() - started
+        stop.set()
+        thread.join()
+        receiver.stop()
+
+    stats = dispatcher.stats()
+    seen = receiver.stats()
+    delivered = summary['delivered'] - before['delivered']
+    dead = summary['dead'] - before['dead']
+    requests = sum(endpoint['requests'] for endpoint in seen['endpoints'].values())
+    print(f"\n{delivered:,} delivered, {dead:,} dead-lettered, {stats['retried']:,} retries "
+          f"in {elapsed:.1f}s ({delivered / elapsed:,.0f} deliveries/s)")
+    print(f"Delivery lag (queue to 2xx, recent): p50 {stats['lag_p50']}s  p95 {stats['lag_p95']}s  "
+          f"p99 {stats['lag_p99']}s")
+    print(f"{requests:,} requests over {seen['connections']:,} connections "
+          f"({requests / max(seen['connections'], 1):,.0f} requests per connection)")
+    print(f"\n{'endpoint':<10} {'requests':>9} {'events':>7} {'dupes':>6} {'failed':>7} {'bad sig':>8} {'max conc':>9}")
+    for name, endpoint in seen['endpoints'].items():
+        print(f"{name:<10} {endpoint['requests']:>9,} {endpoint['events']:>7,} {endpoint['duplicates']:>6} "
+              f"{endpoint['failed']:>7,} {endpoint['bad_signatures']:>8} {endpoint['max_concurrent']:>9}")
+
+    problems = []
+    for name, endpoint in seen['endpoints'].items():
+        if endpoint['max_concurrent'] > args.cap:
+            problems.append(f"{name} saw {endpoint['max_concurrent']} concurrent requests (cap {args.cap})")
+        if endpoint['bad_signatures']:
+            problems.append(f"{name} rejected {endpoint['bad_signatures']} signatures")
+        if name != 'down' and endpoint['events'] != args.events:
+            problems.append(f"{name} received {endpoint['events']} of {args.events} events")
+    if dead != args.dead_events:
+        problems.append(f"{dead} dead-lettered, expected {args.dead_events}")
+    if problems:
+        print("\nFAIL:\n  " + "\n  ".join(problems))
+        sys.exit(1)
+    print("\nOK: every event delivered, caps respected, failing endpoint dead-lettered")
+
+
+if __name__ == '__main__':
+    main()
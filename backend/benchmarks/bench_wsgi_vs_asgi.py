@@ -0,0 +1,219 @@
+"""
+Benchmark: WSGI (gunicorn + psycopg2) vs ASGI (uvicorn + asyncpg) builds
+
+Starts each build on its own port with the same worker count and database,
+then drives both with the same number of concurrent keep-alive connections
+and reports throughput and latency percentiles per endpoint.
+
+Endpoints:
+    health      no database, no auth
+    me          JWT check plus the /auth/me claims fast path
+    status      /auth/verification-status (profile cache, then Postgres)
+    login       Postgres lookup plus a bcrypt check
+
+Pass --no-cache to disable the profile cache and profile claims in both
+servers, so every me/status request reaches Postgres.
+
+Requires a local PostgreSQL configured in .env, plus gunicorn, the packages
+in requirements-asgi.txt and aiohttp. With more than one worker the servers
+share the profile cache through Redis (REDIS_URL).
+
+Usage (from backend/):
+    python benchmarks/bench_wsgi_vs_asgi.py [--concurrency 500] [--duration 20]
+        [--workers 4] [--endpoints health,me,status] [--no-cache]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+
+try:
+    import aiohttp
+except ImportError:
+    sys.exit("This benchmark needs aiohttp: pip install -r requirements-dev.txt")
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'BenchPass123'
+
+
+def server_commands(workers, threads):
+    return {
+        'wsgi': lambda port: [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--threads', str(threads), 'wsgi:application'
+        ],
+        'asgi': lambda port: [
+            sys.executable, '-m', 'uvicorn', 'asgi:application',
+            '--host', '127.0.0.1', '--port', str(port),
+            '--no-access-log', '--backlog', '4096'
+        ]
+    }
+
+
+def start_server(command, workers, no_cache):
+    # uvicorn takes its worker count from here; the app checks it too
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers))
+    if no_cache:
+        env['PROFILE_CACHE_TTL'] = '0'
+        env['JWT_PROFILE_CLAIMS'] = 'False'
+    return subprocess.Popen(
+        command, cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        start_new_session=True
+    )
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=15)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+async def wait_ready(session, base_url, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"server exited:\n{proc.stderr.read().decode(errors='replace')[-2000:]}")
+        try:
+            async with session.get(f'{base_url}/api/health') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError(f"server at {base_url} did not become ready")
+
+
+async def create_bench_user(session, base_url):
+    """Register a throwaway user; returns (email, access_token)"""
+    email = f'bench-{uuid.uuid4().hex[:12]}@example.com'
+    async with session.post(f'{base_url}/api/auth/register', json={
+        'email': email, 'password': PASSWORD, 'full_name': 'Bench User'
+    }) as response:
+        body = await response.json()
+        if response.status != 201:
+            raise RuntimeError(f"register failed ({response.status}): {body}")
+    return email, body['data']['access_token']
+
+
+def build_request(endpoint, base_url, email, token):
+    auth = {'Authorization': f'Bearer {token}'}
+    return {
+        'health': ('GET', f'{base_url}/api/health', {}, None),
+        'me': ('GET', f'{base_url}/api/auth/me', auth, None),
+        'status': ('GET', f'{base_url}/api/auth/verification-status', auth, None),
+        'login': ('POST', f'{base_url}/api/auth/login', {}, {'email': email, 'password': PASSWORD})
+    }[endpoint]
+
+
+async def drive(session, request, concurrency, duration):
+    """Closed loop: ``concurrency`` clients, each sending back-to-back requests"""
+    method, url, headers, body = request
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                async with session.request(method, url, headers=headers, json=body) as response:
+                    await response.read()
+                    ok = response.status < 400
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors += 1
+
+    started = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, errors, time.monotonic() - started
+
+
+def summarize(latencies, errors, elapsed):
+    if not latencies:
+        return {'rps': 0.0, 'errors': errors}
+    ordered = sorted(latencies)
+    cuts = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+    return {
+        'rps': len(ordered) / elapsed,
+        'p50': cuts[49] * 1000,
+        'p95': cuts[94] * 1000,
+        'p99': cuts[98] * 1000,
+        'max': ordered[-1] * 1000,
+        'errors': errors
+    }
+
+
+async def bench_build(name, command, port, args):
+    base_url = f'http://127.0.0.1:{port}'
+    proc = start_server(command(port), args.workers, args.no_cache)
+    connector = aiohttp.TCPConnector(limit=args.concurrency, limit_per_host=args.concurrency)
+    timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+    results = {}
+    try:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await wait_ready(session, base_url, proc)
+            email, token = await create_bench_user(session, base_url)
+            for endpoint in args.endpoints:
+                request = build_request(endpoint, base_url, email, token)
+                # Warm the pools and caches before measuring
+                await drive(session, request, min(args.concurrency, 50), 2)
+                results[endpoint] = summarize(*await drive(session, request, args.concurrency, args.duration))
+                print(f"  {name} {endpoint:<7} done", file=sys.stderr)
+    finally:
+        stop_server(proc)
+    return results
+
+
+def print_report(results, args):
+    print("\n" + "=" * 78)
+    print(f"  WSGI vs ASGI: {args.concurrency} concurrent connections, {args.duration}s per endpoint, "
+          f"{args.workers} workers")
+    print("=" * 78)
+    print(f"  {'endpoint':<8} {'build':<5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    for endpoint in args.endpoints:
+        for build in ('wsgi', 'asgi'):
+            r = results[build][endpoint]
+            if 'p50' not in r:
+                print(f"  {endpoint:<8} {build:<5} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {r['errors']:>7}")
+                continue
+            print(f"  {endpoint:<8} {build:<5} {r['rps']:>9.0f} {r['p50']:>9.1f} {r['p95']:>9.1f} "
+                  f"{r['p99']:>9.1f} {r['max']:>9.1f} {r['errors']:>7}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--endpoints', default='health,me,status')
+    parser.add_argument('--request-timeout', type=float, default=30.0)
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args()
+    args.endpoints = args.endpoints.split(',')
+
+    commands = server_commands(args.workers, args.threads)
+    results = {}
+    for port, build in ((5101, 'wsgi'), (5102, 'asgi')):
+        results[build] = asyncio.run(bench_build(build, commands[build], port, args))
+    print_report(results, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Stub webhook receiver
+
+A local HTTP/1.1 server with keep-alive that accepts deliveries on
+/hooks/<name>. It checks X-Davspay-Signature against the endpoint's secret
+and records requests, distinct events, duplicates, bad signatures, the
+connections opened and the most concurrent requests each endpoint saw.
+Latency and failures can be injected per endpoint. bench_webhooks.py drives
+it in-process; run it on its own to point a dev dispatcher at it.
+
+Usage (from backend/):
+    python benchmarks/webhook_receiver.py --port 8085 [--secret whsec_...] [--latency-ms 20] [--fail-rate 0.1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.webhooks import SIGNATURE_HEADER, verify_signature
+
+
+class EndpointStats:
+    __slots__ = ('requests', 'events', 'duplicates', 'bad_signatures', 'failed', 'active', 'max_active')
+
+    def __init__(self):
+        self.requests = self.duplicates = self.bad_signatures = self.failed = 0
+        self.active = self.max_active = 0
+        self.events = set()
+
+    def as_dict(self):
+        return {
+            'requests': self.requests, 'events': len(self.events), 'duplicates': self.duplicates,
+            'bad_signatures': self.bad_signatures, 'failed': self.failed, 'max_concurrent': self.max_active
+        }
+
+
+class StubReceiver:
+    """Threaded receiver; ``behaviour`` maps endpoint name to
+    {'secret': ..., 'latency': seconds, 'fail_rate': 0..1}, with ``default``
+    applying to names not listed"""
+
+    def __init__(self, host='127.0.0.1', port=0, behaviour=None, default=None):
+        self.behaviour = behaviour or {}
+        self.default = default or {}
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.connections = 0
+
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with receiver.lock:
+                    receiver.connections += 1
+
+            def do_POST(self):
+                receiver.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='webhook-receiver', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        body = request.rfile.read(int(request.headers.get('Content-Length') or 0))
+        name = request.path.rstrip('/').rsplit('/', 1)[-1]
+        behaviour = self.behaviour.get(name, self.default)
+
+        with self.lock:
+            stats = self.endpoints.setdefault(name, EndpointStats())
+            stats.requests += 1
+            stats.active += 1
+            stats.max_active = max(stats.max_active, stats.active)
+        try:
+            secret = behaviour.get('secret')
+            signed = secret is None or verify_signature(secret, request.headers.get(SIGNATURE_HEADER, ''), body)
+            if behaviour.get('latency'):
+                time.sleep(behaviour['latency'])
+            failed = random.random() < behaviour.get('fail_rate', 0.0)
+            status = 400 if not signed else 500 if failed else 200
+            with self.lock:
+                if not signed:
+                    stats.bad_signatures += 1
+                elif failed:
+                    stats.failed += 1
+                else:
+                    event_id = json.loads(body).get('id')
+                    if event_id in stats.events:
+                        stats.duplicates += 1
+                    stats.events.add(event_id)
+        finally:
+            with self.lock:
+                stats.active -= 1
+
+        request.send_response(status)
+        request.send_header('Content-Length', '0')
+        request.end_headers()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'connections': self.connections,
+                'endpoints': {name: stats.as_dict() for name, stats in sorted(self.endpoints.items())}
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8085)
+    parser.add_argument('--secret', help='verify signatures with this secret')
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    receiver = StubReceiver(args.host, args.port, default={
+        'secret': args.secret, 'latency': args.latency_ms / 1000, 'fail_rate': args.fail_rate
+    }).start()
+    print(f"Receiving on {receiver.url}/hooks/<name> (Ctrl-C prints stats and exits)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    receiver.stop()
+    print(json.dumps(receiver.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Build the IFSC directory for Davspay Backend
+
+Converts the RBI's list of bank branches, exported as CSV, into the
+memory-mapped file that /api/validation reads (see services/ifsc.py). The
+CSV needs IFSC, BANK, BRANCH, CITY (or CENTRE), DISTRICT and STATE columns;
+MICR and the UPI, NEFT, RTGS and IMPS flags are used when present.
+
+The new file replaces the old one atomically. Running workers map it within
+IFSC_RELOAD_INTERVAL seconds, with no restart needed. Rebuild whenever the
+RBI publishes an update.
+
+Usage:
+    python build_ifsc_directory.py IFSC.csv [--output PATH]
+"""
+import argparse
+import csv
+import os
+import time
+
+from config import Config
+from services.ifsc import IfscTable, branches_from_csv, write_directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the IFSC directory file from a CSV branch list")
+    parser.add_argument('csv', help='branch list (UTF-8 CSV with a header row)')
+    parser.add_argument('--output', default=Config.IFSC_DIRECTORY_PATH,
+                        help='directory file to write (default: IFSC_DIRECTORY_PATH)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with open(args.csv, newline='', encoding='utf-8-sig') as f:
+        count = write_directory(branches_from_csv(csv.DictReader(f)), args.output)
+    table = IfscTable(args.output)
+    print(f"Wrote {count:,} branches of {len(table.banks):,} banks to {args.output} "
+          f"({os.path.getsize(args.output) / 1048576:.1f} MiB) in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
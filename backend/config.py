@@ -12,6 +12,15 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'dev-jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Verified-claim cache: tokens are HMAC-verified once, then trusted until exp
+    JWT_CLAIM_CACHE_SIZE = int(os.getenv('JWT_CLAIM_CACHE_SIZE', '10000'))   # 0 disables the cache
+    JWT_CLAIM_CACHE_MAX_TTL = int(os.getenv('JWT_CLAIM_CACHE_MAX_TTL', '3600'))
+
+    # Storage driver: 'postgresql' (default) or 'sqlite', an embedded database
+    # for local sandboxes, benchmarks and single-node edge deployments
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'postgresql')
+    SQLITE_PATH = os.getenv('SQLITE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'davspay.db'))
+    SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))      # seconds a writer waits for the lock
 
     # Database
     DB_HOST = os.getenv('DB_HOST', 'localhost')
@@ -20,6 +29,135 @@ class Config:
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'password')
     DB_PORT = os.getenv('DB_PORT', '5432')
 
+    # Database connection pool (per worker process)
+    DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))                 # seconds to wait for a free connection
+    DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', '1800'))    # recycle connections after this many seconds
+    DB_POOL_IDLE_TIMEOUT = float(os.getenv('DB_POOL_IDLE_TIMEOUT', '300'))     # close idle connections above min size
+    DB_POOL_PING_AFTER = float(os.getenv('DB_POOL_PING_AFTER', '30'))          # ping connections idle longer than this on checkout
+    # PREPARE repository statements once per pooled connection (disable behind
+    # a transaction-mode pgbouncer, which does not keep session state)
+    DB_PREPARED_STATEMENTS = os.getenv('DB_PREPARED_STATEMENTS', 'True').lower() in ('true', '1', 'yes')
+
+    # Slow-query log, viewable at /api/admin/slow-queries (per worker process).
+    # EXPLAIN ANALYZE re-runs the statement, so plan capture is sampled.
+    SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', '100'))    # 0 disables the log
+    SLOW_QUERY_LOG_SIZE = int(os.getenv('SLOW_QUERY_LOG_SIZE', '200'))
+    SLOW_QUERY_EXPLAIN_RATE = float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', '0'))      # share of slow reads to EXPLAIN
+    SLOW_QUERY_EXPLAIN_INTERVAL = float(os.getenv('SLOW_QUERY_EXPLAIN_INTERVAL', '60'))  # per statement shape
+    # Sent as X-Admin-Token to reach /api/admin/*; unset disables those routes
+    ADMIN_API_TOKEN = os.getenv('ADMIN_API_TOKEN')
+
+    # Rows fetched per server-side cursor round trip in /transactions/export;
+    # memory per export is roughly this many rows, whatever the total
+    EXPORT_ITERSIZE = int(os.getenv('EXPORT_ITERSIZE', '2000'))
+
+    # Bulk user import (/api/admin/imports/users). Job files live under
+    # IMPORT_DIR so every worker on the host can report on every job.
+    IMPORT_DIR = os.getenv('IMPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'imports'))
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '2000'))                  # rows per COPY + merge
+    IMPORT_HASH_WORKERS = int(os.getenv('IMPORT_HASH_WORKERS', str(os.cpu_count() or 1)))  # 0 = hash on the job thread
+    IMPORT_MAX_BYTES = int(os.getenv('IMPORT_MAX_BYTES', str(200 * 1024 * 1024)))
+
+    # Webhooks. Events are written to an outbox in the same transaction as
+    # the change and delivered by `python webhook_dispatcher.py`.
+    WEBHOOK_MAX_ENDPOINTS = int(os.getenv('WEBHOOK_MAX_ENDPOINTS', '10'))      # per merchant
+    WEBHOOK_MAX_CONCURRENCY = int(os.getenv('WEBHOOK_MAX_CONCURRENCY', '8'))   # highest per-endpoint cap a merchant may set
+    WEBHOOK_ALLOW_HTTP = os.getenv('WEBHOOK_ALLOW_HTTP', 'False').lower() in ('true', '1', 'yes')  # plain-http URLs, for local testing
+    # Private, loopback and link-local receivers (localhost, 10.x, 169.254.169.254); for local testing only
+    WEBHOOK_ALLOW_PRIVATE = os.getenv('WEBHOOK_ALLOW_PRIVATE', 'False').lower() in ('true', '1', 'yes')
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '32'))                  # concurrent deliveries per dispatcher
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '100'))           # rows claimed and not yet finished
+    WEBHOOK_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', '10'))                # seconds per delivery attempt
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '12'))        # then dead-lettered
+    WEBHOOK_RETRY_BASE = float(os.getenv('WEBHOOK_RETRY_BASE', '10'))          # first retry delay, doubling after
+    WEBHOOK_RETRY_MAX = float(os.getenv('WEBHOOK_RETRY_MAX', '21600'))         # longest retry delay
+    # A claimed row is redelivered if its dispatcher has not finished it
+    # within the lease; keep it well above WEBHOOK_TIMEOUT
+    WEBHOOK_LEASE = float(os.getenv('WEBHOOK_LEASE', '300'))
+    WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', '1'))
+    WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', '7'))     # delivered rows are then purged
+    WEBHOOK_METRICS_PORT = int(os.getenv('WEBHOOK_METRICS_PORT', '0'))         # dispatcher's Prometheus port; 0 = off
+
+    # Server-to-server API keys (services/api_keys.py). Each worker holds the
+    # key digests in memory; on PostgreSQL changes arrive by LISTEN/NOTIFY and
+    # the poll is only a fallback, on SQLite it is how other workers catch up.
+    API_KEY_MAX_PER_MERCHANT = int(os.getenv('API_KEY_MAX_PER_MERCHANT', '10'))
+    API_KEY_ROTATION_GRACE = int(os.getenv('API_KEY_ROTATION_GRACE', '86400'))      # seconds the old key keeps working
+    API_KEY_ROTATION_GRACE_MAX = int(os.getenv('API_KEY_ROTATION_GRACE_MAX', str(7 * 86400)))
+    API_KEY_POLL_INTERVAL = float(os.getenv('API_KEY_POLL_INTERVAL', '5'))
+
+    # Access-token revocations (logout, deactivation) are stored in the
+    # database and mirrored by every worker the same way (services/token_revocations.py)
+    TOKEN_REVOCATION_POLL_INTERVAL = float(os.getenv('TOKEN_REVOCATION_POLL_INTERVAL', '5'))
+
+    # Idempotency-Key records for POST/PUT routes (services/idempotency.py).
+    # The lock must outlast the slowest handler (bcrypt queueing included);
+    # a duplicate waits up to IDEMPOTENCY_WAIT_TIMEOUT for the first result.
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', '86400'))                   # seconds a response is replayed
+    IDEMPOTENCY_LOCK_TIMEOUT = float(os.getenv('IDEMPOTENCY_LOCK_TIMEOUT', '30'))
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', '10'))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv('IDEMPOTENCY_CACHE_SIZE', '10000'))     # per-worker LRU; 0 = database only
+
+    # Daily settlement run (settle.py, services/settlements.py). Each payment
+    # pays BPS basis points of its amount plus FIXED paise, capped at the
+    # amount; GST is charged on the day's fees. The run holds at most
+    # SETTLEMENT_CHUNK_ROWS transactions in memory: about 100 bytes each on
+    # PostgreSQL, 250 on SQLite.
+    SETTLEMENT_UPI_FEE_BPS = int(os.getenv('SETTLEMENT_UPI_FEE_BPS', '50'))
+    SETTLEMENT_UPI_FEE_FIXED = int(os.getenv('SETTLEMENT_UPI_FEE_FIXED', '0'))
+    SETTLEMENT_VA_FEE_BPS = int(os.getenv('SETTLEMENT_VA_FEE_BPS', '0'))
+    SETTLEMENT_VA_FEE_FIXED = int(os.getenv('SETTLEMENT_VA_FEE_FIXED', '500'))      # paise per virtual account credit
+    SETTLEMENT_GST_BPS = int(os.getenv('SETTLEMENT_GST_BPS', '1800'))
+    SETTLEMENT_CHUNK_ROWS = int(os.getenv('SETTLEMENT_CHUNK_ROWS', '500000'))
+    SETTLEMENT_WRITE_BATCH = int(os.getenv('SETTLEMENT_WRITE_BATCH', '10000'))     # settlements per COPY
+
+    # Bank account validation (services/ifsc.py, services/bank_accounts.py).
+    # Workers memory-map the IFSC directory built by build_ifsc_directory.py
+    # and pick up a rebuilt file within IFSC_RELOAD_INTERVAL seconds.
+    IFSC_DIRECTORY_PATH = os.getenv('IFSC_DIRECTORY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'ifsc.dir'))
+    IFSC_RELOAD_INTERVAL = float(os.getenv('IFSC_RELOAD_INTERVAL', '60'))
+    ACCOUNT_VALIDATION_MAX_BATCH = int(os.getenv('ACCOUNT_VALIDATION_MAX_BATCH', '10000'))   # pairs per request
+    # Penny drops: 'stub' answers locally and moves no money; 'http' POSTs
+    # each check to PENNY_DROP_URL (see HttpBankAdapter)
+    PENNY_DROP_ADAPTER = os.getenv('PENNY_DROP_ADAPTER', 'stub')
+    PENNY_DROP_URL = os.getenv('PENNY_DROP_URL')
+    PENNY_DROP_API_KEY = os.getenv('PENNY_DROP_API_KEY')
+    PENNY_DROP_WORKERS = int(os.getenv('PENNY_DROP_WORKERS', '16'))          # concurrent checks per worker process
+    PENNY_DROP_TIMEOUT = float(os.getenv('PENNY_DROP_TIMEOUT', '20'))        # seconds a batch waits; keep below GUNICORN_TIMEOUT
+    PENNY_DROP_MAX_BATCH = int(os.getenv('PENNY_DROP_MAX_BATCH', '200'))
+    PENNY_DROP_STUB_LATENCY = float(os.getenv('PENNY_DROP_STUB_LATENCY', '0'))   # simulated bank round trip, seconds
+
+    # Worker processes serving this app. gunicorn.conf.py exports the
+    # gunicorn worker count; uvicorn takes its --workers from it.
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', '1'))
+
+    # Password hashing (bcrypt runs in a process pool, see services/password_hasher.py).
+    # Every web worker has its own pool, so the CPU cores are split between them.
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', '12'))
+    PASSWORD_HASH_WORKERS = int(os.getenv(
+        'PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 1) // max(WEB_CONCURRENCY, 1)))))  # 0 = hash inline
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', '32'))   # waiting requests beyond the workers
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))       # seconds before giving up with 503
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', '1'))  # Retry-After sent with 503
+
+    # Profile cache for /auth/me and /auth/verification-status.
+    # 'memory' keeps one cache per worker, so an update in one worker leaves
+    # the others serving the old profile until their entry expires: with
+    # WEB_CONCURRENCY > 1 its TTL is capped at PROFILE_CACHE_MULTI_WORKER_TTL.
+    # 'redis' (opt-in) shares the cache and its invalidations.
+    PROFILE_CACHE_BACKEND = os.getenv('PROFILE_CACHE_BACKEND', 'memory')
+    PROFILE_CACHE_TTL = int(os.getenv('PROFILE_CACHE_TTL', '60'))
+    PROFILE_CACHE_MULTI_WORKER_TTL = int(os.getenv('PROFILE_CACHE_MULTI_WORKER_TTL', '5'))   # seconds; 0 = no cache
+    PROFILE_CACHE_MAX_ENTRIES = int(os.getenv('PROFILE_CACHE_MAX_ENTRIES', '10000'))
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    # Embed profile claims in access tokens so /auth/me can skip the database
+    # while the token's profile_version is still current. Every process must
+    # see every profile write, so the version map lives in Redis: this is
+    # opt-in, and create_app() refuses it without the Redis backend.
+    JWT_PROFILE_CLAIMS = os.getenv('JWT_PROFILE_CLAIMS', 'False').lower() in ('true', '1', 'yes')
+
     # CORS
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
 
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Sets up a shared directory for Prometheus multiprocess metrics so
+/api/metrics reports totals across every worker, not just the one that
+happens to serve the scrape, and exports the worker count as
+WEB_CONCURRENCY so the app can size per-worker caches and pools (config.py).
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+# Must be set before any worker imports prometheus_client
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'davspay_prometheus')
+)
+
+
+def on_starting(server):
+    """Start every deployment with empty metric files"""
+    # The final count, --workers included; workers inherit the environment
+    os.environ['WEB_CONCURRENCY'] = str(server.cfg.workers)
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    """Drop live gauges of workers that exited"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -1,15 +1,21 @@
 """
 Database Initialization Script for Davspay Backend
 
-This script creates all necessary database tables.
+This script creates all necessary database tables, and brings an existing
+users table up to date with the columns later releases added.
 Run this AFTER deploying to PythonAnywhere or setting up locally.
 
+With STORAGE_BACKEND=sqlite it initializes the file at SQLITE_PATH instead
+(the app also does this on first use).
+
 Usage:
     python init_db.py
 """
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from config import config
+from services.schema import apply_schema, schema_steps
+from services.sqlite_pool import SQLitePool
 import os
 from dotenv import load_dotenv
 
@@ -27,6 +33,23 @@ def get_db_config(env="production"):
         'port': cfg.DB_PORT if hasattr(cfg, 'DB_PORT') else os.getenv('DB_PORT')
     }
 
+def init_sqlite_database(env="production"):
+    """Initialize the embedded SQLite database"""
+    path = config[env].SQLITE_PATH
+    print(f"\n[*] Initializing SQLite database at {path}")
+    pool = SQLitePool(path, init_schema=False)
+    conn = pool.getconn()
+    try:
+        apply_schema(conn, 'sqlite', log=lambda description: print(f"   [*] {description}..."))
+        print(f"\n[+] Database initialization completed ({conn.execute('PRAGMA journal_mode').fetchone()[0]} journal)\n")
+        return True
+    except Exception as e:
+        print(f"\n[!] Error: {e}\n")
+        return False
+    finally:
+        conn.close()
+        pool.closeall()
+
 def init_database(env="production"):
     """Initialize database tables"""
     print("\n" + "="*60)
@@ -48,56 +71,10 @@ def init_database(env="production"):
         print("\n[+] Connected successfully!")
         print("\n[*] Creating tables...\n")
 
-        # Create users table
-        print("   [*] Creating 'users' table...")
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                email VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                full_name VARCHAR(255) NOT NULL,
-                company_name VARCHAR(255),
-                phone VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE,
-                is_verified BOOLEAN DEFAULT FALSE
-            )
-        """)
-
-        # Create index on email for faster lookups
-        print("   [*] Creating email index...")
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)
-        """)
-
-        # Create index on is_active for faster queries
-        print("   [*] Creating is_active index...")
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_users_active ON users(is_active)
-        """)
-
-        # Create function to update updated_at timestamp
-        print("   [*] Creating timestamp trigger function...")
-        cursor.execute("""
-            CREATE OR REPLACE FUNCTION update_updated_at_column()
-            RETURNS TRIGGER AS $$
-            BEGIN
-                NEW.updated_at = CURRENT_TIMESTAMP;
-                RETURN NEW;
-            END;
-            $$ language 'plpgsql';
-        """)
-
-        # Create trigger to auto-update updated_at
-        print("   [*] Creating auto-update trigger...")
-        cursor.execute("""
-            DROP TRIGGER IF EXISTS update_users_updated_at ON users;
-            CREATE TRIGGER update_users_updated_at
-                BEFORE UPDATE ON users
-                FOR EACH ROW
-                EXECUTE FUNCTION update_updated_at_column();
-        """)
+        # Users table, its later columns, indexes and the updated_at trigger
+        for description, sql in schema_steps(cursor, 'postgresql'):
+            print(f"   [*] {description}...")
+            cursor.execute(sql)
 
         # Commit changes
         conn.commit()
@@ -186,6 +163,9 @@ if __name__ == "__main__":
 
     print(f"\nEnvironment: {env}")
 
+    if config[env].STORAGE_BACKEND == 'sqlite':
+        sys.exit(0 if init_sqlite_database(env) else 1)
+
     # Test connection first
     if check_connection(env):
         # Initialize database
@@ -0,0 +1,493 @@
+"""
+Load-testing harness for the Davspay API
+
+Drives a weighted mix of register, login, me, update, verification and
+status traffic at a target request rate (open loop) or a fixed number of
+concurrent clients (closed loop). Reports
+p50/p95/p99/max latency and the error rate per endpoint, writes the results
+as JSON, and exits non-zero when a stored baseline is exceeded.
+
+Works against any running build (python run.py, gunicorn, uvicorn) backed by
+a local Postgres. Requires aiohttp: pip install -r requirements-dev.txt
+
+Usage:
+    # One request per endpoint, checks status codes (post-deploy check)
+    python loadtest.py --smoke
+
+    # 200 req/s for 60s with the default mix, save results
+    python loadtest.py --rps 200 --duration 60 --output results.json
+
+    # 100 concurrent clients, custom mix, compare against a baseline
+    python loadtest.py --concurrency 100 --mix me=10,status=3,login=1 \\
+        --baseline baseline.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import aiohttp
+except ImportError:
+    sys.exit("loadtest.py needs aiohttp: pip install -r requirements-dev.txt")
+
+DEFAULT_BASE_URL = os.getenv('LOADTEST_BASE_URL', 'http://localhost:5000')
+DEFAULT_MIX = 'register=1,login=2,me=10,update=1,verification=1,status=3'
+PASSWORD = 'LoadTest1234'
+
+# Status codes that count as success. A second verification submission is
+# answered 400 "already submitted" by design.
+EXPECTED_STATUS = {
+    'health': {200},
+    'register': {201},
+    'login': {200},
+    'me': {200},
+    'update': {200},
+    'verification': {200, 400},
+    'status': {200},
+}
+
+
+# ----------------------------------------------------------------------
+# Virtual users and operations
+# ----------------------------------------------------------------------
+class VirtualUser:
+    """An account created for the run, with its current access token"""
+
+    __slots__ = ('email', 'token')
+
+    def __init__(self, email, token):
+        self.email = email
+        self.token = token
+
+
+def new_email(run_id):
+    return f"loadtest-{run_id}-{uuid.uuid4().hex[:10]}@example.com"
+
+
+def registration_body(email):
+    return {
+        'email': email,
+        'password': PASSWORD,
+        'full_name': 'Load Test User',
+        'company_name': 'Load Test Co',
+        'phone': '9876543210'
+    }
+
+
+def auth_headers(user):
+    return {'Authorization': f'Bearer {user.token}'}
+
+
+async def op_health(ctx, user):
+    return await ctx.request('GET', '/api/health')
+
+
+async def op_register(ctx, user):
+    email = new_email(ctx.run_id)
+    status, body = await ctx.request('POST', '/api/auth/register', json=registration_body(email))
+    if status == 201:
+        ctx.users.append(VirtualUser(email, body['data']['access_token']))
+    return status, body
+
+
+async def op_login(ctx, user):
+    status, body = await ctx.request('POST', '/api/auth/login', json={
+        'email': user.email, 'password': PASSWORD
+    })
+    if status == 200:
+        user.token = body['data']['access_token']
+    return status, body
+
+
+async def op_me(ctx, user):
+    return await ctx.request('GET', '/api/auth/me', headers=auth_headers(user))
+
+
+async def op_update(ctx, user):
+    status, body = await ctx.request('PUT', '/api/auth/update-profile', headers=auth_headers(user), json={
+        'full_name': f"Load Test User {random.randint(1, 10**6)}",
+        'company_name': 'Load Test Co',
+        'phone': '9876543210'
+    })
+    # Keep the refreshed token so /auth/me stays on the claims fast path
+    if status == 200 and body and body.get('data', {}).get('access_token'):
+        user.token = body['data']['access_token']
+    return status, body
+
+
+async def op_verification(ctx, user):
+    status, body = await ctx.request('POST', '/api/auth/submit-verification', headers=auth_headers(user))
+    if status == 200 and body and body.get('data', {}).get('access_token'):
+        user.token = body['data']['access_token']
+    return status, body
+
+
+async def op_status(ctx, user):
+    return await ctx.request('GET', '/api/auth/verification-status', headers=auth_headers(user))
+
+
+OPERATIONS = {
+    'health': op_health,
+    'register': op_register,
+    'login': op_login,
+    'me': op_me,
+    'update': op_update,
+    'verification': op_verification,
+    'status': op_status,
+}
+
+
+def parse_mix(text):
+    """'me=10,login=2' -> [('me', 10.0), ('login', 2.0)]"""
+    mix = []
+    for part in text.split(','):
+        name, _, weight = part.strip().partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"unknown operation '{name}' (choose from {', '.join(OPERATIONS)})")
+        try:
+            weight = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"bad weight in '{part}'")
+        if weight > 0:
+            mix.append((name, weight))
+    if not mix:
+        raise argparse.ArgumentTypeError("mix is empty")
+    return mix
+
+
+# ----------------------------------------------------------------------
+# Measurement
+# ----------------------------------------------------------------------
+class EndpointStats:
+    """Latencies and outcomes for one operation"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+
+    def add(self, seconds, status, ok):
+        self.latencies.append(seconds)
+        key = str(status)
+        self.statuses[key] = self.statuses.get(key, 0) + 1
+        if not ok:
+            self.errors += 1
+
+    def summary(self, elapsed):
+        count = len(self.latencies)
+        result = {
+            'count': count,
+            'errors': self.errors,
+            'error_rate': round(self.errors / count, 6) if count else 0.0,
+            'rps': round(count / elapsed, 3) if elapsed else 0.0,
+            'statuses': dict(sorted(self.statuses.items()))
+        }
+        if count:
+            ordered = sorted(self.latencies)
+            result.update({
+                'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+                'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+                'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+                'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+                'max_ms': round(ordered[-1] * 1000, 3)
+            })
+        return result
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of a sorted list"""
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class RunContext:
+    """Shared state of one load run"""
+
+    def __init__(self, session, base_url, run_id, users):
+        self.session = session
+        self.base_url = base_url
+        self.run_id = run_id
+        self.users = users
+        self.stats = {}
+        self.recording = False
+
+    async def request(self, method, path, **kwargs):
+        async with self.session.request(method, self.base_url + path, **kwargs) as response:
+            try:
+                body = await response.json(content_type=None)
+            except ValueError:
+                body = None
+            return response.status, body
+
+    async def run_op(self, name, scheduled=None):
+        """Run one operation; latency counts from ``scheduled`` when given
+        (open loop), so a backed-up server cannot hide its queueing delay"""
+        user = random.choice(self.users) if self.users else None
+        start = scheduled if scheduled is not None else time.perf_counter()
+        try:
+            status, _ = await OPERATIONS[name](self, user)
+            ok = status in EXPECTED_STATUS[name]
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status, ok = type(e).__name__, False
+        if self.recording:
+            self.stats.setdefault(name, EndpointStats()).add(time.perf_counter() - start, status, ok)
+        return ok
+
+
+def pick(mix):
+    names, weights = zip(*mix)
+    return random.choices(names, weights)[0]
+
+
+async def closed_loop(ctx, mix, concurrency, deadline):
+    async def client():
+        while time.perf_counter() < deadline:
+            await ctx.run_op(pick(mix))
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def open_loop(ctx, mix, rps, deadline, max_in_flight):
+    """Start requests on a fixed schedule regardless of how fast they finish"""
+    interval = 1.0 / rps
+    next_at = time.perf_counter()
+    in_flight = set()
+    dropped = 0
+    while next_at < deadline:
+        now = time.perf_counter()
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+        if len(in_flight) >= max_in_flight:
+            dropped += 1
+        else:
+            task = asyncio.ensure_future(ctx.run_op(pick(mix), scheduled=next_at))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_at += interval
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return dropped
+
+
+async def seed_users(ctx, count, concurrency=20):
+    """Register the accounts the mix logs in as and reads"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            email = new_email(ctx.run_id)
+            status, body = await ctx.request('POST', '/api/auth/register', json=registration_body(email))
+            if status != 201:
+                raise RuntimeError(f"could not create a load-test user ({status}): {body}")
+            ctx.users.append(VirtualUser(email, body['data']['access_token']))
+
+    await asyncio.gather(*(one() for _ in range(count)))
+
+
+async def run_load(args):
+    run_id = uuid.uuid4().hex[:8]
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    limit = args.concurrency or args.max_in_flight
+    connector = aiohttp.TCPConnector(limit=limit, limit_per_host=limit)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        ctx = RunContext(session, args.base_url.rstrip('/'), run_id, [])
+        status, _ = await ctx.request('GET', '/api/health')
+        if status != 200:
+            raise RuntimeError(f"{args.base_url}/api/health answered {status}")
+
+        print(f"[*] Creating {args.users} users...", file=sys.stderr)
+        await seed_users(ctx, args.users)
+
+        mode = f"{args.rps} req/s" if args.rps else f"{args.concurrency} clients"
+        dropped = 0
+        for phase, seconds in (('warmup', args.warmup), ('measure', args.duration)):
+            if seconds <= 0:
+                continue
+            print(f"[*] {phase}: {seconds:g}s at {mode}", file=sys.stderr)
+            ctx.recording = phase == 'measure'
+            started = time.perf_counter()
+            deadline = started + seconds
+            if args.rps:
+                skipped = await open_loop(ctx, args.mix, args.rps, deadline, args.max_in_flight)
+                if ctx.recording:
+                    dropped = skipped
+            else:
+                await closed_loop(ctx, args.mix, args.concurrency, deadline)
+            elapsed = time.perf_counter() - started
+
+    endpoints = {name: stats.summary(elapsed) for name, stats in sorted(ctx.stats.items())}
+    total = EndpointStats()
+    for stats in ctx.stats.values():
+        total.latencies.extend(stats.latencies)
+        total.errors += stats.errors
+        for key, value in stats.statuses.items():
+            total.statuses[key] = total.statuses.get(key, 0) + value
+
+    return {
+        'meta': {
+            'run_id': run_id,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'base_url': args.base_url,
+            'mode': 'open' if args.rps else 'closed',
+            'target_rps': args.rps,
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'elapsed_s': round(elapsed, 3),
+            'mix': dict(args.mix),
+            'users': args.users,
+            'dropped': dropped,
+            'python': platform.python_version()
+        },
+        'endpoints': endpoints,
+        'total': total.summary(elapsed)
+    }
+
+
+# ----------------------------------------------------------------------
+# Reporting and baselines
+# ----------------------------------------------------------------------
+def print_report(results):
+    meta = results['meta']
+    print("\n" + "=" * 86)
+    target = f"{meta['target_rps']} req/s target" if meta['mode'] == 'open' else f"{meta['concurrency']} clients"
+    print(f"  DAVSPAY LOAD TEST  {meta['base_url']}  ({target}, {meta['elapsed_s']:.0f}s)")
+    print("=" * 86)
+    print(f"  {'endpoint':<13} {'count':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8} {'errors':>7} {'err %':>6}")
+    rows = list(results['endpoints'].items()) + [('TOTAL', results['total'])]
+    for name, r in rows:
+        if not r['count']:
+            continue
+        print(f"  {name:<13} {r['count']:>7} {r['rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+              f"{r['p99_ms']:>8.1f} {r['max_ms']:>8.1f} {r['errors']:>7} {r['error_rate'] * 100:>6.2f}")
+    if meta['dropped']:
+        print(f"\n  [!] {meta['dropped']} requests not started: --max-in-flight reached")
+    print()
+
+
+def compare(results, baseline, tolerance, error_slack):
+    """Regressions of ``results`` against ``baseline`` as readable strings"""
+    failures = []
+    for name, base in baseline.get('endpoints', {}).items():
+        if name not in results['meta']['mix']:
+            continue
+        current = results['endpoints'].get(name)
+        if current is None or not current['count']:
+            failures.append(f"{name}: no requests in this run")
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if metric not in base:
+                continue
+            limit = base[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                failures.append(f"{name} {metric}: {current[metric]:.1f} > {limit:.1f} "
+                                f"(baseline {base[metric]:.1f} +{tolerance:.0%})")
+        limit = base['error_rate'] + error_slack
+        if current['error_rate'] > limit:
+            failures.append(f"{name} error_rate: {current['error_rate']:.2%} > {limit:.2%}")
+    return failures
+
+
+# ----------------------------------------------------------------------
+# Smoke mode (post-deploy check)
+# ----------------------------------------------------------------------
+async def run_smoke(args):
+    run_id = uuid.uuid4().hex[:8]
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        ctx = RunContext(session, args.base_url.rstrip('/'), run_id, [])
+        email = new_email(run_id)
+        status, body = await ctx.request('POST', '/api/auth/register', json=registration_body(email))
+        user = VirtualUser(email, body['data']['access_token'] if status == 201 else None)
+        results = [('register', status in EXPECTED_STATUS['register'])]
+        for name in ('health', 'login', 'me', 'update', 'status', 'verification'):
+            try:
+                status, _ = await OPERATIONS[name](ctx, user)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status = None
+            results.append((name, status in EXPECTED_STATUS[name]))
+        status, _ = await ctx.request('POST', '/api/auth/login', json={'email': email, 'password': 'wrong-password'})
+        results.append(('invalid_login', status == 401))
+
+    print("\n" + "=" * 50)
+    print(f"  SMOKE TEST  {args.base_url}")
+    print("=" * 50)
+    for name, ok in results:
+        print(f"  {name:<14} {'PASSED' if ok else 'FAILED'}")
+    passed = sum(1 for _, ok in results if ok)
+    print(f"\n  {passed}/{len(results)} checks passed\n")
+    return passed == len(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL, help='API root (env LOADTEST_BASE_URL)')
+    parser.add_argument('--smoke', action='store_true', help='one request per endpoint, then exit')
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument('--rps', type=float, help='open loop: start this many requests per second')
+    load.add_argument('--concurrency', type=int, help='closed loop: this many clients back to back')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'weighted operations (default {DEFAULT_MIX}); also: health')
+    parser.add_argument('--duration', type=float, default=30.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='unmeasured seconds before measuring')
+    parser.add_argument('--users', type=int, default=50, help='accounts created before the run')
+    parser.add_argument('--max-in-flight', type=int, default=1000, help='open loop cap on outstanding requests')
+    parser.add_argument('--timeout', type=float, default=30.0, help='per-request timeout in seconds')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='results JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed latency growth over the baseline (0.25 = +25%%)')
+    parser.add_argument('--error-slack', type=float, default=0.01,
+                        help='allowed error-rate growth over the baseline (absolute)')
+    parser.add_argument('--max-error-rate', type=float,
+                        help='fail if the overall error rate is above this, baseline or not')
+    args = parser.parse_args()
+
+    if args.smoke:
+        return 0 if asyncio.run(run_smoke(args)) else 1
+
+    if args.duration <= 0:
+        parser.error('--duration must be positive')
+    if not args.rps and not args.concurrency:
+        args.concurrency = 20
+
+    try:
+        results = asyncio.run(run_load(args))
+    except (aiohttp.ClientError, RuntimeError) as e:
+        print(f"[!] {e}", file=sys.stderr)
+        return 2
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"[+] Results written to {args.output}")
+
+    failures = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += compare(results, json.load(f), args.tolerance, args.error_slack)
+    if args.max_error_rate is not None and results['total']['error_rate'] > args.max_error_rate:
+        failures.append(f"overall error_rate {results['total']['error_rate']:.2%} > {args.max_error_rate:.2%}")
+
+    if failures:
+        print("\n[!] Regressions:")
+        for failure in failures:
+            print(f"    - {failure}")
+        return 1
+    if args.baseline:
+        print(f"[+] Within {args.tolerance:.0%} of baseline {args.baseline}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
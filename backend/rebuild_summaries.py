@@ -0,0 +1,65 @@
+"""
+Rebuild the hourly transaction summaries for Davspay Backend
+
+The transaction_hourly table behind /api/transactions/overview is kept
+current by every ledger write (services/repository.py). Run this once
+after upgrading an existing database, after loading transactions with SQL
+outside the API, or whenever the summaries are in doubt. It recomputes the
+summaries from the ledger one UTC day at a time. Each day is its own
+transaction, so the overview keeps answering throughout. On PostgreSQL,
+ledger writes wait while their day is being rebuilt.
+
+Usage:
+    python rebuild_summaries.py [development|production] [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+
+Without --since/--until the whole ledger is rebuilt; --until is exclusive.
+"""
+import argparse
+import logging
+import time
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from services.repository import SummaryRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild hourly transaction summaries from the ledger")
+    parser.add_argument('env', nargs='?', default='production', choices=('development', 'production'))
+    parser.add_argument('--since', type=date.fromisoformat, default=None, help='first day to rebuild')
+    parser.add_argument('--until', type=date.fromisoformat, default=None, help='day to stop before')
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    app.logger.setLevel(logging.INFO)
+
+    # Runs outside any request, so borrow connections from the pool directly
+    summaries = SummaryRepository(app.db_pool.getconn)
+    since, until = args.since, args.until
+    if since is None or until is None:
+        first, last = summaries.ledger_bounds()
+        if first is None:
+            app.logger.info("The ledger is empty; nothing to rebuild")
+            return
+        since = since or first.date()
+        until = until or last.date() + timedelta(days=1)
+
+    started = time.perf_counter()
+    days = rows = 0
+    day = since
+    while day < until:
+        start = datetime.combine(day, datetime.min.time())
+        rows += summaries.rebuild(start, start + timedelta(days=1))
+        days += 1
+        day += timedelta(days=1)
+        if days % 30 == 0:
+            app.logger.info(f"Rebuilt through {day - timedelta(days=1)} ({rows:,} summary rows)")
+
+    app.logger.info(f"Rebuilt {days} days from {since} to {until} (exclusive): {rows:,} summary rows "
+                    f"in {time.perf_counter() - started:.1f}s")
+    app.db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
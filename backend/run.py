@@ -1,19 +1,23 @@
 """
 Local development server runner
 Run this file for local development: python run.py
+
+The app is created under the __main__ guard: password hashing runs in
+spawned processes (services/password_hasher.py), which re-import this
+module, and each of them would otherwise boot a whole app of its own.
 """
 from app import create_app
 
-# Create Flask app for development
-app = create_app("development")
-
 if __name__ == "__main__":
+    # Create Flask app for development
+    app = create_app("development")
+
     print("\n" + "="*60)
-    print("= Davspay API Server - Development Mode")
+    print("Davspay API Server - Development Mode")
     print("="*60)
-    print("= Server running at: http://localhost:5000")
-    print("< Health check: http://localhost:5000/api/health")
-    print("= API Documentation: http://localhost:5000/")
+    print("Server running at: http://localhost:5000")
+    print("Health check: http://localhost:5000/api/health")
+    print("API Documentation: http://localhost:5000/")
     print("="*60 + "\n")
 
     app.run(
@@ -0,0 +1,232 @@
+"""
+In-memory API key index
+
+Server-to-server calls authenticate with ``Authorization: Bearer live_sk_...``.
+Keys are stored only as SHA-256 digests (api_keys.key_hash). A key is 256
+random bits, so a fast hash is enough; bcrypt buys nothing here.
+
+Each worker keeps every usable key's digest in a dict, so authenticating a
+key is one SHA-256 and one dict lookup, with no database round trip. The
+index loads at startup and then follows the table's ``version`` column: a
+background thread fetches only rows past the newest version it has seen.
+On PostgreSQL it LISTENs on the ``api_keys`` channel, which every key write
+notifies on commit, so rotations and revocations reach all workers within
+milliseconds. The ``poll_interval`` refresh runs regardless and covers
+SQLite, missed notifications and lost listener connections.
+"""
+import hashlib
+import os
+import secrets
+import select
+import threading
+import time
+from datetime import timezone
+
+from services.repository import DatabaseUnavailable
+
+API_KEY_PREFIX = 'live_sk_'
+NOTIFY_CHANNEL = 'api_keys'
+
+
+def generate_api_key():
+    """A new secret key: the prefix and 43 URL-safe characters (256 bits)"""
+    return API_KEY_PREFIX + secrets.token_urlsafe(32)
+
+
+def api_key_digest(key):
+    """Hex SHA-256 of a key, as stored in api_keys.key_hash"""
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def display_prefix(key):
+    """The part of a key that is safe to show again, e.g. live_sk_Ab3x"""
+    return key[:len(API_KEY_PREFIX) + 4]
+
+
+class ApiKeyEntry:
+    """An authenticated key; expires_at is a Unix time, or None"""
+    __slots__ = ('id', 'merchant_id', 'expires_at', 'is_active')
+
+    def __init__(self, id, merchant_id, expires_at, is_active=True):
+        self.id = id
+        self.merchant_id = merchant_id
+        self.expires_at = expires_at
+        self.is_active = is_active      # the merchant's users.is_active when the key last changed
+
+
+class ApiKeyIndex:
+    """Per-process map of key digest -> ApiKeyEntry, kept current in the background
+
+    ``changes(since)`` returns ApiKeyChangeRows past a version
+    (ApiKeyRepository.changes). ``listen`` opens an autocommit psycopg2
+    connection for LISTEN, or is None to rely on polling alone.
+    """
+
+    def __init__(self, changes, listen=None, poll_interval=5.0, load_timeout=5.0, logger=None):
+        self._changes = changes
+        self._listen = listen
+        self.poll_interval = poll_interval
+        self.load_timeout = load_timeout
+        self.logger = logger
+
+        # Lookups read these without a lock: a dict get is atomic, and the
+        # refresh thread swaps in whole entries
+        self._by_digest = {}
+        self._digests = {}              # key id -> digest, to apply updates
+        self._expiring = {}             # key id -> expires_at, for rotated keys
+        self._version = 0
+
+        self._loaded = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._listening = False
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._inactive = 0
+        self._refreshes = 0
+        self._changes_applied = 0
+        self._last_refresh = None
+
+    # ------------------------------------------------------------------
+    # Lookup
+    # ------------------------------------------------------------------
+    def authenticate(self, key):
+        """The ApiKeyEntry for a usable key, else None
+
+        Raises DatabaseUnavailable only while the first load has not
+        completed within ``load_timeout``.
+        """
+        if self._pid != os.getpid():
+            self.start()
+        if not self._loaded.is_set() and not self._loaded.wait(self.load_timeout):
+            raise DatabaseUnavailable()
+
+        entry = self._by_digest.get(hashlib.sha256(key.encode('utf-8')).digest())
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.time():
+            with self._stats_lock:
+                self._expired += 1
+            return None
+        # Deactivation revokes the keys too; this covers a change feed that
+        # has the user's row but not yet the revocations
+        if entry is not None and not entry.is_active:
+            with self._stats_lock:
+                self._inactive += 1
+            return None
+        with self._stats_lock:
+            if entry is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return entry
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+    def start(self):
+        """Start the refresh thread in this process (again after a fork)
+
+        A forked worker keeps the parent's entries and version and simply
+        catches up from there.
+        """
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._listening = False
+            self._thread = threading.Thread(target=self._run, name='api-key-index', daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Apply every key change past the version seen so far; returns how many"""
+        with self._refresh_lock:
+            rows = self._changes(self._version)
+            now = time.time()
+            for row in rows:
+                self._apply(row, now)
+                self._version = max(self._version, row.version)
+            # Rotated keys lapse without a write of their own
+            for key_id, expires_at in list(self._expiring.items()):
+                if expires_at <= now:
+                    self._remove(key_id)
+            with self._stats_lock:
+                self._refreshes += 1
+                self._changes_applied += len(rows)
+                self._last_refresh = time.monotonic()
+        self._loaded.set()
+        return len(rows)
+
+    def _apply(self, row, now):
+        self._remove(row.id)
+        expires_at = _unix_time(row.expires_at)
+        if row.revoked_at is not None or (expires_at is not None and expires_at <= now):
+            return
+        digest = bytes.fromhex(row.key_hash)
+        self._by_digest[digest] = ApiKeyEntry(row.id, row.merchant_id, expires_at, bool(row.is_active))
+        self._digests[row.id] = digest
+        if expires_at is not None:
+            self._expiring[row.id] = expires_at
+
+    def _remove(self, key_id):
+        digest = self._digests.pop(key_id, None)
+        if digest is not None:
+            self._by_digest.pop(digest, None)
+        self._expiring.pop(key_id, None)
+
+    def _run(self):
+        conn = None
+        while True:
+            try:
+                if conn is None and self._listen is not None:
+                    conn = self._listen()
+                    conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    self._listening = True
+                wait = self.poll_interval if self._loaded.is_set() else 0
+                if conn is not None:
+                    # Refresh whether woken by a notification or by the
+                    # timeout; the payload carries nothing we need
+                    if select.select([conn], [], [], wait)[0]:
+                        conn.poll()
+                        conn.notifies.clear()
+                else:
+                    time.sleep(wait)
+                self.refresh()
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.error(f"API key index refresh error: {e}")
+                self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                time.sleep(min(self.poll_interval, 5.0))
+
+    def stats(self):
+        with self._stats_lock:
+            lookups = self._hits + self._misses + self._expired + self._inactive
+            return {
+                'keys': len(self._by_digest),
+                'version': self._version,
+                'loaded': self._loaded.is_set(),
+                'listening': self._listening,
+                'hits': self._hits,
+                'misses': self._misses,
+                'expired': self._expired,
+                'inactive': self._inactive,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'refreshes': self._refreshes,
+                'changes_applied': self._changes_applied,
+                'last_refresh_seconds_ago': (round(time.monotonic() - self._last_refresh, 3)
+                                             if self._last_refresh is not None else None)
+            }
+
+
+def _unix_time(value):
+    """Naive-UTC TIMESTAMP (as utcnow() writes them) to a Unix time"""
+    return value.replace(tzinfo=timezone.utc).timestamp() if value is not None else None
@@ -0,0 +1,165 @@
+"""
+Async data-access layer (asyncpg)
+
+The same statements and row types as services/repository.py, run on an
+asyncpg pool for the ASGI build. asyncpg prepares and caches every statement
+per connection on first use, so the hot auth queries skip parsing and
+planning just like the PREPARE/EXECUTE path of the sync repositories.
+Single statements run in autocommit mode; each write here is one statement.
+"""
+import asyncio
+
+import asyncpg
+
+from services.repository import (
+    CREATE_USER, EMAIL_EXISTS, GET_CREDENTIALS, GET_PROFILE, HISTORY_FILTERS, PROFILE_FIELDS,
+    SUBMIT_VERIFICATION, TOKEN_REVOCATION_CHANGES, CredentialsRow, DatabaseUnavailable, ProfileRow,
+    TokenRevocationRow, TransactionRow, UserRow, VerificationSubmissionRow, export_statement,
+    history_params, history_statement, profile_update_statement, utcnow
+)
+
+# Errors that mean "no usable connection", as opposed to a bad query
+_UNAVAILABLE = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.CannotConnectNowError,
+    asyncpg.TooManyConnectionsError,
+    asyncpg.ConnectionDoesNotExistError,
+    asyncpg.InterfaceError
+)
+
+
+async def create_pool(cfg, min_size=1, max_size=10, max_inactive_lifetime=300.0):
+    """asyncpg pool from the DB_* settings of a config object or dict"""
+    return await asyncpg.create_pool(
+        host=cfg['DB_HOST'],
+        database=cfg['DB_NAME'],
+        user=cfg['DB_USER'],
+        password=cfg['DB_PASSWORD'],
+        port=int(cfg['DB_PORT']),
+        min_size=min_size,
+        max_size=max_size,
+        max_inactive_connection_lifetime=max_inactive_lifetime
+    )
+
+
+def pool_stats(pool):
+    """Pool usage in the shape of ConnectionPool.stats()"""
+    size = pool.get_size()
+    idle = pool.get_idle_size()
+    return {
+        'driver': 'asyncpg',
+        'size': size,
+        'in_use': size - idle,
+        'idle': idle,
+        'min_size': pool.get_min_size(),
+        'max_size': pool.get_max_size()
+    }
+
+
+class AsyncRepository:
+    """Base class: borrows a connection per call from an asyncpg pool"""
+
+    def __init__(self, pool, timeout=5.0):
+        self._pool = pool
+        # Seconds to wait for a free connection before DatabaseUnavailable
+        self.timeout = timeout
+
+    async def _fetchrow(self, statement, params):
+        try:
+            async with self._pool.acquire(timeout=self.timeout) as conn:
+                return await conn.fetchrow(statement.numbered_sql, *params)
+        except _UNAVAILABLE as e:
+            raise DatabaseUnavailable() from e
+
+    async def _fetch_one(self, statement, params, row_type):
+        row = await self._fetchrow(statement, params)
+        return row_type(row) if row is not None else None
+
+    async def _fetch_all(self, statement, params, row_type):
+        try:
+            async with self._pool.acquire(timeout=self.timeout) as conn:
+                rows = await conn.fetch(statement.numbered_sql, *params)
+        except _UNAVAILABLE as e:
+            raise DatabaseUnavailable() from e
+        return [row_type(row) for row in rows]
+
+
+class AsyncUserRepository(AsyncRepository):
+    """Queries against the users table"""
+
+    async def email_exists(self, email):
+        return await self._fetchrow(EMAIL_EXISTS, (email,)) is not None
+
+    async def create(self, email, password_hash, full_name, company_name, phone):
+        """Insert a user; returns None if the email is already registered"""
+        return await self._fetch_one(
+            CREATE_USER,
+            (email, password_hash, full_name, company_name, phone),
+            UserRow
+        )
+
+    async def get_credentials(self, email):
+        return await self._fetch_one(GET_CREDENTIALS, (email,), CredentialsRow)
+
+    async def get_profile(self, user_id):
+        """Active user's profile, or None"""
+        return await self._fetch_one(GET_PROFILE, (user_id,), ProfileRow)
+
+    async def update_profile(self, user_id, changes):
+        """Apply ``changes`` (a dict limited to PROFILE_FIELDS); returns the updated user"""
+        fields = [field for field in PROFILE_FIELDS if field in changes]
+        if not fields:
+            raise ValueError("No profile fields to update")
+        params = [changes[field] for field in fields]
+        params.append(user_id)
+        return await self._fetch_one(profile_update_statement(fields), params, ProfileRow)
+
+
+class AsyncVerificationRepository(AsyncRepository):
+    """Merchant verification state (stored on users)"""
+
+    async def submit(self, user_id):
+        """Mark a user pending; None if the user does not exist"""
+        return await self._fetch_one(SUBMIT_VERIFICATION, (user_id,), VerificationSubmissionRow)
+
+
+class AsyncTokenRevocationRepository(AsyncRepository):
+    """The token_revocations change feed (written by the WSGI build)"""
+
+    async def changes(self, since):
+        """Unexpired revocations written after version ``since``, oldest first"""
+        return await self._fetch_all(TOKEN_REVOCATION_CHANGES, (since, utcnow()), TokenRevocationRow)
+
+
+class AsyncTransactionRepository(AsyncRepository):
+    """Queries against the transactions ledger"""
+
+    async def history(self, merchant_id, limit, before=None, filters=None):
+        """Up to ``limit`` transactions older than ``before``; returns (rows, has_more)"""
+        filters = filters or {}
+        statement = history_statement(filters, before is not None)
+        rows = await self._fetch_all(statement, history_params(merchant_id, limit + 1, before, filters),
+                                     TransactionRow)
+        return rows[:limit], len(rows) > limit
+
+    async def export(self, merchant_id, filters=None, itersize=2000):
+        """Every matching transaction, oldest first, as an async generator of row batches
+
+        asyncpg cursors need a transaction; rows are fetched ``itersize`` at a
+        time and never materialized in full.
+        """
+        filters = filters or {}
+        statement = export_statement(filters)
+        params = [merchant_id] + [filters[name] for name in HISTORY_FILTERS if name in filters]
+        try:
+            async with self._pool.acquire(timeout=self.timeout) as conn:
+                async with conn.transaction(readonly=True):
+                    cursor = await conn.cursor(statement.numbered_sql, *params)
+                    while True:
+                        rows = await cursor.fetch(itersize)
+                        if not rows:
+                            break
+                        yield [TransactionRow(row) for row in rows]
+        except _UNAVAILABLE as e:
+            raise DatabaseUnavailable() from e
@@ -0,0 +1,258 @@
+"""
+Bank account validation
+
+validate_accounts() checks a batch of account number / IFSC pairs in one
+pass. Formats are checked first, then the IFSC directory (services/ifsc.py),
+with each distinct IFSC looked up once. The batch touches neither the
+database nor the network, so thousands of pairs take milliseconds.
+
+Penny drops go further. A PennyDropper has a bank adapter credit a token
+amount to each account and report the name the bank holds for it. Checks
+fan out over a per-process thread pool, so a batch takes about as long as its
+slowest check rather than the sum of them. Checks still unanswered at the
+deadline are reported as ``timeout``; their request_id lets the merchant
+reconcile them with the bank later. StubBankAdapter answers locally and moves no
+money. HttpBankAdapter POSTs each check to a bank or aggregator API. Other
+providers plug in as BankAdapter subclasses chosen in
+app.create_bank_adapter.
+"""
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import validate_account_number, validate_ifsc
+
+MAX_REFERENCE_LENGTH = 64
+
+# Penny-drop outcomes
+VERIFIED = 'verified'         # the account exists; name_at_bank is the holder's name
+NOT_FOUND = 'not_found'       # the bank has no such account at the branch
+FAILED = 'failed'             # the bank or adapter could not complete the check
+TIMEOUT = 'timeout'           # no answer before the deadline; may still complete
+STATUSES = (VERIFIED, NOT_FOUND, FAILED, TIMEOUT)
+
+
+class AccountBatchError(ValueError):
+    """A validation request's body is unusable as a whole"""
+
+
+def parse_batch(data, max_size):
+    """The ``accounts`` list of a request body, at most ``max_size`` long"""
+    accounts = data.get('accounts') if isinstance(data, dict) else None
+    if not isinstance(accounts, list) or not accounts:
+        raise AccountBatchError('accounts must be a non-empty list')
+    if len(accounts) > max_size:
+        raise AccountBatchError(f'At most {max_size} accounts are allowed per request')
+    return accounts
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ('' if value is None else str(value))
+
+
+def validate_accounts(accounts, table):
+    """Per-entry results for ``accounts`` checked against an IfscTable
+
+    Each entry is an object with account_number, ifsc and an optional
+    reference echoed back. Results keep the request's order and carry the
+    normalised fields, ``valid``, the reasons an entry is not valid and the
+    branch (a Branch row) when the IFSC is known.
+    """
+    branches = {}
+    results = []
+    for index, entry in enumerate(accounts):
+        if not isinstance(entry, dict):
+            results.append({'index': index, 'reference': None, 'account_number': None, 'ifsc': None,
+                            'valid': False, 'errors': ['entry must be an object'], 'branch': None})
+            continue
+
+        account_number = _text(entry.get('account_number')).replace(' ', '')
+        ifsc = _text(entry.get('ifsc')).upper()
+        reference = entry.get('reference')
+        errors = []
+        if reference is not None and (not isinstance(reference, str) or len(reference) > MAX_REFERENCE_LENGTH):
+            errors.append(f'reference must be a string of at most {MAX_REFERENCE_LENGTH} characters')
+            reference = None
+        if not validate_account_number(account_number):
+            errors.append('account_number must be 9 to 18 digits')
+
+        branch = None
+        if not validate_ifsc(ifsc):
+            errors.append('ifsc must be a 4-letter bank code, 0 and a 6-character branch code')
+        else:
+            if ifsc not in branches:
+                branches[ifsc] = table.get(ifsc)
+            branch = branches[ifsc]
+            if branch is None:
+                errors.append('ifsc is not in the directory')
+
+        results.append({'index': index, 'reference': reference, 'account_number': account_number,
+                        'ifsc': ifsc, 'valid': not errors, 'errors': errors, 'branch': branch})
+    return results
+
+
+def batch_summary(results):
+    """Counts of a validate_accounts() batch, plus penny-drop outcomes if any ran"""
+    valid = sum(1 for result in results if result['valid'])
+    summary = {'total': len(results), 'valid': valid, 'invalid': len(results) - valid}
+    checks = [result['penny_drop'] for result in results if result.get('penny_drop') is not None]
+    if checks:
+        summary['penny_drop'] = {status: sum(1 for check in checks if check.status == status)
+                                 for status in STATUSES}
+    return summary
+
+
+# ----------------------------------------------------------------------
+# Penny drops
+# ----------------------------------------------------------------------
+class PennyDropResult:
+    """Outcome of one penny drop; request_id is ours, bank_reference the bank's"""
+    __slots__ = ('request_id', 'status', 'name_at_bank', 'bank_reference', 'message')
+
+    def __init__(self, status, name_at_bank=None, bank_reference=None, message=None, request_id=None):
+        self.request_id = request_id
+        self.status = status
+        self.name_at_bank = name_at_bank
+        self.bank_reference = bank_reference
+        self.message = message
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class BankAdapter:
+    """Performs penny drops; subclasses implement verify()"""
+
+    name = None
+
+    def verify(self, account_number, ifsc, request_id):
+        """PennyDropResult for one account; may block, and may raise on
+        transport errors (reported as ``failed``)
+
+        ``request_id`` is unique per check; pass it to the bank so a retried
+        check is not paid twice.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class StubBankAdapter(BankAdapter):
+    """Local stand-in that moves no money
+
+    Accounts ending in 000 do not exist and accounts ending in 999 fail at
+    the bank; every other account is verified under a made-up name.
+    ``latency`` simulates the bank's round trip in seconds.
+    """
+
+    name = 'stub'
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def verify(self, account_number, ifsc, request_id):
+        if self.latency:
+            time.sleep(self.latency)
+        if account_number.endswith('000'):
+            return PennyDropResult(NOT_FOUND, message='No such account at this branch')
+        if account_number.endswith('999'):
+            return PennyDropResult(FAILED, message='The bank declined the transfer')
+        return PennyDropResult(VERIFIED, name_at_bank=f'STUB ACCOUNT {account_number[-4:]}',
+                               bank_reference=f'STUB{request_id[-12:].upper()}')
+
+
+class HttpBankAdapter(BankAdapter):
+    """Penny drops through a JSON API
+
+    POSTs ``{"account_number", "ifsc", "request_id"}`` to ``url`` with the
+    API key as a bearer token, and expects ``{"status", "name_at_bank",
+    "bank_reference", "message"}`` back, status being one of verified,
+    not_found or failed. Connections are kept alive across checks.
+    """
+
+    name = 'http'
+
+    def __init__(self, url, api_key=None, timeout=10.0, pool_size=16, session=None):
+        if not url:
+            raise ValueError("The http penny-drop adapter needs PENNY_DROP_URL")
+        self.url = url
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            if api_key:
+                session.headers['Authorization'] = f'Bearer {api_key}'
+        self.session = session
+
+    def verify(self, account_number, ifsc, request_id):
+        try:
+            response = self.session.post(
+                self.url,
+                json={'account_number': account_number, 'ifsc': ifsc, 'request_id': request_id},
+                timeout=self.timeout
+            )
+        except requests.Timeout:
+            return PennyDropResult(TIMEOUT, message='The bank did not answer in time')
+        if response.status_code != 200:
+            return PennyDropResult(FAILED, message=f'The bank API returned HTTP {response.status_code}')
+        body = response.json()
+        status = body.get('status')
+        if status not in (VERIFIED, NOT_FOUND, FAILED):
+            return PennyDropResult(FAILED, message='The bank API returned an unknown status')
+        return PennyDropResult(status, name_at_bank=body.get('name_at_bank'),
+                               bank_reference=body.get('bank_reference'), message=body.get('message'))
+
+    def close(self):
+        self.session.close()
+
+
+class PennyDropper:
+    """Runs penny drops through ``adapter``, ``workers`` at a time per process
+
+    The pool is shared by every request this process serves, so a large
+    batch queues behind, not alongside, other batches. ``timeout`` bounds
+    how long one batch waits, queueing included.
+    """
+
+    def __init__(self, adapter, workers=16, timeout=20.0, logger=None):
+        self.adapter = adapter
+        self.timeout = timeout
+        self.logger = logger
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='penny-drop')
+
+    def verify(self, checks):
+        """PennyDropResults for (account_number, ifsc) pairs, in the same order"""
+        request_ids = [f'pd_{secrets.token_hex(12)}' for _ in checks]
+        futures = [self._executor.submit(self._verify, account_number, ifsc, request_id)
+                   for (account_number, ifsc), request_id in zip(checks, request_ids)]
+        done, _ = wait(futures, timeout=self.timeout)
+
+        results = []
+        for future, request_id in zip(futures, request_ids):
+            if future in done:
+                result = future.result()
+            else:
+                # Not started yet: drop it. Running: it finishes unobserved
+                future.cancel()
+                result = PennyDropResult(TIMEOUT, message='No answer before the deadline')
+            result.request_id = request_id
+            results.append(result)
+        return results
+
+    def _verify(self, account_number, ifsc, request_id):
+        try:
+            return self.adapter.verify(account_number, ifsc, request_id)
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error(f"Penny drop error ({self.adapter.name}): {e}")
+            return PennyDropResult(FAILED, message='The bank could not be reached')
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.adapter.close()
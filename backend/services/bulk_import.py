@@ -0,0 +1,355 @@
+"""
+Bulk user import
+
+Loads CSV or NDJSON uploads into ``users`` as a background job. The upload is
+spooled to disk and parsed as a stream, rows are validated with the same
+helpers as the API (utils.py), passwords are bcrypt-hashed on a dedicated
+process pool one batch ahead of loading, and each batch is COPYed into a
+temporary staging table and merged with INSERT ... ON CONFLICT DO NOTHING.
+SQLite has no COPY; there the staging table is filled with executemany.
+
+Each job lives in its own directory under ``directory``: the upload,
+``status.json`` and ``errors.csv`` (line, email, error), so any worker
+process on the host can report on a job another worker is running.
+"""
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from services.password_hasher import hash_passwords
+from utils import sanitize_string, validate_email, validate_password, validate_phone
+
+FORMATS = ('csv', 'ndjson')
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+_BCRYPT_HASH = re.compile(r'^\$2[aby]\$\d\d\$[./A-Za-z0-9]{53}$')
+
+# Column widths from the users table; COPY rejects a whole batch on overflow
+MAX_LENGTHS = {'email': 255, 'full_name': 255, 'company_name': 255, 'phone': 20}
+
+STAGING_TABLE = """
+    CREATE TEMP TABLE IF NOT EXISTS import_users_staging (
+        line INTEGER NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        company_name VARCHAR(255),
+        phone VARCHAR(20)
+    )
+"""
+
+STAGING_COLUMNS = ('line', 'email', 'password_hash', 'full_name', 'company_name', 'phone')
+
+COPY_STAGING = f"COPY import_users_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+
+INSERT_STAGING = f"INSERT INTO import_users_staging VALUES ({', '.join(['?'] * len(STAGING_COLUMNS))})"
+
+# WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+MERGE_STAGED_USERS = """
+    INSERT INTO users (email, password_hash, full_name, company_name, phone)
+    SELECT email, password_hash, full_name, company_name, phone
+    FROM import_users_staging
+    WHERE true
+    ORDER BY line
+    ON CONFLICT (email) DO NOTHING
+    RETURNING email
+"""
+
+
+class ImportFormatError(Exception):
+    """The upload cannot be parsed at all (bad header, unknown format)"""
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+
+def read_rows(stream, fmt):
+    """Yield (line, row dict or None, error) from a binary stream"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='' if fmt == 'csv' else None)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            return
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+        missing = {'email', 'full_name'} - set(reader.fieldnames)
+        if missing or not {'password', 'password_hash'} & set(reader.fieldnames):
+            raise ImportFormatError(
+                "CSV header must include email, full_name and password or password_hash"
+            )
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, 'Too many columns'
+            else:
+                yield reader.line_num, row, None
+    elif fmt == 'ndjson':
+        for line, raw in enumerate(text, 1):
+            if not raw.strip():
+                continue
+            try:
+                row = json.loads(raw)
+            except ValueError:
+                yield line, None, 'Invalid JSON'
+                continue
+            if not isinstance(row, dict):
+                yield line, None, 'Each line must be a JSON object'
+                continue
+            yield line, row, None
+    else:
+        raise ImportFormatError(f"Unsupported format: {fmt}")
+
+
+def validate_row(row):
+    """Return (record, None) for an importable row, else (None, message)
+
+    ``record`` holds email, full_name, company_name, phone and either
+    password (to be hashed) or password_hash (stored as given).
+    """
+    values = {}
+    for field in ('email', 'full_name', 'company_name', 'phone', 'password', 'password_hash'):
+        value = row.get(field)
+        if value is not None and not isinstance(value, str):
+            return None, f'{field} must be a string'
+        if value and '\x00' in value:
+            return None, f'{field} contains a NUL character'
+        values[field] = value
+
+    email = sanitize_string(values['email']).lower()
+    full_name = sanitize_string(values['full_name'])
+    record = {
+        'email': email,
+        'full_name': full_name,
+        'company_name': sanitize_string(values['company_name']),
+        'phone': sanitize_string(values['phone'])
+    }
+    if not email:
+        return None, 'email is required'
+    if not full_name:
+        return None, 'full_name is required'
+    if not validate_email(email):
+        return None, 'Invalid email format'
+    if record['phone'] and not validate_phone(record['phone']):
+        return None, 'Invalid phone number'
+    for field, limit in MAX_LENGTHS.items():
+        if len(record[field]) > limit:
+            return None, f'{field} is longer than {limit} characters'
+
+    password_hash = sanitize_string(values['password_hash'])
+    if password_hash:
+        if not _BCRYPT_HASH.match(password_hash):
+            return None, 'password_hash is not a bcrypt hash'
+        record['password_hash'] = password_hash
+    else:
+        password = values['password'] or ''
+        valid, message = validate_password(password)
+        if not valid:
+            return None, message
+        record['password'] = password
+    return record, None
+
+
+class BulkImporter:
+    """Starts import jobs and reports on them"""
+
+    def __init__(self, pool, directory, rounds=12, prefix=b'2b', hash_workers=None,
+                 batch_size=2000, logger=None):
+        self.pool = pool
+        self.directory = directory
+        self.rounds = rounds
+        self.prefix = prefix
+        # 0 hashes on the job thread
+        self.hash_workers = (os.cpu_count() or 1) if hash_workers is None else hash_workers
+        self.batch_size = batch_size
+        self.logger = logger
+
+    # ------------------------------------------------------------------
+    # Job files
+    # ------------------------------------------------------------------
+    def _job_dir(self, job_id):
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        path = os.path.join(self.directory, job_id)
+        return path if os.path.isdir(path) else None
+
+    def create_job(self, fmt):
+        """Reserve a job; returns (job_id, path to write the upload to)"""
+        if fmt not in FORMATS:
+            raise ImportFormatError(f"Unsupported format: {fmt}")
+        job_id = uuid.uuid4().hex
+        path = os.path.join(self.directory, job_id)
+        os.makedirs(path)
+        return job_id, os.path.join(path, f'upload.{fmt}')
+
+    def _write_status(self, job_id, status):
+        path = os.path.join(self.directory, job_id, 'status.json')
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(status, f)
+        os.replace(tmp, path)
+
+    def status(self, job_id):
+        """The job's status dict, or None for an unknown job"""
+        path = self._job_dir(job_id)
+        if path is None:
+            return None
+        try:
+            with open(os.path.join(path, 'status.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'job_id': job_id, 'state': 'uploading'}
+
+    def report_path(self, job_id):
+        """Path of the job's errors.csv, or None"""
+        path = self._job_dir(job_id)
+        if path is None:
+            return None
+        report = os.path.join(path, 'errors.csv')
+        return report if os.path.exists(report) else None
+
+    # ------------------------------------------------------------------
+    # Running
+    # ------------------------------------------------------------------
+    def start(self, job_id, fmt):
+        """Run the job on a background thread of this process"""
+        status = {
+            'job_id': job_id, 'format': fmt, 'state': 'queued', 'pid': os.getpid(),
+            'created_at': _now(), 'started_at': None, 'finished_at': None,
+            'rows_read': 0, 'imported': 0, 'rejected': 0, 'rows_per_second': None,
+            'error': None
+        }
+        self._write_status(job_id, status)
+        thread = threading.Thread(target=self.run, args=(job_id, fmt, status),
+                                  name=f'import-{job_id[:8]}', daemon=True)
+        thread.start()
+        return status
+
+    def run(self, job_id, fmt, status):
+        job_dir = os.path.join(self.directory, job_id)
+        status.update(state='running', started_at=_now())
+        self._write_status(job_id, status)
+        started = time.monotonic()
+        executor = None
+        pending = None
+
+        def flush(batch):
+            nonlocal executor, pending
+            if executor is None and self.hash_workers and any('password' in r for r in batch):
+                executor = self._executor()
+            # Hash this batch while the previous one loads
+            hashed = self._hash(batch, executor)
+            if pending is not None:
+                self._load(*pending, report, status, started, job_id)
+            pending = (batch, hashed)
+
+        try:
+            with open(os.path.join(job_dir, f'upload.{fmt}'), 'rb') as upload, \
+                    open(os.path.join(job_dir, 'errors.csv'), 'w', newline='') as report_file:
+                report = csv.writer(report_file)
+                report.writerow(('line', 'email', 'error'))
+
+                seen = {}
+                batch = []
+                for line, row, error in read_rows(upload, fmt):
+                    status['rows_read'] += 1
+                    record = None
+                    if error is None:
+                        record, error = validate_row(row)
+                    if record is not None:
+                        first = seen.setdefault(record['email'], line)
+                        if first != line:
+                            record, error = None, f'Duplicate email in upload (first on line {first})'
+                    if record is None:
+                        email = row.get('email') if isinstance(row, dict) else None
+                        report.writerow((line, email if isinstance(email, str) else '', error))
+                        status['rejected'] += 1
+                        continue
+
+                    record['line'] = line
+                    batch.append(record)
+                    if len(batch) >= self.batch_size:
+                        flush(batch)
+                        batch = []
+
+                if batch:
+                    flush(batch)
+                if pending is not None:
+                    self._load(*pending, report, status, started, job_id)
+
+            status['state'] = 'completed'
+        except Exception as e:
+            status.update(state='failed', error=str(e))
+            if self.logger is not None:
+                self.logger.error(f"Import {job_id} failed: {e}")
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+            elapsed = time.monotonic() - started
+            status['finished_at'] = _now()
+            status['rows_per_second'] = round(status['rows_read'] / elapsed, 1) if elapsed else None
+            self._write_status(job_id, status)
+            try:
+                os.remove(os.path.join(job_dir, f'upload.{fmt}'))
+            except OSError:
+                pass
+
+    def _executor(self):
+        # Separate from PasswordHasher's pool so a big import never queues
+        # ahead of interactive logins
+        return ProcessPoolExecutor(max_workers=self.hash_workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def _hash(self, batch, executor):
+        """Start hashing the batch's plain passwords; returns an iterator of hashes"""
+        passwords = [record['password'] for record in batch if 'password' in record]
+        if not passwords:
+            return iter(())
+        return hash_passwords(passwords, self.rounds, self.prefix, executor=executor)
+
+    def _load(self, batch, hashed, report, status, started, job_id):
+        """Stage one batch and merge it into users; duplicates go to the report"""
+        rows = []
+        for record in batch:
+            password_hash = record['password_hash'] if 'password_hash' in record else next(hashed)
+            rows.append((record['line'], record['email'], password_hash,
+                         record['full_name'], record['company_name'], record['phone']))
+
+        conn = self.pool.getconn()
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(STAGING_TABLE)
+                cursor.execute("DELETE FROM import_users_staging")
+                if conn.dialect == 'sqlite':
+                    cursor.executemany(INSERT_STAGING, rows)
+                else:
+                    buffer = io.StringIO()
+                    csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(rows)
+                    buffer.seek(0)
+                    cursor.copy_expert(COPY_STAGING, buffer)
+                cursor.execute(MERGE_STAGED_USERS)
+                inserted = {row[0] for row in cursor.fetchall()}
+                cursor.execute("DELETE FROM import_users_staging")
+                conn.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        for record in batch:
+            if record['email'] not in inserted:
+                report.writerow((record['line'], record['email'], 'Email already registered'))
+        status['imported'] += len(inserted)
+        status['rejected'] += len(batch) - len(inserted)
+        status['rows_per_second'] = round(status['rows_read'] / max(time.monotonic() - started, 1e-9), 1)
+        self._write_status(job_id, status)
@@ -0,0 +1,397 @@
+"""
+PostgreSQL connection pool
+
+Keeps a bounded set of psycopg2 connections open per worker process so
+request handlers do not pay the TCP and authentication handshake on every
+call. Handlers keep using ``conn.close()``; on a pooled connection that
+returns it to the pool instead of closing the socket.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class TimedCursorMixin:
+    """Reports the duration of every execute to query observers
+
+    Shared by the psycopg2 and sqlite3 cursor classes.
+    """
+
+    observers = ()
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            if vars is None:
+                return super().execute(query)
+            return super().execute(query, vars)
+        finally:
+            self._notify(query, vars, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._notify(query, None, time.perf_counter() - start)
+
+    def _notify(self, query, vars, duration):
+        for observer in self.observers:
+            try:
+                observer(self, query, vars, duration)
+            except Exception:
+                pass
+
+
+class TimedCursor(TimedCursorMixin, extensions.cursor):
+    """psycopg2 cursor that reports the duration of every execute to query observers"""
+
+
+class PooledConnection:
+    """Proxy around a psycopg2 connection that returns it to the pool on close()"""
+
+    __slots__ = ('_pool', '_raw', 'pid', 'created_at', 'last_used', 'closed_by_pool', 'prepared')
+
+    dialect = 'postgresql'
+
+    def __init__(self, pool, raw, prepare_statements=True):
+        self._pool = pool
+        self._raw = raw
+        self.pid = os.getpid()
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.closed_by_pool = True
+        # Names of server-side prepared statements on this session; they
+        # survive checkouts because reset() runs RESET ALL, not DISCARD ALL
+        self.prepared = set() if prepare_statements else None
+
+    @property
+    def raw(self):
+        """The underlying psycopg2 connection"""
+        return self._raw
+
+    @property
+    def closed(self):
+        return self.closed_by_pool or self._raw.closed
+
+    def cursor(self, *args, **kwargs):
+        """Create a cursor; defaults to a TimedCursor wired to the pool's observers"""
+        if 'cursor_factory' not in kwargs and self._pool.query_observers:
+            kwargs['cursor_factory'] = TimedCursor
+        cursor = self._raw.cursor(*args, **kwargs)
+        if isinstance(cursor, TimedCursor):
+            cursor.observers = self._pool.query_observers
+        return cursor
+
+    def execute_statement(self, cursor, statement, params=()):
+        """Run a repository Statement, as PREPARE-once/EXECUTE when enabled"""
+        if self.prepared is None:
+            cursor.execute(statement.sql, params)
+            return cursor
+
+        if statement.name not in self.prepared:
+            try:
+                cursor.execute(statement.prepare_sql)
+            except errors.DuplicatePreparedStatement:
+                # Already on the server; the transaction is aborted, so let
+                # the caller fail this once and reuse the statement next time
+                self.prepared.add(statement.name)
+                raise
+            self.prepared.add(statement.name)
+
+        try:
+            cursor.execute(statement.execute_sql, params)
+        except errors.InvalidSqlStatementName:
+            # The session lost its prepared statements; re-prepare next time
+            self.prepared.clear()
+            raise
+        return cursor
+
+    def close(self):
+        """Return the connection to the pool (safe to call more than once)"""
+        if not self.closed_by_pool:
+            self._pool.putconn(self)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class ConnectionPool:
+    """Thread-safe, fork-aware pool of PostgreSQL connections"""
+
+    dialect = 'postgresql'
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, timeout=5.0,
+                 max_lifetime=1800.0, idle_timeout=300.0, ping_after=30.0,
+                 prepare_statements=True, logger=None):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+
+        self.connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+        self.prepare_statements = prepare_statements
+        self.logger = logger
+        self.query_observers = []
+
+        self._cond = threading.Condition()
+        self._pid = None
+        self._inherited = []
+        self._reset_state()
+
+    def _reset_state(self):
+        """Forget all connections (used on first use and after a fork)"""
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._created = 0
+        self._retired = 0
+
+    def _ensure_process(self):
+        """Reset the pool in a freshly forked worker (call with the lock held)
+
+        Connections opened by the parent share its sockets, so the child must
+        never use or close them. They are parked in ``_inherited`` so garbage
+        collection does not send a terminate message on the parent's session.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return False
+        if self._pid is not None:
+            self._inherited.extend(self._idle)
+        self._pid = pid
+        self._reset_state()
+        return True
+
+    def add_query_observer(self, callback):
+        """Register callback(cursor, sql, params, seconds) run after every execute"""
+        self.query_observers.append(callback)
+
+    # ------------------------------------------------------------------
+    # Connection lifecycle
+    # ------------------------------------------------------------------
+    def _connect(self):
+        raw = psycopg2.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return PooledConnection(self, raw, self.prepare_statements)
+
+    def unpooled(self):
+        """A separate autocommit connection the caller owns, e.g. to LISTEN on"""
+        raw = psycopg2.connect(**self.connect_kwargs)
+        raw.autocommit = True
+        return raw
+
+    def _discard(self, conn):
+        """Close a connection that is leaving the pool for good"""
+        conn.closed_by_pool = True
+        try:
+            if not conn.raw.closed:
+                conn.raw.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, conn, now):
+        return self.max_lifetime and now - conn.created_at >= self.max_lifetime
+
+    def _is_alive(self, conn, now):
+        """Cheap liveness check, with a round trip only for long-idle connections"""
+        raw = conn.raw
+        if raw.closed:
+            return False
+        if raw.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if self.ping_after is not None and now - conn.last_used >= self.ping_after:
+            try:
+                with raw.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                raw.rollback()
+            except Exception:
+                return False
+        return True
+
+    def prefill(self):
+        """Open connections until the pool holds at least min_size"""
+        while True:
+            with self._cond:
+                self._ensure_process()
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self._release_to_idle(conn)
+
+    def getconn(self, timeout=None):
+        """Check out a connection, waiting up to ``timeout`` seconds"""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+
+        with self._cond:
+            needs_prefill = self._ensure_process() and self.min_size > 0
+
+        if needs_prefill:
+            try:
+                self.prefill()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Connection pool prefill error: {e}")
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available within {timeout:.1f}s")
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._checkouts += 1
+            wait = time.monotonic() - start
+            self._wait_total += wait
+            if wait > self._wait_max:
+                self._wait_max = wait
+
+        try:
+            now = time.monotonic()
+            if conn is not None and (self._is_expired(conn, now) or not self._is_alive(conn, now)):
+                self._discard(conn)
+                with self._cond:
+                    self._retired += 1
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        conn.closed_by_pool = False
+        conn.last_used = time.monotonic()
+        return conn
+
+    def putconn(self, conn):
+        """Reset a connection and return it to the pool"""
+        if conn.closed_by_pool:
+            return
+        conn.closed_by_pool = True
+
+        if conn.pid != os.getpid():
+            # Checked out before a fork; the socket belongs to the parent
+            with self._cond:
+                self._inherited.append(conn)
+            return
+
+        healthy = not conn.raw.closed
+        if healthy:
+            try:
+                # Rolls back any open transaction and runs RESET ALL, restoring
+                # autocommit/isolation defaults in a single round trip.
+                conn.raw.reset()
+            except Exception:
+                healthy = False
+
+        now = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+        if not healthy or self._is_expired(conn, now):
+            self._discard(conn)
+            with self._cond:
+                self._size -= 1
+                self._retired += 1
+                self._cond.notify()
+            return
+
+        conn.last_used = now
+        self._release_to_idle(conn)
+
+    def _release_to_idle(self, conn):
+        conn.closed_by_pool = True
+        stale = []
+        with self._cond:
+            self._idle.append(conn)
+            # Trim connections above min_size that have sat idle too long.
+            # The idle deque is LIFO, so the oldest-used sit at the left end.
+            if self.idle_timeout:
+                now = time.monotonic()
+                while (self._size > self.min_size and self._idle
+                       and now - self._idle[0].last_used >= self.idle_timeout):
+                    stale.append(self._idle.popleft())
+                    self._size -= 1
+                    self._retired += 1
+            self._cond.notify()
+        for old in stale:
+            self._discard(old)
+
+    def closeall(self):
+        """Close every idle connection owned by this process"""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._retired += len(idle)
+        for conn in idle:
+            self._discard(conn)
+
+    def usage(self):
+        """(in_use, idle) connection counts for this process"""
+        with self._cond:
+            return self._in_use, len(self._idle)
+
+    def stats(self):
+        """Snapshot of pool usage for sizing workers against the database"""
+        with self._cond:
+            checkouts = self._checkouts
+            return {
+                'pid': os.getpid(),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'checkouts': checkouts,
+                'waits': self._waits,
+                'timeouts': self._timeouts,
+                'wait_time_total_ms': round(self._wait_total * 1000, 3),
+                'wait_time_max_ms': round(self._wait_max * 1000, 3),
+                'wait_time_avg_ms': round(self._wait_total * 1000 / checkouts, 3) if checkouts else 0.0,
+                'connections_created': self._created,
+                'connections_retired': self._retired
+            }
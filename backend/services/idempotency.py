@@ -0,0 +1,235 @@
+"""
+Idempotency-Key store
+
+Clients retry POST/PUT requests on timeouts. With an ``Idempotency-Key``
+header, the first request runs and its response is recorded; repeats get
+that response back without redoing the work (no second bcrypt hash, no
+second insert).
+
+Records live in the idempotency_keys table, so every worker sees them, and
+completed responses are also kept in a per-worker LRU, so a repeat usually
+costs no query at all. The first request claims the key's row (INSERT ...
+ON CONFLICT DO NOTHING) with a short lock. A concurrent duplicate waits for
+the result instead of racing it: on an in-process event when the owner is
+in the same worker, by polling the row otherwise. A request whose owner
+died is taken over once the lock lapses, and 5xx responses are not
+recorded, so the client can retry those for real.
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from services.repository import utcnow
+
+# begin() outcomes
+OWNER = 'owner'           # run the request, then complete() or abandon()
+REPLAY = 'replay'         # return the stored response
+MISMATCH = 'mismatch'     # the key was used for a different request body
+IN_PROGRESS = 'in_progress'  # still running elsewhere after the wait
+
+
+class StoredResponse:
+    """A recorded response, as replayed to duplicates"""
+    __slots__ = ('fingerprint', 'status', 'body', 'content_type', 'expires_at')
+
+    def __init__(self, fingerprint, status, body, content_type, expires_at):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+        self.expires_at = expires_at    # naive UTC
+
+
+class IdempotencyStore:
+    """Idempotency-Key records over ``repository`` (an IdempotencyRepository)
+
+    ``lock_timeout`` bounds how long a claim stays valid without a result,
+    so keep it above the slowest handler. ``wait_timeout`` is how long a
+    duplicate waits for the first request before answering "in progress".
+    """
+
+    def __init__(self, repository, ttl=86400, lock_timeout=30.0, wait_timeout=10.0, max_entries=10000,
+                 poll_interval=0.05, purge_interval=300.0, logger=None):
+        self.repository = repository
+        self.ttl = timedelta(seconds=ttl)
+        self.lock_timeout = timedelta(seconds=lock_timeout)
+        self.wait_timeout = wait_timeout
+        self.max_entries = max_entries
+        self.poll_interval = poll_interval
+        self.purge_interval = purge_interval
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._responses = OrderedDict()     # key hash -> StoredResponse
+        self._running = {}                  # key hash -> Event, for requests owned by this worker
+        self._next_purge = time.monotonic() + purge_interval
+
+        self._requests = 0
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._executed = 0
+        self._mismatches = 0
+        self._in_progress = 0
+        self._takeovers = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # ------------------------------------------------------------------
+    # Request lifecycle
+    # ------------------------------------------------------------------
+    def begin(self, key_hash, fingerprint):
+        """Return (outcome, StoredResponse or None) for a request carrying a key"""
+        with self._lock:
+            self._requests += 1
+        stored = self._cached(key_hash)
+        if stored is not None:
+            if stored.fingerprint != fingerprint:
+                return self._count_mismatch()
+            with self._lock:
+                self._memory_hits += 1
+            return REPLAY, stored
+
+        self._maybe_purge()
+        started = time.monotonic()
+        waited = False
+        delay = self.poll_interval
+        while True:
+            now = utcnow()
+            if self.repository.claim(key_hash, fingerprint, now, now + self.lock_timeout, now + self.ttl):
+                return self._owned(key_hash, started, waited)
+
+            row = self.repository.load(key_hash)
+            if row is None:
+                continue    # released between our claim and load; claim again
+            if row.expires_at <= now:
+                if self.repository.take_over(key_hash, fingerprint, now, now + self.lock_timeout, now + self.ttl):
+                    return self._owned(key_hash, started, waited)
+                continue
+            if row.fingerprint != fingerprint:
+                return self._count_mismatch()
+            if row.status == 'done':
+                stored = StoredResponse(row.fingerprint, row.response_status, row.response_body,
+                                        row.content_type, row.expires_at)
+                self._remember(key_hash, stored)
+                if waited:
+                    self._record_wait(started)
+                with self._lock:
+                    self._db_hits += 1
+                return REPLAY, stored
+            if row.locked_until <= now:
+                # The owner died or gave up without releasing the key
+                if self.repository.take_over(key_hash, fingerprint, now, now + self.lock_timeout, now + self.ttl):
+                    with self._lock:
+                        self._takeovers += 1
+                    return self._owned(key_hash, started, waited)
+                continue
+
+            remaining = self.wait_timeout - (time.monotonic() - started)
+            if remaining <= 0:
+                self._record_wait(started)
+                with self._lock:
+                    self._in_progress += 1
+                return IN_PROGRESS, None
+            waited = True
+            event = self._running.get(key_hash)
+            if event is not None:
+                event.wait(remaining)
+            else:
+                time.sleep(min(delay, remaining))
+                delay = min(delay * 2, 0.5)
+
+    def complete(self, key_hash, fingerprint, status, body, content_type):
+        """Record the owner's response and wake anyone waiting for it"""
+        try:
+            self.repository.complete(key_hash, status, body, content_type)
+            self._remember(key_hash, StoredResponse(fingerprint, status, body, content_type, utcnow() + self.ttl))
+        finally:
+            self._finish(key_hash)
+
+    def abandon(self, key_hash):
+        """Give the key up without a result (a 5xx or an exception), so a retry runs again"""
+        try:
+            self.repository.release(key_hash)
+        finally:
+            self._finish(key_hash)
+
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    def _owned(self, key_hash, started, waited):
+        with self._lock:
+            self._executed += 1
+            self._running[key_hash] = threading.Event()
+        if waited:
+            self._record_wait(started)
+        return OWNER, None
+
+    def _finish(self, key_hash):
+        with self._lock:
+            event = self._running.pop(key_hash, None)
+        if event is not None:
+            event.set()
+
+    def _count_mismatch(self):
+        with self._lock:
+            self._mismatches += 1
+        return MISMATCH, None
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        with self._lock:
+            self._waits += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+
+    def _cached(self, key_hash):
+        with self._lock:
+            stored = self._responses.get(key_hash)
+            if stored is None:
+                return None
+            if stored.expires_at <= utcnow():
+                del self._responses[key_hash]
+                return None
+            self._responses.move_to_end(key_hash)
+            return stored
+
+    def _remember(self, key_hash, stored):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._responses[key_hash] = stored
+            self._responses.move_to_end(key_hash)
+            while len(self._responses) > self.max_entries:
+                self._responses.popitem(last=False)
+
+    def _maybe_purge(self):
+        """Delete a batch of expired records, at most once per purge_interval per worker"""
+        if time.monotonic() < self._next_purge:
+            return
+        self._next_purge = time.monotonic() + self.purge_interval
+        try:
+            self.repository.purge(utcnow())
+        except Exception as e:
+            if self.logger is not None:
+                self.logger.error(f"Idempotency purge error: {e}")
+
+    def stats(self):
+        with self._lock:
+            hits = self._memory_hits + self._db_hits
+            return {
+                'requests': self._requests,
+                'memory_hits': self._memory_hits,
+                'db_hits': self._db_hits,
+                'hit_rate': round(hits / self._requests, 4) if self._requests else 0.0,
+                'executed': self._executed,
+                'mismatches': self._mismatches,
+                'in_progress_responses': self._in_progress,
+                'takeovers': self._takeovers,
+                'lock_waits': self._waits,
+                'lock_wait_avg_ms': round(self._wait_total / self._waits * 1000, 2) if self._waits else 0.0,
+                'lock_wait_max_ms': round(self._wait_max * 1000, 2),
+                'cached_responses': len(self._responses),
+                'running': len(self._running)
+            }
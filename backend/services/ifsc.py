@@ -0,0 +1,250 @@
+"""
+IFSC directory
+
+Bank branch details by IFSC, read from a compact file that
+build_ifsc_directory.py builds from the RBI's branch list. Each worker
+memory-maps the file read-only. The pages live once in the operating
+system's page cache however many gunicorn workers map them, and a worker
+pays nothing at startup: a lookup faults in only the pages it touches.
+
+The file is an open-addressing hash table kept at most half full. A lookup
+hashes the 11-character IFSC (CRC-32) to a slot and probes linearly, so it
+reads one or two 16-byte slots and one record whatever the directory's
+size, without building any per-branch Python objects in advance.
+
+Layout (little-endian):
+    header   magic, version, slot count, branch count, section offsets/lengths
+    slots    slot count x (11-byte IFSC, flags byte, uint32 record offset);
+             an empty slot's IFSC is all zero bytes
+    banks    UTF-8 lines "<4-letter bank code>\\t<bank name>"
+    records  per branch: uint16 length, then UTF-8 branch, city, district,
+             state and MICR separated by \\x1f
+
+write_directory() writes a new file beside the old one and renames it into
+place. Workers notice the new file within ``reload_interval`` seconds and
+map it; lookups already running finish on the old mapping.
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from services.repository import Row
+from utils import validate_ifsc
+
+MAGIC = b'DAVSIFSC'
+VERSION = 1
+# magic, version, slot count, branches, banks offset/length, records offset/length
+HEADER = struct.Struct('<8sIIIIIII')
+SLOT = struct.Struct('<11sBI')
+RECORD_LENGTH = struct.Struct('<H')
+EMPTY_KEY = bytes(11)
+FIELD_SEPARATOR = '\x1f'
+
+# Payment systems a branch takes part in, one bit each in the slot's flags
+PAYMENT_SYSTEMS = (('upi', 1), ('neft', 2), ('rtgs', 4), ('imps', 8))
+_FLAG_VALUES = tuple(tuple(bool(flags & bit) for _, bit in PAYMENT_SYSTEMS) for flags in range(16))
+
+
+class DirectoryUnavailable(Exception):
+    """The IFSC directory file is missing or not a directory file"""
+
+
+class Branch(Row):
+    """A bank branch from the IFSC directory"""
+    __slots__ = ('ifsc', 'bank_code', 'bank', 'branch', 'city', 'district', 'state', 'micr',
+                 'upi', 'neft', 'rtgs', 'imps')
+
+
+def _slot_index(key, mask):
+    return zlib.crc32(key) & mask
+
+
+class IfscTable:
+    """One mapped directory file; lookups never modify it"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise DirectoryUnavailable(f"{path} is not an IFSC directory")
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        (magic, version, slot_count, self.branches, banks_offset, banks_length,
+         self._records_offset, records_length) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise DirectoryUnavailable(f"{path} is not a version {VERSION} IFSC directory")
+        if (slot_count & (slot_count - 1) or self.branches * 2 > slot_count
+                or HEADER.size + slot_count * SLOT.size > banks_offset
+                or self._records_offset + records_length > len(self._map)):
+            raise DirectoryUnavailable(f"{path} is truncated or corrupt")
+
+        self._mask = slot_count - 1
+        banks = self._map[banks_offset:banks_offset + banks_length].decode('utf-8')
+        self.banks = dict(line.split('\t', 1) for line in banks.splitlines())
+
+    def __len__(self):
+        return self.branches
+
+    def get(self, ifsc):
+        """Branch for an upper-case IFSC, or None"""
+        key = ifsc.encode('ascii', 'replace')
+        if len(key) != len(EMPTY_KEY):
+            return None
+        index = _slot_index(key, self._mask)
+        while True:
+            slot_key, flags, offset = SLOT.unpack_from(self._map, HEADER.size + index * SLOT.size)
+            if slot_key == key:
+                return self._branch(ifsc, flags, offset)
+            if slot_key == EMPTY_KEY:
+                return None
+            index = (index + 1) & self._mask
+
+    def _branch(self, ifsc, flags, offset):
+        start = self._records_offset + offset
+        (length,) = RECORD_LENGTH.unpack_from(self._map, start)
+        start += RECORD_LENGTH.size
+        fields = self._map[start:start + length].decode('utf-8').split(FIELD_SEPARATOR)
+        bank_code = ifsc[:4]
+        return Branch((ifsc, bank_code, self.banks.get(bank_code, ''), *fields, *_FLAG_VALUES[flags & 15]))
+
+
+class IfscDirectory:
+    """Per-process handle on the directory file, remapped when it is rebuilt
+
+    The file is mapped on first use, so a missing file only fails the
+    requests that need it (DirectoryUnavailable).
+    """
+
+    def __init__(self, path, reload_interval=60.0, logger=None):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.logger = logger
+        self._table = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def table(self):
+        """The current IfscTable; hold on to it to answer a whole batch from one file"""
+        table = self._table
+        if table is not None and time.monotonic() < self._checked + self.reload_interval:
+            return table
+        with self._lock:
+            now = time.monotonic()
+            if self._table is not None and now < self._checked + self.reload_interval:
+                return self._table
+            self._checked = now
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                if self._table is None:
+                    raise DirectoryUnavailable(
+                        f"IFSC directory {self.path} not found; build it with build_ifsc_directory.py"
+                    )
+                return self._table
+            identity = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if self._table is None or identity != self._table.identity:
+                try:
+                    self._table = IfscTable(self.path)
+                except DirectoryUnavailable as e:
+                    # Keep answering from the old file until a good one appears
+                    if self._table is None:
+                        raise
+                    if self.logger is not None:
+                        self.logger.error(f"IFSC directory reload failed: {e}")
+                    return self._table
+                if self.logger is not None:
+                    self.logger.info(f"Mapped IFSC directory {self.path}: {len(self._table):,} branches")
+            return self._table
+
+    def lookup(self, ifsc):
+        """Branch for ``ifsc`` (any case, surrounding spaces allowed), or None"""
+        ifsc = (ifsc or '').strip().upper()
+        return self.table().get(ifsc) if validate_ifsc(ifsc) else None
+
+
+# ----------------------------------------------------------------------
+# Building
+# ----------------------------------------------------------------------
+_CSV_TRUE = ('true', 'yes', 'y', '1')
+
+
+def branches_from_csv(reader):
+    """Branch tuples for write_directory from csv.DictReader rows
+
+    Expects the columns of the RBI branch list as commonly exported: IFSC,
+    BANK, BRANCH, CITY (or CENTRE), DISTRICT, STATE and optionally MICR, UPI,
+    NEFT, RTGS and IMPS, in any case. Rows without a valid IFSC are skipped.
+    """
+    for row in reader:
+        row = {(key or '').strip().upper(): (value or '').strip() for key, value in row.items()}
+        ifsc = row.get('IFSC', '').upper()
+        if not validate_ifsc(ifsc):
+            continue
+        flags = 0
+        for name, bit in PAYMENT_SYSTEMS:
+            if row.get(name.upper(), '').lower() in _CSV_TRUE:
+                flags |= bit
+        yield (ifsc, row.get('BANK', ''), row.get('BRANCH', ''), row.get('CITY') or row.get('CENTRE', ''),
+               row.get('DISTRICT', ''), row.get('STATE', ''), row.get('MICR', ''), flags)
+
+
+def write_directory(branches, path):
+    """Write ``branches`` to a directory file at ``path``, replacing it atomically
+
+    ``branches`` yields (ifsc, bank, branch, city, district, state, micr,
+    flags) with upper-case IFSCs; a repeated IFSC keeps its last row.
+    Returns the number of branches written.
+    """
+    entries = {}
+    banks = {}
+    for ifsc, bank, branch, city, district, state, micr, flags in branches:
+        fields = (branch, city, district, state, micr)
+        record = FIELD_SEPARATOR.join(field.replace(FIELD_SEPARATOR, ' ') for field in fields).encode('utf-8')
+        if len(record) > 0xFFFF:
+            raise ValueError(f"{ifsc}: branch details are too long")
+        entries[ifsc] = (flags, record)
+        if bank and not banks.get(ifsc[:4]):
+            banks[ifsc[:4]] = bank.replace('\t', ' ').replace('\n', ' ')
+
+    slot_count = 16
+    while slot_count < len(entries) * 2:
+        slot_count *= 2
+    mask = slot_count - 1
+
+    slots = bytearray(slot_count * SLOT.size)
+    records = bytearray()
+    for ifsc, (flags, record) in entries.items():
+        key = ifsc.encode('ascii')
+        index = _slot_index(key, mask)
+        while slots[index * SLOT.size] != 0:
+            index = (index + 1) & mask
+        SLOT.pack_into(slots, index * SLOT.size, key, flags, len(records))
+        records += RECORD_LENGTH.pack(len(record))
+        records += record
+
+    bank_lines = ''.join(f"{code}\t{name}\n" for code, name in sorted(banks.items())).encode('utf-8')
+    banks_offset = HEADER.size + len(slots)
+    records_offset = banks_offset + len(bank_lines)
+    if records_offset + len(records) > 0xFFFFFFFF:
+        raise ValueError("IFSC directory would exceed 4 GiB")
+    header = HEADER.pack(MAGIC, VERSION, slot_count, len(entries), banks_offset, len(bank_lines),
+                         records_offset, len(records))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    partial = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(partial, 'wb') as f:
+            for part in (header, slots, bank_lines, records):
+                f.write(part)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return len(entries)
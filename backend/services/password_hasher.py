@@ -0,0 +1,275 @@
+"""
+Password hashing service
+
+bcrypt deliberately burns ~250 ms of CPU per call. Running it inline pins a
+request worker for that long, so a burst of logins starves cheap endpoints.
+This service runs hashing and verification in a process pool sized to the
+cores, behind a bounded queue: when the queue is full callers get HasherBusy
+immediately and should answer 503 with Retry-After. The ``*_async`` methods
+share the same pool and bound for handlers running on an event loop.
+
+Workers are spawned, and a spawned process re-imports the script that
+started the parent. Scripts must therefore create the app under their
+``if __name__ == "__main__"`` guard (see run.py), or every hashing process
+boots an app of its own.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from itertools import repeat
+
+import bcrypt as _bcrypt
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing queue is full or a hash did not finish in time"""
+
+    def __init__(self, retry_after, message="Password hashing queue is full"):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _hash_password(password, rounds, prefix):
+    """Worker: return (bcrypt hash, seconds spent hashing)"""
+    start = time.perf_counter()
+    salt = _bcrypt.gensalt(rounds=rounds, prefix=prefix)
+    pw_hash = _bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+    return pw_hash, time.perf_counter() - start
+
+
+def _check_password(pw_hash, password):
+    """Worker: return (match, seconds spent verifying)"""
+    start = time.perf_counter()
+    match = _bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    return match, time.perf_counter() - start
+
+
+def hash_passwords(passwords, rounds, prefix=b'2b', executor=None, chunksize=16):
+    """Hash many passwords, spread over ``executor``'s processes when given
+
+    For bulk jobs, which bring their own executor so they never queue ahead
+    of interactive logins in PasswordHasher's pool. Returns an iterator of
+    hashes in input order; with an executor every hash is submitted up front.
+    """
+    if executor is None:
+        return (_hash_password(password, rounds, prefix)[0] for password in passwords)
+    results = executor.map(_hash_password, passwords, repeat(rounds), repeat(prefix), chunksize=chunksize)
+    return (pw_hash for pw_hash, _ in results)
+
+
+class _OpStats:
+    """Counters for one operation type"""
+
+    __slots__ = ('count', 'compute_total', 'compute_max', 'compute_last', 'wait_total')
+
+    def __init__(self):
+        self.count = 0
+        self.compute_total = 0.0
+        self.compute_max = 0.0
+        self.compute_last = 0.0
+        self.wait_total = 0.0
+
+    def add(self, compute, wait):
+        self.count += 1
+        self.compute_total += compute
+        self.compute_last = compute
+        if compute > self.compute_max:
+            self.compute_max = compute
+        self.wait_total += wait
+
+    def as_dict(self):
+        count = self.count
+        return {
+            'count': count,
+            'compute_avg_ms': round(self.compute_total * 1000 / count, 3) if count else 0.0,
+            'compute_max_ms': round(self.compute_max * 1000, 3),
+            'compute_last_ms': round(self.compute_last * 1000, 3),
+            'queue_wait_avg_ms': round(self.wait_total * 1000 / count, 3) if count else 0.0
+        }
+
+
+class PasswordHasher:
+    """Bounded, process-pool backed bcrypt hashing and verification"""
+
+    def __init__(self, rounds=12, prefix='2b', workers=None, queue_size=32,
+                 timeout=10.0, retry_after=1, start_method='spawn'):
+        self.rounds = rounds
+        self.prefix = prefix.encode('ascii') if isinstance(prefix, str) else prefix
+        # workers=0 hashes inline on the request thread (still bounded)
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max(self.workers, 1) + queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.start_method = start_method
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._pid = None
+        self._pending = 0
+        self._pending_max = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._ops = {'hash': _OpStats(), 'check': _OpStats()}
+        self._observers = []
+
+    def add_observer(self, callback):
+        """Register callback(operation, seconds) called after each hash/check"""
+        self._observers.append(callback)
+
+    def _get_executor(self):
+        with self._lock:
+            pid = os.getpid()
+            if self._executor is None or self._pid != pid:
+                # A pool inherited across fork is unusable; start a fresh one
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method)
+                )
+                self._pid = pid
+            return self._executor
+
+    def _reset_executor(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HasherBusy(self.retry_after)
+        with self._lock:
+            self._pending += 1
+            if self._pending > self._pending_max:
+                self._pending_max = self._pending
+
+    def _release(self, *_):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _submit(self, fn, args):
+        """Queue work on the process pool; returns (executor, future)"""
+        executor = self._get_executor()
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            self._release()
+            self._reset_executor(executor)
+            raise
+        except Exception:
+            self._release()
+            raise
+        # The slot is held until the work really finishes, even if the
+        # caller stops waiting, so the queue bound stays honest.
+        future.add_done_callback(self._release)
+        return executor, future
+
+    def _timed_out(self):
+        with self._lock:
+            self._timeouts += 1
+        return HasherBusy(self.retry_after, "Password hashing timed out")
+
+    def _finish(self, op, start, compute):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._ops[op].add(compute, max(elapsed - compute, 0.0))
+        for callback in self._observers:
+            callback(op, elapsed)
+
+    def _run(self, op, fn, *args):
+        self._acquire()
+        start = time.perf_counter()
+
+        if self.workers == 0:
+            try:
+                result, compute = fn(*args)
+            finally:
+                self._release()
+        else:
+            executor, future = self._submit(fn, args)
+            try:
+                result, compute = future.result(timeout=self.timeout)
+            except FutureTimeout:
+                raise self._timed_out()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                raise
+
+        self._finish(op, start, compute)
+        return result
+
+    async def _run_async(self, op, fn, *args):
+        """_run() for event loops: awaits the pool instead of blocking a thread"""
+        self._acquire()
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+
+        if self.workers == 0:
+            try:
+                result, compute = await loop.run_in_executor(None, fn, *args)
+            finally:
+                self._release()
+        else:
+            executor, future = self._submit(fn, args)
+            try:
+                result, compute = await asyncio.wait_for(
+                    asyncio.wrap_future(future, loop=loop), self.timeout
+                )
+            except asyncio.TimeoutError:
+                raise self._timed_out()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                raise
+
+        self._finish(op, start, compute)
+        return result
+
+    def generate_password_hash(self, password):
+        """Hash a password; returns the bcrypt hash as str"""
+        return self._run('hash', _hash_password, password, self.rounds, self.prefix)
+
+    def check_password_hash(self, pw_hash, password):
+        """Verify a password against a bcrypt hash"""
+        return self._run('check', _check_password, pw_hash, password)
+
+    async def generate_password_hash_async(self, password):
+        """generate_password_hash() for async handlers"""
+        return await self._run_async('hash', _hash_password, password, self.rounds, self.prefix)
+
+    async def check_password_hash_async(self, pw_hash, password):
+        """check_password_hash() for async handlers"""
+        return await self._run_async('check', _check_password, pw_hash, password)
+
+    @property
+    def queue_depth(self):
+        """Hashes currently queued or running"""
+        return self._pending
+
+    def stats(self):
+        """Queue depth, rejections and per-operation timings"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'max_pending': self.max_pending,
+                'queue_depth': self._pending,
+                'queue_depth_max': self._pending_max,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'hash': self._ops['hash'].as_dict(),
+                'check': self._ops['check'].as_dict()
+            }
+
+    def shutdown(self):
+        """Stop the worker processes owned by this process"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None and self._pid == os.getpid():
+            executor.shutdown(wait=False)
@@ -0,0 +1,189 @@
+"""
+Read-through cache for user profiles
+
+/auth/me and /auth/verification-status are polled by the dashboard on every
+page load. Profiles are cached per user with a TTL and LRU eviction behind a
+pluggable backend: in-process by default, or Redis to share entries (and,
+more importantly, invalidations) across gunicorn workers.
+
+Stale fills are prevented with versions: a reader takes a version token with
+its cache miss, and its later fill is dropped if a writer invalidated the
+user in between.
+"""
+import datetime
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL (one copy per worker)"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._versions = OrderedDict()  # key -> invalidation sequence
+        self._seq = 0
+        self._version_floor = 0
+        self._evictions = 0
+
+    def get(self, key):
+        """Return (value or None, version token)"""
+        now = time.monotonic()
+        with self._lock:
+            token = self._seq
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, token
+            if entry[0] <= now:
+                del self._entries[key]
+                return None, token
+            self._entries.move_to_end(key)
+            return entry[1], token
+
+    def fill(self, key, token, value, ttl):
+        """Store value unless the key was invalidated after ``token`` was taken"""
+        with self._lock:
+            if self._versions.get(key, self._version_floor) > token:
+                return False
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+            return True
+
+    def invalidate(self, key):
+        with self._lock:
+            self._seq += 1
+            self._entries.pop(key, None)
+            self._versions[key] = self._seq
+            self._versions.move_to_end(key)
+            while len(self._versions) > self.max_entries:
+                # Forgetting a version must never let a stale fill through
+                _, seq = self._versions.popitem(last=False)
+                self._version_floor = max(self._version_floor, seq)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'evictions': self._evictions
+            }
+
+
+def _json_default(obj):
+    """Profiles carry datetimes; store them as ISO strings in Redis"""
+    if isinstance(obj, (datetime.datetime, datetime.date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class RedisCacheBackend:
+    """Redis-backed cache shared by all workers (requires the redis package)"""
+
+    # Fill only if the version key still holds the token the reader saw
+    _FILL_SCRIPT = """
+        local current = redis.call('GET', KEYS[2]) or '0'
+        if current ~= ARGV[1] then
+            return 0
+        end
+        redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+        return 1
+    """
+
+    def __init__(self, url, version_ttl=86400):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PROFILE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._fill = self._client.register_script(self._FILL_SCRIPT)
+        self.version_ttl = version_ttl
+
+    @staticmethod
+    def _version_key(key):
+        return f"{key}:v"
+
+    def get(self, key):
+        raw, version = self._client.mget(key, self._version_key(key))
+        token = version.decode('ascii') if version is not None else '0'
+        if raw is None:
+            return None, token
+        return json.loads(raw), token
+
+    def fill(self, key, token, value, ttl):
+        stored = self._fill(
+            keys=[key, self._version_key(key)],
+            args=[token, json.dumps(value, separators=(',', ':'), default=_json_default), max(int(ttl), 1)]
+        )
+        return bool(stored)
+
+    def invalidate(self, key):
+        pipe = self._client.pipeline()
+        pipe.delete(key)
+        pipe.incr(self._version_key(key))
+        pipe.expire(self._version_key(key), self.version_ttl)
+        pipe.execute()
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+class ProfileCache:
+    """Per-user profile cache with hit/miss accounting"""
+
+    def __init__(self, backend, ttl=60, prefix='profile'):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._stale_fills = 0
+        self._invalidations = 0
+
+    def _key(self, user_id):
+        return f"{self.prefix}:{user_id}"
+
+    def get(self, user_id):
+        """Return (profile or None, token); pass the token to fill() on a miss"""
+        profile, token = self.backend.get(self._key(user_id))
+        with self._lock:
+            if profile is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        return profile, token
+
+    def fill(self, user_id, token, profile):
+        """Cache a profile read from the database after a miss (not with ttl 0)"""
+        if self.ttl <= 0:
+            return
+        if not self.backend.fill(self._key(user_id), token, profile, self.ttl):
+            with self._lock:
+                self._stale_fills += 1
+
+    def invalidate(self, user_id):
+        """Drop a user's entry; call after every committed write to the user"""
+        self.backend.invalidate(self._key(user_id))
+        with self._lock:
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            stats = {
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'stale_fills_skipped': self._stale_fills,
+                'invalidations': self._invalidations
+            }
+        stats.update(self.backend.stats())
+        return stats
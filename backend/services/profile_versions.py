@@ -0,0 +1,130 @@
+"""
+Per-user profile version map
+
+Access tokens can carry a snapshot of the user's profile together with the
+``profile_version`` it was taken at. /auth/me trusts that snapshot only while
+the version here still matches; every profile write (deactivation included)
+bumps the version in the database and records it here. An unknown user, never
+recorded or expired, means "ask the database".
+
+The app uses the Redis map, shared by every worker. The in-process map only
+sees its own process's writes, so it suits single-process tools and tests.
+"""
+import threading
+from collections import OrderedDict
+
+
+class MemoryVersionMap:
+    """Bounded in-process map of user id -> latest known profile version"""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._versions = OrderedDict()
+
+    def get(self, user_id):
+        with self._lock:
+            return self._versions.get(user_id)
+
+    def set(self, user_id, version):
+        """Record a version; never moves a user backwards"""
+        with self._lock:
+            current = self._versions.get(user_id)
+            if current is None or version > current:
+                self._versions[user_id] = version
+            self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_entries:
+                self._versions.popitem(last=False)
+
+    def __len__(self):
+        return len(self._versions)
+
+
+class RedisVersionMap:
+    """Version map shared by all workers (requires the redis package)"""
+
+    # SET only if the new version is higher than the stored one
+    _SET_MAX_SCRIPT = """
+        local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+        if tonumber(ARGV[1]) > current then
+            redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+        else
+            redis.call('EXPIRE', KEYS[1], ARGV[2])
+        end
+    """
+
+    def __init__(self, url, ttl=86400 * 2, prefix='profile_version'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("PROFILE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self._set_max = self._client.register_script(self._SET_MAX_SCRIPT)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, user_id):
+        value = self._client.get(f"{self.prefix}:{user_id}")
+        return int(value) if value is not None else None
+
+    def set(self, user_id, version):
+        self._set_max(keys=[f"{self.prefix}:{user_id}"], args=[version, self.ttl])
+
+
+class ProfileVersions:
+    """Version checks for claims-based /auth/me, with fast-path accounting"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._fast = 0
+        self._slow = 0
+
+    def is_current(self, user_id, version):
+        """True if a token snapshot taken at ``version`` is still up to date
+
+        False for a user the map does not know: the caller reads the database.
+        """
+        current = self.backend.get(user_id)
+        fresh = current is not None and current == version
+        with self._lock:
+            if fresh:
+                self._fast += 1
+            else:
+                self._slow += 1
+        return fresh
+
+    def record(self, user_id, version):
+        if version is not None:
+            self.backend.set(user_id, version)
+
+    def stats(self):
+        with self._lock:
+            total = self._fast + self._slow
+            return {
+                'claims_hits': self._fast,
+                'claims_misses': self._slow,
+                'claims_hit_rate': round(self._fast / total, 4) if total else 0.0
+            }
+
+
+def profile_claims(user):
+    """Extra access-token claims for a row carrying the profile columns"""
+    return {
+        'profile': {
+            'email': user.email,
+            'full_name': user.full_name,
+            'company_name': user.company_name,
+            'phone': user.phone,
+            'is_verified': user.is_verified,
+            'created_at': user.created_at.isoformat() if user.created_at else None
+        },
+        'is_active': user.is_active,
+        'verification_status': user.verification_status or 'not_submitted',
+        'profile_version': user.profile_version
+    }
+
+
+def profile_from_claims(user_id, claims):
+    """The /auth/me profile carried by decoded claims"""
+    return dict(claims['profile'], id=user_id, verification_status=claims['verification_status'])
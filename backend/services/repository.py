@@ -0,0 +1,1218 @@
+"""
+Data-access layer
+
+Repositories own every SQL statement the API runs. Statements are defined
+once at import time and reused, rows come back as compact ``__slots__``
+objects instead of one dict per row, and connections are always taken from
+(and returned to) the single connection source passed in by create_app.
+
+On pooled connections statements run as server-side prepared statements:
+PREPARE once per connection, then EXECUTE, so Postgres skips parsing and
+planning on the hot auth queries.
+"""
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timezone
+
+from services.transactions import transaction_json
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when no database connection could be obtained"""
+
+
+class Row:
+    """Compact row built from a DB tuple; subclasses only declare __slots__"""
+
+    __slots__ = ()
+
+    def __init__(self, values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._asdict() == other._asdict()
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class UserRow(Row):
+    """User as returned after registration"""
+    __slots__ = ('id', 'email', 'full_name', 'company_name', 'phone', 'created_at',
+                 'is_active', 'is_verified', 'verification_status', 'profile_version')
+
+
+class CredentialsRow(Row):
+    """Login lookup: profile fields plus the password hash"""
+    __slots__ = ('id', 'email', 'password_hash', 'full_name', 'company_name', 'phone',
+                 'is_active', 'is_verified', 'verification_status', 'created_at',
+                 'profile_version')
+
+
+class ProfileRow(Row):
+    """Everything /auth/me and /auth/verification-status render, plus the
+    fields access-token profile claims are built from"""
+    __slots__ = ('id', 'email', 'full_name', 'company_name', 'phone', 'is_active',
+                 'is_verified', 'verification_status', 'created_at',
+                 'verification_submitted_at', 'profile_version')
+
+
+class TransactionRow(Row):
+    """One ledger entry; amount is in paise"""
+    __slots__ = ('id', 'merchant_id', 'channel', 'kind', 'status', 'amount', 'currency',
+                 'reference', 'counterparty', 'description', 'created_at', 'updated_at')
+
+
+class HourlySummaryRow(Row):
+    """A merchant's transactions of one day, channel and kind, by status (from transaction_hourly)"""
+    __slots__ = ('day', 'channel', 'kind', 'pending_count', 'pending_amount', 'success_count',
+                 'success_amount', 'failed_count', 'failed_amount')
+
+
+class SettlementRow(Row):
+    """A merchant's settlement for one day; amounts are in paise"""
+    __slots__ = ('settlement_date', 'payment_count', 'gross', 'refund_count', 'refunds', 'fees',
+                 'gst', 'net', 'created_at')
+
+
+class SettlementSummaryRow(Row):
+    """A merchant's settlements added up over all days"""
+    __slots__ = ('settlements', 'gross', 'refunds', 'fees', 'gst', 'net')
+
+
+class WebhookEndpointRow(Row):
+    """A merchant's webhook receiver; secret signs every delivery"""
+    __slots__ = ('id', 'merchant_id', 'url', 'secret', 'max_concurrency', 'enabled', 'created_at')
+
+
+class DeadLetterRow(Row):
+    """An outbox entry that ran out of delivery attempts"""
+    __slots__ = ('id', 'endpoint_id', 'merchant_id', 'url', 'event', 'attempts', 'created_at',
+                 'last_status', 'last_error')
+
+
+class ApiKeyRow(Row):
+    """An API key as the dashboard lists it; only the digest of the key is stored"""
+    __slots__ = ('id', 'merchant_id', 'name', 'prefix', 'created_at', 'expires_at', 'revoked_at')
+
+
+class ApiKeyChangeRow(Row):
+    """What a worker's in-memory key index needs to know about one key"""
+    __slots__ = ('id', 'merchant_id', 'key_hash', 'expires_at', 'revoked_at', 'version', 'is_active')
+
+
+class TokenRevocationRow(Row):
+    """One revocation: a token by jti, or (jti None) a user's tokens up to revoked_at"""
+    __slots__ = ('user_id', 'jti', 'revoked_at', 'expires_at', 'version')
+
+
+class IdempotencyRow(Row):
+    """The record of one Idempotency-Key; response fields are set once done"""
+    __slots__ = ('key_hash', 'fingerprint', 'status', 'response_status', 'response_body',
+                 'content_type', 'locked_until', 'expires_at')
+
+
+class VerificationSubmissionRow(Row):
+    """Outcome of a verification submission; id is None if already pending"""
+    __slots__ = ('target_id',) + ProfileRow.__slots__
+
+
+_PLACEHOLDER = re.compile(r'%(%|s)')
+
+# Every Statement by name, so tooling that only sees ``EXECUTE name`` (the
+# slow-query log) can recover the SQL
+_statements = {}
+
+
+def statement_for_name(name):
+    """The Statement registered as ``name``, or None"""
+    return _statements.get(name)
+
+
+class Statement:
+    """A named SQL statement, built once and reused for every execution
+
+    ``sql`` uses psycopg2 ``%s`` placeholders. The PREPARE/EXECUTE forms, the
+    ``$n`` form asyncpg takes and the ``?`` form for SQLite are derived once
+    here so executing a statement costs no string work. ``sqlite`` overrides
+    the SQLite form where the dialects differ: one statement, or a tuple run
+    in order with the same parameters (use ``?1`` to repeat a parameter).
+    """
+
+    __slots__ = ('name', 'sql', 'param_count', 'numbered_sql', 'prepare_sql', 'execute_sql',
+                 'sqlite_steps')
+
+    def __init__(self, name, sql, sqlite=None):
+        self.name = name
+        self.sql = sql
+
+        count = 0
+
+        def numbered(match):
+            nonlocal count
+            if match.group(1) == '%':
+                return '%'
+            count += 1
+            return f'${count}'
+
+        self.numbered_sql = _PLACEHOLDER.sub(numbered, sql)
+        if sqlite is None:
+            sqlite = _PLACEHOLDER.sub(lambda m: '%' if m.group(1) == '%' else '?', sql)
+        self.sqlite_steps = (sqlite,) if isinstance(sqlite, str) else tuple(sqlite)
+        self.param_count = count
+        self.prepare_sql = f"PREPARE {name} AS {self.numbered_sql}"
+        if count:
+            self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * count)})"
+        else:
+            self.execute_sql = f"EXECUTE {name}"
+        _statements[name] = self
+
+    def execute(self, conn, cursor, params=()):
+        """Execute on ``conn``, prepared server-side when the connection supports it"""
+        execute_statement = getattr(conn, 'execute_statement', None)
+        if execute_statement is not None:
+            return execute_statement(cursor, self, params)
+        cursor.execute(self.sql, params)
+        return cursor
+
+
+class Repository:
+    """Base class: borrows a connection per call from ``connect``"""
+
+    def __init__(self, connect):
+        self._connect = connect
+
+    @contextmanager
+    def _cursor(self, commit=False):
+        conn = self._connect()
+        if conn is None:
+            raise DatabaseUnavailable()
+        try:
+            cursor = conn.cursor()
+            try:
+                yield conn, cursor
+                if commit:
+                    conn.commit()
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+    def _fetch_one(self, statement, params, row_type, commit=False):
+        with self._cursor(commit=commit) as (conn, cursor):
+            row = statement.execute(conn, cursor, params).fetchone()
+        return row_type(row) if row is not None else None
+
+    def _fetch_all(self, statement, params, row_type):
+        with self._cursor() as (conn, cursor):
+            rows = statement.execute(conn, cursor, params).fetchall()
+        return [row_type(row) for row in rows]
+
+    def _stream(self, statement, params, row_type, itersize):
+        """Yield lists of up to ``itersize`` rows, one per fetch round trip
+
+        On PostgreSQL the query runs in a named (server-side) cursor, so the
+        result is never materialized on the client; SQLite steps its cursor
+        lazily anyway. The connection is held until the generator finishes
+        or is closed.
+        """
+        conn = self._connect()
+        if conn is None:
+            raise DatabaseUnavailable()
+        try:
+            if getattr(conn, 'dialect', 'postgresql') == 'postgresql':
+                # DECLARE only takes a plain query, not EXECUTE of a prepared one
+                cursor = conn.cursor(name=f"stream_{statement.name}")
+                cursor.itersize = itersize
+                cursor.execute(statement.sql, params)
+            else:
+                cursor = conn.cursor()
+                statement.execute(conn, cursor, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(itersize)
+                    if not rows:
+                        break
+                    yield [row_type(row) for row in rows]
+            finally:
+                cursor.close()
+        finally:
+            conn.close()
+
+
+# ----------------------------------------------------------------------
+# Users
+# ----------------------------------------------------------------------
+EMAIL_EXISTS = Statement('user_email_exists', """
+    SELECT 1 FROM users WHERE email = %s
+""")
+
+CREATE_USER = Statement('user_create', """
+    INSERT INTO users (email, password_hash, full_name, company_name, phone)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id, email, full_name, company_name, phone, created_at,
+              is_active, is_verified, verification_status, profile_version
+""")
+
+GET_CREDENTIALS = Statement('user_credentials', """
+    SELECT id, email, password_hash, full_name, company_name, phone,
+           is_active, is_verified, verification_status, created_at,
+           profile_version
+    FROM users
+    WHERE email = %s
+""")
+
+# Shared by every statement that returns a ProfileRow
+PROFILE_COLUMNS = ('id, email, full_name, company_name, phone, is_active, is_verified, '
+                   'verification_status, created_at, verification_submitted_at, profile_version')
+
+GET_PROFILE = Statement('user_profile', f"""
+    SELECT {PROFILE_COLUMNS}
+    FROM users
+    WHERE id = %s AND is_active = TRUE
+""")
+
+# Bumping profile_version retires the profile claims in the user's tokens
+DEACTIVATE_USER = Statement('user_deactivate', f"""
+    UPDATE users
+    SET is_active = FALSE, updated_at = CURRENT_TIMESTAMP,
+        profile_version = profile_version + 1
+    WHERE id = %s AND is_active = TRUE
+    RETURNING {PROFILE_COLUMNS}
+""")
+
+# Columns update_profile may touch, in the order they appear in SET clauses
+PROFILE_FIELDS = ('full_name', 'company_name', 'phone')
+
+_update_statements = {}
+
+
+def profile_update_statement(fields):
+    """Statement for one combination of updated fields (at most 7 exist)
+
+    Each variant gets a stable name, so it is prepared once per connection.
+    Every update bumps profile_version, which retires profile claims carried
+    by access tokens issued before it.
+    """
+    fields = tuple(field for field in PROFILE_FIELDS if field in fields)
+    statement = _update_statements.get(fields)
+    if statement is None:
+        assignments = ', '.join(f"{field} = %s" for field in fields)
+        statement = Statement(f"user_update_{'_'.join(fields)}", f"""
+            UPDATE users
+            SET {assignments}, updated_at = CURRENT_TIMESTAMP,
+                profile_version = profile_version + 1
+            WHERE id = %s
+            RETURNING {PROFILE_COLUMNS}
+        """)
+        _update_statements[fields] = statement
+    return statement
+
+
+class UserRepository(Repository):
+    """Queries against the users table"""
+
+    def email_exists(self, email):
+        with self._cursor() as (conn, cursor):
+            return EMAIL_EXISTS.execute(conn, cursor, (email,)).fetchone() is not None
+
+    def create(self, email, password_hash, full_name, company_name, phone):
+        """Insert a user; returns None if the email is already registered"""
+        return self._fetch_one(
+            CREATE_USER,
+            (email, password_hash, full_name, company_name, phone),
+            UserRow,
+            commit=True
+        )
+
+    def get_credentials(self, email):
+        return self._fetch_one(GET_CREDENTIALS, (email,), CredentialsRow)
+
+    def get_profile(self, user_id):
+        """Active user's profile, or None"""
+        return self._fetch_one(GET_PROFILE, (user_id,), ProfileRow)
+
+    def update_profile(self, user_id, changes):
+        """Apply ``changes`` (a dict limited to PROFILE_FIELDS); returns the updated user"""
+        fields = [field for field in PROFILE_FIELDS if field in changes]
+        if not fields:
+            raise ValueError("No profile fields to update")
+        params = [changes[field] for field in fields]
+        params.append(user_id)
+        return self._fetch_one(profile_update_statement(fields), params, ProfileRow, commit=True)
+
+    def deactivate(self, user_id):
+        """Deactivate an active user and revoke their API keys in the same
+        transaction; returns the updated user, or None"""
+        with self._cursor(commit=True) as (conn, cursor):
+            row = DEACTIVATE_USER.execute(conn, cursor, (user_id,)).fetchone()
+            if row is None:
+                return None
+            ApiKeyRepository.revoke_merchant_keys(conn, cursor, user_id)
+        return ProfileRow(row)
+
+
+# ----------------------------------------------------------------------
+# Verification
+# ----------------------------------------------------------------------
+# One statement: the CTE reports whether the user exists at all, so a
+# missing user and an earlier submission are told apart without a SELECT.
+SUBMIT_VERIFICATION = Statement('verification_submit', f"""
+    WITH target AS (
+        SELECT id FROM users WHERE id = %s
+    ), updated AS (
+        UPDATE users u
+        SET verification_status = 'pending',
+            verification_submitted_at = CURRENT_TIMESTAMP,
+            updated_at = CURRENT_TIMESTAMP,
+            profile_version = u.profile_version + 1
+        FROM target t
+        WHERE u.id = t.id
+          AND u.verification_status IS DISTINCT FROM 'pending'
+        RETURNING {', '.join('u.' + column for column in PROFILE_COLUMNS.split(', '))}
+    )
+    SELECT t.id AS target_id, up.*
+    FROM target t
+    LEFT JOIN updated up ON up.id = t.id
+""", sqlite=(
+    # No data-modifying CTEs in SQLite: update first, then report the target
+    # row plus, only if that UPDATE changed it (changes()), its profile.
+    """
+    UPDATE users
+    SET verification_status = 'pending',
+        verification_submitted_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP,
+        profile_version = profile_version + 1
+    WHERE id = ?1
+      AND verification_status IS DISTINCT FROM 'pending'
+    """,
+    f"""
+    SELECT t.id AS target_id, up.*
+    FROM (SELECT id FROM users WHERE id = ?1) t
+    LEFT JOIN (
+        SELECT {PROFILE_COLUMNS} FROM users WHERE id = ?1 AND changes() > 0
+    ) up ON up.id = t.id
+    """
+))
+
+
+class VerificationRepository(Repository):
+    """Merchant verification state (stored on users)"""
+
+    def submit(self, user_id):
+        """Mark a user pending; None if the user does not exist"""
+        return self._fetch_one(SUBMIT_VERIFICATION, (user_id,), VerificationSubmissionRow, commit=True)
+
+
+# ----------------------------------------------------------------------
+# Transactions
+# ----------------------------------------------------------------------
+TRANSACTION_COLUMNS = ', '.join(TransactionRow.__slots__)
+
+# Filters history() accepts, in the order their conditions appear
+HISTORY_FILTERS = ('channel', 'kind', 'status', 'since', 'until')
+
+_HISTORY_CONDITIONS = {
+    'channel': 'channel = %s',
+    'kind': 'kind = %s',
+    'status': 'status = %s',
+    'since': 'created_at >= %s',
+    'until': 'created_at < %s',
+}
+
+# Keyset: strictly after the last row of the previous page. The plain
+# created_at bound is redundant but lets Postgres prune newer partitions.
+_HISTORY_KEYSET = 'created_at <= %s AND (created_at, id) < (%s, %s)'
+
+_history_statements = {}
+
+
+def history_statement(filters, keyset):
+    """Statement for one combination of history filters (at most 64 exist)
+
+    Newest first, walking idx_transactions_merchant_created, so every page
+    costs one index descent however deep the client has paged.
+    """
+    filters = tuple(name for name in HISTORY_FILTERS if name in filters)
+    statement = _history_statements.get((filters, keyset))
+    if statement is None:
+        conditions = ['merchant_id = %s'] + [_HISTORY_CONDITIONS[name] for name in filters]
+        if keyset:
+            conditions.append(_HISTORY_KEYSET)
+        name = '_'.join(filters) or 'all'
+        statement = Statement(f"transactions_history_{name}{'_keyset' if keyset else ''}", f"""
+            SELECT {TRANSACTION_COLUMNS}
+            FROM transactions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """)
+        _history_statements[(filters, keyset)] = statement
+    return statement
+
+
+_export_statements = {}
+
+
+def export_statement(filters):
+    """Statement for a full, oldest-first export under ``filters``"""
+    filters = tuple(name for name in HISTORY_FILTERS if name in filters)
+    statement = _export_statements.get(filters)
+    if statement is None:
+        conditions = ['merchant_id = %s'] + [_HISTORY_CONDITIONS[name] for name in filters]
+        statement = Statement(f"transactions_export_{'_'.join(filters) or 'all'}", f"""
+            SELECT {TRANSACTION_COLUMNS}
+            FROM transactions
+            WHERE {' AND '.join(conditions)}
+            ORDER BY created_at, id
+        """)
+        _export_statements[filters] = statement
+    return statement
+
+
+def history_params(merchant_id, limit, before, filters):
+    """Parameters for history_statement(filters, before is not None)"""
+    params = [merchant_id]
+    params.extend(filters[name] for name in HISTORY_FILTERS if name in filters)
+    if before is not None:
+        created_at, id = before
+        params.extend((created_at, created_at, id))
+    params.append(limit)
+    return params
+
+
+# created_at comes from utcnow(), not the database clock: the overview,
+# summary and settlement windows are computed app-side in UTC, and
+# CURRENT_TIMESTAMP is local time on a Postgres server with another TimeZone
+CREATE_TRANSACTION = Statement('transaction_create', f"""
+    INSERT INTO transactions (merchant_id, channel, kind, status, amount, currency,
+                              reference, counterparty, description, created_at, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING {TRANSACTION_COLUMNS}
+""")
+
+# Only pending entries settle, so a repeated status callback changes nothing
+# and announces nothing twice
+SETTLE_TRANSACTION = Statement('transaction_settle', f"""
+    UPDATE transactions
+    SET status = %s, updated_at = %s
+    WHERE id = %s AND merchant_id = %s AND status = 'pending'
+    RETURNING {TRANSACTION_COLUMNS}
+""")
+
+# Adds one write's deltas to its hourly summary row (see schema.py)
+UPSERT_HOURLY_SUMMARY = Statement('transaction_hourly_upsert', """
+    INSERT INTO transaction_hourly (merchant_id, hour, channel, kind, pending_count, pending_amount,
+                                    success_count, success_amount, failed_count, failed_amount)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (merchant_id, hour, channel, kind) DO UPDATE SET
+        pending_count = transaction_hourly.pending_count + excluded.pending_count,
+        pending_amount = transaction_hourly.pending_amount + excluded.pending_amount,
+        success_count = transaction_hourly.success_count + excluded.success_count,
+        success_amount = transaction_hourly.success_amount + excluded.success_amount,
+        failed_count = transaction_hourly.failed_count + excluded.failed_count,
+        failed_amount = transaction_hourly.failed_amount + excluded.failed_amount
+""")
+
+# Position of each status's (count, amount) pair in the upsert's deltas
+_SUMMARY_OFFSETS = {'pending': 0, 'success': 2, 'failed': 4}
+
+
+def summary_params(row, previous_status=None):
+    """UPSERT_HOURLY_SUMMARY parameters moving ``row`` into its status,
+    and out of ``previous_status`` for a state change"""
+    deltas = [0] * 6
+    offset = _SUMMARY_OFFSETS[row.status]
+    deltas[offset] += 1
+    deltas[offset + 1] += row.amount
+    if previous_status is not None:
+        offset = _SUMMARY_OFFSETS[previous_status]
+        deltas[offset] -= 1
+        deltas[offset + 1] -= row.amount
+    hour = row.created_at.replace(minute=0, second=0, microsecond=0)
+    return (row.merchant_id, hour, row.channel, row.kind, *deltas)
+
+
+# Webhook event announcing each ledger change (see the API reference)
+TRANSACTION_EVENTS = {
+    ('payment', 'pending'): 'payment.created',
+    ('payment', 'success'): 'payment.captured',
+    ('payment', 'failed'): 'payment.failed',
+    ('refund', 'pending'): 'refund.created',
+    ('refund', 'success'): 'refund.completed',
+    ('refund', 'failed'): 'refund.failed',
+}
+
+
+class TransactionRepository(Repository):
+    """Queries against the transactions ledger
+
+    Every write also adjusts its transaction_hourly row, and with an
+    ``outbox`` (WebhookRepository) queues its webhook event, in the same
+    database transaction: the summaries and the events change if and only
+    if the ledger does.
+    """
+
+    def __init__(self, connect, outbox=None):
+        super().__init__(connect)
+        self._outbox = outbox
+
+    def _announce(self, conn, cursor, row):
+        if self._outbox is not None:
+            self._outbox.emit(conn, cursor, row.merchant_id, TRANSACTION_EVENTS[row.kind, row.status],
+                              transaction_json(row))
+
+    def create(self, merchant_id, channel, amount, kind='payment', status='pending', currency='INR',
+               reference=None, counterparty=None, description=None):
+        """Add a ledger entry; amount is in paise"""
+        now = utcnow()
+        params = (merchant_id, channel, kind, status, amount, currency, reference, counterparty, description,
+                  now, now)
+        with self._cursor(commit=True) as (conn, cursor):
+            row = TransactionRow(CREATE_TRANSACTION.execute(conn, cursor, params).fetchone())
+            UPSERT_HOURLY_SUMMARY.execute(conn, cursor, summary_params(row))
+            self._announce(conn, cursor, row)
+        return row
+
+    def settle(self, merchant_id, transaction_id, status):
+        """Move a pending entry to success or failed; None if it is not pending"""
+        with self._cursor(commit=True) as (conn, cursor):
+            row = SETTLE_TRANSACTION.execute(conn, cursor, (status, utcnow(), transaction_id, merchant_id)).fetchone()
+            if row is None:
+                return None
+            row = TransactionRow(row)
+            UPSERT_HOURLY_SUMMARY.execute(conn, cursor, summary_params(row, previous_status='pending'))
+            self._announce(conn, cursor, row)
+        return row
+
+    def history(self, merchant_id, limit, before=None, filters=None):
+        """Up to ``limit`` transactions older than ``before`` (created_at, id)
+
+        Returns (rows, has_more); one extra row is read to tell whether
+        another page exists.
+        """
+        filters = filters or {}
+        statement = history_statement(filters, before is not None)
+        rows = self._fetch_all(statement, history_params(merchant_id, limit + 1, before, filters),
+                               TransactionRow)
+        return rows[:limit], len(rows) > limit
+
+    def export(self, merchant_id, filters=None, itersize=2000):
+        """Every matching transaction, oldest first, as a generator of row batches"""
+        filters = filters or {}
+        params = [merchant_id] + [filters[name] for name in HISTORY_FILTERS if name in filters]
+        return self._stream(export_statement(filters), params, TransactionRow, itersize)
+
+
+# ----------------------------------------------------------------------
+# Dashboard summaries
+# ----------------------------------------------------------------------
+# The overview reads at most (days x channels x kinds) grouped rows from
+# the primary key range of one merchant, however many transactions the
+# merchant has
+HOURLY_OVERVIEW = Statement('transaction_hourly_overview', """
+    SELECT CAST(date_trunc('day', hour) AS DATE), channel, kind,
+           CAST(SUM(pending_count) AS BIGINT), CAST(SUM(pending_amount) AS BIGINT),
+           CAST(SUM(success_count) AS BIGINT), CAST(SUM(success_amount) AS BIGINT),
+           CAST(SUM(failed_count) AS BIGINT), CAST(SUM(failed_amount) AS BIGINT)
+    FROM transaction_hourly
+    WHERE merchant_id = %s AND hour >= %s
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+""", sqlite="""
+    SELECT date(hour), channel, kind,
+           SUM(pending_count), SUM(pending_amount), SUM(success_count), SUM(success_amount),
+           SUM(failed_count), SUM(failed_amount)
+    FROM transaction_hourly
+    WHERE merchant_id = ? AND hour >= ?
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+""")
+
+# Keeps ledger writes from adjusting summaries while a range is rebuilt,
+# so none is counted twice or lost; reads are not blocked. Plain SQL:
+# LOCK cannot be PREPAREd
+LOCK_HOURLY_SUMMARIES = "LOCK TABLE transaction_hourly IN SHARE ROW EXCLUSIVE MODE"
+
+DELETE_HOURLY_SUMMARIES = Statement('transaction_hourly_delete', """
+    DELETE FROM transaction_hourly WHERE hour >= %s AND hour < %s
+""")
+
+_REBUILD_HOURLY = """
+    INSERT INTO transaction_hourly (merchant_id, hour, channel, kind, pending_count, pending_amount,
+                                    success_count, success_amount, failed_count, failed_amount)
+    SELECT merchant_id, {hour}, channel, kind,
+           SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status = 'pending' THEN amount ELSE 0 END),
+           SUM(CASE WHEN status = 'success' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status = 'success' THEN amount ELSE 0 END),
+           SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END),
+           SUM(CASE WHEN status = 'failed' THEN amount ELSE 0 END)
+    FROM transactions
+    WHERE created_at >= {param} AND created_at < {param}
+    GROUP BY 1, 2, 3, 4
+"""
+
+REBUILD_HOURLY_SUMMARIES = Statement(
+    'transaction_hourly_rebuild',
+    _REBUILD_HOURLY.format(hour="date_trunc('hour', created_at)", param='%s'),
+    sqlite=_REBUILD_HOURLY.format(hour="strftime('%Y-%m-%d %H:00:00', created_at)", param='?')
+)
+
+LEDGER_BOUNDS = Statement('transaction_ledger_bounds', """
+    SELECT MIN(created_at), MAX(created_at) FROM transactions
+""")
+
+
+def _as_date(value):
+    """SQLite returns date(...) as text"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _as_datetime(value):
+    """SQLite returns MIN/MAX of a TIMESTAMP column as text"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+class SummaryRepository(Repository):
+    """Hourly transaction summaries: the dashboard overview reads them, the
+    rebuild command recomputes them from the ledger"""
+
+    def overview(self, merchant_id, since):
+        """Daily totals per channel and kind from ``since`` (an hour-aligned datetime) on"""
+        rows = self._fetch_all(HOURLY_OVERVIEW, (merchant_id, since), HourlySummaryRow)
+        for row in rows:
+            row.day = _as_date(row.day)
+        return rows
+
+    def rebuild(self, start, end):
+        """Recompute the summaries for [start, end), which must be hour-aligned
+
+        One database transaction: readers see the old rows until it commits.
+        Returns the number of summary rows written.
+        """
+        with self._cursor(commit=True) as (conn, cursor):
+            if getattr(conn, 'dialect', 'postgresql') == 'postgresql':
+                cursor.execute(LOCK_HOURLY_SUMMARIES)
+            DELETE_HOURLY_SUMMARIES.execute(conn, cursor, (start, end))
+            return REBUILD_HOURLY_SUMMARIES.execute(conn, cursor, (start, end)).rowcount
+
+    def ledger_bounds(self):
+        """(first, last) created_at in the ledger, or (None, None) when empty"""
+        with self._cursor() as (conn, cursor):
+            first, last = LEDGER_BOUNDS.execute(conn, cursor).fetchone()
+        return _as_datetime(first), _as_datetime(last)
+
+
+# ----------------------------------------------------------------------
+# Settlements
+# ----------------------------------------------------------------------
+# Written in bulk by the settlement run (services/settlements.py); the API
+# only reads them, newest day first, along the (merchant_id, settlement_date)
+# unique index
+SETTLEMENT_COLUMNS = ', '.join(SettlementRow.__slots__)
+
+LIST_SETTLEMENTS = Statement('settlement_list', f"""
+    SELECT {SETTLEMENT_COLUMNS}
+    FROM settlements
+    WHERE merchant_id = %s
+    ORDER BY settlement_date DESC
+    LIMIT %s
+""")
+
+LIST_SETTLEMENTS_BEFORE = Statement('settlement_list_before', f"""
+    SELECT {SETTLEMENT_COLUMNS}
+    FROM settlements
+    WHERE merchant_id = %s AND settlement_date < %s
+    ORDER BY settlement_date DESC
+    LIMIT %s
+""")
+
+# SUM(bigint) is numeric on PostgreSQL; cast back so both dialects return ints
+SETTLEMENT_SUMMARY = Statement('settlement_summary', """
+    SELECT COUNT(*),
+           CAST(COALESCE(SUM(gross), 0) AS BIGINT),
+           CAST(COALESCE(SUM(refunds), 0) AS BIGINT),
+           CAST(COALESCE(SUM(fees), 0) AS BIGINT),
+           CAST(COALESCE(SUM(gst), 0) AS BIGINT),
+           CAST(COALESCE(SUM(net), 0) AS BIGINT)
+    FROM settlements
+    WHERE merchant_id = %s
+""")
+
+
+class SettlementRepository(Repository):
+    """A merchant's daily settlements"""
+
+    def history(self, merchant_id, limit, before=None):
+        """Up to ``limit`` settlements dated before ``before`` (a date), newest first
+
+        Returns (rows, has_more), reading one extra row like
+        TransactionRepository.history.
+        """
+        if before is None:
+            rows = self._fetch_all(LIST_SETTLEMENTS, (merchant_id, limit + 1), SettlementRow)
+        else:
+            rows = self._fetch_all(LIST_SETTLEMENTS_BEFORE, (merchant_id, before, limit + 1), SettlementRow)
+        return rows[:limit], len(rows) > limit
+
+    def summary(self, merchant_id):
+        return self._fetch_one(SETTLEMENT_SUMMARY, (merchant_id,), SettlementSummaryRow)
+
+
+# ----------------------------------------------------------------------
+# Webhooks
+# ----------------------------------------------------------------------
+WEBHOOK_ENDPOINT_COLUMNS = ', '.join(WebhookEndpointRow.__slots__)
+
+CREATE_WEBHOOK_ENDPOINT = Statement('webhook_endpoint_create', f"""
+    INSERT INTO webhook_endpoints (merchant_id, url, secret, max_concurrency)
+    VALUES (%s, %s, %s, %s)
+    RETURNING {WEBHOOK_ENDPOINT_COLUMNS}
+""")
+
+LIST_WEBHOOK_ENDPOINTS = Statement('webhook_endpoint_list', f"""
+    SELECT {WEBHOOK_ENDPOINT_COLUMNS}
+    FROM webhook_endpoints
+    WHERE merchant_id = %s AND enabled = TRUE
+    ORDER BY id
+""")
+
+DISABLE_WEBHOOK_ENDPOINT = Statement('webhook_endpoint_disable', """
+    UPDATE webhook_endpoints
+    SET enabled = FALSE
+    WHERE id = %s AND merchant_id = %s AND enabled = TRUE
+    RETURNING id
+""")
+
+# One outbox row per enabled endpoint of the merchant. Parameters in a
+# SELECT list have no column to take a type from, hence the casts (which
+# SQLite must not see: CAST AS TIMESTAMP there means NUMERIC).
+_EMIT_WEBHOOK = """
+    INSERT INTO webhook_outbox (endpoint_id, event, payload, created_at, next_attempt_at)
+    SELECT id, {values}
+    FROM webhook_endpoints
+    WHERE {target} AND enabled = TRUE
+    RETURNING id
+"""
+
+_EMIT_VALUES = {
+    'postgresql': 'CAST(%s AS VARCHAR), CAST(%s AS TEXT), CAST(%s AS TIMESTAMP), CAST(%s AS TIMESTAMP)',
+    'sqlite': '?, ?, ?, ?',
+}
+
+EMIT_WEBHOOK = Statement(
+    'webhook_emit',
+    _EMIT_WEBHOOK.format(values=_EMIT_VALUES['postgresql'], target='merchant_id = %s'),
+    sqlite=_EMIT_WEBHOOK.format(values=_EMIT_VALUES['sqlite'], target='merchant_id = ?')
+)
+
+EMIT_WEBHOOK_ENDPOINT = Statement(
+    'webhook_emit_endpoint',
+    _EMIT_WEBHOOK.format(values=_EMIT_VALUES['postgresql'], target='merchant_id = %s AND id = %s'),
+    sqlite=_EMIT_WEBHOOK.format(values=_EMIT_VALUES['sqlite'], target='merchant_id = ? AND id = ?')
+)
+
+LIST_DEAD_LETTERS = Statement('webhook_dead_letters', """
+    SELECT o.id, o.endpoint_id, e.merchant_id, e.url, o.event, o.attempts, o.created_at,
+           o.last_status, o.last_error
+    FROM webhook_outbox o
+    JOIN webhook_endpoints e ON e.id = o.endpoint_id
+    WHERE o.status = 'dead'
+    ORDER BY o.id DESC
+    LIMIT %s
+""")
+
+REQUEUE_DEAD_LETTER = Statement('webhook_requeue', """
+    UPDATE webhook_outbox
+    SET status = 'pending', attempts = 0, next_attempt_at = %s, last_error = NULL
+    WHERE id = %s AND status = 'dead'
+""")
+
+REQUEUE_ENDPOINT_DEAD_LETTERS = Statement('webhook_requeue_endpoint', """
+    UPDATE webhook_outbox
+    SET status = 'pending', attempts = 0, next_attempt_at = %s, last_error = NULL
+    WHERE endpoint_id = %s AND status = 'dead'
+""")
+
+# Delivered rows are purged by the dispatcher, so this stays a small scan
+OUTBOX_COUNTS = Statement('webhook_outbox_counts', """
+    SELECT status, COUNT(*)
+    FROM webhook_outbox
+    GROUP BY status
+""")
+
+# Head of the delivery queue (idx_webhook_outbox_due)
+OUTBOX_HEAD = Statement('webhook_outbox_head', """
+    SELECT next_attempt_at
+    FROM webhook_outbox
+    WHERE status = 'pending'
+    ORDER BY next_attempt_at
+    LIMIT 1
+""")
+
+
+def utcnow():
+    """Naive UTC; outbox times come from the application clock, never the
+    database's, so every dialect and the dispatcher compare like with like"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class WebhookRepository(Repository):
+    """Webhook endpoints and the delivery outbox
+
+    ``dumps`` serializes event payloads (the app's JSON provider). Payloads
+    are stored as sent, so the signature covers exactly what was committed.
+    """
+
+    def __init__(self, connect, dumps):
+        super().__init__(connect)
+        self._dumps = dumps
+
+    def create_endpoint(self, merchant_id, url, secret, max_concurrency):
+        return self._fetch_one(CREATE_WEBHOOK_ENDPOINT, (merchant_id, url, secret, max_concurrency),
+                               WebhookEndpointRow, commit=True)
+
+    def endpoints(self, merchant_id):
+        """The merchant's enabled endpoints"""
+        return self._fetch_all(LIST_WEBHOOK_ENDPOINTS, (merchant_id,), WebhookEndpointRow)
+
+    def disable_endpoint(self, merchant_id, endpoint_id):
+        """Stop deliveries to an endpoint; False if it is not the merchant's"""
+        with self._cursor(commit=True) as (conn, cursor):
+            row = DISABLE_WEBHOOK_ENDPOINT.execute(conn, cursor, (endpoint_id, merchant_id)).fetchone()
+        return row is not None
+
+    def emit(self, conn, cursor, merchant_id, event, data, endpoint_id=None):
+        """Queue ``event`` for the merchant's endpoints on the caller's cursor
+
+        Nothing is committed here: the rows become visible to the dispatcher
+        with the caller's transaction. Returns the outbox ids.
+        """
+        now = utcnow()
+        payload = self._dumps({
+            'id': f"evt_{uuid.uuid4().hex}",
+            'event': event,
+            'timestamp': f"{now.isoformat(timespec='seconds')}Z",
+            'data': data
+        })
+        if endpoint_id is None:
+            params = (event, payload, now, now, merchant_id)
+            statement = EMIT_WEBHOOK
+        else:
+            params = (event, payload, now, now, merchant_id, endpoint_id)
+            statement = EMIT_WEBHOOK_ENDPOINT
+        return [row[0] for row in statement.execute(conn, cursor, params).fetchall()]
+
+    def send_test(self, merchant_id, endpoint_id):
+        """Queue a webhook.test event for one endpoint; None if it is not the merchant's"""
+        with self._cursor(commit=True) as (conn, cursor):
+            ids = self.emit(conn, cursor, merchant_id, 'webhook.test',
+                            {'message': 'Test event from Davspay'}, endpoint_id=endpoint_id)
+        return ids[0] if ids else None
+
+    def dead_letters(self, limit=50):
+        return self._fetch_all(LIST_DEAD_LETTERS, (limit,), DeadLetterRow)
+
+    def requeue(self, ids=(), endpoint_id=None):
+        """Give dead-lettered entries a fresh set of attempts; returns how many"""
+        now = utcnow()
+        with self._cursor(commit=True) as (conn, cursor):
+            count = 0
+            for outbox_id in ids:
+                count += REQUEUE_DEAD_LETTER.execute(conn, cursor, (now, outbox_id)).rowcount
+            if endpoint_id is not None:
+                count += REQUEUE_ENDPOINT_DEAD_LETTERS.execute(conn, cursor, (now, endpoint_id)).rowcount
+        return count
+
+    def outbox_summary(self):
+        """Per-status counts, and how long the most overdue entry has waited"""
+        with self._cursor() as (conn, cursor):
+            counts = OUTBOX_COUNTS.execute(conn, cursor).fetchall()
+            head = OUTBOX_HEAD.execute(conn, cursor).fetchone()
+        summary = {'pending': 0, 'delivered': 0, 'dead': 0}
+        summary.update(counts)
+        overdue = (utcnow() - head[0]).total_seconds() if head is not None else 0.0
+        summary['oldest_due_seconds'] = round(max(overdue, 0.0), 3)
+        return summary
+
+
+# ----------------------------------------------------------------------
+# API keys
+# ----------------------------------------------------------------------
+API_KEY_COLUMNS = ', '.join(ApiKeyRow.__slots__)
+
+# Writers serialize on this lock, so the next version is always MAX + 1 and
+# versions become visible in order: a worker that has seen version n has
+# seen every change before it. Readers (ACCESS SHARE) are not blocked.
+# SQLite already allows one writer at a time. (LOCK cannot be PREPAREd, so
+# this is plain SQL rather than a Statement.)
+LOCK_API_KEYS = "LOCK TABLE api_keys IN SHARE ROW EXCLUSIVE MODE"
+
+_NEXT_API_KEY_VERSION = "(SELECT COALESCE(MAX(version), 0) + 1 FROM api_keys)"
+
+CREATE_API_KEY = Statement('api_key_create', f"""
+    INSERT INTO api_keys (merchant_id, name, prefix, key_hash, created_at, version)
+    VALUES (%s, %s, %s, %s, %s, {_NEXT_API_KEY_VERSION})
+    RETURNING {API_KEY_COLUMNS}
+""")
+
+LIST_API_KEYS = Statement('api_key_list', f"""
+    SELECT {API_KEY_COLUMNS}
+    FROM api_keys
+    WHERE merchant_id = %s AND revoked_at IS NULL AND (expires_at IS NULL OR expires_at > %s)
+    ORDER BY id
+""")
+
+# Rotation retires the current key (not one already on its way out)
+EXPIRE_API_KEY = Statement('api_key_expire', f"""
+    UPDATE api_keys
+    SET expires_at = %s, version = {_NEXT_API_KEY_VERSION}
+    WHERE id = %s AND merchant_id = %s AND revoked_at IS NULL AND expires_at IS NULL
+    RETURNING name
+""")
+
+REVOKE_API_KEY = Statement('api_key_revoke', f"""
+    UPDATE api_keys
+    SET revoked_at = %s, version = {_NEXT_API_KEY_VERSION}
+    WHERE id = %s AND merchant_id = %s AND revoked_at IS NULL
+    RETURNING id
+""")
+
+MERCHANT_API_KEY_IDS = Statement('api_key_merchant_ids', """
+    SELECT id FROM api_keys WHERE merchant_id = %s AND revoked_at IS NULL ORDER BY id
+""")
+
+API_KEY_CHANGES = Statement('api_key_changes', """
+    SELECT k.id, k.merchant_id, k.key_hash, k.expires_at, k.revoked_at, k.version, u.is_active
+    FROM api_keys k
+    JOIN users u ON u.id = k.merchant_id
+    WHERE k.version > %s
+    ORDER BY k.version
+""")
+
+# Wakes every worker's index on commit; without it they catch up on their
+# next poll
+NOTIFY_API_KEYS = Statement('api_key_notify', "SELECT pg_notify('api_keys', '')", sqlite=())
+
+
+class ApiKeyRepository(Repository):
+    """API key issuance, rotation and revocation, plus the change feed the
+    in-memory key index (services/api_keys.py) follows
+
+    Callers pass the key's display prefix and SHA-256 digest; the key itself
+    never reaches the database.
+    """
+
+    def keys(self, merchant_id):
+        """The merchant's usable keys, including rotated ones still in their grace period"""
+        return self._fetch_all(LIST_API_KEYS, (merchant_id, utcnow()), ApiKeyRow)
+
+    def create(self, merchant_id, name, prefix, key_hash):
+        with self._cursor(commit=True) as (conn, cursor):
+            self._lock(conn, cursor)
+            row = ApiKeyRow(CREATE_API_KEY.execute(
+                conn, cursor, (merchant_id, name, prefix, key_hash, utcnow())).fetchone())
+            self._notify(conn, cursor)
+        return row
+
+    def rotate(self, merchant_id, key_id, prefix, key_hash, grace):
+        """Replace a key; the old one keeps working for ``grace`` (a timedelta)
+
+        Returns the new key's row, or None if ``key_id`` is not one of the
+        merchant's current keys.
+        """
+        now = utcnow()
+        with self._cursor(commit=True) as (conn, cursor):
+            self._lock(conn, cursor)
+            old = EXPIRE_API_KEY.execute(conn, cursor, (now + grace, key_id, merchant_id)).fetchone()
+            if old is None:
+                return None
+            row = ApiKeyRow(CREATE_API_KEY.execute(
+                conn, cursor, (merchant_id, old[0], prefix, key_hash, now)).fetchone())
+            self._notify(conn, cursor)
+        return row
+
+    def revoke(self, merchant_id, key_id):
+        """Disable a key at once; False if it is not the merchant's"""
+        with self._cursor(commit=True) as (conn, cursor):
+            self._lock(conn, cursor)
+            row = REVOKE_API_KEY.execute(conn, cursor, (utcnow(), key_id, merchant_id)).fetchone()
+            if row is not None:
+                self._notify(conn, cursor)
+        return row is not None
+
+    @classmethod
+    def revoke_merchant_keys(cls, conn, cursor, merchant_id):
+        """Revoke every key of a merchant on the caller's cursor (user deactivation)
+
+        Nothing is committed here. Each key takes its own version, and the
+        NOTIFY goes out with the caller's commit. Returns how many keys were
+        revoked.
+        """
+        cls._lock(conn, cursor)
+        ids = [row[0] for row in MERCHANT_API_KEY_IDS.execute(conn, cursor, (merchant_id,)).fetchall()]
+        now = utcnow()
+        for key_id in ids:
+            REVOKE_API_KEY.execute(conn, cursor, (now, key_id, merchant_id)).fetchone()
+        if ids:
+            cls._notify(conn, cursor)
+        return len(ids)
+
+    def changes(self, since):
+        """Every key written after version ``since``, oldest change first"""
+        return self._fetch_all(API_KEY_CHANGES, (since,), ApiKeyChangeRow)
+
+    @staticmethod
+    def _lock(conn, cursor):
+        if getattr(conn, 'dialect', 'postgresql') == 'postgresql':
+            cursor.execute(LOCK_API_KEYS)
+
+    @staticmethod
+    def _notify(conn, cursor):
+        NOTIFY_API_KEYS.execute(conn, cursor)
+
+
+# ----------------------------------------------------------------------
+# Token revocations
+# ----------------------------------------------------------------------
+# Versioned like api_keys: writers take this lock so versions commit in order
+LOCK_TOKEN_REVOCATIONS = "LOCK TABLE token_revocations IN SHARE ROW EXCLUSIVE MODE"
+
+REVOKE_TOKENS = Statement('token_revoke', """
+    INSERT INTO token_revocations (user_id, jti, revoked_at, expires_at, version)
+    VALUES (%s, %s, %s, %s, (SELECT COALESCE(MAX(version), 0) + 1 FROM token_revocations))
+""")
+
+# Expired rows cover only tokens that are rejected as expired anyway. The
+# newest row stays, so the next version never goes back below what workers
+# have already seen.
+PURGE_TOKEN_REVOCATIONS = Statement('token_revocation_purge', """
+    DELETE FROM token_revocations
+    WHERE expires_at <= %s AND version < (SELECT MAX(version) FROM token_revocations)
+""")
+
+TOKEN_REVOCATION_CHANGES = Statement('token_revocation_changes', """
+    SELECT user_id, jti, revoked_at, expires_at, version
+    FROM token_revocations
+    WHERE version > %s AND expires_at > %s
+    ORDER BY version
+""")
+
+NOTIFY_TOKEN_REVOCATIONS = Statement('token_revocation_notify',
+                                     "SELECT pg_notify('token_revocations', '')", sqlite=())
+
+
+class TokenRevocationRepository(Repository):
+    """Access-token revocations, plus the change feed every worker's
+    revocation list (services/token_revocations.py) follows"""
+
+    def revoke_token(self, user_id, jti, expires_at):
+        """Revoke one token until its ``exp`` (a naive-UTC datetime)"""
+        self._revoke(user_id, jti, expires_at)
+
+    def revoke_user(self, user_id, expires_at):
+        """Revoke every token of the user issued so far; ``expires_at`` is
+        when the newest of them expires"""
+        self._revoke(user_id, None, expires_at)
+
+    def _revoke(self, user_id, jti, expires_at):
+        now = utcnow()
+        with self._cursor(commit=True) as (conn, cursor):
+            if getattr(conn, 'dialect', 'postgresql') == 'postgresql':
+                cursor.execute(LOCK_TOKEN_REVOCATIONS)
+            PURGE_TOKEN_REVOCATIONS.execute(conn, cursor, (now,))
+            REVOKE_TOKENS.execute(conn, cursor, (user_id, jti, now, expires_at))
+            NOTIFY_TOKEN_REVOCATIONS.execute(conn, cursor)
+
+    def changes(self, since):
+        """Unexpired revocations written after version ``since``, oldest first"""
+        return self._fetch_all(TOKEN_REVOCATION_CHANGES, (since, utcnow()), TokenRevocationRow)
+
+
+# ----------------------------------------------------------------------
+# Idempotency keys
+# ----------------------------------------------------------------------
+CLAIM_IDEMPOTENCY_KEY = Statement('idempotency_claim', """
+    INSERT INTO idempotency_keys (key_hash, fingerprint, created_at, locked_until, expires_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON CONFLICT (key_hash) DO NOTHING
+    RETURNING key_hash
+""")
+
+# An expired record, or one whose owner died holding the lock, is reused
+TAKE_OVER_IDEMPOTENCY_KEY = Statement('idempotency_take_over', """
+    UPDATE idempotency_keys
+    SET fingerprint = %s, status = 'in_progress', response_status = NULL, response_body = NULL,
+        content_type = NULL, created_at = %s, locked_until = %s, expires_at = %s
+    WHERE key_hash = %s AND (expires_at <= %s OR (status = 'in_progress' AND locked_until <= %s))
+    RETURNING key_hash
+""")
+
+LOAD_IDEMPOTENCY_KEY = Statement('idempotency_load', f"""
+    SELECT {', '.join(IdempotencyRow.__slots__)}
+    FROM idempotency_keys
+    WHERE key_hash = %s
+""")
+
+COMPLETE_IDEMPOTENCY_KEY = Statement('idempotency_complete', """
+    UPDATE idempotency_keys
+    SET status = 'done', response_status = %s, response_body = %s, content_type = %s
+    WHERE key_hash = %s AND status = 'in_progress'
+""")
+
+RELEASE_IDEMPOTENCY_KEY = Statement('idempotency_release', """
+    DELETE FROM idempotency_keys
+    WHERE key_hash = %s AND status = 'in_progress'
+""")
+
+PURGE_IDEMPOTENCY_KEYS = Statement('idempotency_purge', """
+    DELETE FROM idempotency_keys
+    WHERE key_hash IN (
+        SELECT key_hash FROM idempotency_keys
+        WHERE expires_at < %s
+        LIMIT %s
+    )
+""")
+
+
+class IdempotencyRepository(Repository):
+    """Idempotency-Key records (services/idempotency.py drives them)"""
+
+    def claim(self, key_hash, fingerprint, now, locked_until, expires_at):
+        """Insert an in-progress record; True if this call created it"""
+        with self._cursor(commit=True) as (conn, cursor):
+            row = CLAIM_IDEMPOTENCY_KEY.execute(
+                conn, cursor, (key_hash, fingerprint, now, locked_until, expires_at)).fetchone()
+        return row is not None
+
+    def take_over(self, key_hash, fingerprint, now, locked_until, expires_at):
+        """Reclaim an expired or abandoned record; True on success"""
+        with self._cursor(commit=True) as (conn, cursor):
+            row = TAKE_OVER_IDEMPOTENCY_KEY.execute(
+                conn, cursor, (fingerprint, now, locked_until, expires_at, key_hash, now, now)).fetchone()
+        return row is not None
+
+    def load(self, key_hash):
+        return self._fetch_one(LOAD_IDEMPOTENCY_KEY, (key_hash,), IdempotencyRow)
+
+    def complete(self, key_hash, status, body, content_type):
+        with self._cursor(commit=True) as (conn, cursor):
+            COMPLETE_IDEMPOTENCY_KEY.execute(conn, cursor, (status, body, content_type, key_hash))
+
+    def release(self, key_hash):
+        """Drop an in-progress record so the request can be retried"""
+        with self._cursor(commit=True) as (conn, cursor):
+            RELEASE_IDEMPOTENCY_KEY.execute(conn, cursor, (key_hash,))
+
+    def purge(self, now, limit=1000):
+        """Delete up to ``limit`` expired records; returns how many"""
+        with self._cursor(commit=True) as (conn, cursor):
+            return PURGE_IDEMPOTENCY_KEYS.execute(conn, cursor, (now, limit)).rowcount
@@ -0,0 +1,385 @@
+"""
+Database schema for every storage driver
+
+One definition of the tables shared by init_db.py (PostgreSQL) and the
+embedded SQLite driver: the users table from init_db.py plus the columns that
+add_verification.py, db_update.py (2FA) and add_profile_version.py add, the
+transactions ledger with its hourly summaries, daily settlements, the
+webhook outbox, API keys and Idempotency-Key records. apply_schema() is idempotent and brings an older database up to date.
+"""
+from datetime import date
+
+USERS_TABLE = """
+    CREATE TABLE IF NOT EXISTS users (
+        id {id_column},
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password_hash VARCHAR(255) NOT NULL,
+        full_name VARCHAR(255) NOT NULL,
+        company_name VARCHAR(255),
+        phone VARCHAR(20),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        is_active BOOLEAN DEFAULT TRUE,
+        is_verified BOOLEAN DEFAULT FALSE
+    )
+"""
+
+ID_COLUMN = {
+    'postgresql': 'SERIAL PRIMARY KEY',
+    'sqlite': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+}
+
+# Columns added after the first release, in the order they were introduced
+USER_COLUMNS = (
+    # add_verification.py
+    ('verification_status',
+     "VARCHAR(20) DEFAULT 'not_submitted' CHECK (verification_status IN ('not_submitted', 'pending'))"),
+    ('verification_submitted_at', 'TIMESTAMP'),
+    # db_update.py (2FA)
+    ('two_factor_enabled', 'BOOLEAN DEFAULT FALSE'),
+    ('phone_verified', 'BOOLEAN DEFAULT FALSE'),
+    ('remember_token', 'VARCHAR(255)'),
+    ('remember_token_expires', 'TIMESTAMP'),
+    # add_profile_version.py
+    ('profile_version', 'INTEGER NOT NULL DEFAULT 1'),
+)
+
+USER_INDEXES = (
+    ('idx_users_email', 'email'),
+    ('idx_users_active', 'is_active'),
+    ('idx_users_verification_status', 'verification_status'),
+    ('idx_users_remember_token', 'remember_token'),
+)
+
+# PostgreSQL keeps updated_at current with a trigger; the repository
+# statements also set it explicitly, so SQLite needs none
+POSTGRES_TRIGGER = (
+    """
+    CREATE OR REPLACE FUNCTION update_updated_at_column()
+    RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.updated_at = CURRENT_TIMESTAMP;
+        RETURN NEW;
+    END;
+    $$ language 'plpgsql';
+    """,
+    """
+    DROP TRIGGER IF EXISTS update_users_updated_at ON users;
+    CREATE TRIGGER update_users_updated_at
+        BEFORE UPDATE ON users
+        FOR EACH ROW
+        EXECUTE FUNCTION update_updated_at_column();
+    """
+)
+
+# Transaction ledger. Amounts are integer paise. On PostgreSQL the table is
+# range-partitioned by month on created_at, so the primary key must include
+# it; history reads walk (merchant_id, created_at, id) newest first.
+TRANSACTIONS_TABLE = {
+    'postgresql': """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id BIGSERIAL,
+            merchant_id INTEGER NOT NULL REFERENCES users(id),
+            {columns},
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """,
+    'sqlite': """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            merchant_id INTEGER NOT NULL REFERENCES users(id),
+            {columns}
+        )
+    """,
+}
+
+TRANSACTION_COLUMNS = """
+    channel VARCHAR(20) NOT NULL CHECK (channel IN ('upi', 'virtual_account')),
+    kind VARCHAR(10) NOT NULL DEFAULT 'payment' CHECK (kind IN ('payment', 'refund')),
+    status VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'success', 'failed')),
+    amount BIGINT NOT NULL CHECK (amount > 0),
+    currency CHAR(3) NOT NULL DEFAULT 'INR',
+    reference VARCHAR(64),
+    counterparty VARCHAR(255),
+    description VARCHAR(255),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+"""
+
+TRANSACTION_INDEXES = (
+    ('idx_transactions_merchant_created', 'merchant_id, created_at, id'),
+)
+
+# The settlement run scans one day across every merchant. The ledger is
+# appended in created_at order, so on PostgreSQL a BRIN index (a few pages
+# per partition, next to no write cost) narrows that to the day's blocks
+TRANSACTION_CREATED_INDEX = {
+    'postgresql': 'USING brin (created_at)',
+    'sqlite': '(created_at)',
+}
+
+# Per-merchant hourly totals behind the dashboard overview, keyed by the
+# hour each transaction was created in. Every ledger write adjusts its row
+# in the same database transaction (TransactionRepository);
+# rebuild_summaries.py recomputes them from the ledger.
+TRANSACTION_HOURLY_TABLE = """
+    CREATE TABLE IF NOT EXISTS transaction_hourly (
+        merchant_id INTEGER NOT NULL REFERENCES users(id),
+        hour TIMESTAMP NOT NULL,
+        channel VARCHAR(20) NOT NULL,
+        kind VARCHAR(10) NOT NULL,
+        pending_count INTEGER NOT NULL DEFAULT 0,
+        pending_amount BIGINT NOT NULL DEFAULT 0,
+        success_count INTEGER NOT NULL DEFAULT 0,
+        success_amount BIGINT NOT NULL DEFAULT 0,
+        failed_count INTEGER NOT NULL DEFAULT 0,
+        failed_amount BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (merchant_id, hour, channel, kind)
+    )
+"""
+
+TRANSACTION_HOURLY_INDEXES = (
+    # Rebuilds delete by hour across every merchant
+    ('idx_transaction_hourly_hour', 'hour'),
+)
+
+# One settlement per merchant and day, written by settle.py
+# (services/settlements.py); amounts are integer paise and
+# net = gross - refunds - fees - gst
+SETTLEMENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS settlements (
+        id {id_column},
+        merchant_id INTEGER NOT NULL REFERENCES users(id),
+        settlement_date DATE NOT NULL,
+        payment_count INTEGER NOT NULL,
+        gross BIGINT NOT NULL,
+        refund_count INTEGER NOT NULL,
+        refunds BIGINT NOT NULL,
+        fees BIGINT NOT NULL,
+        gst BIGINT NOT NULL,
+        net BIGINT NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        UNIQUE (merchant_id, settlement_date)
+    )
+"""
+
+SETTLEMENT_INDEXES = (
+    ('idx_settlements_date', 'settlement_date'),
+)
+
+# Merchant webhook endpoints and the delivery outbox. Outbox rows are written
+# in the same transaction as the change they announce and delivered by
+# webhook_dispatcher.py; delivered rows are purged after a retention period,
+# dead-lettered ones stay until requeued.
+WEBHOOK_ENDPOINTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS webhook_endpoints (
+        id {id_column},
+        merchant_id INTEGER NOT NULL REFERENCES users(id),
+        url VARCHAR(2048) NOT NULL,
+        secret VARCHAR(64) NOT NULL,
+        max_concurrency INTEGER NOT NULL DEFAULT 4 CHECK (max_concurrency > 0),
+        enabled BOOLEAN NOT NULL DEFAULT TRUE,
+        created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+WEBHOOK_OUTBOX_TABLE = """
+    CREATE TABLE IF NOT EXISTS webhook_outbox (
+        id {id_column},
+        endpoint_id INTEGER NOT NULL REFERENCES webhook_endpoints(id),
+        event VARCHAR(64) NOT NULL,
+        payload TEXT NOT NULL,
+        status VARCHAR(10) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'delivered', 'dead')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL,
+        created_at TIMESTAMP NOT NULL,
+        delivered_at TIMESTAMP,
+        last_status INTEGER,
+        last_error VARCHAR(255)
+    )
+"""
+
+OUTBOX_ID_COLUMN = {
+    'postgresql': 'BIGSERIAL PRIMARY KEY',
+    'sqlite': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+}
+
+# (name, table, columns, partial-index predicate)
+WEBHOOK_INDEXES = (
+    ('idx_webhook_endpoints_merchant', 'webhook_endpoints', 'merchant_id', None),
+    # The dispatcher's claim query walks only rows still to be delivered
+    ('idx_webhook_outbox_due', 'webhook_outbox', 'next_attempt_at', "status = 'pending'"),
+    ('idx_webhook_outbox_endpoint_due', 'webhook_outbox', 'endpoint_id, next_attempt_at', "status = 'pending'"),
+    ('idx_webhook_outbox_delivered', 'webhook_outbox', 'delivered_at', "status = 'delivered'"),
+    ('idx_webhook_outbox_dead', 'webhook_outbox', 'endpoint_id', "status = 'dead'"),
+)
+
+# Server-to-server API keys, stored as SHA-256 digests. Every write gives the
+# row the next ``version`` (under a table lock, so versions commit in order);
+# workers keep an in-memory index and fetch only rows past the version they
+# have seen (services/api_keys.py).
+API_KEYS_TABLE = """
+    CREATE TABLE IF NOT EXISTS api_keys (
+        id {id_column},
+        merchant_id INTEGER NOT NULL REFERENCES users(id),
+        name VARCHAR(100) NOT NULL,
+        prefix VARCHAR(16) NOT NULL,
+        key_hash CHAR(64) NOT NULL UNIQUE,
+        version BIGINT NOT NULL UNIQUE,
+        created_at TIMESTAMP NOT NULL,
+        expires_at TIMESTAMP,
+        revoked_at TIMESTAMP
+    )
+"""
+
+API_KEY_INDEXES = (
+    ('idx_api_keys_merchant', 'merchant_id'),
+)
+
+# Revoked access tokens: one token by jti (logout), or with jti NULL every
+# token of the user issued up to revoked_at (deactivation). Versions work as
+# for api_keys; workers mirror the live rows (services/token_revocations.py).
+# Rows are purged once the tokens they cover would have expired anyway.
+TOKEN_REVOCATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS token_revocations (
+        id {id_column},
+        user_id INTEGER NOT NULL,
+        jti VARCHAR(64),
+        revoked_at TIMESTAMP NOT NULL,
+        expires_at TIMESTAMP NOT NULL,
+        version BIGINT NOT NULL UNIQUE
+    )
+"""
+
+TOKEN_REVOCATION_INDEXES = (
+    ('idx_token_revocations_expires', 'expires_at'),
+)
+
+# Idempotency-Key records: the first request with a key claims its row,
+# duplicates replay the stored response. Rows are purged after expires_at.
+IDEMPOTENCY_KEYS_TABLE = """
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key_hash CHAR(64) PRIMARY KEY,
+        fingerprint CHAR(64) NOT NULL,
+        status VARCHAR(12) NOT NULL DEFAULT 'in_progress' CHECK (status IN ('in_progress', 'done')),
+        response_status INTEGER,
+        response_body TEXT,
+        content_type VARCHAR(100),
+        created_at TIMESTAMP NOT NULL,
+        locked_until TIMESTAMP NOT NULL,
+        expires_at TIMESTAMP NOT NULL
+    )
+"""
+
+IDEMPOTENCY_INDEXES = (
+    ('idx_idempotency_keys_expires', 'expires_at'),
+)
+
+# Monthly partitions created ahead of time; rows outside them land in
+# transactions_default. Re-run init_db.py monthly (e.g. from cron) so the
+# next months always exist before rows arrive for them.
+PARTITION_MONTHS_AHEAD = 3
+
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def transaction_partitions(today=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """(name, from, to) for this month's partition and the next ``months_ahead``"""
+    first = (today or date.today()).replace(day=1)
+    partitions = []
+    for offset in range(months_ahead + 1):
+        start = _add_months(first, offset)
+        partitions.append((f"transactions_{start:%Y_%m}", start, _add_months(start, 1)))
+    return partitions
+
+
+def _existing_columns(cursor, dialect):
+    if dialect == 'sqlite':
+        cursor.execute("PRAGMA table_info(users)")
+        return {row[1] for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_name = 'users'
+    """)
+    return {row[0] for row in cursor.fetchall()}
+
+
+def schema_steps(cursor, dialect, today=None):
+    """Yield (description, sql) for everything the schema still needs
+
+    Lazy on purpose: the column check runs after the caller has executed the
+    CREATE TABLE step.
+    """
+    yield "Creating 'users' table", USERS_TABLE.format(id_column=ID_COLUMN[dialect])
+
+    existing = _existing_columns(cursor, dialect)
+    for name, definition in USER_COLUMNS:
+        if name not in existing:
+            yield f"Adding {name} column", f"ALTER TABLE users ADD COLUMN {name} {definition}"
+
+    for index, column in USER_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON users({column})"
+
+    if dialect == 'postgresql':
+        yield "Creating timestamp trigger function", POSTGRES_TRIGGER[0]
+        yield "Creating auto-update trigger", POSTGRES_TRIGGER[1]
+
+    yield "Creating 'transactions' table", TRANSACTIONS_TABLE[dialect].format(columns=TRANSACTION_COLUMNS.strip())
+    if dialect == 'postgresql':
+        yield "Creating transactions_default partition", \
+            "CREATE TABLE IF NOT EXISTS transactions_default PARTITION OF transactions DEFAULT"
+        for name, start, end in transaction_partitions(today):
+            yield f"Creating {name} partition", (
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+    for index, columns in TRANSACTION_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON transactions({columns})"
+    yield "Creating idx_transactions_created", \
+        f"CREATE INDEX IF NOT EXISTS idx_transactions_created ON transactions {TRANSACTION_CREATED_INDEX[dialect]}"
+
+    yield "Creating 'transaction_hourly' table", TRANSACTION_HOURLY_TABLE
+    for index, column in TRANSACTION_HOURLY_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON transaction_hourly({column})"
+
+    yield "Creating 'settlements' table", SETTLEMENTS_TABLE.format(id_column=ID_COLUMN[dialect])
+    for index, column in SETTLEMENT_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON settlements({column})"
+
+    yield "Creating 'webhook_endpoints' table", WEBHOOK_ENDPOINTS_TABLE.format(id_column=ID_COLUMN[dialect])
+    yield "Creating 'webhook_outbox' table", WEBHOOK_OUTBOX_TABLE.format(id_column=OUTBOX_ID_COLUMN[dialect])
+    for index, table, columns, where in WEBHOOK_INDEXES:
+        predicate = f" WHERE {where}" if where else ''
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON {table}({columns}){predicate}"
+
+    yield "Creating 'api_keys' table", API_KEYS_TABLE.format(id_column=ID_COLUMN[dialect])
+    for index, column in API_KEY_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON api_keys({column})"
+
+    yield "Creating 'token_revocations' table", TOKEN_REVOCATIONS_TABLE.format(id_column=ID_COLUMN[dialect])
+    for index, column in TOKEN_REVOCATION_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON token_revocations({column})"
+
+    yield "Creating 'idempotency_keys' table", IDEMPOTENCY_KEYS_TABLE
+    for index, column in IDEMPOTENCY_INDEXES:
+        yield f"Creating {index}", f"CREATE INDEX IF NOT EXISTS {index} ON idempotency_keys({column})"
+
+
+def apply_schema(conn, dialect, log=None):
+    """Create or upgrade the schema on ``conn`` and commit"""
+    cursor = conn.cursor()
+    try:
+        for description, sql in schema_steps(cursor, dialect):
+            if log is not None:
+                log(description)
+            cursor.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,343 @@
+"""
+Daily settlement engine
+
+Turns one day's successful transactions into one settlement per merchant:
+payment count and gross, refund count and refunds, fees, GST on the fees
+and the net payout, all in integer paise.
+
+The ledger is read in fixed-size columnar chunks, so a run holds at most
+``chunk_rows`` transactions in memory however many the day has. On
+PostgreSQL the rows arrive as a binary COPY of four fixed-width integer
+columns that NumPy reads in place (no Python object per row or per value).
+SQLite hands back tuples that are packed into the same columns chunk by
+chunk. Each chunk is folded into per-merchant totals with ``np.bincount``,
+indexed directly by merchant id. The settlements are then written in
+batches with COPY (executemany on SQLite), replacing any earlier run for
+the day in the same transaction, so a day can be re-settled safely.
+
+Fee rules, per payment: ``round(amount * bps / 10000) + fixed``, rounded
+half up and capped at the payment amount. Refunds carry no fee and come
+off the payout in full. GST is ``gst_bps`` of the merchant's fees for the
+day, rounded half up once per settlement rather than per transaction.
+"""
+import io
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from services.repository import Statement, utcnow
+from services.transactions import CHANNELS, KINDS
+
+# Integer codes the scan query sends instead of the channel/kind strings:
+# the index into CHANNELS and KINDS
+_CHANNEL_CODE = "CASE channel {} END".format(
+    ' '.join(f"WHEN '{name}' THEN {code}" for code, name in enumerate(CHANNELS)))
+_KIND_CODE = "CASE kind {} END".format(
+    ' '.join(f"WHEN '{name}' THEN {code}" for code, name in enumerate(KINDS)))
+PAYMENT = KINDS.index('payment')
+
+# Only settled, rupee-denominated entries count; created_at is naive UTC,
+# so a settlement day is a UTC day
+SCAN_TRANSACTIONS = f"""
+    SELECT merchant_id, ({_CHANNEL_CODE})::smallint, ({_KIND_CODE})::smallint, amount
+    FROM transactions
+    WHERE status = 'success' AND currency = 'INR' AND created_at >= %s AND created_at < %s
+"""
+
+SCAN_TRANSACTIONS_SQLITE = f"""
+    SELECT merchant_id, {_CHANNEL_CODE}, {_KIND_CODE}, amount
+    FROM transactions
+    WHERE status = 'success' AND currency = 'INR' AND created_at >= ? AND created_at < ?
+"""
+
+SETTLEMENT_COLUMNS = ('merchant_id', 'settlement_date', 'payment_count', 'gross', 'refund_count',
+                      'refunds', 'fees', 'gst', 'net', 'created_at')
+
+DELETE_SETTLEMENTS = Statement('settlement_delete_day', "DELETE FROM settlements WHERE settlement_date = %s")
+
+COPY_SETTLEMENTS = f"COPY settlements ({', '.join(SETTLEMENT_COLUMNS)}) FROM STDIN"
+
+INSERT_SETTLEMENTS = (f"INSERT INTO settlements ({', '.join(SETTLEMENT_COLUMNS)}) "
+                      f"VALUES ({', '.join(['?'] * len(SETTLEMENT_COLUMNS))})")
+
+# One row of the binary COPY of SCAN_TRANSACTIONS: a field count, then a
+# length word ahead of each big-endian value
+COPY_RECORD = np.dtype([
+    ('fields', '>i2'),
+    ('merchant_id_length', '>i4'), ('merchant_id', '>i4'),
+    ('channel_length', '>i4'), ('channel', '>i2'),
+    ('kind_length', '>i4'), ('kind', '>i2'),
+    ('amount_length', '>i4'), ('amount', '>i8'),
+])
+_COPY_LENGTHS = (('fields', 4), ('merchant_id_length', 4), ('channel_length', 2),
+                 ('kind_length', 2), ('amount_length', 8))
+COPY_SIGNATURE = b'PGCOPY\n\xff\r\n\x00'
+COPY_TRAILER = b'\xff\xff'
+
+# Float64 bincount weights add integers exactly while every partial sum
+# stays below 2**53
+_EXACT_FLOAT_LIMIT = 2 ** 53
+
+
+class SettlementTotals:
+    """Per-merchant running totals, fed one columnar chunk at a time
+
+    ``fees`` maps each channel to (basis points, fixed fee in paise). The
+    totals are arrays indexed by merchant id, grown as larger ids turn up,
+    so memory is a few dozen bytes per merchant id plus one chunk.
+    """
+
+    def __init__(self, fees, gst_bps=1800):
+        missing = set(CHANNELS) - set(fees)
+        if missing:
+            raise ValueError(f"No fee configured for: {', '.join(sorted(missing))}")
+        self.fee_bps = np.array([fees[name][0] for name in CHANNELS], dtype=np.int64)
+        self.fee_fixed = np.array([fees[name][1] for name in CHANNELS], dtype=np.int64)
+        if (self.fee_bps < 0).any() or (self.fee_fixed < 0).any() or gst_bps < 0:
+            raise ValueError("Fees and GST must not be negative")
+        self.gst_bps = gst_bps
+        # amount * bps must fit in an int64
+        self._max_amount = (2 ** 63 - 1 - 5000) // max(int(self.fee_bps.max()), 1)
+
+        self.rows = 0
+        self.chunks = 0
+        self.largest_chunk = 0
+        self._payment_count = np.zeros(0, dtype=np.int64)
+        self._gross = np.zeros(0, dtype=np.int64)
+        self._refund_count = np.zeros(0, dtype=np.int64)
+        self._refunds = np.zeros(0, dtype=np.int64)
+        self._fees = np.zeros(0, dtype=np.int64)
+
+    def add(self, merchant_id, channel, kind, amount):
+        """Fold in one chunk of equal-length integer columns"""
+        n = len(amount)
+        if n == 0:
+            return
+        merchant_id = np.asarray(merchant_id, dtype=np.int64)
+        channel = np.asarray(channel, dtype=np.int64)
+        kind = np.asarray(kind, dtype=np.int64)
+        amount = np.asarray(amount, dtype=np.int64)
+        if merchant_id.min() < 0 or amount.min() <= 0:
+            raise ValueError("Merchant ids must be non-negative and amounts positive")
+        if amount.max() > self._max_amount:
+            raise ValueError("Transaction amount too large for the fee calculation")
+
+        size = self._grow(int(merchant_id.max()) + 1)
+        payment = kind == PAYMENT
+        fee = (amount * self.fee_bps[channel] + 5000) // 10000 + self.fee_fixed[channel]
+        np.minimum(fee, amount, out=fee)
+        fee *= payment
+        paid = amount * payment
+        refunded = amount - paid
+
+        payments = np.bincount(merchant_id, weights=payment, minlength=size).astype(np.int64)
+        self._payment_count += payments
+        self._refund_count += np.bincount(merchant_id, minlength=size) - payments
+        # A bound on every per-merchant sum in this chunk, in Python ints
+        exact = int(amount.max()) * n < _EXACT_FLOAT_LIMIT
+        self._gross += self._sum(merchant_id, paid, size, exact)
+        self._refunds += self._sum(merchant_id, refunded, size, exact)
+        # fee <= amount per row, so the same bound holds for the fees
+        self._fees += self._sum(merchant_id, fee, size, exact)
+
+        self.rows += n
+        self.chunks += 1
+        self.largest_chunk = max(self.largest_chunk, n)
+
+    @staticmethod
+    def _sum(merchant_id, values, size, exact):
+        """Per-merchant integer sums of ``values``"""
+        if exact:
+            return np.bincount(merchant_id, weights=values, minlength=size).astype(np.int64)
+        sums = np.zeros(size, dtype=np.int64)
+        np.add.at(sums, merchant_id, values)
+        return sums
+
+    def _grow(self, size):
+        current = len(self._gross)
+        if size <= current:
+            return current
+        size = max(size, current * 2)
+        for name in ('_payment_count', '_gross', '_refund_count', '_refunds', '_fees'):
+            grown = np.zeros(size, dtype=np.int64)
+            old = getattr(self, name)
+            grown[:len(old)] = old
+            setattr(self, name, grown)
+        return size
+
+    def add_copy_records(self, records):
+        """Fold in a structured COPY_RECORD array from a binary COPY"""
+        for field, expected in _COPY_LENGTHS:
+            if (records[field] != expected).any():
+                raise ValueError(f"Unexpected COPY row layout ({field})")
+        self.add(records['merchant_id'], records['channel'], records['kind'], records['amount'])
+
+    def result(self):
+        """Column arrays for every merchant with activity, ordered by merchant id
+
+        Keys: merchant_id, payment_count, gross, refund_count, refunds, fees,
+        gst and net.
+        """
+        active = np.flatnonzero(self._payment_count + self._refund_count)
+        fees = self._fees[active]
+        gst = (fees * self.gst_bps + 5000) // 10000
+        gross = self._gross[active]
+        refunds = self._refunds[active]
+        return {
+            'merchant_id': active.astype(np.int64),
+            'payment_count': self._payment_count[active],
+            'gross': gross,
+            'refund_count': self._refund_count[active],
+            'refunds': refunds,
+            'fees': fees,
+            'gst': gst,
+            'net': gross - refunds - fees - gst,
+        }
+
+
+class BinaryCopyReader:
+    """File-like target for ``copy_expert``: parses a binary COPY in chunks
+
+    psycopg2 calls ``write`` once per row; complete rows are handed to
+    ``consume`` as a structured COPY_RECORD array once ``chunk_rows`` have
+    arrived, and the rest at ``finish()``.
+    """
+
+    def __init__(self, consume, chunk_rows):
+        self.consume = consume
+        self._flush_at = max(chunk_rows, 1) * COPY_RECORD.itemsize
+        self._buffer = bytearray()
+        self._header = False
+
+    def write(self, data):
+        self._buffer += data
+        if len(self._buffer) >= self._flush_at:
+            self._flush()
+
+    def _flush(self):
+        buffer = self._buffer
+        if not self._header:
+            if len(buffer) < 19:
+                return
+            if bytes(buffer[:11]) != COPY_SIGNATURE:
+                raise ValueError("Not a binary COPY stream")
+            extension = int.from_bytes(buffer[15:19], 'big')
+            if len(buffer) < 19 + extension:
+                return
+            del buffer[:19 + extension]
+            self._header = True
+        count = len(buffer) // COPY_RECORD.itemsize
+        if count:
+            # Hand the filled buffer to NumPy as is and carry the partial row
+            # over into a new one: no copy of the chunk
+            self._buffer = buffer[count * COPY_RECORD.itemsize:]
+            self.consume(np.frombuffer(buffer, dtype=COPY_RECORD, count=count))
+
+    def finish(self):
+        """Parse what is left; the stream must end with the COPY trailer"""
+        if self._buffer.endswith(COPY_TRAILER):
+            del self._buffer[-len(COPY_TRAILER):]
+        else:
+            raise ValueError("Binary COPY stream ended without its trailer")
+        self._flush()
+        if self._buffer or not self._header:
+            raise ValueError("Binary COPY stream ended mid-row")
+
+
+class SettlementEngine:
+    """Settles a day's transactions for every merchant in one run"""
+
+    def __init__(self, pool, fees, gst_bps=1800, chunk_rows=500_000, write_batch=10_000, logger=None):
+        self.pool = pool
+        self.fees = dict(fees)
+        self.gst_bps = gst_bps
+        self.chunk_rows = chunk_rows
+        self.write_batch = write_batch
+        self.logger = logger
+        SettlementTotals(self.fees, gst_bps)    # validate the fee schedule now
+
+    def run(self, day):
+        """Compute and store the settlements for ``day`` (a date); returns a summary dict"""
+        start = datetime.combine(day, datetime.min.time())
+        end = start + timedelta(days=1)
+        started = time.perf_counter()
+        totals = SettlementTotals(self.fees, self.gst_bps)
+
+        conn = self.pool.getconn()
+        try:
+            cursor = conn.cursor()
+            try:
+                if conn.dialect == 'sqlite':
+                    self._scan_sqlite(cursor, start, end, totals)
+                else:
+                    reader = BinaryCopyReader(totals.add_copy_records, self.chunk_rows)
+                    query = cursor.mogrify(SCAN_TRANSACTIONS, (start, end)).decode()
+                    cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT binary)", reader)
+                    reader.finish()
+                scanned = time.perf_counter()
+                result = totals.result()
+                self._write(conn, cursor, day, result)
+                conn.commit()
+            finally:
+                cursor.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'date': day.isoformat(),
+            'transactions': totals.rows,
+            'merchants': len(result['merchant_id']),
+            'gross': int(result['gross'].sum()),
+            'refunds': int(result['refunds'].sum()),
+            'fees': int(result['fees'].sum()),
+            'gst': int(result['gst'].sum()),
+            'net': int(result['net'].sum()),
+            'chunks': totals.chunks,
+            'scan_seconds': round(scanned - started, 3),
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(totals.rows / elapsed) if elapsed else None
+        }
+        if self.logger is not None:
+            self.logger.info(f"Settled {summary['date']}: {summary['transactions']:,} transactions, "
+                             f"{summary['merchants']:,} merchants in {summary['seconds']}s")
+        return summary
+
+    def _scan_sqlite(self, cursor, start, end, totals):
+        cursor.execute(SCAN_TRANSACTIONS_SQLITE, (start, end))
+        while True:
+            rows = cursor.fetchmany(self.chunk_rows)
+            if not rows:
+                break
+            columns = np.array(rows, dtype=np.int64)
+            del rows
+            totals.add(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3])
+
+    def _write(self, conn, cursor, day, result):
+        """Replace the day's settlements with ``result``, write_batch rows at a time"""
+        sqlite = conn.dialect == 'sqlite'
+        DELETE_SETTLEMENTS.execute(conn, cursor, (day,))
+        now = utcnow().replace(microsecond=0)
+        names = SETTLEMENT_COLUMNS[2:-1]
+        merchants = result['merchant_id']
+        for low in range(0, len(merchants), self.write_batch):
+            high = low + self.write_batch
+            columns = [merchants[low:high].tolist()] + [result[name][low:high].tolist() for name in names]
+            if sqlite:
+                cursor.executemany(INSERT_SETTLEMENTS, [
+                    (values[0], day) + values[1:] + (now,) for values in zip(*columns)
+                ])
+            else:
+                prefix, suffix = f"\t{day.isoformat()}\t", f"\t{now.isoformat(' ')}\n"
+                buffer = io.StringIO()
+                buffer.writelines(
+                    f"{values[0]}{prefix}{values[1]}\t{values[2]}\t{values[3]}\t{values[4]}\t"
+                    f"{values[5]}\t{values[6]}\t{values[7]}{suffix}"
+                    for values in zip(*columns)
+                )
+                buffer.seek(0)
+                cursor.copy_expert(COPY_SETTLEMENTS, buffer)
@@ -0,0 +1,194 @@
+"""
+Slow-query log
+
+A query observer (see ConnectionPool.add_query_observer) that records every
+statement slower than a threshold: its SQL shape with literals stripped, the
+duration and the request endpoint that ran it. Entries go to a fixed-size
+ring buffer, so the log costs constant memory however slow the database gets.
+
+A sampled share of slow read-only statements also gets its plan captured
+with EXPLAIN (ANALYZE, BUFFERS) (EXPLAIN QUERY PLAN on SQLite). ANALYZE runs
+the statement a second time, on the request thread, so sampling is off by
+default and each shape is explained at most once per ``explain_interval``.
+"""
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from services.repository import statement_for_name
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'(?<![\w$?])\d+(?:\.\d+)?\b')
+_EXECUTE = re.compile(r'^EXECUTE\s+(\w+)', re.IGNORECASE)
+_READ_ONLY = re.compile(r'^\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+_WRITES = re.compile(r'\b(?:INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|TRUNCATE|LOCK)\b', re.IGNORECASE)
+
+
+def query_text(query):
+    """SQL text of an execute() call; resolves EXECUTE to the prepared statement"""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    match = _EXECUTE.match(query.lstrip())
+    if match:
+        statement = statement_for_name(match.group(1))
+        if statement is not None:
+            return statement.sql
+    return query
+
+
+def query_shape(sql):
+    """One-line SQL with string and number literals replaced by ``?``"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+def is_read_only(sql):
+    return bool(_READ_ONLY.match(sql)) and not _WRITES.search(sql)
+
+
+class SlowQueryLog:
+    """Ring buffer of statements slower than ``threshold`` seconds"""
+
+    def __init__(self, threshold, capacity=200, dialect='postgresql', explain_rate=0.0,
+                 explain_interval=60.0, endpoint=None, logger=None):
+        self.threshold = threshold
+        self.dialect = dialect
+        self.explain_rate = explain_rate
+        self.explain_interval = explain_interval
+        self.endpoint = endpoint
+        self.logger = logger
+
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=capacity)
+        self._explained_at = {}
+        self._recorded = 0
+        self._explained = 0
+        self._explain_errors = 0
+
+    def __call__(self, cursor, query, vars, seconds):
+        """Query observer: (cursor, sql, params, seconds)"""
+        if seconds < self.threshold:
+            return
+
+        sql = query_text(query)
+        shape = query_shape(sql)
+        endpoint = self.endpoint() if self.endpoint is not None else None
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'duration_ms': round(seconds * 1000, 3),
+            'endpoint': endpoint,
+            'sql': shape,
+            'plan': None
+        }
+        if self._should_explain(shape, sql):
+            entry['plan'] = self._explain(cursor, query, vars)
+
+        with self._lock:
+            self._entries.append(entry)
+            self._recorded += 1
+
+        if self.logger is not None:
+            self.logger.warning(f"Slow query ({entry['duration_ms']:.1f} ms) in {endpoint}: {shape[:200]}")
+
+    def _should_explain(self, shape, sql):
+        if self.explain_rate <= 0 or random.random() >= self.explain_rate:
+            return False
+        if not is_read_only(sql):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(shape)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            if len(self._explained_at) >= 1000:
+                self._explained_at.clear()
+            self._explained_at[shape] = now
+        return True
+
+    def _explain(self, cursor, query, vars):
+        """Plan for a statement that just ran on ``cursor``'s connection
+
+        Uses a separate plain cursor, so the caller's pending result set and
+        the observers are untouched. On PostgreSQL the EXPLAIN runs inside a
+        savepoint; a failure must not abort the caller's transaction.
+        """
+        conn = cursor.connection
+        if self.dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        else:
+            if conn.get_transaction_status() == 3:   # TRANSACTION_STATUS_INERROR
+                return None
+            prefix = 'EXPLAIN (ANALYZE, BUFFERS) '
+
+        explain = conn.cursor()
+        try:
+            if self.dialect == 'sqlite':
+                explain.execute(prefix + query, vars or ())
+                plan = '\n'.join(row[-1] for row in explain.fetchall())
+            else:
+                explain.execute('SAVEPOINT slow_query_explain')
+                try:
+                    explain.execute(prefix + query, vars)
+                    plan = '\n'.join(row[0] for row in explain.fetchall())
+                except Exception:
+                    explain.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                    raise
+                finally:
+                    explain.execute('RELEASE SAVEPOINT slow_query_explain')
+        except Exception as e:
+            with self._lock:
+                self._explain_errors += 1
+            return f"EXPLAIN failed: {e}"
+        finally:
+            explain.close()
+
+        with self._lock:
+            self._explained += 1
+        return plan
+
+    def entries(self, limit=None):
+        """Most recent entries first"""
+        with self._lock:
+            entries = list(self._entries)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def summary(self):
+        """Slow statements grouped by shape, slowest total first"""
+        groups = {}
+        for entry in self.entries():
+            group = groups.get(entry['sql'])
+            if group is None:
+                group = groups[entry['sql']] = {
+                    'sql': entry['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'endpoints': set()
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['duration_ms']
+            group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+            if entry['endpoint']:
+                group['endpoints'].add(entry['endpoint'])
+        for group in groups.values():
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['endpoints'] = sorted(group['endpoints'])
+        return sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._explained_at.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'threshold_ms': self.threshold * 1000,
+                'capacity': self._entries.maxlen,
+                'buffered': len(self._entries),
+                'recorded': self._recorded,
+                'explained': self._explained,
+                'explain_errors': self._explain_errors
+            }
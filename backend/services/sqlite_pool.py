@@ -0,0 +1,270 @@
+"""
+Embedded SQLite storage driver
+
+A drop-in for ConnectionPool (same getconn/putconn/usage/stats/observer
+interface) backed by a local SQLite file, for developer sandboxes, benchmark
+runs and small edge deployments that should not need a Postgres server.
+
+Each thread keeps one connection for its lifetime (no checkout handshake at
+all); once the thread has exited, the next new connection (or a usage/stats
+call) closes it, so a server with one thread per request does not leak file
+descriptors. The database runs in WAL mode so readers never block the writer, and
+BOOLEAN/TIMESTAMP/DATE columns come back as bool/datetime/date like psycopg2
+returns them. Repository statements run their SQLite form (Statement.sqlite_steps).
+"""
+import datetime
+import os
+import sqlite3
+import threading
+import time
+import weakref
+
+from services.db_pool import PoolTimeout, TimedCursorMixin
+from services.schema import apply_schema
+
+
+def _convert_boolean(value):
+    return value not in (b'0', b'')
+
+
+def _convert_timestamp(value):
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+def _convert_date(value):
+    return datetime.date.fromisoformat(value.decode())
+
+
+# Converters only apply to connections opened with detect_types, i.e. ours
+sqlite3.register_converter('BOOLEAN', _convert_boolean)
+sqlite3.register_converter('TIMESTAMP', _convert_timestamp)
+sqlite3.register_converter('DATE', _convert_date)
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+
+# WAL lets readers run alongside the single writer; NORMAL sync is durable
+# across application crashes (not power loss) and avoids an fsync per commit
+DEFAULT_PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('foreign_keys', 'ON'),
+    ('temp_store', 'MEMORY'),
+    ('cache_size', '-16000'),        # KiB, i.e. 16 MB of page cache per connection
+    ('mmap_size', '268435456'),      # read through a 256 MB memory map
+)
+
+class TimedSQLiteCursor(TimedCursorMixin, sqlite3.Cursor):
+    """sqlite3 cursor that reports the duration of every execute to query observers"""
+
+
+class SQLiteConnection:
+    """A thread's cached sqlite3 connection, checked out like a pooled one"""
+
+    __slots__ = ('_pool', '_raw', 'pid', 'owner', 'depth', 'created_at', 'thread')
+
+    dialect = 'sqlite'
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self.pid = os.getpid()
+        self.owner = None
+        self.depth = 0
+        self.created_at = time.monotonic()
+        # The thread the connection belongs to; held weakly so the pool
+        # does not keep finished threads alive
+        self.thread = weakref.ref(threading.current_thread())
+
+    @property
+    def raw(self):
+        """The underlying sqlite3 connection"""
+        return self._raw
+
+    @property
+    def orphaned(self):
+        """True once the owning thread has exited"""
+        thread = self.thread()
+        return thread is None or not thread.is_alive()
+
+    @property
+    def closed(self):
+        return self.depth == 0
+
+    def cursor(self, *args, **kwargs):
+        """Create a cursor; a TimedSQLiteCursor when the pool has observers"""
+        if self._pool.query_observers and not args:
+            cursor = self._raw.cursor(TimedSQLiteCursor)
+            cursor.observers = self._pool.query_observers
+            return cursor
+        return self._raw.cursor(*args)
+
+    def execute_statement(self, cursor, statement, params=()):
+        """Run a repository Statement's SQLite form"""
+        for sql in statement.sqlite_steps:
+            cursor.execute(sql, params)
+        return cursor
+
+    def close(self):
+        """Return the connection (safe to call more than once)"""
+        if self.depth and self.owner == threading.get_ident():
+            self._pool.putconn(self)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class SQLitePool:
+    """Per-thread SQLite connections with ConnectionPool's interface"""
+
+    dialect = 'sqlite'
+
+    def __init__(self, path, timeout=5.0, pragmas=DEFAULT_PRAGMAS, init_schema=True, logger=None):
+        # ':memory:' databases are private to their connection, so that mode
+        # shares one connection between threads, one checkout at a time
+        self.memory = path == ':memory:'
+        self.path = path
+        self.timeout = timeout
+        self.pragmas = pragmas
+        self.init_schema = init_schema
+        self.logger = logger
+        self.query_observers = []
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._connections = []
+        self._memory_lock = threading.RLock()
+        self._pid = os.getpid()
+        self._schema_ready = False
+        # Held while the schema is applied, so no thread queries before it exists
+        self._schema_lock = threading.Lock()
+        self._checkouts = 0
+        self._created = 0
+        self._reaped = 0
+
+        if not self.memory:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+
+    def add_query_observer(self, callback):
+        """Register callback(cursor, sql, params, seconds) run after every execute"""
+        self.query_observers.append(callback)
+
+    def _open(self):
+        raw = sqlite3.connect(
+            self.path,
+            timeout=self.timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        for name, value in self.pragmas:
+            raw.execute(f"PRAGMA {name} = {value}")
+        return raw
+
+    def _ensure_process(self):
+        # Caller holds the lock. Connections inherited across fork belong to
+        # the parent; forget them without closing.
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._connections = []
+            self._local = threading.local()
+            self._memory_lock = threading.RLock()
+
+    def _reap(self):
+        """Close the connections of threads that have exited
+
+        ':memory:' mode shares its one connection between threads, so it is
+        never reaped.
+        """
+        if self.memory:
+            return
+        with self._lock:
+            self._ensure_process()
+            live, orphans = [], []
+            for conn in self._connections:
+                (orphans if conn.orphaned else live).append(conn)
+            if not orphans:
+                return
+            self._connections = live
+            self._reaped += len(orphans)
+        for conn in orphans:
+            conn.raw.close()
+
+    def _connect(self):
+        self._reap()
+        raw = self._open()
+        with self._lock:
+            self._ensure_process()
+        if self.init_schema and not self._schema_ready:
+            with self._schema_lock:
+                if not self._schema_ready:
+                    apply_schema(raw, self.dialect, log=self.logger.debug if self.logger else None)
+                    self._schema_ready = True
+        conn = SQLiteConnection(self, raw)
+        with self._lock:
+            self._connections.append(conn)
+            self._created += 1
+        return conn
+
+    def getconn(self, timeout=None):
+        """This thread's connection; nested checkouts share it"""
+        if self.memory:
+            if not self._memory_lock.acquire(timeout=self.timeout if timeout is None else timeout):
+                raise PoolTimeout(f"no SQLite connection available within {self.timeout}s")
+            if not self._connections:
+                self._connect()
+            conn = self._connections[0]
+        else:
+            conn = getattr(self._local, 'conn', None)
+            if conn is None or conn.pid != os.getpid():
+                conn = self._local.conn = self._connect()
+        conn.owner = threading.get_ident()
+        conn.depth += 1
+        with self._lock:
+            self._checkouts += 1
+        return conn
+
+    def putconn(self, conn):
+        """End a checkout; the outermost one rolls back anything uncommitted"""
+        if conn.depth == 0 or conn.owner != threading.get_ident():
+            return
+        conn.depth -= 1
+        if conn.depth == 0 and conn.pid == os.getpid() and conn.raw.in_transaction:
+            conn.raw.rollback()
+        if self.memory:
+            self._memory_lock.release()
+
+    def closeall(self):
+        """Close every connection opened by this process"""
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+            self._schema_ready = False
+        for conn in connections:
+            conn.raw.close()
+
+    def usage(self):
+        """(in_use, idle) connection counts for this process's live threads"""
+        self._reap()
+        with self._lock:
+            in_use = sum(1 for conn in self._connections if conn.depth)
+            return in_use, len(self._connections) - in_use
+
+    def stats(self):
+        in_use, idle = self.usage()
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'driver': 'sqlite',
+                'path': self.path,
+                'sqlite_version': sqlite3.sqlite_version,
+                'size': in_use + idle,
+                'in_use': in_use,
+                'idle': idle,
+                'checkouts': self._checkouts,
+                'connections_created': self._created,
+                'connections_reaped': self._reaped
+            }
@@ -0,0 +1,111 @@
+"""
+Verified-JWT claim cache
+
+The dashboard fires several API calls per page with the same bearer token,
+and each one base64-decodes and HMAC-verifies it again. This bounded LRU
+keeps the claims of tokens that already passed verification, keyed by a
+SHA-256 digest of the token (the raw token is never stored), until the
+token's ``exp``. Revocation hooks evict entries by token or by identity so
+logout and account deactivation take effect immediately.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class VerifiedTokenCache:
+    """Bounded map of token digest -> (header, claims) until expiry"""
+
+    def __init__(self, max_entries=10000, max_ttl=3600):
+        self.max_entries = max_entries
+        # Upper bound for tokens without exp, and a cap on how long a
+        # verification result is trusted
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # digest -> (expires_at, identity, header, claims)
+        self._by_identity = {}          # identity -> set of digests
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._evictions = 0
+        self._revocations = 0
+
+    @staticmethod
+    def digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def get(self, token):
+        """Return (header, claims) for a verified, unexpired token, else None"""
+        key = self.digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            if entry[0] <= now:
+                self._remove(key)
+                self._expired += 1
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[2], entry[3]
+
+    def put(self, token, header, claims):
+        """Remember a token that just passed full verification"""
+        now = time.time()
+        expires_at = min(claims.get('exp', now + self.max_ttl), now + self.max_ttl)
+        if expires_at <= now:
+            return
+        key = self.digest(token)
+        identity = claims.get('sub')
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, identity, header, claims)
+            self._by_identity.setdefault(identity, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+
+    def _remove(self, key):
+        # Caller holds the lock
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        keys = self._by_identity.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_identity[entry[1]]
+
+    def revoke_token(self, token):
+        """Evict one token (e.g. on logout)"""
+        with self._lock:
+            key = self.digest(token)
+            if key in self._entries:
+                self._remove(key)
+                self._revocations += 1
+
+    def revoke_identity(self, identity):
+        """Evict every cached token of a user (e.g. on deactivation)"""
+        with self._lock:
+            for key in list(self._by_identity.get(str(identity), ())):
+                self._remove(key)
+                self._revocations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'expired': self._expired,
+                'evictions': self._evictions,
+                'revocations': self._revocations
+            }
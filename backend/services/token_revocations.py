@@ -0,0 +1,175 @@
+"""
+Access-token revocation list
+
+Access tokens are verified without a database round trip, so logging out or
+deactivating a user does not by itself stop the tokens already issued.
+Revocations are written to the token_revocations table
+(TokenRevocationRepository), and every worker mirrors the unexpired rows in
+memory, so checking a token costs two dict lookups.
+
+The mirror follows the table's ``version`` column the way the API key index
+does (services/api_keys.py): a background thread fetches only rows past the
+newest version it has seen, woken by NOTIFY on the ``token_revocations``
+channel on PostgreSQL and every ``poll_interval`` seconds regardless. The
+worker that records a revocation applies it at once. The ASGI build has no
+thread: it passes ``changes=None`` and feeds rows to ``apply()`` from its
+event loop.
+"""
+import os
+import select
+import threading
+import time
+from datetime import timezone
+
+from services.repository import DatabaseUnavailable
+
+NOTIFY_CHANNEL = 'token_revocations'
+
+
+class RevocationList:
+    """Per-process view of token_revocations, kept current in the background
+
+    ``changes(since)`` returns TokenRevocationRows past a version
+    (TokenRevocationRepository.changes). ``listen`` opens an autocommit
+    psycopg2 connection for LISTEN, or is None to rely on polling alone.
+    """
+
+    def __init__(self, changes=None, listen=None, poll_interval=5.0, load_timeout=5.0, logger=None):
+        self._changes = changes
+        self._listen = listen
+        self.poll_interval = poll_interval
+        self.load_timeout = load_timeout
+        self.logger = logger
+
+        # Checks read these without a lock: the refresh replaces single items
+        self._tokens = {}               # jti -> expires_at
+        self._users = {}                # user id (str) -> (revoked_at, expires_at)
+        self.version = 0
+
+        self._loaded = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._listening = False
+        self._rejected = 0
+        self._refreshes = 0
+        self._last_refresh = None
+
+    # ------------------------------------------------------------------
+    # Checks
+    # ------------------------------------------------------------------
+    def is_revoked(self, claims):
+        """True if the token with these (verified) claims has been revoked
+
+        Raises DatabaseUnavailable only while the first load has not
+        completed within ``load_timeout``.
+        """
+        if self._changes is not None and self._pid != os.getpid():
+            self.start()
+        if not self._loaded.is_set() and (self._changes is None or not self._loaded.wait(self.load_timeout)):
+            raise DatabaseUnavailable()
+
+        revoked = claims.get('jti') in self._tokens
+        if not revoked:
+            user = self._users.get(str(claims.get('sub')))
+            revoked = user is not None and claims.get('iat', 0) <= user[0]
+        if revoked:
+            with self._stats_lock:
+                self._rejected += 1
+        return revoked
+
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    def apply(self, rows):
+        """Mirror TokenRevocationRows, as read from the table or just written"""
+        now = time.time()
+        for row in rows:
+            expires_at = _unix_time(row.expires_at)
+            if expires_at <= now:
+                continue
+            if row.jti is not None:
+                self._tokens[row.jti] = expires_at
+            else:
+                key = str(row.user_id)
+                revoked_at = _unix_time(row.revoked_at)
+                current = self._users.get(key)
+                if current is None or revoked_at >= current[0]:
+                    self._users[key] = (revoked_at, max(expires_at, current[1] if current else 0))
+            self.version = max(self.version, row.version or 0)
+        # Entries past expires_at only cover tokens rejected as expired anyway
+        for jti, expires_at in list(self._tokens.items()):
+            if expires_at <= now:
+                self._tokens.pop(jti, None)
+        for key, (_, expires_at) in list(self._users.items()):
+            if expires_at <= now:
+                self._users.pop(key, None)
+        with self._stats_lock:
+            self._refreshes += 1
+            self._last_refresh = time.monotonic()
+        self._loaded.set()
+
+    def start(self):
+        """Start the refresh thread in this process (again after a fork)"""
+        with self._start_lock:
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+            self._pid = pid
+            self._listening = False
+            threading.Thread(target=self._run, name='token-revocations', daemon=True).start()
+
+    def refresh(self):
+        """Apply every revocation past the version seen so far; returns how many"""
+        with self._refresh_lock:
+            rows = self._changes(self.version)
+            self.apply(rows)
+        return len(rows)
+
+    def _run(self):
+        conn = None
+        while True:
+            try:
+                if conn is None and self._listen is not None:
+                    conn = self._listen()
+                    conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    self._listening = True
+                wait = self.poll_interval if self._loaded.is_set() else 0
+                if conn is not None:
+                    if select.select([conn], [], [], wait)[0]:
+                        conn.poll()
+                        conn.notifies.clear()
+                else:
+                    time.sleep(wait)
+                self.refresh()
+            except Exception as e:
+                if self.logger is not None:
+                    self.logger.error(f"Token revocation refresh error: {e}")
+                self._listening = False
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                    conn = None
+                time.sleep(min(self.poll_interval, 5.0))
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'tokens': len(self._tokens),
+                'users': len(self._users),
+                'version': self.version,
+                'loaded': self._loaded.is_set(),
+                'listening': self._listening,
+                'rejected': self._rejected,
+                'refreshes': self._refreshes,
+                'last_refresh_seconds_ago': (round(time.monotonic() - self._last_refresh, 3)
+                                             if self._last_refresh is not None else None)
+            }
+
+
+def _unix_time(value):
+    """Naive-UTC TIMESTAMP (as utcnow() writes them) to a Unix time"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
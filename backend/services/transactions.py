@@ -0,0 +1,270 @@
+"""
+Transaction history, export and overview helpers
+
+Query-string parsing, the opaque keyset cursor, the JSON shape of a ledger
+entry, the streaming export encoders and the dashboard overview built from
+hourly summaries, shared by the WSGI and ASGI routes.
+The cursor encodes the (created_at, id) of the last row on a page; the next
+page starts strictly after it, so clients never see a row twice or skip one
+when new transactions arrive while they page.
+"""
+import base64
+import binascii
+import csv
+import io
+import zlib
+from datetime import datetime, timedelta, timezone
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+CHANNELS = ('upi', 'virtual_account')
+KINDS = ('payment', 'refund')
+STATUSES = ('pending', 'success', 'failed')
+
+
+class HistoryQueryError(ValueError):
+    """Invalid history query parameter; the message is safe to return"""
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just after ``row``"""
+    raw = f"{row.created_at.isoformat()}|{row.id}".encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from encode_cursor()"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, _, id = raw.partition('|')
+        return datetime.fromisoformat(created_at), int(id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HistoryQueryError('Invalid cursor')
+
+
+def _parse_time(value, name):
+    """ISO date or datetime; aware values are converted to naive UTC"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HistoryQueryError(f'{name} must be an ISO 8601 date or datetime')
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_history_args(args):
+    """(limit, before, filters) from the history query string
+
+    ``args`` is the request's query dict (Flask or Quart).
+    """
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise HistoryQueryError('limit must be an integer')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise HistoryQueryError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+
+    cursor = args.get('cursor')
+    before = decode_cursor(cursor) if cursor else None
+    return limit, before, parse_filters(args)
+
+
+def parse_filters(args):
+    """channel/kind/status/since/until filters from the query string"""
+    filters = {}
+    for name, allowed in (('channel', CHANNELS), ('kind', KINDS), ('status', STATUSES)):
+        value = args.get(name)
+        if value:
+            if value not in allowed:
+                raise HistoryQueryError(f"{name} must be one of: {', '.join(allowed)}")
+            filters[name] = value
+    for name in ('since', 'until'):
+        value = args.get(name)
+        if value:
+            filters[name] = _parse_time(value, name)
+    return filters
+
+
+def transaction_json(row):
+    """API shape of a TransactionRow"""
+    return {
+        'id': row.id,
+        'channel': row.channel,
+        'kind': row.kind,
+        'status': row.status,
+        'amount': row.amount,
+        'currency': row.currency,
+        'reference': row.reference,
+        'counterparty': row.counterparty,
+        'description': row.description,
+        'created_at': row.created_at,
+        'updated_at': row.updated_at
+    }
+
+
+def history_page(rows, has_more):
+    """Response data for one page of history"""
+    return {
+        'transactions': [transaction_json(row) for row in rows],
+        'next_cursor': encode_cursor(rows[-1]) if has_more else None,
+        'has_more': has_more
+    }
+
+
+# ----------------------------------------------------------------------
+# Export
+# ----------------------------------------------------------------------
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+EXPORT_COLUMNS = ('id', 'channel', 'kind', 'status', 'amount', 'currency', 'reference',
+                  'counterparty', 'description', 'created_at', 'updated_at')
+
+
+def parse_export_args(args):
+    """(format, gzip, filters) from the export query string"""
+    fmt = args.get('format', 'ndjson').lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HistoryQueryError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    compress = args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return fmt, compress, parse_filters(args)
+
+
+def export_filename(fmt, compress, today=None):
+    name = f"transactions-{(today or datetime.now()).strftime('%Y%m%d')}.{fmt}"
+    return f"{name}.gz" if compress else name
+
+
+class ExportEncoder:
+    """Incremental NDJSON/CSV encoder, optionally gzip-compressed on the fly
+
+    Fed one fetch batch at a time, so memory is bounded by the batch size
+    however many rows the export has. ``dumps_bytes`` is the app's JSON
+    encoder (FastJSONProvider.dumps_bytes).
+    """
+
+    def __init__(self, fmt, dumps_bytes, compress=False, level=6):
+        self.fmt = fmt
+        self.dumps_bytes = dumps_bytes
+        # wbits 31 writes a gzip container rather than a raw zlib stream
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31) if compress else None
+        self.rows = 0
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+
+    def _output(self, data):
+        return self.compressor.compress(data) if self.compressor is not None else data
+
+    def start(self):
+        """Bytes that open the document (the CSV header row)"""
+        if self.fmt != 'csv':
+            return b''
+        self._csv.writerow(EXPORT_COLUMNS)
+        return self._output(self._take())
+
+    def _take(self):
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def encode(self, rows):
+        """Bytes for a batch of TransactionRows (may be empty while gzip buffers)"""
+        self.rows += len(rows)
+        if self.fmt == 'csv':
+            self._csv.writerows(
+                (row.id, row.channel, row.kind, row.status, row.amount, row.currency,
+                 row.reference, row.counterparty, row.description,
+                 row.created_at.isoformat(), row.updated_at.isoformat() if row.updated_at else '')
+                for row in rows
+            )
+            return self._output(self._take())
+        dumps = self.dumps_bytes
+        return self._output(b''.join(dumps(transaction_json(row)) + b'\n' for row in rows))
+
+    def finish(self):
+        """Bytes that close the document (the rest of the gzip stream)"""
+        return self.compressor.flush() if self.compressor is not None else b''
+
+
+def export_chunks(batches, encoder):
+    """Byte chunks for an iterable of row batches"""
+    chunk = encoder.start()
+    if chunk:
+        yield chunk
+    for rows in batches:
+        chunk = encoder.encode(rows)
+        if chunk:
+            yield chunk
+    yield encoder.finish()
+
+
+# ----------------------------------------------------------------------
+# Dashboard overview
+# ----------------------------------------------------------------------
+DEFAULT_OVERVIEW_DAYS = 30
+MAX_OVERVIEW_DAYS = 90
+
+
+def parse_overview_args(args, today):
+    """(first day, days) for the overview window ending ``today`` (UTC)"""
+    try:
+        days = int(args.get('days', DEFAULT_OVERVIEW_DAYS))
+    except ValueError:
+        raise HistoryQueryError('days must be an integer')
+    if not 1 <= days <= MAX_OVERVIEW_DAYS:
+        raise HistoryQueryError(f'days must be between 1 and {MAX_OVERVIEW_DAYS}')
+    return today - timedelta(days=days - 1), days
+
+
+def _overview_totals():
+    return {'transactions': 0, 'successful': 0, 'failed': 0, 'pending': 0, 'success_rate': None,
+            'volume': 0, 'refund_count': 0, 'refunds': 0}
+
+
+def _add_summary(totals, row):
+    if row.kind == 'refund':
+        totals['refund_count'] += row.success_count
+        totals['refunds'] += row.success_amount
+        return
+    totals['transactions'] += row.pending_count + row.success_count + row.failed_count
+    totals['successful'] += row.success_count
+    totals['failed'] += row.failed_count
+    totals['pending'] += row.pending_count
+    totals['volume'] += row.success_amount
+
+
+def _finish_totals(totals):
+    decided = totals['successful'] + totals['failed']
+    if decided:
+        totals['success_rate'] = round(totals['successful'] / decided, 4)
+    return totals
+
+
+def overview_data(rows, first_day, days):
+    """Overview response data from HourlySummaryRows (one per day, channel and kind)
+
+    Payments make up transactions, volume (successful amount) and the
+    success rate (successful out of those no longer pending); successful
+    refunds are reported separately. Amounts are in paise and every day of
+    the window is present.
+    """
+    totals = _overview_totals()
+    channels = {channel: _overview_totals() for channel in CHANNELS}
+    daily = {first_day + timedelta(days=offset): _overview_totals() for offset in range(days)}
+    for row in rows:
+        _add_summary(totals, row)
+        _add_summary(channels[row.channel], row)
+        if row.day in daily:
+            _add_summary(daily[row.day], row)
+    return {
+        'since': first_day,
+        'days': days,
+        'totals': _finish_totals(totals),
+        'channels': {channel: _finish_totals(values) for channel, values in channels.items()},
+        'daily': [dict(date=day, **_finish_totals(values)) for day, values in daily.items()]
+    }
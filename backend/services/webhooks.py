@@ -0,0 +1,629 @@
+"""
+Webhook delivery
+
+Events reach merchants through the webhook_outbox table. Repositories write
+outbox rows in the same transaction as the change they announce
+(WebhookRepository.emit); a WebhookDispatcher, run as its own process by
+webhook_dispatcher.py, delivers them.
+
+The dispatcher claims due rows in batches with FOR UPDATE SKIP LOCKED, so
+several dispatchers can share one outbox. No lock is held while a request is
+in flight: claiming pushes the row's next_attempt_at out by ``lease``, and a
+row whose dispatcher dies simply falls due again when the lease runs out.
+Deliveries run on a thread pool over one requests.Session, which keeps
+connections to each receiver alive, with at most the endpoint's
+max_concurrency requests in flight per endpoint and a few rounds more
+claimed ahead for it. Failures retry with
+exponential backoff; after ``max_attempts`` the row is dead-lettered until an
+operator requeues it. Delivery is at least once, so receivers should dedupe
+on the event id.
+
+Receivers must be public hosts. destination_error() resolves a URL's host
+and refuses private, loopback, link-local (169.254.169.254 included),
+reserved, multicast and unspecified addresses; the API checks it when an
+endpoint is registered and the dispatcher again before every attempt, so a
+host re-pointed at an internal address after registration (DNS rebinding)
+is not reached either.
+"""
+import hashlib
+import hmac
+import ipaddress
+import random
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from queue import Empty, SimpleQueue
+from urllib.parse import urlsplit
+
+import requests
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from requests.adapters import HTTPAdapter
+
+from services.repository import Row, utcnow
+
+SIGNATURE_HEADER = 'X-Davspay-Signature'
+USER_AGENT = 'Davspay-Webhooks/1.0'
+
+ATTEMPT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0, 3600.0, 21600.0)
+
+# Rows are claimed by pushing next_attempt_at past the lease; the subquery
+# takes the row locks, and SKIP LOCKED lets concurrent dispatchers pass each
+# other. {scope} narrows the claim to one endpoint (a range scan on
+# idx_webhook_outbox_endpoint_due) or away from the endpoints already active.
+CLAIM_OUTBOX = """
+    UPDATE webhook_outbox
+    SET next_attempt_at = %s
+    WHERE id IN (
+        SELECT id FROM webhook_outbox
+        WHERE status = 'pending' AND next_attempt_at <= %s{scope}
+        ORDER BY next_attempt_at
+        LIMIT %s{lock}
+    )
+    RETURNING id, endpoint_id, event, payload, attempts, created_at
+"""
+
+LOAD_ENDPOINTS = """
+    SELECT id, url, secret, max_concurrency, enabled
+    FROM webhook_endpoints
+    WHERE id IN ({ids})
+"""
+
+MARK_DELIVERED = """
+    UPDATE webhook_outbox
+    SET status = 'delivered', attempts = attempts + 1, delivered_at = %s,
+        last_status = %s, last_error = NULL
+    WHERE id IN ({ids})
+"""
+
+MARK_RETRY = """
+    UPDATE webhook_outbox
+    SET attempts = attempts + 1, next_attempt_at = %s, last_status = %s, last_error = %s
+    WHERE id = %s
+"""
+
+MARK_DEAD = """
+    UPDATE webhook_outbox
+    SET status = 'dead', attempts = attempts + 1, last_status = %s, last_error = %s
+    WHERE id = %s
+"""
+
+# Hands rows still queued in this process back on shutdown
+RELEASE = """
+    UPDATE webhook_outbox
+    SET next_attempt_at = %s
+    WHERE id IN ({ids})
+"""
+
+COUNT_DUE = """
+    SELECT COUNT(*) FROM webhook_outbox
+    WHERE status = 'pending' AND next_attempt_at <= %s
+"""
+
+OUTBOX_HEAD = """
+    SELECT next_attempt_at FROM webhook_outbox
+    WHERE status = 'pending'
+    ORDER BY next_attempt_at
+    LIMIT 1
+"""
+
+PURGE_DELIVERED = """
+    DELETE FROM webhook_outbox
+    WHERE id IN (
+        SELECT id FROM webhook_outbox
+        WHERE status = 'delivered' AND delivered_at < %s
+        LIMIT %s
+    )
+"""
+
+PURGE_BATCH = 5000
+
+
+class OutboxRow(Row):
+    """A claimed outbox entry; attempts counts earlier tries"""
+    __slots__ = ('id', 'endpoint_id', 'event', 'payload', 'attempts', 'created_at')
+
+
+class _Endpoint:
+    """Per-endpoint delivery state, only touched by the dispatch loop"""
+    __slots__ = ('id', 'url', 'secret', 'limit', 'enabled', 'in_flight', 'waiting', 'idle_until')
+
+    def __init__(self, id):
+        self.id = id
+        self.in_flight = 0
+        self.waiting = deque()
+        self.idle_until = 0.0     # monotonic; no refill before this once it ran dry
+
+
+def sign(secret, timestamp, body):
+    """X-Davspay-Signature value: ``t=<unix time>,v1=<hex HMAC-SHA256>``
+
+    The MAC covers ``"<t>.<body>"``, so a captured request cannot be
+    replayed later with a fresh timestamp.
+    """
+    mac = hmac.new(secret.encode(), f"{timestamp}.".encode() + body, hashlib.sha256)
+    return f"t={timestamp},v1={mac.hexdigest()}"
+
+
+def verify_signature(secret, header, body, tolerance=300, now=None):
+    """Check a signature header as a receiver would"""
+    try:
+        fields = dict(part.split('=', 1) for part in header.split(','))
+        timestamp = int(fields['t'])
+    except (KeyError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > tolerance:
+        return False
+    expected = sign(secret, timestamp, body).rsplit('v1=', 1)[1]
+    return hmac.compare_digest(expected, fields.get('v1', ''))
+
+
+def backoff(attempt, base, cap):
+    """Seconds before retry number ``attempt`` (1-based)
+
+    Doubles per attempt up to ``cap``; the random half spreads out retries
+    from a burst of failures so a recovering receiver is not hit all at once.
+    """
+    delay = min(cap, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def is_public_address(address):
+    """True for an ipaddress address that webhooks may be delivered to"""
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_global and not (
+        address.is_private or address.is_loopback or address.is_link_local or address.is_reserved
+        or address.is_multicast or address.is_unspecified
+    )
+
+
+def destination_error(url):
+    """Why ``url`` may not receive webhooks, or None
+
+    Every address the host resolves to must be public, so a name with one
+    internal record among public ones is refused too.
+    """
+    host = urlsplit(url).hostname
+    if not host:
+        return 'url has no host'
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, None, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        return f"url host {host} does not resolve"
+    for address in sorted(addresses):
+        # Scoped IPv6 addresses carry their interface after a '%'
+        if not is_public_address(ipaddress.ip_address(address.split('%')[0])):
+            return f"url host {host} resolves to a non-public address ({address})"
+    return None
+
+
+def make_session(pool_size):
+    """A Session that keeps up to ``pool_size`` connections alive per host"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=256, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+class DispatcherMetrics:
+    """Prometheus metrics for one dispatcher process, on their own registry"""
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else CollectorRegistry()
+        self.deliveries = Counter(
+            'davspay_webhook_deliveries_total', 'Delivery attempts by outcome',
+            ['outcome'], registry=self.registry
+        )
+        self.attempt_seconds = Histogram(
+            'davspay_webhook_attempt_seconds', 'HTTP round trip of one delivery attempt',
+            buckets=ATTEMPT_BUCKETS, registry=self.registry
+        )
+        self.lag_seconds = Histogram(
+            'davspay_webhook_delivery_lag_seconds', 'Time from event to successful delivery',
+            buckets=LAG_BUCKETS, registry=self.registry
+        )
+        self.in_flight = Gauge(
+            'davspay_webhook_in_flight', 'Deliveries in progress', registry=self.registry
+        )
+        self.due = Gauge(
+            'davspay_webhook_outbox_due', 'Outbox entries due for delivery', registry=self.registry
+        )
+        self.oldest_due_seconds = Gauge(
+            'davspay_webhook_oldest_due_seconds', 'How long the most overdue outbox entry has waited',
+            registry=self.registry
+        )
+
+
+class WebhookDispatcher:
+    """Claims due outbox rows and delivers them; see the module docstring
+
+    ``run()`` owns all dispatch state on the calling thread; the executor's
+    threads only make HTTP requests and hand results back through a queue.
+    """
+
+    def __init__(self, pool, workers=32, batch_size=100, timeout=10.0, max_attempts=12,
+                 retry_base=10.0, retry_max=6 * 3600.0, lease=300.0, poll_interval=1.0,
+                 retention_days=7, stats_interval=15.0, prefetch=4, session=None, metrics=None,
+                 allow_private=False, logger=None):
+        self.pool = pool
+        self.workers = workers
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease = timedelta(seconds=lease)
+        self.poll_interval = poll_interval
+        self.retention = timedelta(days=retention_days)
+        self.stats_interval = stats_interval
+        self.session = session if session is not None else make_session(workers)
+        self.metrics = metrics
+        self.allow_private = allow_private
+        self.logger = logger
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._results = SimpleQueue()
+        self._wake = threading.Event()
+        self._endpoints = {}
+        self._outstanding = 0      # claimed here and not yet recorded
+        self._in_flight = 0
+        self._draining = False
+
+        self._totals = {'delivered': 0, 'retried': 0, 'dead': 0}
+        self._lags = deque(maxlen=10000)
+        self._window = (time.monotonic(), 0)
+        self._next_discovery = 0.0
+        self._next_housekeeping = 0.0
+        self._next_purge = 0.0
+
+    # ------------------------------------------------------------------
+    # Loop
+    # ------------------------------------------------------------------
+    def run(self, stop):
+        """Deliver until ``stop`` (a threading.Event) is set, then drain"""
+        try:
+            while not stop.is_set():
+                try:
+                    busy = self.step()
+                except Exception as e:
+                    if self.logger is not None:
+                        self.logger.error(f"Webhook dispatch error: {e}")
+                    busy = False
+                if not busy:
+                    self._wake.wait(self.poll_interval)
+        finally:
+            self.drain()
+
+    def step(self):
+        """One pass: record finished deliveries, claim more; True if there may be more work now"""
+        self._wake.clear()
+        conn = self.pool.getconn()
+        try:
+            recorded = self._record(conn)
+            claimed = 0
+            if not self._draining:
+                claimed = self._refill(conn) + self._discover(conn)
+            if time.monotonic() >= self._next_housekeeping:
+                self._housekeeping(conn)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return recorded > 0 or claimed > 0
+
+    def drain(self, timeout=None):
+        """Stop claiming, wait for in-flight requests and hand queued rows back"""
+        self._draining = True
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout * 2)
+        while self._in_flight and time.monotonic() < deadline:
+            self._wake.wait(0.1)
+            self._wake.clear()
+            self._with_connection(self._record)
+
+        waiting = [row.id for endpoint in self._endpoints.values() for row in endpoint.waiting]
+        if waiting:
+            def release(conn):
+                cursor = conn.cursor()
+                cursor.execute(self._sql(conn, RELEASE, len(waiting)), [utcnow()] + waiting)
+                conn.commit()
+            self._with_connection(release)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _with_connection(self, fn):
+        conn = self.pool.getconn()
+        try:
+            return fn(conn)
+        except Exception as e:
+            conn.rollback()
+            if self.logger is not None:
+                self.logger.error(f"Webhook dispatch error: {e}")
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _sql(conn, sql, ids=0):
+        """``sql`` for the connection's dialect, with ``ids`` placeholders in {ids}"""
+        if '{ids}' in sql:
+            sql = sql.replace('{ids}', ', '.join(['%s'] * ids))
+        return sql.replace('%s', '?') if conn.dialect == 'sqlite' else sql
+
+    # ------------------------------------------------------------------
+    # Claiming
+    # ------------------------------------------------------------------
+    def _refill(self, conn):
+        """Top up endpoints already being delivered to that are running low
+
+        Each endpoint keeps up to ``prefetch`` rounds of max_concurrency rows
+        queued here, so a slow receiver holds only its own share of the batch
+        and the claim is a short index range scan rather than a walk past
+        everybody else's backlog.
+        """
+        claimed = 0
+        now = time.monotonic()
+        for endpoint in list(self._endpoints.values()):
+            room = self.batch_size - self._outstanding
+            if room <= 0:
+                break
+            target = endpoint.limit * self.prefetch
+            if not endpoint.enabled or len(endpoint.waiting) > target // 2 or endpoint.idle_until > now:
+                continue
+            wanted = min(target - len(endpoint.waiting), room)
+            got = self._claim(conn, wanted, " AND endpoint_id = %s", [endpoint.id])
+            if got < wanted:
+                endpoint.idle_until = now + self.poll_interval
+            claimed += got
+        return claimed
+
+    def _discover(self, conn):
+        """Claim from the head of the outbox for endpoints not active here
+
+        Runs once per poll interval, or again straight away while it keeps
+        filling the batch.
+        """
+        room = self.batch_size - self._outstanding
+        if room <= 0 or time.monotonic() < self._next_discovery:
+            return 0
+        active = list(self._endpoints)[:500]
+        scope = f" AND endpoint_id NOT IN ({', '.join(['%s'] * len(active))})" if active else ''
+        claimed = self._claim(conn, room, scope, active)
+        self._next_discovery = 0.0 if claimed == room else time.monotonic() + self.poll_interval
+        return claimed
+
+    def _claim(self, conn, limit, scope, params):
+        now = utcnow()
+        lock = '' if conn.dialect == 'sqlite' else ' FOR UPDATE SKIP LOCKED'
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self._sql(conn, CLAIM_OUTBOX.format(scope=scope, lock=lock)),
+                           [now + self.lease, now] + params + [limit])
+            rows = [OutboxRow(row) for row in cursor.fetchall()]
+            unknown = {row.endpoint_id for row in rows} - self._endpoints.keys()
+            if unknown:
+                self._load_endpoints(conn, cursor, unknown)
+            conn.commit()
+        finally:
+            cursor.close()
+
+        rows.sort(key=lambda row: row.id)
+        for row in rows:
+            self._dispatch(row)
+        return len(rows)
+
+    def _load_endpoints(self, conn, cursor, ids):
+        """Refresh url, secret, limit and enabled for ``ids``"""
+        ids = sorted(ids)
+        cursor.execute(self._sql(conn, LOAD_ENDPOINTS, len(ids)), ids)
+        found = set()
+        for id, url, secret, limit, enabled in cursor.fetchall():
+            endpoint = self._endpoints.get(id)
+            if endpoint is None:
+                endpoint = self._endpoints[id] = _Endpoint(id)
+            endpoint.url, endpoint.secret, endpoint.limit, endpoint.enabled = url, secret, limit, bool(enabled)
+            found.add(id)
+        for id in set(ids) - found:
+            endpoint = self._endpoints.setdefault(id, _Endpoint(id))
+            endpoint.url = endpoint.secret = None
+            endpoint.limit, endpoint.enabled = 1, False
+
+    def _dispatch(self, row):
+        self._outstanding += 1
+        endpoint = self._endpoints[row.endpoint_id]
+        endpoint.waiting.append(row)
+        self._pump(endpoint)
+
+    def _pump(self, endpoint):
+        if not endpoint.enabled:
+            while endpoint.waiting:
+                self._results.put((endpoint.waiting.popleft(), None, 'Endpoint disabled', None, None, True))
+        while endpoint.waiting and endpoint.in_flight < endpoint.limit:
+            row = endpoint.waiting.popleft()
+            endpoint.in_flight += 1
+            self._in_flight += 1
+            self._executor.submit(self._deliver, row, endpoint.url, endpoint.secret)
+        if self.metrics is not None:
+            self.metrics.in_flight.set(self._in_flight)
+
+    # ------------------------------------------------------------------
+    # Delivery (executor threads)
+    # ------------------------------------------------------------------
+    def _deliver(self, row, url, secret):
+        body = row.payload.encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Davspay-Event': row.event,
+            'X-Davspay-Delivery': str(row.id),
+            SIGNATURE_HEADER: sign(secret, int(time.time()), body)
+        }
+        status = error = retry_after = None
+        start = time.perf_counter()
+        try:
+            # Resolved again for every attempt: the name may point elsewhere now
+            if not self.allow_private:
+                error = destination_error(url)
+            if error is None:
+                response = self.session.post(url, data=body, headers=headers, timeout=self.timeout,
+                                             allow_redirects=False)
+                status = response.status_code
+                if not 200 <= status < 300:
+                    error = f"HTTP {status}"
+                    if status in (429, 503):
+                        retry_after = response.headers.get('Retry-After')
+                response.close()
+        except requests.RequestException as e:
+            error = f"{type(e).__name__}: {e}"
+        except Exception as e:  # never lose a result, or the row waits out its lease
+            error = f"{type(e).__name__}: {e}"
+        self._results.put((row, status, error, time.perf_counter() - start, retry_after, False))
+        self._wake.set()
+
+    # ------------------------------------------------------------------
+    # Results
+    # ------------------------------------------------------------------
+    def _record(self, conn):
+        """Write finished deliveries back in one transaction; returns how many"""
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except Empty:
+                break
+        if not results:
+            return 0
+
+        now = utcnow()
+        delivered = {}
+        retry = []
+        dead = []
+        touched = set()
+        for row, status, error, seconds, retry_after, final in results:
+            self._outstanding -= 1
+            # Disabled-endpoint results can outlive the endpoint's entry;
+            # anything that was in flight still has one
+            endpoint = self._endpoints.get(row.endpoint_id)
+            if endpoint is not None:
+                touched.add(endpoint)
+            if seconds is not None:
+                self._in_flight -= 1
+                endpoint.in_flight -= 1
+                if self.metrics is not None:
+                    self.metrics.attempt_seconds.observe(seconds)
+
+            if error is None:
+                delivered.setdefault(status, []).append(row.id)
+                lag = max((now - datetime_from_db(row.created_at)).total_seconds(), 0.0)
+                self._lags.append(lag)
+                self._count('delivered', lag=lag)
+            elif final or row.attempts + 1 >= self.max_attempts:
+                dead.append((status, error[:255], row.id))
+                self._count('dead')
+            else:
+                delay = backoff(row.attempts + 1, self.retry_base, self.retry_max)
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, min(float(retry_after), self.retry_max))
+                retry.append((now + timedelta(seconds=delay), status, error[:255], row.id))
+                self._count('retried')
+
+        for endpoint in touched:
+            self._pump(endpoint)
+            if not endpoint.in_flight and not endpoint.waiting:
+                self._endpoints.pop(endpoint.id, None)
+        if self.metrics is not None:
+            self.metrics.in_flight.set(self._in_flight)
+
+        # A failed write leaves the rows pending; they are delivered again
+        # once their lease expires (at least once, never lost)
+        cursor = conn.cursor()
+        try:
+            for status, ids in delivered.items():
+                cursor.execute(self._sql(conn, MARK_DELIVERED, len(ids)), [now, status] + ids)
+            if retry:
+                cursor.executemany(self._sql(conn, MARK_RETRY), retry)
+            if dead:
+                cursor.executemany(self._sql(conn, MARK_DEAD), dead)
+            conn.commit()
+        finally:
+            cursor.close()
+        return len(results)
+
+    def _count(self, outcome, lag=None):
+        self._totals[outcome] += 1
+        if self.metrics is not None:
+            self.metrics.deliveries.labels(outcome).inc()
+            if lag is not None:
+                self.metrics.lag_seconds.observe(lag)
+
+    # ------------------------------------------------------------------
+    # Housekeeping and stats
+    # ------------------------------------------------------------------
+    def _housekeeping(self, conn):
+        self._next_housekeeping = time.monotonic() + self.stats_interval
+        now = utcnow()
+        cursor = conn.cursor()
+        try:
+            cursor.execute(self._sql(conn, COUNT_DUE), (now,))
+            due = cursor.fetchone()[0]
+            cursor.execute(OUTBOX_HEAD)
+            head = cursor.fetchone()
+            oldest = max((now - datetime_from_db(head[0])).total_seconds(), 0.0) if head else 0.0
+            # Pick up endpoints disabled or edited while they stayed busy here
+            if self._endpoints:
+                self._load_endpoints(conn, cursor, list(self._endpoints))
+
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + 3600
+                purged = PURGE_BATCH
+                while purged == PURGE_BATCH:
+                    cursor.execute(self._sql(conn, PURGE_DELIVERED), (now - self.retention, PURGE_BATCH))
+                    purged = cursor.rowcount
+                    conn.commit()
+            conn.commit()
+        finally:
+            cursor.close()
+
+        if self.metrics is not None:
+            self.metrics.due.set(due)
+            self.metrics.oldest_due_seconds.set(oldest)
+        if self.logger is not None and (self._totals['delivered'] or due):
+            stats = self.stats()
+            self.logger.info(
+                f"Webhooks: {stats['deliveries_per_second']}/s delivered, lag p50 {stats['lag_p50']}s "
+                f"p99 {stats['lag_p99']}s, {due} due (oldest {oldest:.1f}s), "
+                f"{stats['in_flight']} in flight, totals {self._totals}"
+            )
+
+    def stats(self):
+        """Totals, throughput since the previous call and recent delivery-lag percentiles (seconds)"""
+        now = time.monotonic()
+        started, delivered = self._window
+        elapsed = now - started
+        rate = (self._totals['delivered'] - delivered) / elapsed if elapsed > 0 else 0.0
+        self._window = (now, self._totals['delivered'])
+
+        lags = sorted(self._lags)
+
+        def percentile(p):
+            return round(lags[min(int(len(lags) * p), len(lags) - 1)], 3) if lags else None
+
+        return {
+            **self._totals,
+            'in_flight': self._in_flight,
+            'queued': sum(len(endpoint.waiting) for endpoint in self._endpoints.values()),
+            'endpoints': len(self._endpoints),
+            'deliveries_per_second': round(rate, 1),
+            'lag_p50': percentile(0.5),
+            'lag_p95': percentile(0.95),
+            'lag_p99': percentile(0.99)
+        }
+
+
+def datetime_from_db(value):
+    """TIMESTAMP values SQLite hands back untyped (RETURNING, aggregates)"""
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
@@ -0,0 +1,42 @@
+"""
+Daily settlement run for Davspay Backend
+
+Computes every merchant's settlement for one UTC day from the transactions
+ledger and stores it in the settlements table (see services/settlements.py).
+Run it once a day after midnight UTC, e.g. from cron:
+
+    15 0 * * * cd /path/to/backend && python settle.py production
+
+Re-running a day replaces that day's settlements, so a late status callback
+can be folded in by settling the day again.
+
+Usage:
+    python settle.py [development|production] [--date YYYY-MM-DD]
+"""
+import argparse
+import logging
+from datetime import date, timedelta
+
+from app import create_app, create_settlement_engine
+from services.repository import utcnow
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Settle one day's transactions")
+    parser.add_argument('env', nargs='?', default='production', choices=('development', 'production'))
+    parser.add_argument('--date', type=date.fromisoformat, default=None,
+                        help='day to settle (default: yesterday, UTC)')
+    args = parser.parse_args()
+
+    app = create_app(args.env)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    app.logger.setLevel(logging.INFO)
+
+    day = args.date or (utcnow().date() - timedelta(days=1))
+    summary = create_settlement_engine(app).run(day)
+    app.logger.info(f"Settlement summary: {summary}")
+    app.db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Shared fixtures: one app per storage driver, and registered merchants
+
+Every test runs against SQLite (a fresh file per session) and PostgreSQL.
+The PostgreSQL run uses the testing config's database (DB_* variables,
+default davspay_test_db), which is emptied first; it is skipped when no
+server answers. Each test registers its own merchants, so tests do not
+see each other's rows.
+"""
+import socket
+import uuid
+
+import psycopg2
+import pytest
+
+from app import create_app
+from config import config
+from services.schema import apply_schema
+from services.ifsc import write_directory
+
+ADMIN_TOKEN = 'test-admin-token'
+PASSWORD = 'Password1234'
+
+# (ifsc, bank, branch, city, district, state, micr, flags): UPI, NEFT, RTGS, IMPS bits
+BRANCHES = [
+    ('HDFC0000001', 'HDFC Bank', 'Fort', 'Mumbai', 'Mumbai', 'Maharashtra', '400240002', 0b1111),
+    ('SBIN0000691', 'State Bank of India', 'New Delhi Main', 'New Delhi', 'New Delhi', 'Delhi',
+     '110002087', 0b0110),
+]
+
+# Webhook hosts the tests register, resolved without a network
+HOSTS = {
+    'hooks.example.com': ['93.184.216.34'],
+    'internal.example.com': ['10.0.0.5'],
+    'mixed.example.com': ['93.184.216.34', '127.0.0.1'],
+}
+
+TABLES = ('idempotency_keys', 'token_revocations', 'api_keys', 'webhook_outbox', 'webhook_endpoints',
+          'settlements', 'transaction_hourly', 'transactions', 'users')
+
+
+def postgresql_connection():
+    """A connection to the testing database, or None if there is no server"""
+    cfg = config['testing']
+    try:
+        return psycopg2.connect(host=cfg.DB_HOST, database=cfg.DB_NAME, user=cfg.DB_USER,
+                                password=cfg.DB_PASSWORD, port=cfg.DB_PORT, connect_timeout=2)
+    except psycopg2.OperationalError:
+        return None
+
+
+def reset_postgresql(conn):
+    """Bring the testing database to the current schema with no rows"""
+    try:
+        apply_schema(conn, 'postgresql')
+        with conn.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope='session', params=['sqlite', 'postgresql'])
+def app(request, tmp_path_factory):
+    driver = request.param
+    base = tmp_path_factory.mktemp(driver)
+    if driver == 'postgresql':
+        conn = postgresql_connection()
+        if conn is None:
+            pytest.skip('no PostgreSQL server for the testing config')
+        reset_postgresql(conn)
+
+    ifsc_path = str(base / 'ifsc.dir')
+    write_directory(BRANCHES, ifsc_path)
+
+    app = create_app('testing', config_overrides={
+        'STORAGE_BACKEND': driver,
+        'SQLITE_PATH': str(base / 'davspay.db'),
+        'ADMIN_API_TOKEN': ADMIN_TOKEN,
+        'IFSC_DIRECTORY_PATH': ifsc_path,
+        'IMPORT_DIR': str(base / 'imports'),
+        'IMPORT_HASH_WORKERS': 0,
+        'PASSWORD_HASH_WORKERS': 0,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'WEB_CONCURRENCY': 1,
+        'PROFILE_CACHE_BACKEND': 'memory',
+        'JWT_PROFILE_CLAIMS': False,
+        'PENNY_DROP_ADAPTER': 'stub',
+        'PENNY_DROP_STUB_LATENCY': 0,
+    })
+    app.driver = driver
+    yield app
+
+    app.penny_drop.close()
+    app.password_hasher.shutdown()
+    app.db_pool.closeall()
+
+
+@pytest.fixture(autouse=True)
+def fake_dns(monkeypatch):
+    """Answer getaddrinfo for HOSTS; IP literals still go to the real resolver"""
+    resolve = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if host in HOSTS:
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, port or 0))
+                    for address in HOSTS[host]]
+        return resolve(host, port, *args, **kwargs)
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin_headers():
+    return {'X-Admin-Token': ADMIN_TOKEN}
+
+
+class Merchant:
+    """A registered user and the headers that authenticate as them"""
+
+    def __init__(self, email, user_id, token):
+        self.email = email
+        self.id = user_id
+        self.token = token
+
+    @property
+    def headers(self):
+        return {'Authorization': f'Bearer {self.token}'}
+
+
+def unique_email():
+    return f'merchant-{uuid.uuid4().hex[:12]}@example.com'
+
+
+def register_merchant(client, **fields):
+    body = {'email': unique_email(), 'password': PASSWORD, 'full_name': 'Test Merchant', **fields}
+    response = client.post('/api/auth/register', json=body)
+    assert response.status_code == 201, response.get_json()
+    data = response.get_json()['data']
+    return Merchant(body['email'], data['user']['id'], data['access_token'])
+
+
+@pytest.fixture
+def merchant(client):
+    return register_merchant(client)
+
+
+@pytest.fixture
+def other_merchant(client):
+    return register_merchant(client)
@@ -0,0 +1,135 @@
+"""Operator routes under /api/admin"""
+import time
+
+from conftest import PASSWORD, unique_email
+from test_api_keys import bearer, create_key
+from test_webhooks import create_endpoint
+
+
+def dead_letter(app, outbox_id):
+    """Mark an outbox entry dead, as the dispatcher does after its last attempt"""
+    conn = app.db_pool.getconn()
+    try:
+        placeholder = '?' if conn.dialect == 'sqlite' else '%s'
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE webhook_outbox SET status = 'dead', attempts = 12 WHERE id = {placeholder}",
+                       (outbox_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def wait_for_import(client, admin_headers, status_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(status_url, headers=admin_headers).get_json()['data']['job']
+        if job['state'] in ('completed', 'failed') or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_admin_routes_require_the_token(client):
+    for method, path in (('get', '/api/admin/slow-queries'), ('delete', '/api/admin/slow-queries'),
+                         ('get', '/api/admin/webhooks'), ('post', '/api/admin/webhooks/requeue'),
+                         ('post', '/api/admin/users/1/deactivate'), ('post', '/api/admin/imports/users'),
+                         ('get', '/api/admin/imports/0123456789abcdef0123456789abcdef')):
+        response = getattr(client, method)(path, headers={'X-Admin-Token': 'wrong'})
+        assert response.status_code == 401, path
+
+
+def test_slow_queries(client, admin_headers):
+    response = client.get('/api/admin/slow-queries?limit=5', headers=admin_headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert {'pid', 'stats', 'summary', 'entries'} <= set(data)
+
+    assert client.delete('/api/admin/slow-queries', headers=admin_headers).status_code == 200
+    assert client.get('/api/admin/slow-queries', headers=admin_headers).get_json()['data']['entries'] == []
+
+
+def test_user_import(client, admin_headers, merchant):
+    new_email = unique_email()
+    upload = (
+        'email,full_name,password,company_name\n'
+        f'{new_email},Imported User,{PASSWORD},Imports Ltd\n'
+        'not-an-email,Broken Row,Password1234,\n'
+    ).encode()
+    response = client.post('/api/admin/imports/users?format=csv', headers=admin_headers, data=upload,
+                           content_type='text/csv')
+    assert response.status_code == 202
+    data = response.get_json()['data']
+
+    job = wait_for_import(client, admin_headers, data['status_url'])
+    assert job['state'] == 'completed'
+    assert (job['imported'], job['rejected']) == (1, 1)
+
+    report = client.get(data['report_url'], headers=admin_headers)
+    assert report.status_code == 200
+    assert b'not-an-email' in report.data
+
+    login = client.post('/api/auth/login', json={'email': new_email, 'password': PASSWORD})
+    assert login.status_code == 200
+
+
+def test_user_import_rejects_unknown_formats(client, admin_headers):
+    response = client.post('/api/admin/imports/users', headers=admin_headers, data=b'x',
+                           content_type='application/octet-stream')
+    assert response.status_code == 400
+
+
+def test_unknown_import_job(client, admin_headers):
+    job_id = '0123456789abcdef0123456789abcdef'
+    assert client.get(f'/api/admin/imports/{job_id}', headers=admin_headers).status_code == 404
+    assert client.get(f'/api/admin/imports/{job_id}/errors', headers=admin_headers).status_code == 404
+
+
+def test_webhook_outbox_and_requeue(app, client, admin_headers, merchant):
+    endpoint = create_endpoint(client, merchant)
+    delivery_id = client.post(f"/api/webhooks/{endpoint['id']}/test",
+                              headers=merchant.headers).get_json()['data']['delivery_id']
+    dead_letter(app, delivery_id)
+
+    response = client.get('/api/admin/webhooks', headers=admin_headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert 'outbox' in data
+    assert delivery_id in [entry['id'] for entry in data['dead_letters']]
+
+    response = client.post('/api/admin/webhooks/requeue', headers=admin_headers, json={'ids': [delivery_id]})
+    assert response.status_code == 200
+    assert response.get_json()['data']['requeued'] == 1
+
+    dead_letter(app, delivery_id)
+    response = client.post('/api/admin/webhooks/requeue', headers=admin_headers,
+                           json={'endpoint_id': endpoint['id']})
+    assert response.get_json()['data']['requeued'] == 1
+
+
+def test_requeue_validates_its_body(client, admin_headers):
+    for body in ({}, {'ids': 'x'}, {'ids': ['1']}, {'endpoint_id': 'x'}):
+        response = client.post('/api/admin/webhooks/requeue', headers=admin_headers, json=body)
+        assert response.status_code == 400, body
+
+
+def test_deactivate_user(client, admin_headers, merchant):
+    response = client.post(f'/api/admin/users/{merchant.id}/deactivate', headers=admin_headers)
+    assert response.status_code == 200
+    assert response.get_json()['data']['user'] == {'id': merchant.id, 'email': merchant.email,
+                                                   'is_active': False}
+
+    # Tokens already issued stop working, and login is refused
+    assert client.get('/api/auth/me', headers=merchant.headers).status_code == 401
+    login = client.post('/api/auth/login', json={'email': merchant.email, 'password': PASSWORD})
+    assert login.status_code == 403
+
+    again = client.post(f'/api/admin/users/{merchant.id}/deactivate', headers=admin_headers)
+    assert again.status_code == 404
+
+
+def test_deactivate_user_disables_api_keys(client, admin_headers, merchant):
+    key = create_key(client, merchant)
+    assert client.get('/api/transactions', headers=bearer(key)).status_code == 200
+
+    client.post(f'/api/admin/users/{merchant.id}/deactivate', headers=admin_headers)
+    assert client.get('/api/transactions', headers=bearer(key)).status_code == 401
+    assert client.get('/api/transactions/export', headers=bearer(key)).status_code == 401
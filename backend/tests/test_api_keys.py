@@ -0,0 +1,86 @@
+"""Server-to-server API keys under /api/api-keys"""
+import os
+
+from services.api_keys import ApiKeyIndex, api_key_digest, generate_api_key
+from services.repository import ApiKeyChangeRow
+
+
+def create_key(client, merchant, name='Backend'):
+    response = client.post('/api/api-keys', headers=merchant.headers, json={'name': name})
+    assert response.status_code == 201
+    return response.get_json()['data']['api_key']
+
+
+def bearer(key):
+    return {'Authorization': f"Bearer {key['key']}"}
+
+
+def test_create_and_list(client, merchant):
+    key = create_key(client, merchant)
+    assert key['name'] == 'Backend'
+    assert key['key'].startswith(key['prefix'])
+
+    response = client.get('/api/api-keys', headers=merchant.headers)
+    assert response.status_code == 200
+    keys = response.get_json()['data']['api_keys']
+    assert [entry['id'] for entry in keys] == [key['id']]
+    assert 'key' not in keys[0]
+
+
+def test_create_rejects_long_names(client, merchant):
+    response = client.post('/api/api-keys', headers=merchant.headers, json={'name': 'x' * 101})
+    assert response.status_code == 400
+
+
+def test_key_authenticates_merchant_routes(client, merchant):
+    key = create_key(client, merchant)
+    assert client.get('/api/transactions', headers=bearer(key)).status_code == 200
+    assert client.get('/api/settlements', headers=bearer(key)).status_code == 200
+    assert client.get('/api/validation/ifsc/HDFC0000001', headers=bearer(key)).status_code == 200
+
+    # Dashboard-only routes still need the JWT
+    assert client.get('/api/auth/me', headers=bearer(key)).status_code in (401, 422)
+    assert client.get('/api/transactions', headers={'Authorization': 'Bearer live_sk_unknown'}).status_code == 401
+
+
+def test_rotate_with_and_without_grace(client, merchant):
+    key = create_key(client, merchant)
+    response = client.post(f"/api/api-keys/{key['id']}/rotate", headers=merchant.headers,
+                           json={'grace_seconds': 3600})
+    assert response.status_code == 201
+    rotated = response.get_json()['data']['api_key']
+    assert client.get('/api/transactions', headers=bearer(rotated)).status_code == 200
+    assert client.get('/api/transactions', headers=bearer(key)).status_code == 200
+
+    response = client.post(f"/api/api-keys/{rotated['id']}/rotate", headers=merchant.headers,
+                           json={'grace_seconds': 0})
+    assert response.status_code == 201
+    assert client.get('/api/transactions', headers=bearer(rotated)).status_code == 401
+
+
+def test_rotate_validates_grace(client, merchant):
+    key = create_key(client, merchant)
+    response = client.post(f"/api/api-keys/{key['id']}/rotate", headers=merchant.headers,
+                           json={'grace_seconds': -1})
+    assert response.status_code == 400
+
+
+def test_revoke(client, merchant, other_merchant):
+    key = create_key(client, merchant)
+    assert client.delete(f"/api/api-keys/{key['id']}", headers=other_merchant.headers).status_code == 404
+
+    assert client.delete(f"/api/api-keys/{key['id']}", headers=merchant.headers).status_code == 200
+    assert client.get('/api/transactions', headers=bearer(key)).status_code == 401
+    assert client.delete(f"/api/api-keys/{key['id']}", headers=merchant.headers).status_code == 404
+    assert client.get('/api/api-keys', headers=merchant.headers).get_json()['data']['api_keys'] == []
+
+
+def test_index_rejects_keys_of_inactive_merchants():
+    index = ApiKeyIndex(changes=None)
+    key = generate_api_key()
+    row = ApiKeyChangeRow((1, 7, api_key_digest(key), None, None, 1, False))
+    index._apply(row, 0)
+    index._loaded.set()
+    index._pid = os.getpid()
+    assert index.authenticate(key) is None
+    assert index.stats()['inactive'] == 1
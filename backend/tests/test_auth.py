@@ -0,0 +1,149 @@
+"""Registration, login, logout and the profile routes under /api/auth"""
+from types import SimpleNamespace
+
+from app import create_profile_cache
+from conftest import PASSWORD, register_merchant, unique_email
+
+
+def test_register_returns_user_and_token(client):
+    email = unique_email()
+    response = client.post('/api/auth/register', json={
+        'email': email.upper(), 'password': PASSWORD, 'full_name': ' Asha Rao ', 'company_name': 'Rao Traders'
+    })
+    assert response.status_code == 201
+    data = response.get_json()['data']
+    assert data['user']['email'] == email
+    assert data['user']['full_name'] == 'Asha Rao'
+    assert data['user']['company_name'] == 'Rao Traders'
+    assert data['access_token']
+
+
+def test_register_rejects_missing_fields_and_short_passwords(client):
+    response = client.post('/api/auth/register', json={'email': unique_email(), 'password': PASSWORD})
+    assert response.status_code == 400
+
+    response = client.post('/api/auth/register', json={
+        'email': unique_email(), 'password': 'short', 'full_name': 'Test'
+    })
+    assert response.status_code == 400
+    assert 'at least 8 characters' in response.get_json()['message']
+
+    response = client.post('/api/auth/register', json={
+        'email': 'not-an-email', 'password': PASSWORD, 'full_name': 'Test'
+    })
+    assert response.status_code == 400
+
+
+def test_register_refuses_a_taken_email(client, merchant):
+    response = client.post('/api/auth/register', json={
+        'email': merchant.email, 'password': PASSWORD, 'full_name': 'Someone Else'
+    })
+    assert response.status_code == 409
+
+
+def test_login(client, merchant):
+    response = client.post('/api/auth/login', json={'email': merchant.email, 'password': PASSWORD})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['user']['id'] == merchant.id
+    assert data['user']['verification_status'] == 'not_submitted'
+
+    me = client.get('/api/auth/me', headers={'Authorization': f"Bearer {data['access_token']}"})
+    assert me.status_code == 200
+
+
+def test_login_rejects_bad_credentials(client, merchant):
+    response = client.post('/api/auth/login', json={'email': merchant.email, 'password': 'Wrong12345'})
+    assert response.status_code == 401
+    response = client.post('/api/auth/login', json={'email': unique_email(), 'password': PASSWORD})
+    assert response.status_code == 401
+    response = client.post('/api/auth/login', json={'email': merchant.email})
+    assert response.status_code == 400
+
+
+def test_me(client, merchant):
+    response = client.get('/api/auth/me', headers=merchant.headers)
+    assert response.status_code == 200
+    user = response.get_json()['data']['user']
+    assert user['id'] == merchant.id
+    assert user['email'] == merchant.email
+    assert user['is_verified'] is False
+    assert user['verification_status'] == 'not_submitted'
+
+
+def test_me_requires_a_valid_token(client):
+    assert client.get('/api/auth/me').status_code == 401
+    response = client.get('/api/auth/me', headers={'Authorization': 'Bearer not.a.token'})
+    assert response.status_code in (401, 422)
+
+
+def test_logout_revokes_the_token(client, merchant):
+    other_session = client.post('/api/auth/login', json={'email': merchant.email, 'password': PASSWORD})
+    other_token = other_session.get_json()['data']['access_token']
+
+    response = client.post('/api/auth/logout', headers=merchant.headers)
+    assert response.status_code == 200
+
+    response = client.get('/api/auth/me', headers=merchant.headers)
+    assert response.status_code == 401
+    assert client.post('/api/auth/logout', headers=merchant.headers).status_code == 401
+
+    # Only the token used to log out is revoked
+    response = client.get('/api/auth/me', headers={'Authorization': f'Bearer {other_token}'})
+    assert response.status_code == 200
+
+
+def test_update_profile(client, merchant):
+    response = client.put('/api/auth/update-profile', headers=merchant.headers,
+                          json={'full_name': 'New Name', 'phone': '9876543210'})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['user']['full_name'] == 'New Name'
+    assert data['user']['phone'] == '9876543210'
+    assert data['access_token']
+
+    # The profile cache was invalidated
+    me = client.get('/api/auth/me', headers=merchant.headers).get_json()['data']['user']
+    assert me['full_name'] == 'New Name'
+
+
+def test_update_profile_needs_a_field(client, merchant):
+    response = client.put('/api/auth/update-profile', headers=merchant.headers, json={'full_name': ''})
+    assert response.status_code == 400
+
+
+def test_verification(client, merchant):
+    status = client.get('/api/auth/verification-status', headers=merchant.headers)
+    assert status.status_code == 200
+    assert status.get_json()['data']['verification_status'] == 'not_submitted'
+
+    response = client.post('/api/auth/submit-verification', headers=merchant.headers)
+    assert response.status_code == 200
+    assert response.get_json()['data']['user']['verification_status'] == 'pending'
+
+    status = client.get('/api/auth/verification-status', headers=merchant.headers).get_json()['data']
+    assert status['verification_status'] == 'pending'
+    assert status['verification_submitted_at'] is not None
+
+    again = client.post('/api/auth/submit-verification', headers=merchant.headers)
+    assert again.status_code == 400
+
+
+def test_tokens_are_per_user(client, merchant):
+    other = register_merchant(client)
+    me = client.get('/api/auth/me', headers=other.headers).get_json()['data']['user']
+    assert me['id'] == other.id != merchant.id
+
+
+def test_memory_profile_cache_is_short_lived_with_several_workers():
+    settings = {'PROFILE_CACHE_BACKEND': 'memory', 'PROFILE_CACHE_TTL': 60, 'PROFILE_CACHE_MAX_ENTRIES': 100,
+                'PROFILE_CACHE_MULTI_WORKER_TTL': 5, 'WEB_CONCURRENCY': 1}
+    assert create_profile_cache(SimpleNamespace(config=settings)).ttl == 60
+    settings['WEB_CONCURRENCY'] = 9
+    assert create_profile_cache(SimpleNamespace(config=settings)).ttl == 5
+
+    settings['PROFILE_CACHE_MULTI_WORKER_TTL'] = 0
+    cache = create_profile_cache(SimpleNamespace(config=settings))
+    _, token = cache.get(1)
+    cache.fill(1, token, {'id': 1})
+    assert cache.get(1)[0] is None
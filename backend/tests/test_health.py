@@ -0,0 +1,53 @@
+"""Status pages, health checks and metrics"""
+
+
+def test_index_page(client):
+    response = client.get('/')
+    assert response.status_code == 200
+
+
+def test_api_root_lists_every_endpoint(client, app):
+    response = client.get('/api/')
+    assert response.status_code == 200
+    endpoints = response.get_json()['endpoints']
+    routed = {rule.endpoint for rule in app.url_map.iter_rules() if rule.rule.startswith('/api')}
+    assert routed <= set(endpoints)
+
+    assert endpoints['auth.register']['requires_auth'] is False
+    assert endpoints['auth.get_current_user']['auth'] == ['jwt']
+    assert endpoints['auth.get_transactions']['auth'] == ['jwt', 'api_key']
+    assert endpoints['admin.deactivate_user']['auth'] == ['admin_token']
+
+
+def test_health(client):
+    response = client.get('/api/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'healthy'
+
+
+def test_health_stats_requires_the_admin_token(client, admin_headers):
+    assert client.get('/api/health/stats').status_code == 401
+    assert client.get('/api/health/stats', headers={'X-Admin-Token': 'wrong'}).status_code == 401
+
+    response = client.get('/api/health/stats', headers=admin_headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    for section in ('db_pool', 'password_hasher', 'profile_cache', 'api_key_index', 'revocation_list',
+                    'idempotency'):
+        assert section in data
+
+
+def test_metrics_requires_the_admin_token(client, admin_headers):
+    client.get('/api/health')
+    assert client.get('/api/metrics').status_code == 401
+    assert client.get('/api/metrics', headers={'X-Admin-Token': 'wrong'}).status_code == 401
+
+    response = client.get('/api/metrics', headers=admin_headers)
+    assert response.status_code == 200
+    assert b'# TYPE' in response.data
+
+
+def test_unknown_route(client):
+    response = client.get('/api/no-such-route')
+    assert response.status_code == 404
+    assert response.get_json()['success'] is False
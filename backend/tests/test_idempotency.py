@@ -0,0 +1,132 @@
+"""Idempotency-Key handling on POST/PUT routes"""
+import uuid
+
+from conftest import PASSWORD, unique_email
+from test_webhooks import HOOK_URL
+
+
+def stored_bodies(app):
+    """Every recorded response body, from the table and this worker's LRU"""
+    conn = app.db_pool.getconn()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT response_body FROM idempotency_keys WHERE response_body IS NOT NULL")
+        bodies = [row[0] for row in cursor.fetchall()]
+    finally:
+        conn.close()
+    return bodies + [stored.body for stored in app.idempotency._responses.values()]
+
+
+def key_header(headers=None, key=None):
+    return {**(headers or {}), 'Idempotency-Key': key or uuid.uuid4().hex}
+
+
+def test_register_replays_the_first_response(client):
+    headers = key_header()
+    body = {'email': unique_email(), 'password': PASSWORD, 'full_name': 'Retry Merchant'}
+    first = client.post('/api/auth/register', headers=headers, json=body)
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    retry = client.post('/api/auth/register', headers=headers, json=body)
+    assert retry.status_code == 201
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json()['data']['user'] == first.get_json()['data']['user']
+
+    # Without the key the duplicate runs for real
+    assert client.post('/api/auth/register', json=body).status_code == 409
+
+
+def test_key_reused_for_another_body(client, merchant):
+    headers = key_header(merchant.headers)
+    assert client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL}).status_code == 201
+    response = client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL + '/other'})
+    assert response.status_code == 422
+
+
+def test_keys_are_scoped_to_the_caller(client, merchant, other_merchant):
+    key = uuid.uuid4().hex
+    first = client.post('/api/webhooks', headers=key_header(merchant.headers, key), json={'url': HOOK_URL})
+    second = client.post('/api/webhooks', headers=key_header(other_merchant.headers, key), json={'url': HOOK_URL})
+    assert second.status_code == 201
+    assert 'Idempotent-Replayed' not in second.headers
+    assert second.get_json()['data']['endpoint']['id'] != first.get_json()['data']['endpoint']['id']
+
+
+def test_replay_does_not_repeat_the_work(client, merchant):
+    headers = key_header(merchant.headers)
+    endpoint = client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL}).get_json()['data']['endpoint']
+    client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL})
+    endpoints = client.get('/api/webhooks', headers=merchant.headers).get_json()['data']['endpoints']
+    assert [entry['id'] for entry in endpoints] == [endpoint['id']]
+
+
+def test_penny_drop_replay(client, merchant):
+    headers = key_header(merchant.headers)
+    body = {'accounts': [{'account_number': '123456789012', 'ifsc': 'HDFC0000001'}]}
+    first = client.post('/api/validation/penny-drop', headers=headers, json=body)
+    retry = client.post('/api/validation/penny-drop', headers=headers, json=body)
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+
+
+def test_rejects_oversized_keys(client, merchant):
+    response = client.post('/api/webhooks', headers=key_header(merchant.headers, 'k' * 256), json={'url': HOOK_URL})
+    assert response.status_code == 400
+
+
+def test_access_tokens_are_never_stored(app, client, merchant):
+    headers = key_header()
+    body = {'email': unique_email(), 'password': PASSWORD, 'full_name': 'Token Merchant'}
+    first = client.post('/api/auth/register', headers=headers, json=body)
+    update_headers = key_header(merchant.headers)
+    update = client.put('/api/auth/update-profile', headers=update_headers, json={'full_name': 'Renamed'})
+    verification_headers = key_header(merchant.headers)
+    client.post('/api/auth/submit-verification', headers=verification_headers)
+
+    bodies = stored_bodies(app)
+    assert len(bodies) >= 3
+    # Every JWT starts with the base64 of '{"'
+    assert not [stored for stored in bodies if 'eyJ' in stored]
+
+    # Replays carry a working token of their own
+    for headers, method, path, kwargs, original in (
+            (headers, 'post', '/api/auth/register', {'json': body}, first),
+            (update_headers, 'put', '/api/auth/update-profile', {'json': {'full_name': 'Renamed'}}, update),
+            (verification_headers, 'post', '/api/auth/submit-verification', {}, None)):
+        replay = getattr(client, method)(path, headers=headers, **kwargs)
+        assert replay.headers['Idempotent-Replayed'] == 'true'
+        token = replay.get_json()['data']['access_token']
+        assert token
+        me = client.get('/api/auth/me', headers={'Authorization': f'Bearer {token}'})
+        assert me.status_code == 200
+        if original is not None:
+            assert me.get_json()['data']['user']['id'] == original.get_json()['data']['user']['id']
+
+
+def test_replay_for_a_deactivated_user_has_no_token(client, admin_headers):
+    headers = key_header()
+    body = {'email': unique_email(), 'password': PASSWORD, 'full_name': 'Soon Deactivated'}
+    first = client.post('/api/auth/register', headers=headers, json=body)
+    user_id = first.get_json()['data']['user']['id']
+    client.post(f'/api/admin/users/{user_id}/deactivate', headers=admin_headers)
+
+    replay = client.post('/api/auth/register', headers=headers, json=body)
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    assert replay.get_json()['data']['access_token'] is None
+
+
+def test_webhook_secrets_are_never_stored(app, client, merchant):
+    headers = key_header(merchant.headers)
+    first = client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL})
+    secret = first.get_json()['data']['endpoint']['secret']
+    assert secret.startswith('whsec_')
+
+    bodies = stored_bodies(app)
+    assert not [stored for stored in bodies if secret in stored or 'whsec_' in stored]
+
+    replay = client.post('/api/webhooks', headers=headers, json={'url': HOOK_URL})
+    assert replay.headers['Idempotent-Replayed'] == 'true'
+    endpoint = replay.get_json()['data']['endpoint']
+    assert endpoint['id'] == first.get_json()['data']['endpoint']['id']
+    assert endpoint['secret'] is None
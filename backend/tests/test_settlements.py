@@ -0,0 +1,280 @@
+"""Settlements: the engine against a Decimal reference, and the /api/settlements route"""
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pytest
+
+from app import create_settlement_engine
+from services.repository import utcnow
+from services.settlements import COPY_RECORD, COPY_SIGNATURE, COPY_TRAILER, BinaryCopyReader, SettlementTotals
+from services.transactions import CHANNELS, KINDS, STATUSES
+from test_transactions import seed
+
+FEES = {'upi': (50, 0), 'virtual_account': (0, 500)}
+GST_BPS = 1800
+RESULT_FIELDS = ('payment_count', 'gross', 'refund_count', 'refunds', 'fees', 'gst', 'net')
+
+
+# ----------------------------------------------------------------------
+# Reference
+# ----------------------------------------------------------------------
+def _half_up(numerator, denominator):
+    return int((Decimal(numerator) / Decimal(denominator)).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def reference_settlements(rows, fees=FEES, gst_bps=GST_BPS):
+    """The settlement rules applied one row at a time, in Decimal
+
+    ``rows`` are (merchant_id, channel, kind, status, amount, currency).
+    Returns {merchant_id: tuple in RESULT_FIELDS order}.
+    """
+    totals = {}
+    for merchant_id, channel, kind, status, amount, currency in rows:
+        if status != 'success' or currency != 'INR':
+            continue
+        entry = totals.setdefault(merchant_id, [0, 0, 0, 0, 0])
+        if kind == 'payment':
+            bps, fixed = fees[channel]
+            entry[0] += 1
+            entry[1] += amount
+            entry[4] += min(_half_up(amount * bps, 10000) + fixed, amount)
+        else:
+            entry[2] += 1
+            entry[3] += amount
+    result = {}
+    for merchant_id, (payments, gross, refund_count, refunds, fee) in totals.items():
+        gst = _half_up(fee * gst_bps, 10000)
+        result[merchant_id] = (payments, gross, refund_count, refunds, fee, gst, gross - refunds - fee - gst)
+    return result
+
+
+def engine_settlements(result):
+    """SettlementTotals.result() in reference_settlements' shape"""
+    columns = [result['merchant_id'].tolist()] + [result[name].tolist() for name in RESULT_FIELDS]
+    return {values[0]: tuple(values[1:]) for values in zip(*columns)}
+
+
+def settleable_columns(rows):
+    """What the scan query returns for ``rows``: (merchant_id, channel, kind, amount) arrays"""
+    kept = [row for row in rows if row[3] == 'success' and row[5] == 'INR']
+    return (
+        np.array([row[0] for row in kept], dtype=np.int64),
+        np.array([CHANNELS.index(row[1]) for row in kept], dtype=np.int64),
+        np.array([KINDS.index(row[2]) for row in kept], dtype=np.int64),
+        np.array([row[4] for row in kept], dtype=np.int64),
+    )
+
+
+def settle_columns(rows, chunks=1, fees=FEES, gst_bps=GST_BPS):
+    totals = SettlementTotals(fees, gst_bps)
+    for chunk in zip(*(np.array_split(column, chunks) for column in settleable_columns(rows))):
+        totals.add(*chunk)
+    return engine_settlements(totals.result())
+
+
+def copy_stream(merchant_id, channel, kind, amount):
+    """The binary COPY of the scan query for these columns"""
+    records = np.zeros(len(amount), dtype=COPY_RECORD)
+    records['fields'] = 4
+    records['merchant_id_length'], records['merchant_id'] = 4, merchant_id
+    records['channel_length'], records['channel'] = 2, channel
+    records['kind_length'], records['kind'] = 2, kind
+    records['amount_length'], records['amount'] = 8, amount
+    header = COPY_SIGNATURE + (0).to_bytes(4, 'big') + (0).to_bytes(4, 'big')
+    return header + records.tobytes() + COPY_TRAILER
+
+
+def settle_copy(rows, step, chunk_rows):
+    """Settle ``rows`` through the binary COPY parser, written ``step`` bytes at a time"""
+    totals = SettlementTotals(FEES, GST_BPS)
+    reader = BinaryCopyReader(totals.add_copy_records, chunk_rows)
+    stream = copy_stream(*settleable_columns(rows))
+    for position in range(0, len(stream), step):
+        reader.write(stream[position:position + step])
+    reader.finish()
+    return engine_settlements(totals.result())
+
+
+def random_rows(rng, n, merchants, max_amount):
+    """Random ledger rows over every channel, kind, status and currency"""
+    amounts = rng.integers(1, max_amount, n, endpoint=True)
+    # Small amounts hit the fee cap and the half-up ties
+    small = rng.random(n) < 0.2
+    amounts[small] = rng.integers(1, 1000, int(small.sum()), endpoint=True)
+    return list(zip(
+        rng.integers(1, merchants, n, endpoint=True).tolist(),
+        rng.choice(CHANNELS, n).tolist(),
+        rng.choice(KINDS, n, p=[0.9, 0.1]).tolist(),
+        rng.choice(STATUSES, n, p=[0.05, 0.9, 0.05]).tolist(),
+        amounts.tolist(),
+        rng.choice(['INR', 'USD'], n, p=[0.9, 0.1]).tolist(),
+    ))
+
+
+# ----------------------------------------------------------------------
+# Engine
+# ----------------------------------------------------------------------
+def test_fee_rounding_is_half_up():
+    rows = [
+        # 50 bps: 0.5 paise rounds up, 0.495 down, 1.5 up
+        (1, 'upi', 'payment', 'success', 100, 'INR'),
+        (1, 'upi', 'payment', 'success', 99, 'INR'),
+        (1, 'upi', 'payment', 'success', 300, 'INR'),
+        # 25 paise of fees: GST is 4.5 paise, rounded up once per settlement
+        (2, 'upi', 'payment', 'success', 5000, 'INR'),
+    ]
+    expected = {
+        1: (3, 499, 0, 0, 3, 1, 499 - 3 - 1),
+        2: (1, 5000, 0, 0, 25, 5, 5000 - 25 - 5),
+    }
+    assert reference_settlements(rows) == expected
+    assert settle_columns(rows) == expected
+
+
+def test_fees_are_capped_at_the_payment_amount():
+    # The 500 paise virtual account fee on a 300 paise credit is capped at 300
+    rows = [(7, 'virtual_account', 'payment', 'success', 300, 'INR'),
+            (7, 'virtual_account', 'payment', 'success', 800, 'INR')]
+    expected = {7: (2, 1100, 0, 0, 800, 144, 1100 - 800 - 144)}
+    assert reference_settlements(rows) == expected
+    assert settle_columns(rows) == expected
+
+
+def test_refunds_carry_no_fee():
+    rows = [(3, 'upi', 'payment', 'success', 10000, 'INR'),
+            (3, 'upi', 'refund', 'success', 2500, 'INR'),
+            (4, 'virtual_account', 'refund', 'success', 700, 'INR')]
+    expected = {
+        3: (1, 10000, 1, 2500, 50, 9, 10000 - 2500 - 50 - 9),
+        4: (0, 0, 1, 700, 0, 0, -700),
+    }
+    assert settle_columns(rows) == reference_settlements(rows) == expected
+
+
+@pytest.mark.parametrize('amount', [0, -1, -50000])
+def test_zero_and_negative_amounts_are_refused(amount):
+    totals = SettlementTotals(FEES, GST_BPS)
+    with pytest.raises(ValueError):
+        totals.add([1, 2], [0, 0], [0, 0], [1000, amount])
+    # The rejected chunk left nothing behind
+    assert engine_settlements(totals.result()) == {}
+
+
+def test_negative_merchant_ids_and_fees_are_refused():
+    with pytest.raises(ValueError):
+        SettlementTotals(FEES, GST_BPS).add([-1], [0], [0], [1000])
+    with pytest.raises(ValueError):
+        SettlementTotals({'upi': (-1, 0), 'virtual_account': (0, 500)}, GST_BPS)
+    with pytest.raises(ValueError):
+        SettlementTotals(FEES, -1)
+    with pytest.raises(ValueError):
+        SettlementTotals({'upi': (50, 0)}, GST_BPS)
+
+
+def test_other_currencies_and_unsettled_entries_are_left_out():
+    rows = [(5, 'upi', 'payment', 'success', 10000, 'INR'),
+            (5, 'upi', 'payment', 'success', 10000, 'USD'),
+            (5, 'upi', 'refund', 'success', 500, 'EUR'),
+            (5, 'upi', 'payment', 'pending', 10000, 'INR'),
+            (5, 'upi', 'payment', 'failed', 10000, 'INR'),
+            (6, 'upi', 'payment', 'success', 10000, 'USD')]
+    expected = {5: (1, 10000, 0, 0, 50, 9, 10000 - 50 - 9)}
+    assert settle_columns(rows) == reference_settlements(rows) == expected
+
+
+def test_empty_batches():
+    totals = SettlementTotals(FEES, GST_BPS)
+    totals.add([], [], [], [])
+    assert totals.rows == 0 and totals.chunks == 0
+    result = totals.result()
+    assert all(len(result[name]) == 0 for name in ('merchant_id',) + RESULT_FIELDS)
+
+    # Empty chunks between real ones change nothing
+    totals.add([1], [0], [0], [10000])
+    totals.add([], [], [], [])
+    assert engine_settlements(totals.result()) == {1: (1, 10000, 0, 0, 50, 9, 9941)}
+
+    # A COPY with no rows, and one cut off mid-row
+    assert settle_copy([], step=1, chunk_rows=10) == {}
+    reader = BinaryCopyReader(SettlementTotals(FEES, GST_BPS).add_copy_records, 10)
+    reader.write(copy_stream(*settleable_columns([(1, 'upi', 'payment', 'success', 100, 'INR')]))[:-5])
+    with pytest.raises(ValueError):
+        reader.finish()
+
+
+@pytest.mark.parametrize('max_amount, merchants', [
+    (5_000_000, 200),
+    (10 ** 13, 20),     # sums past 2**53 take the exact-integer path
+])
+def test_random_ledgers_match_the_reference(max_amount, merchants):
+    rng = np.random.default_rng(20240615)
+    rows = random_rows(rng, 20_000, merchants, max_amount)
+    expected = reference_settlements(rows)
+
+    assert settle_columns(rows) == expected
+    assert settle_columns(rows, chunks=7) == expected
+    # Binary COPY split at byte offsets that fall mid-header and mid-row
+    assert settle_copy(rows, step=997, chunk_rows=3000) == expected
+    assert settle_copy(rows, step=13, chunk_rows=1) == expected
+
+
+def test_run_matches_the_reference(app, merchant, other_merchant):
+    """A settle.py run over the ledger: INR only, settled entries only"""
+    ledger = [
+        (merchant.id, 'upi', 'payment', 'success', 100, 'INR'),
+        (merchant.id, 'upi', 'payment', 'success', 5000, 'INR'),
+        (merchant.id, 'virtual_account', 'payment', 'success', 300, 'INR'),
+        (merchant.id, 'upi', 'payment', 'success', 9000, 'USD'),
+        (merchant.id, 'upi', 'refund', 'success', 1200, 'INR'),
+        (merchant.id, 'upi', 'payment', 'failed', 4000, 'INR'),
+        (merchant.id, 'upi', 'payment', 'pending', 4000, 'INR'),
+        (other_merchant.id, 'virtual_account', 'payment', 'success', 123457, 'INR'),
+    ]
+    with app.app_context():
+        for merchant_id, channel, kind, status, amount, currency in ledger:
+            row = app.transactions.create(merchant_id, channel, amount, kind=kind, currency=currency)
+            if status != 'pending':
+                app.transactions.settle(merchant_id, row.id, status)
+
+    engine = create_settlement_engine(app)
+    engine.run(utcnow().date())
+
+    expected = reference_settlements(ledger, engine.fees, engine.gst_bps)
+    with app.app_context():
+        for merchant_id in (merchant.id, other_merchant.id):
+            rows, _ = app.settlements.history(merchant_id, 1)
+            assert tuple(getattr(rows[0], name) for name in RESULT_FIELDS) == expected[merchant_id]
+
+
+def test_run_on_an_empty_day(app):
+    summary = create_settlement_engine(app).run(utcnow().date().replace(year=2001))
+    assert (summary['transactions'], summary['merchants'], summary['net']) == (0, 0, 0)
+
+
+# ----------------------------------------------------------------------
+# /api/settlements
+# ----------------------------------------------------------------------
+def test_list_settlements(app, client, merchant):
+    seed(app, merchant.id)
+    today = utcnow().date()
+    create_settlement_engine(app).run(today)
+
+    response = client.get('/api/settlements', headers=merchant.headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert len(data['settlements']) == 1
+    settlement = data['settlements'][0]
+    assert settlement['date'] == today.isoformat()
+    # 50 bps on UPI, 500 paise per virtual account credit, 18% GST on the fees
+    assert (settlement['payment_count'], settlement['gross']) == (2, 30000)
+    assert (settlement['refund_count'], settlement['refunds']) == (1, 3000)
+    assert (settlement['fees'], settlement['gst']) == (550, 99)
+    assert settlement['net'] == 30000 - 3000 - 550 - 99
+    assert data['summary']['net'] == settlement['net']
+    assert data['has_more'] is False
+
+
+def test_settlements_reject_bad_queries(client, merchant):
+    assert client.get('/api/settlements?limit=0', headers=merchant.headers).status_code == 400
+    assert client.get('/api/settlements?before=soon', headers=merchant.headers).status_code == 400
+    assert client.get('/api/settlements').status_code == 401
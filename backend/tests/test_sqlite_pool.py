@@ -0,0 +1,37 @@
+"""The embedded SQLite driver's per-thread connections"""
+import threading
+
+from services.sqlite_pool import SQLitePool
+
+
+def query_in_threads(pool, count):
+    def work():
+        conn = pool.getconn()
+        try:
+            conn.cursor().execute('SELECT 1').fetchone()
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=work) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_connections_of_exited_threads_are_closed(tmp_path):
+    pool = SQLitePool(str(tmp_path / 'pool.db'), init_schema=False)
+    try:
+        query_in_threads(pool, 8)
+        # Every worker thread has exited, so none of its connections count
+        assert pool.usage() == (0, 0)
+        stats = pool.stats()
+        assert stats['connections_created'] == 8
+        assert stats['connections_reaped'] == 8
+
+        conn = pool.getconn()
+        conn.close()
+        query_in_threads(pool, 4)
+        assert pool.usage() == (0, 1)
+    finally:
+        pool.closeall()
@@ -0,0 +1,114 @@
+"""Transaction history, export and overview under /api/transactions"""
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+
+def seed(app, merchant_id):
+    """Five ledger entries: two settled payments, a failed one, a pending one and a refund"""
+    transactions = app.transactions
+    with app.app_context():
+        rows = [
+            transactions.create(merchant_id, 'upi', 10000, reference='order-1'),
+            transactions.create(merchant_id, 'virtual_account', 20000, reference='order-2'),
+            transactions.create(merchant_id, 'upi', 5000, reference='order-3'),
+            transactions.create(merchant_id, 'upi', 7000, reference='order-4'),
+            transactions.create(merchant_id, 'upi', 3000, kind='refund', reference='refund-1'),
+        ]
+        transactions.settle(merchant_id, rows[0].id, 'success')
+        transactions.settle(merchant_id, rows[1].id, 'success')
+        transactions.settle(merchant_id, rows[2].id, 'failed')
+        transactions.settle(merchant_id, rows[4].id, 'success')
+    return rows
+
+
+def test_history_pages_newest_first(app, client, merchant):
+    rows = seed(app, merchant.id)
+
+    response = client.get('/api/transactions?limit=2', headers=merchant.headers)
+    assert response.status_code == 200
+    page = response.get_json()['data']
+    assert page['has_more'] is True
+    seen = [entry['id'] for entry in page['transactions']]
+
+    while page['has_more']:
+        page = client.get(f"/api/transactions?limit=2&cursor={page['next_cursor']}",
+                          headers=merchant.headers).get_json()['data']
+        seen += [entry['id'] for entry in page['transactions']]
+
+    assert seen == [row.id for row in reversed(rows)]
+
+
+def test_history_filters(app, client, merchant):
+    seed(app, merchant.id)
+    data = client.get('/api/transactions?status=success&kind=payment',
+                      headers=merchant.headers).get_json()['data']
+    assert sorted(entry['reference'] for entry in data['transactions']) == ['order-1', 'order-2']
+
+    data = client.get('/api/transactions?channel=virtual_account', headers=merchant.headers).get_json()['data']
+    assert [entry['amount'] for entry in data['transactions']] == [20000]
+
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=abc', 'status=done', 'cursor=***', 'since=yesterday'])
+def test_history_rejects_bad_queries(client, merchant, query):
+    response = client.get(f'/api/transactions?{query}', headers=merchant.headers)
+    assert response.status_code == 400
+
+
+def test_history_is_per_merchant(app, client, merchant, other_merchant):
+    seed(app, merchant.id)
+    data = client.get('/api/transactions', headers=other_merchant.headers).get_json()['data']
+    assert data['transactions'] == []
+    assert client.get('/api/transactions').status_code == 401
+
+
+def test_export_ndjson(app, client, merchant):
+    rows = seed(app, merchant.id)
+    response = client.get('/api/transactions/export', headers=merchant.headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert 'attachment' in response.headers['Content-Disposition']
+    exported = [json.loads(line) for line in response.data.splitlines()]
+    assert [entry['id'] for entry in exported] == [row.id for row in rows]
+
+
+def test_export_csv_gzip(app, client, merchant):
+    rows = seed(app, merchant.id)
+    response = client.get('/api/transactions/export?format=csv&gzip=1&status=success',
+                          headers=merchant.headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/gzip'
+    reader = csv.reader(io.StringIO(gzip.decompress(response.data).decode('utf-8')))
+    header, *lines = list(reader)
+    assert header[:5] == ['id', 'channel', 'kind', 'status', 'amount']
+    assert [int(line[0]) for line in lines] == [rows[0].id, rows[1].id, rows[4].id]
+
+
+def test_export_rejects_unknown_formats(client, merchant):
+    response = client.get('/api/transactions/export?format=xml', headers=merchant.headers)
+    assert response.status_code == 400
+
+
+def test_overview(app, client, merchant):
+    seed(app, merchant.id)
+    response = client.get('/api/transactions/overview?days=7', headers=merchant.headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['days'] == 7
+    assert len(data['daily']) == 7
+    totals = data['totals']
+    assert totals['transactions'] == 4
+    assert (totals['successful'], totals['failed'], totals['pending']) == (2, 1, 1)
+    assert totals['volume'] == 30000
+    assert totals['success_rate'] == round(2 / 3, 4)
+    assert (totals['refund_count'], totals['refunds']) == (1, 3000)
+    assert data['channels']['virtual_account']['volume'] == 20000
+    assert data['daily'][-1]['volume'] == 30000
+
+
+def test_overview_rejects_bad_windows(client, merchant):
+    assert client.get('/api/transactions/overview?days=0', headers=merchant.headers).status_code == 400
+    assert client.get('/api/transactions/overview?days=x', headers=merchant.headers).status_code == 400
@@ -0,0 +1,69 @@
+"""Bank account validation under /api/validation"""
+import pytest
+
+
+def test_ifsc_lookup(client, merchant):
+    response = client.get('/api/validation/ifsc/hdfc0000001', headers=merchant.headers)
+    assert response.status_code == 200
+    branch = response.get_json()['data']['branch']
+    assert branch['ifsc'] == 'HDFC0000001'
+    assert branch['bank'] == 'HDFC Bank'
+    assert branch['city'] == 'Mumbai'
+    assert (branch['upi'], branch['neft'], branch['rtgs'], branch['imps']) == (True, True, True, True)
+
+
+@pytest.mark.parametrize('code', ['HDFC0999999', 'BAD'])
+def test_ifsc_lookup_not_found(client, merchant, code):
+    assert client.get(f'/api/validation/ifsc/{code}', headers=merchant.headers).status_code == 404
+
+
+def test_account_batch(client, merchant):
+    response = client.post('/api/validation/accounts', headers=merchant.headers, json={'accounts': [
+        {'account_number': '1234 5678 9012', 'ifsc': 'hdfc0000001', 'reference': 'vendor-1'},
+        {'account_number': '12', 'ifsc': 'HDFC0000001'},
+        {'account_number': '123456789012', 'ifsc': 'ABCD0999999'},
+        'not an object',
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    first, short, unknown, bogus = data['results']
+    assert first['valid'] and first['account_number'] == '123456789012' and first['reference'] == 'vendor-1'
+    assert first['branch']['bank'] == 'HDFC Bank'
+    assert not short['valid'] and not unknown['valid'] and not bogus['valid']
+    assert 'ifsc is not in the directory' in unknown['errors']
+    assert data['summary'] == {'total': 4, 'valid': 1, 'invalid': 3}
+
+
+@pytest.mark.parametrize('body', [None, {}, {'accounts': []}, {'accounts': 'x'}])
+def test_account_batch_rejects_bad_bodies(client, merchant, body):
+    response = client.post('/api/validation/accounts', headers=merchant.headers, json=body)
+    assert response.status_code == 400
+
+
+def test_account_batch_limit(app, client, merchant):
+    accounts = [{'account_number': '123456789012', 'ifsc': 'HDFC0000001'}] * (app.config['ACCOUNT_VALIDATION_MAX_BATCH'] + 1)
+    response = client.post('/api/validation/accounts', headers=merchant.headers, json={'accounts': accounts})
+    assert response.status_code == 400
+
+
+def test_penny_drop(client, merchant):
+    response = client.post('/api/validation/penny-drop', headers=merchant.headers, json={'accounts': [
+        {'account_number': '123456789012', 'ifsc': 'HDFC0000001'},
+        {'account_number': '123456789000', 'ifsc': 'SBIN0000691'},
+        {'account_number': '123456789999', 'ifsc': 'SBIN0000691'},
+        {'account_number': '123456789012', 'ifsc': 'ABCD0999999'},
+    ]})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    verified, missing, declined, invalid = data['results']
+    assert verified['penny_drop']['status'] == 'verified'
+    assert verified['penny_drop']['name_at_bank'] == 'STUB ACCOUNT 9012'
+    assert missing['penny_drop']['status'] == 'not_found'
+    assert declined['penny_drop']['status'] == 'failed'
+    assert invalid['penny_drop'] is None
+    assert data['summary']['penny_drop']['verified'] == 1
+
+
+def test_requires_auth(client):
+    assert client.get('/api/validation/ifsc/HDFC0000001').status_code == 401
+    assert client.post('/api/validation/penny-drop', json={'accounts': []}).status_code == 401
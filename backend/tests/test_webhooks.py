@@ -0,0 +1,98 @@
+"""Webhook endpoints under /api/webhooks"""
+from types import SimpleNamespace
+
+import pytest
+
+from services.webhooks import WebhookDispatcher
+
+HOOK_URL = 'https://hooks.example.com/davspay'
+
+
+def create_endpoint(client, merchant, **fields):
+    response = client.post('/api/webhooks', headers=merchant.headers, json={'url': HOOK_URL, **fields})
+    assert response.status_code == 201
+    return response.get_json()['data']['endpoint']
+
+
+def test_create_and_list(client, merchant):
+    endpoint = create_endpoint(client, merchant, max_concurrency=2)
+    assert endpoint['secret'].startswith('whsec_')
+    assert endpoint['max_concurrency'] == 2
+
+    response = client.get('/api/webhooks', headers=merchant.headers)
+    assert response.status_code == 200
+    endpoints = response.get_json()['data']['endpoints']
+    assert [entry['id'] for entry in endpoints] == [endpoint['id']]
+    assert 'secret' not in endpoints[0]
+
+
+def test_create_validates_url_and_concurrency(client, merchant):
+    for body in ({}, {'url': 'http://hooks.example.com/plain'}, {'url': 'not a url'},
+                 {'url': HOOK_URL, 'max_concurrency': 0}, {'url': HOOK_URL, 'max_concurrency': True}):
+        response = client.post('/api/webhooks', headers=merchant.headers, json=body)
+        assert response.status_code == 400, body
+
+
+@pytest.mark.parametrize('url', [
+    'https://127.0.0.1/hook', 'https://localhost/hook', 'https://10.1.2.3/hook', 'https://192.168.0.10/hook',
+    'https://169.254.169.254/latest/meta-data', 'https://[::1]/hook', 'https://[::ffff:127.0.0.1]/hook',
+    'https://0.0.0.0/hook', 'https://internal.example.com/hook', 'https://mixed.example.com/hook',
+    'https://unknown.invalid/hook',
+])
+def test_create_refuses_non_public_hosts(client, merchant, url):
+    response = client.post('/api/webhooks', headers=merchant.headers, json={'url': url})
+    assert response.status_code == 400, url
+
+
+def test_dispatcher_rechecks_the_host_before_delivering():
+    class Session:
+        posted = []
+
+        def post(self, url, **kwargs):
+            self.posted.append(url)
+            return SimpleNamespace(status_code=200, headers={}, close=lambda: None)
+
+    dispatcher = WebhookDispatcher(None, workers=1, session=Session())
+    row = SimpleNamespace(id=1, event='webhook.test', payload='{}')
+    try:
+        # Registered while public, since re-pointed at the metadata service
+        dispatcher._deliver(row, 'https://169.254.169.254/hook', 'whsec_test')
+        _, status, error, *_ = dispatcher._results.get_nowait()
+        assert status is None and 'non-public' in error
+
+        dispatcher._deliver(row, HOOK_URL, 'whsec_test')
+        _, status, error, *_ = dispatcher._results.get_nowait()
+        assert (status, error) == (200, None)
+        assert Session.posted == [HOOK_URL]
+    finally:
+        dispatcher._executor.shutdown()
+
+
+def test_endpoint_limit(app, client, merchant):
+    for _ in range(app.config['WEBHOOK_MAX_ENDPOINTS']):
+        create_endpoint(client, merchant)
+    response = client.post('/api/webhooks', headers=merchant.headers, json={'url': HOOK_URL})
+    assert response.status_code == 409
+
+
+def test_send_test_event(client, merchant, other_merchant):
+    endpoint = create_endpoint(client, merchant)
+    response = client.post(f"/api/webhooks/{endpoint['id']}/test", headers=merchant.headers)
+    assert response.status_code == 202
+    assert response.get_json()['data']['delivery_id']
+
+    response = client.post(f"/api/webhooks/{endpoint['id']}/test", headers=other_merchant.headers)
+    assert response.status_code == 404
+
+
+def test_delete(client, merchant, other_merchant):
+    endpoint = create_endpoint(client, merchant)
+    assert client.delete(f"/api/webhooks/{endpoint['id']}", headers=other_merchant.headers).status_code == 404
+    assert client.delete(f"/api/webhooks/{endpoint['id']}", headers=merchant.headers).status_code == 200
+    assert client.get('/api/webhooks', headers=merchant.headers).get_json()['data']['endpoints'] == []
+    assert client.post(f"/api/webhooks/{endpoint['id']}/test", headers=merchant.headers).status_code == 404
+
+
+def test_requires_a_token(client):
+    assert client.get('/api/webhooks').status_code == 401
+    assert client.post('/api/webhooks', json={'url': HOOK_URL}).status_code == 401
@@ -46,6 +46,16 @@ def validate_phone(phone):
 
     return False
 
+def validate_ifsc(ifsc):
+    """Validate IFSC format: 4-letter bank code, a zero, 6-character branch code"""
+    pattern = r'^[A-Z]{4}0[A-Z0-9]{6}$'
+    return re.match(pattern, ifsc) is not None
+
+def validate_account_number(account_number):
+    """Validate Indian bank account number format (9 to 18 digits)"""
+    pattern = r'^[0-9]{9,18}$'
+    return re.match(pattern, account_number) is not None
+
 def sanitize_string(text):
     """Sanitize string input"""
     if not text:
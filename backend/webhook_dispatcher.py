@@ -0,0 +1,51 @@
+"""
+Webhook dispatcher for Davspay Backend
+
+Delivers queued webhook events from the outbox table to merchant endpoints
+(see services/webhooks.py). Run it next to the web workers, e.g. as its own
+systemd unit or supervisor program; several dispatchers can share one
+outbox. SIGTERM/SIGINT finish in-flight deliveries and hand queued events
+back before exiting.
+
+Set WEBHOOK_METRICS_PORT to serve Prometheus metrics (throughput, delivery
+lag, backlog) from the dispatcher.
+
+Usage:
+    python webhook_dispatcher.py [development|production]
+"""
+import logging
+import signal
+import sys
+import threading
+
+from prometheus_client import start_http_server
+
+from app import create_app, create_webhook_dispatcher
+from services.webhooks import DispatcherMetrics
+
+
+def main(env="production"):
+    app = create_app(env)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    app.logger.setLevel(logging.INFO)
+
+    metrics = DispatcherMetrics()
+    port = app.config['WEBHOOK_METRICS_PORT']
+    if port:
+        start_http_server(port, registry=metrics.registry)
+        app.logger.info(f"Webhook metrics on :{port}/metrics")
+
+    dispatcher = create_webhook_dispatcher(app, metrics)
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+
+    app.logger.info(f"Webhook dispatcher started ({app.db_pool.dialect}, "
+                    f"{app.config['WEBHOOK_WORKERS']} workers)")
+    dispatcher.run(stop)
+    app.logger.info(f"Webhook dispatcher stopped: {dispatcher.stats()}")
+    app.db_pool.closeall()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else "production")
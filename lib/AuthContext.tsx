@@ -19,7 +19,8 @@ interface AuthContextType {
   login: (email: string, password: string, rememberMe?: boolean) => Promise<boolean>;
   register: (data: RegisterData) => Promise<boolean>;
   logout: () => void;
-  updateUser: (user: User) => void;
+  updateUser: (user: User, accessToken?: string) => void;
+  updateProfile: (changes: ProfileChanges) => Promise<boolean>;
   isAuthenticated: boolean;
   loading: boolean;
 }
@@ -32,6 +33,12 @@ interface RegisterData {
   phone?: string;
 }
 
+interface ProfileChanges {
+  full_name?: string;
+  company_name?: string;
+  phone?: string;
+}
+
 const AuthContext = createContext<AuthContextType | undefined>(undefined);
 
 export const useAuth = () => {
@@ -140,18 +147,55 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
     }
   };
 
-  const updateUser = (updatedUser: User) => {
+  // Profile writes return a fresh access_token: the old one carries the
+  // previous profile, which the API no longer answers /auth/me from
+  const updateUser = (updatedUser: User, accessToken?: string) => {
     setUser(updatedUser);
-    // Update stored user data
-    const storedInLocal = localStorage.getItem('davspay_token');
-    if (storedInLocal) {
-      localStorage.setItem('davspay_user', JSON.stringify(updatedUser));
-    } else {
-      sessionStorage.setItem('davspay_user', JSON.stringify(updatedUser));
+    if (accessToken) {
+      setToken(accessToken);
+    }
+    // Update stored data wherever the session lives
+    const storage = localStorage.getItem('davspay_token') ? localStorage : sessionStorage;
+    storage.setItem('davspay_user', JSON.stringify(updatedUser));
+    if (accessToken) {
+      storage.setItem('davspay_token', accessToken);
+    }
+  };
+
+  const updateProfile = async (changes: ProfileChanges): Promise<boolean> => {
+    try {
+      const response = await fetch(`${API_URL}/auth/update-profile`, {
+        method: 'PUT',
+        headers: {
+          'Content-Type': 'application/json',
+          'Authorization': `Bearer ${token}`,
+        },
+        body: JSON.stringify(changes),
+      });
+
+      const result = await response.json();
+
+      if (response.ok && result.success && user) {
+        const { user: updated, access_token } = result.data;
+        updateUser({ ...user, ...updated }, access_token);
+        return true;
+      }
+
+      return false;
+    } catch (error) {
+      console.error('Profile update error:', error);
+      return false;
     }
   };
 
   const logout = () => {
+    // Revoke the token server-side too; the local session ends regardless
+    if (token) {
+      fetch(`${API_URL}/auth/logout`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+      }).catch((error) => console.error('Logout error:', error));
+    }
     setUser(null);
     setToken(null);
     // Clear both localStorage and sessionStorage
@@ -170,6 +214,7 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
     register,
     logout,
     updateUser,
+    updateProfile,
     isAuthenticated: !!user && !!token,
     loading,
   };